@@ -65,6 +65,11 @@ EXTRA_REQUIRES = dict(
 	# Dependencies for developing OctoPrint plugins
 	plugins=[
 		"cookiecutter>=1.4,<1.5"
+	],
+
+	# Dependencies for detecting attached printers through udev instead of polling the USB bus
+	hotplug=[
+		"pyudev>=0.16"
 	]
 )
 
@@ -11,6 +11,10 @@ import subprocess
 import Queue
 import threading
 import collections
+import copy
+import time
+
+from multiprocessing.pool import ThreadPool
 
 from octoprint.settings import settings
 import octoprint.plugin
@@ -107,19 +111,40 @@ class Events(object):
 def eventManager():
 	global _instance
 	if _instance is None:
-		_instance = EventManager()
+		s = settings()
+		_instance = EventManager(workers=s.getInt(["events", "dispatch", "workers"]),
+		                         coalesce=s.get(["events", "dispatch", "coalesce"]))
 	return _instance
 
 
 class EventManager(object):
 	"""
 	Handles receiving events and dispatching them to subscribers
+
+	Every subscriber -- each subscribed listener and each :class:`~octoprint.plugin.EventHandlerPlugin` -- gets
+	its own queue of events, which is processed on a pool of ``workers`` threads. Subscribers receive their events
+	in the order they were fired, but a slow subscriber only delays its own events, not those of all others. Bound
+	methods of the same object count as one subscriber, so an object subscribing separate handlers to e.g. the
+	opening and closing of client connections still receives those events in order.
+
+	Events whose names are contained in ``coalesce`` are not queued for a subscriber if an identical event (same
+	name, equal payload) is still waiting to be delivered to it, so bursts of them are only delivered once.
 	"""
 
-	def __init__(self):
+	SLOW_LISTENER_THRESHOLD = 5.0
+	"""Seconds after which a listener's handling of an event gets logged as slow."""
+
+	def __init__(self, workers=4, coalesce=None):
 		self._registeredListeners = collections.defaultdict(list)
 		self._logger = logging.getLogger(__name__)
 
+		self._coalesce = frozenset(coalesce) if coalesce else frozenset()
+
+		self._subscribers = dict()
+		self._metrics = collections.defaultdict(_ListenerMetrics)
+		self._lock = threading.Lock()
+		self._pool = ThreadPool(max(workers, 1))
+
 		self._queue = Queue.Queue()
 		self._worker = threading.Thread(target=self._work)
 		self._worker.daemon = True
@@ -129,22 +154,86 @@ class EventManager(object):
 		try:
 			while True:
 				event, payload = self._queue.get(True)
+				self._dispatch(event, payload)
+
+				if event == Events.UPDATED_FILES and isinstance(payload, dict) and payload.get("type") == "printables":
+					# when sending UpdatedFiles with type "printables", also send another event with deprecated type "gcode"
+					# TODO v1.3.0 Remove again
+					legacy_payload = copy.deepcopy(payload)
+					legacy_payload["type"] = "gcode"
+					self._dispatch(event, legacy_payload)
+		except:
+			self._logger.exception("Ooops, the event bus worker loop crashed")
 
-				eventListeners = self._registeredListeners[event]
-				self._logger.debug("Firing event: %s (Payload: %r)" % (event, payload))
-
-				for listener in eventListeners:
-					self._logger.debug("Sending action to %r" % listener)
-					try:
-						listener(event, payload)
-					except:
-						self._logger.exception("Got an exception while sending event %s (Payload: %r) to %s" % (event, payload, listener))
+	def _dispatch(self, event, payload):
+		self._logger.debug("Firing event: %s (Payload: %r)" % (event, payload))
 
-				octoprint.plugin.call_plugin(octoprint.plugin.types.EventHandlerPlugin,
-				                             "on_event",
-				                             args=[event, payload])
+		subscribers = [(_subscriber_key(listener), _listener_name(listener), listener) for listener in list(self._registeredListeners[event])]
+		try:
+			for plugin, on_event in octoprint.plugin.plugin_manager().get_implementation_methods("on_event", octoprint.plugin.types.EventHandlerPlugin):
+				subscribers.append((_subscriber_key(on_event), plugin._identifier, on_event))
 		except:
-			self._logger.exception("Ooops, the event bus worker loop crashed")
+			self._logger.exception("Error while collecting the event handler plugins for event %s" % event)
+
+		now = time.time()
+		with self._lock:
+			for key, name, callback in subscribers:
+				subscriber = self._subscribers.get(key)
+				if subscriber is None:
+					subscriber = self._subscribers[key] = _Subscriber()
+
+				if event in self._coalesce and any(e == event and p == payload and c == callback
+				                                   for e, p, _, _, c in subscriber.pending):
+					self._metrics[name].coalesced += 1
+					continue
+
+				subscriber.pending.append((event, payload, now, name, callback))
+				if not subscriber.scheduled:
+					subscriber.scheduled = True
+					self._pool.apply_async(self._deliver, (key, subscriber))
+
+	def _deliver(self, key, subscriber):
+		while True:
+			with self._lock:
+				if not subscriber.pending:
+					subscriber.scheduled = False
+					if self._subscribers.get(key) is subscriber:
+						del self._subscribers[key]
+					return
+				event, payload, fired, name, callback = subscriber.pending.popleft()
+
+			self._logger.debug("Sending action to %s" % name)
+			start = time.time()
+			try:
+				callback(event, payload)
+			except:
+				self._logger.exception("Got an exception while sending event %s (Payload: %r) to %s" % (event, payload, name))
+			duration = time.time() - start
+
+			if duration > self.SLOW_LISTENER_THRESHOLD:
+				self._logger.warn("Sending event %s to %s took %.1fs" % (event, name, duration))
+
+			with self._lock:
+				self._metrics[name].record(start - fired, duration)
+
+	def get_metrics(self):
+		"""
+		Returns the number of events waiting to be dispatched (``queued``) and per subscriber the number of delivered
+		(``calls``), waiting (``pending``) and coalesced (``coalesced``) events, the time between firing and delivery
+		(``delay``) and the time spent handling the events (``duration``), both average and maximum in seconds.
+		"""
+		with self._lock:
+			pending = collections.defaultdict(int)
+			for subscriber in self._subscribers.values():
+				for _, _, _, name, _ in subscriber.pending:
+					pending[name] += 1
+
+			listeners = dict()
+			for name in set(self._metrics.keys()) | set(pending.keys()):
+				listeners[name] = self._metrics[name].as_dict()
+				listeners[name]["pending"] = pending[name]
+
+		return dict(queued=self._queue.qsize(), listeners=listeners)
 
 	def fire(self, event, payload=None):
 		"""
@@ -159,14 +248,6 @@ class EventManager(object):
 
 		self._queue.put((event, payload))
 
-		if event == Events.UPDATED_FILES and "type" in payload and payload["type"] == "printables":
-			# when sending UpdatedFiles with type "printables", also send another event with deprecated type "gcode"
-			# TODO v1.3.0 Remove again
-			import copy
-			legacy_payload = copy.deepcopy(payload)
-			legacy_payload["type"] = "gcode"
-			self._queue.put((event, legacy_payload))
-
 	def subscribe(self, event, callback):
 		"""
 		Subscribe a listener to an event -- pass in the event name (as a string) and the callback object
@@ -192,6 +273,53 @@ class EventManager(object):
 		self._logger.debug("Unsubscribed listener %r for event %s" % (callback, event))
 
 
+class _Subscriber(object):
+	def __init__(self):
+		# (event, payload, fired, listener name, callback)
+		self.pending = collections.deque()
+		self.scheduled = False
+
+
+class _ListenerMetrics(object):
+	def __init__(self):
+		self.calls = 0
+		self.coalesced = 0
+		self.delay_total = self.delay_max = 0.0
+		self.duration_total = self.duration_max = 0.0
+
+	def record(self, delay, duration):
+		self.calls += 1
+		self.delay_total += delay
+		self.delay_max = max(self.delay_max, delay)
+		self.duration_total += duration
+		self.duration_max = max(self.duration_max, duration)
+
+	def as_dict(self):
+		calls = max(self.calls, 1)
+		return dict(calls=self.calls,
+		            coalesced=self.coalesced,
+		            delay=dict(avg=self.delay_total / calls, max=self.delay_max),
+		            duration=dict(avg=self.duration_total / calls, max=self.duration_max))
+
+
+def _subscriber_key(listener):
+	# bound methods of the same object share the object's queue, the object itself might not be hashable
+	instance = getattr(listener, "im_self", None)
+	if instance is not None:
+		return "instance", id(instance)
+	return listener
+
+
+def _listener_name(listener):
+	instance = getattr(listener, "im_self", None)
+	if instance is not None:
+		return "{}.{}".format(instance.__class__.__name__, listener.__name__)
+	name = getattr(listener, "__name__", None)
+	if name is not None:
+		return "{}.{}".format(getattr(listener, "__module__", None), name)
+	return repr(listener)
+
+
 class GenericEventListener(object):
 	"""
 	The GenericEventListener can be subclassed to easily create custom event listeners.
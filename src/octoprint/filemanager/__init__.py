@@ -5,6 +5,7 @@ __author__ = "Gina Häußge <osd@foosel.net>"
 __license__ = 'GNU Affero General Public License http://www.gnu.org/licenses/agpl.html'
 __copyright__ = "Copyright (C) 2014 The OctoPrint Project - Released under terms of the AGPLv3 License"
 
+import io
 import logging
 import os
 
@@ -14,9 +15,10 @@ import octoprint.util
 from octoprint.events import eventManager, Events
 
 from .destinations import FileDestinations
-from .analysis import QueueEntry, AnalysisQueue
+from .analysis import QueueEntry, AnalysisQueue, AnalysisResultCache
 from .storage import LocalFileStorage
-from .util import AbstractFileWrapper, StreamWrapper, DiskFileWrapper
+from .util import AbstractFileWrapper, StreamWrapper, DiskFileWrapper, GcodeAnalysisSink, MinifyingGcodeStream, \
+	minified_gcode_path, is_minified_gcode_valid, remove_minified_gcode
 
 from collections import namedtuple
 
@@ -176,7 +178,18 @@ class FileManager(object):
 		self._preprocessor_hooks = dict()
 
 		import octoprint.settings
-		self._recovery_file = os.path.join(octoprint.settings.settings().getBaseFolder("data"), "print_recovery_data.yaml")
+		s = octoprint.settings.settings()
+		self._recovery_file = os.path.join(s.getBaseFolder("data"), "print_recovery_data.yaml")
+
+		self._analysis_cache = None
+		if s.getBoolean(["gcodeAnalysis", "cache", "enabled"]):
+			self._analysis_cache = AnalysisResultCache(os.path.join(s.getBaseFolder("data"), "analysis_cache.yaml"),
+			                                           max_entries=s.getInt(["gcodeAnalysis", "cache", "size"]),
+			                                           max_size=s.getInt(["gcodeAnalysis", "cache", "maxSize"]),
+			                                           max_extruders=s.getInt(["gcodeAnalysis", "maxExtruders"]))
+
+		self._streaming_analysis = s.getBoolean(["gcodeAnalysis", "streaming"])
+		self._minify_uploads = s.getBoolean(["gcodeMinification", "uploads"])
 
 	def initialize(self):
 		self.reload_plugins()
@@ -207,14 +220,17 @@ class FileManager(object):
 
 	def _determine_analysis_backlog(self, storage_type, storage_manager):
 		counter = 0
+		cached = 0
 		for entry, path, printer_profile in storage_manager.analysis_backlog:
 			file_type = get_file_type(path)[-1]
 
 			# we'll use the default printer profile for the backlog since we don't know better
 			queue_entry = QueueEntry(entry, file_type, storage_type, path, self._printer_profile_manager.get_default())
-			if self._analysis_queue.enqueue(queue_entry, high_priority=False):
+			if self._apply_cached_analysis(queue_entry, storage_manager=storage_manager):
+				cached += 1
+			elif self._analysis_queue.enqueue(queue_entry, high_priority=False):
 				counter += 1
-		self._logger.info("Added {counter} items from storage type \"{storage_type}\" to analysis queue".format(**locals()))
+		self._logger.info("Added {counter} items from storage type \"{storage_type}\" to analysis queue, {cached} more were taken from the analysis cache".format(**locals()))
 
 	def add_storage(self, storage_type, storage_manager):
 		self._storage_managers[storage_type] = storage_manager
@@ -357,6 +373,9 @@ class FileManager(object):
 			result[dst] = self._storage_managers[dst].list_files(path=path, filter=filter, recursive=recursive)
 		return result
 
+	def list_files_sorted(self, destination, path=None, filter=None, sort="name", reverse=False, limit=None, cursor=None):
+		return self._storage(destination).list_files_sorted(path=path, filter=filter, sort=sort, reverse=reverse, limit=limit, cursor=cursor)
+
 	def add_file(self, destination, path, file_object, links=None, allow_overwrite=False, printer_profile=None, analysis=None):
 		if printer_profile is None:
 			printer_profile = self._printer_profile_manager.get_current_or_default()
@@ -370,14 +389,46 @@ class FileManager(object):
 
 			if hook_file_object is not None:
 				file_object = hook_file_object
-		file_path = self._storage(destination).add_file(path, file_object, links=links, printer_profile=printer_profile, allow_overwrite=allow_overwrite)
+
+		# minify GCODE while it is being saved
+		minifying_stream = None
+		if self._minify_uploads and isinstance(file_object, AbstractFileWrapper):
+			file_type = get_file_type(path)
+			if file_type and file_type[-1] == "gcode":
+				minifying_stream = MinifyingGcodeStream(file_object.stream())
+				file_object = StreamWrapper(file_object.filename, minifying_stream)
+
+		# analyze GCODE while it is being saved instead of reading it again afterwards, unless saving doesn't read the
+		# file anyway (moved files) or analysis is paused (e.g. while printing), those are left to the analysis queue
+		analysis_sink = None
+		if analysis is None and self._streaming_analysis and isinstance(file_object, AbstractFileWrapper) \
+				and not (isinstance(file_object, DiskFileWrapper) and file_object.move) \
+				and not self._analysis_queue.paused:
+			file_type = get_file_type(path)
+			if file_type and file_type[-1] == "gcode":
+				analysis_sink = GcodeAnalysisSink(printer_profile)
+				file_object.add_sink(analysis_sink)
+
+		try:
+			file_path = self._storage(destination).add_file(path, file_object, links=links, printer_profile=printer_profile, allow_overwrite=allow_overwrite)
+		except:
+			# the storage might reject the file before reading it, stop the analysis waiting for its data
+			if analysis_sink is not None and not analysis_sink.finished:
+				analysis_sink.abort()
+			raise
 		absolute_path = self._storage(destination).path_on_disk(file_path)
 
+		if minifying_stream is not None:
+			self._logger.info("Minified {} by {} bytes".format(file_path, minifying_stream.minifier.saved))
+
 		if analysis is None:
 			file_type = get_file_type(absolute_path)
 			if file_type:
 				queue_entry = QueueEntry(file_path, file_type[-1], destination, absolute_path, printer_profile)
-				self._analysis_queue.enqueue(queue_entry, high_priority=True)
+				if analysis_sink is not None and analysis_sink.result is not None:
+					self._apply_streamed_analysis(queue_entry, analysis_sink.result)
+				elif not self._apply_cached_analysis(queue_entry):
+					self._analysis_queue.enqueue(queue_entry, high_priority=True)
 		else:
 			self._add_analysis_result(destination, path, analysis)
 
@@ -385,7 +436,10 @@ class FileManager(object):
 		return file_path
 
 	def remove_file(self, destination, path):
+		removed_files = self._files_on_disk(destination, path)
+		self._abort_analysis(destination, removed_files)
 		self._storage(destination).remove_file(path)
+		self._remove_generated_files(removed_files)
 		eventManager().fire(Events.UPDATED_FILES, dict(type="printables"))
 
 	def add_folder(self, destination, path, ignore_existing=True):
@@ -394,7 +448,10 @@ class FileManager(object):
 		return folder_path
 
 	def remove_folder(self, destination, path, recursive=True):
+		removed_files = self._files_on_disk(destination, path)
+		self._abort_analysis(destination, removed_files)
 		self._storage(destination).remove_folder(path, recursive=recursive)
+		self._remove_generated_files(removed_files)
 		eventManager().fire(Events.UPDATED_FILES, dict(type="printables"))
 
 	def get_metadata(self, destination, path):
@@ -486,6 +543,43 @@ class FileManager(object):
 			raise NoSuchStorage("No storage configured for destination {destination}".format(**locals()))
 		return self._storage_managers[destination]
 
+	def _files_on_disk(self, destination, path):
+		# the file or the files in the folder at path, whose generated files are obsolete once they are gone
+		try:
+			absolute_path = self._storage(destination).path_on_disk(path)
+		except io.UnsupportedOperation:
+			return []
+
+		if os.path.isdir(absolute_path):
+			return [os.path.join(root, name) for root, _, names in os.walk(absolute_path) for name in names]
+		return [absolute_path]
+
+	def _abort_analysis(self, destination, paths):
+		# analysis results of files that are about to be removed would only end up in their removed metadata
+		for absolute_path in paths:
+			file_type = get_file_type(absolute_path)
+			if not file_type:
+				continue
+
+			try:
+				path = self.path_in_storage(destination, absolute_path)
+				self._analysis_queue.abort(QueueEntry(path, file_type[-1], destination, absolute_path, None))
+			except:
+				self._logger.exception("Error aborting the analysis of {}".format(absolute_path))
+
+	def _remove_generated_files(self, paths):
+		from octoprint.util.comm import compiled_job_path
+
+		for path in paths:
+			try:
+				job_path = compiled_job_path(path)
+				if os.path.exists(job_path):
+					os.remove(job_path)
+
+				remove_minified_gcode(minified_gcode_path(path))
+			except:
+				self._logger.exception("Error removing the files generated from {}".format(path))
+
 	def _add_analysis_result(self, destination, path, result):
 		if not destination in self._storage_managers:
 			return
@@ -496,3 +590,81 @@ class FileManager(object):
 	def _on_analysis_finished(self, entry, result):
 		self._add_analysis_result(entry.location, entry.path, result)
 
+		if self._analysis_cache is not None and entry.location in self._storage_managers:
+			file_hash = self._get_file_hash(self._storage_managers[entry.location], entry.path)
+			if file_hash is not None:
+				self._analysis_cache.put(file_hash, entry.printer_profile, result)
+
+	def flush_analysis_cache(self):
+		"""
+		Persists the analysis results added to the analysis cache that haven't been persisted yet.
+		"""
+		if self._analysis_cache is not None:
+			self._analysis_cache.flush()
+
+	def _apply_streamed_analysis(self, entry, result):
+		"""
+		Sets the analysis result of ``entry`` from the analysis done while the file was saved.
+		"""
+		self._logger.debug("Using streamed analysis result for {entry}".format(**locals()))
+		self._on_analysis_finished(entry, result)
+		eventManager().fire(Events.METADATA_ANALYSIS_FINISHED, {"file": entry.path, "result": result})
+		self._enqueue_generated_files(entry, result)
+
+	def _apply_cached_analysis(self, entry, storage_manager=None):
+		"""
+		Sets the analysis result of ``entry`` from the analysis cache if a result for a file with identical contents
+		and the same printer profile is available.
+
+		Returns:
+		    boolean: True if a cached result was applied, False otherwise.
+		"""
+		if self._analysis_cache is None:
+			return False
+
+		if storage_manager is None:
+			storage_manager = self._storage(entry.location)
+
+		file_hash = self._get_file_hash(storage_manager, entry.path)
+		if file_hash is None:
+			return False
+
+		result = self._analysis_cache.get(file_hash, entry.printer_profile)
+		if result is None:
+			return False
+
+		self._logger.debug("Using cached analysis result for {entry}".format(**locals()))
+		storage_manager.set_additional_metadata(entry.path, "analysis", result)
+		eventManager().fire(Events.METADATA_ANALYSIS_FINISHED, {"file": entry.path, "result": result})
+		self._enqueue_generated_files(entry, result)
+		return True
+
+	def _enqueue_generated_files(self, entry, result):
+		"""
+		Enqueues ``entry`` for creating its compiled print job and minified version if enabled and missing, for files
+		whose analysis ``result`` was available without running them through the analysis queue, which creates those
+		for all files it analyzes.
+		"""
+		if entry.type != "gcode":
+			return
+
+		import octoprint.settings
+		from octoprint.util.comm import compiled_job_path, is_compiled_job_valid
+
+		s = octoprint.settings.settings()
+		path = entry.absolute_path
+		missing_job = s.getBoolean(["serial", "compileJobs"]) \
+		              and not is_compiled_job_valid(path, compiled_job_path(path))
+		missing_minified = s.getBoolean(["gcodeMinification", "transfers"]) \
+		                   and not is_minified_gcode_valid(path, minified_gcode_path(path))
+		if not missing_job and not missing_minified:
+			return
+
+		self._analysis_queue.enqueue(entry._replace(analysis=result), high_priority=False)
+
+	def _get_file_hash(self, storage_manager, path):
+		metadata = storage_manager.get_metadata(path)
+		if not isinstance(metadata, dict) or not "hash" in metadata:
+			return None
+		return metadata["hash"]
+
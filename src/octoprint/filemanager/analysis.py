@@ -11,14 +11,17 @@ import Queue as queue
 import os
 import threading
 import collections
+import json
 import time
+import multiprocessing
 
 from octoprint.events import Events, eventManager
+from octoprint.settings import settings
 
 import octoprint.util.gcodeInterpreter as gcodeInterpreter
 
 
-class QueueEntry(collections.namedtuple("QueueEntry", "path, type, location, absolute_path, printer_profile")):
+class QueueEntry(collections.namedtuple("QueueEntry", "path, type, location, absolute_path, printer_profile, analysis")):
 	"""
 	A :class:`QueueEntry` for processing through the :class:`AnalysisQueue`. Wraps the entry's properties necessary
 	for processing.
@@ -30,8 +33,13 @@ class QueueEntry(collections.namedtuple("QueueEntry", "path, type, location, abs
 	    location (str): Location the file is located on.
 	    absolute_path (str): Absolute path on disk through which to access the file.
 	    printer_profile (PrinterProfile): :class:`PrinterProfile` which to use for analysis.
+	    analysis (dict): Analysis result of the file if already known (e.g. from the analysis cache), in which case
+	        the file is only processed further (e.g. compiled into a print job) and the result isn't reported again.
 	"""
 
+	def __new__(cls, path, type, location, absolute_path, printer_profile, analysis=None):
+		return super(QueueEntry, cls).__new__(cls, path, type, location, absolute_path, printer_profile, analysis)
+
 	def __str__(self):
 		return "{location}:{path}".format(location=self.location, path=self.path)
 
@@ -56,8 +64,22 @@ class AnalysisQueue(object):
 	def __init__(self):
 		self._logger = logging.getLogger(__name__)
 		self._callbacks = []
+
+		s = settings()
+		self._budget = CpuBudget(idle_share=s.getFloat(["gcodeAnalysis", "cpuBudget", "idle"]),
+		                         busy_share=s.getFloat(["gcodeAnalysis", "cpuBudget", "busy"]),
+		                         time_slice=s.getFloat(["gcodeAnalysis", "cpuBudget", "slice"]))
+
+		workers = s.getInt(["gcodeAnalysis", "workers"])
+		if workers == 1:
+			gcode_queue = GcodeAnalysisQueue(self._analysis_finished, budget=self._budget)
+		else:
+			gcode_queue = ProcessPoolGcodeAnalysisQueue(self._analysis_finished, budget=self._budget,
+			                                            workers=workers,
+			                                            niceness=s.getInt(["gcodeAnalysis", "workerNiceness"]))
+
 		self._queues = dict(
-			gcode=GcodeAnalysisQueue(self._analysis_finished)
+			gcode=gcode_queue
 		)
 
 	def register_finish_callback(self, callback):
@@ -81,11 +103,277 @@ class AnalysisQueue(object):
 		for queue in self._queues.values():
 			queue.resume()
 
+	@property
+	def paused(self):
+		"""
+		Whether analysis is currently paused, e.g. while printing.
+		"""
+		return any(queue.paused for queue in self._queues.values())
+
+	def abort(self, entry):
+		"""
+		Aborts a running analysis of the file described by the :class:`QueueEntry` ``entry``, if supported by the
+		queue responsible for its type.
+		"""
+		if not entry.type in self._queues:
+			return False
+		return self._queues[entry.type].abort(entry.location, entry.path)
+
+	def set_busy(self, busy):
+		"""
+		Signals whether the printer is currently busy (e.g. transferring a file or printing), in which case low
+		priority analysis backs off to the ``busy`` CPU share configured for the :class:`CpuBudget`.
+		"""
+		for queue in self._queues.values():
+			queue.set_busy(busy)
+
 	def _analysis_finished(self, entry, result):
 		for callback in self._callbacks:
 			callback(entry, result)
 		eventManager().fire(Events.METADATA_ANALYSIS_FINISHED, {"file": entry.path, "result": result})
 
+class AnalysisResultCache(object):
+	"""
+	Persistent LRU cache of analysis results, shared by all storages.
+
+	Results are keyed by the hash of the analyzed file's contents together with the parameters of the printer profile
+	the analysis depends on, so identical files uploaded under another name or into another folder can reuse an
+	existing result instead of being analyzed again. Only the fields of a result listed in :attr:`FIELDS` are kept.
+	At most ``max_entries`` results taking up at most ``max_size`` bytes are kept, the least recently used ones are
+	evicted first.
+
+	The cache is persisted as YAML to ``path`` ``save_delay`` seconds after a result was added, so that the results
+	of many files analyzed in a row are written at once. Results added within the last ``save_delay`` seconds before
+	a shutdown are lost unless :meth:`flush` is called.
+
+	Arguments:
+	    path (str): Path of the file to persist the cache to.
+	    max_entries (int): Maximum number of results to keep.
+	    max_extruders (int): Value of the ``gcodeAnalysis.maxExtruders`` setting, part of the key since it influences
+	        the analysis result.
+	    max_size (int): Maximum size of the kept results in bytes, measured as their JSON representation.
+	    save_delay (float): Delay in seconds between adding a result and persisting the cache.
+	"""
+
+	FIELDS = ("estimatedPrintTime", "filament")
+
+	def __init__(self, path, max_entries=1000, max_extruders=10, max_size=1024 * 1024, save_delay=5.0):
+		self._logger = logging.getLogger(__name__)
+
+		self._path = path
+		self._max_entries = max_entries
+		self._max_extruders = max_extruders
+		self._max_size = max_size
+		self._save_delay = save_delay
+
+		self._entries = collections.OrderedDict()
+		self._sizes = dict()
+		self._size = 0
+		self._mutex = threading.RLock()
+		self._save_timer = None
+
+		self._load()
+
+	def get(self, file_hash, printer_profile):
+		"""
+		Returns the cached analysis result for a file with hash ``file_hash`` analyzed with ``printer_profile``, or
+		``None`` if there is none.
+		"""
+		key = self._key(file_hash, printer_profile)
+		with self._mutex:
+			if not key in self._entries:
+				return None
+
+			# move to the end of the LRU order
+			result = self._entries.pop(key)
+			self._entries[key] = result
+			return dict(result)
+
+	def put(self, file_hash, printer_profile, result):
+		"""
+		Adds the analysis ``result`` for a file with hash ``file_hash`` analyzed with ``printer_profile``, evicting the
+		least recently used results if the cache is full.
+		"""
+		key = self._key(file_hash, printer_profile)
+		with self._mutex:
+			self._add(key, result)
+			self._schedule_save()
+
+	def flush(self):
+		"""
+		Persists the cache now if results were added since it was last persisted.
+		"""
+		with self._mutex:
+			if self._save_timer is None:
+				return
+			self._save_timer.cancel()
+			self._save_timer = None
+			self._save()
+
+	def __len__(self):
+		return len(self._entries)
+
+	def _add(self, key, result):
+		self._remove(key)
+
+		result = dict((field, result[field]) for field in self.FIELDS if field in result)
+		size = len(json.dumps(result))
+		self._entries[key] = result
+		self._sizes[key] = size
+		self._size += size
+
+		while self._entries and (len(self._entries) > self._max_entries or self._size > self._max_size):
+			self._remove(next(iter(self._entries)))
+
+	def _remove(self, key):
+		if key in self._entries:
+			del self._entries[key]
+			self._size -= self._sizes.pop(key)
+
+	def _schedule_save(self):
+		if self._save_timer is not None:
+			return
+
+		if self._save_delay <= 0:
+			self._save()
+			return
+
+		self._save_timer = threading.Timer(self._save_delay, self.flush)
+		self._save_timer.daemon = True
+		self._save_timer.start()
+
+	def _key(self, file_hash, printer_profile):
+		import hashlib
+
+		if printer_profile:
+			axes = printer_profile.get("axes", dict())
+			extruder = printer_profile.get("extruder", dict())
+			parameters = (axes.get("x", dict()).get("speed"),
+			              axes.get("y", dict()).get("speed"),
+			              tuple(tuple(offset) for offset in extruder.get("offsets", [])),
+			              self._max_extruders)
+		else:
+			parameters = (self._max_extruders,)
+
+		return "{}:{}".format(file_hash, hashlib.sha1(repr(parameters)).hexdigest())
+
+	def _load(self):
+		if not os.path.isfile(self._path):
+			return
+
+		try:
+			import yaml
+			with open(self._path) as f:
+				data = yaml.safe_load(f)
+		except:
+			self._logger.exception("Error while loading analysis cache from {}".format(self._path))
+			return
+
+		if not isinstance(data, list):
+			return
+
+		with self._mutex:
+			for entry in data[-self._max_entries:]:
+				if isinstance(entry, dict) and "key" in entry and isinstance(entry.get("result"), dict):
+					self._add(entry["key"], entry["result"])
+
+	def _save(self):
+		data = [dict(key=key, result=result) for key, result in self._entries.items()]
+		try:
+			import yaml
+			from octoprint.util import atomic_write
+			with atomic_write(self._path) as f:
+				yaml.safe_dump(data, stream=f, default_flow_style=False, indent="  ", allow_unicode=True)
+		except:
+			self._logger.exception("Error while saving analysis cache to {}".format(self._path))
+
+
+class CpuBudget(object):
+	"""
+	Duty cycle scheduler limiting the share of time low priority analysis may spend working.
+
+	Analysis implementations call :meth:`throttle` regularly. Once the work done since the last pause exceeds the
+	current share of a time slice of ``time_slice`` seconds, :meth:`throttle` sleeps long enough to bring the ratio of
+	working time to total time back down to the share. The share is ``idle_share`` while the printer is idle and
+	``busy_share`` while it is busy (see :meth:`set_busy`), a share of ``1.0`` disables throttling completely.
+
+	Changes of the busy state take effect immediately, even if the analysis is currently sleeping.
+
+	Arguments:
+	    idle_share (float): Share of time to spend working while the printer is idle, between 0.01 and 1.0.
+	    busy_share (float): Share of time to spend working while the printer is busy, between 0.01 and 1.0.
+	    time_slice (float): Length of a time slice in seconds.
+	"""
+
+	MIN_SHARE = 0.01
+
+	def __init__(self, idle_share=0.5, busy_share=0.1, time_slice=0.1):
+		self._idle_share = self._clamp(idle_share)
+		self._busy_share = self._clamp(busy_share)
+		self._time_slice = time_slice
+
+		self._busy = False
+		self._condition = threading.Condition()
+		self._work_start = None
+
+	@property
+	def share(self):
+		return self._busy_share if self._busy else self._idle_share
+
+	@property
+	def idle_share(self):
+		return self._idle_share
+
+	@property
+	def busy_share(self):
+		return self._busy_share
+
+	@property
+	def time_slice(self):
+		return self._time_slice
+
+	@property
+	def busy(self):
+		return self._busy
+
+	def set_busy(self, busy):
+		with self._condition:
+			if self._busy == busy:
+				return
+			self._busy = busy
+			self._work_start = time.time()
+			self._condition.notify_all()
+
+	def start(self):
+		"""
+		Starts a new time slice, to be called when the throttled work starts.
+		"""
+		self._work_start = time.time()
+
+	def throttle(self):
+		now = time.time()
+		if self._work_start is None:
+			self._work_start = now
+			return
+
+		with self._condition:
+			share = self.share
+			if share >= 1.0:
+				self._work_start = now
+				return
+
+			worked = now - self._work_start
+			if worked < share * self._time_slice:
+				return
+
+			self._condition.wait(worked * (1.0 - share) / share)
+		self._work_start = time.time()
+
+	@classmethod
+	def _clamp(cls, share):
+		return min(1.0, max(cls.MIN_SHARE, share))
+
+
 class AbstractAnalysisQueue(object):
 	"""
 	The :class:`AbstractAnalysisQueue` is the parent class of all specific analysis queues such as the
@@ -96,6 +384,8 @@ class AbstractAnalysisQueue(object):
 	    finished_callback (callable): Callback that will be called upon finishing analysis of an entry in the queue.
 	        The callback will be called with the analyzed entry as the first argument and the analysis result as
 	        returned from the queue implementation as the second parameter.
+	    budget (CpuBudget): :class:`CpuBudget` to use for throttling low priority analysis. If not set, a budget
+	        with default shares will be used.
 
 	.. automethod:: _do_analysis
 
@@ -105,10 +395,11 @@ class AbstractAnalysisQueue(object):
 	LOW_PRIO = 0
 	HIGH_PRIO = 100
 
-	def __init__(self, finished_callback):
+	def __init__(self, finished_callback, budget=None):
 		self._logger = logging.getLogger(__name__)
 
 		self._finished_callback = finished_callback
+		self._budget = budget if budget is not None else CpuBudget()
 
 		self._active = threading.Event()
 		self._active.set()
@@ -118,6 +409,7 @@ class AbstractAnalysisQueue(object):
 
 		self._queue = queue.PriorityQueue()
 		self._current = None
+		self._discarded = None
 
 		self._worker = threading.Thread(target=self._work)
 		self._worker.daemon = True
@@ -164,6 +456,26 @@ class AbstractAnalysisQueue(object):
 		self._logger.debug("Resuming analyzer")
 		self._active.set()
 
+	@property
+	def paused(self):
+		return not self._active.is_set()
+
+	def abort(self, location, path):
+		"""
+		Aborts a running analysis of the file ``path`` on ``location``. Not supported by default, sub classes able
+		to abort individual entries need to override this.
+
+		Returns:
+		    boolean: True if a running analysis was aborted, False otherwise.
+		"""
+		return False
+
+	def set_busy(self, busy):
+		"""
+		Sets the busy state of the queue's :class:`CpuBudget`.
+		"""
+		self._budget.set_busy(busy)
+
 	def _work(self):
 		aborted = None
 		while True:
@@ -181,10 +493,16 @@ class AbstractAnalysisQueue(object):
 				self._analyze(entry, high_priority=(priority == self.__class__.HIGH_PRIO))
 				self._queue.task_done()
 			except gcodeInterpreter.AnalysisAborted:
-				aborted = entry
-				self._logger.debug("Running analysis of entry {entry} aborted".format(**locals()))
+				if entry is self._discarded:
+					self._queue.task_done()
+					self._logger.debug("Running analysis of entry {entry} aborted, discarding it".format(**locals()))
+				else:
+					aborted = entry
+					self._logger.debug("Running analysis of entry {entry} aborted".format(**locals()))
 			else:
 				time.sleep(1.0)
+			finally:
+				self._discarded = None
 
 	def _analyze(self, entry, high_priority=False):
 		path = entry.absolute_path
@@ -195,14 +513,16 @@ class AbstractAnalysisQueue(object):
 		self._current_progress = 0
 
 		try:
-			self._logger.info("Starting analysis of {entry}".format(**locals()))
-			eventManager().fire(Events.METADATA_ANALYSIS_STARTED, {"file": entry.path, "type": entry.type})
+			if entry.analysis is None:
+				self._logger.info("Starting analysis of {entry}".format(**locals()))
+				eventManager().fire(Events.METADATA_ANALYSIS_STARTED, {"file": entry.path, "type": entry.type})
 			try:
 				result = self._do_analysis(high_priority=high_priority)
 			except TypeError:
 				result = self._do_analysis()
-			self._logger.debug("Analysis of entry {entry} finished, notifying callback".format(**locals()))
-			self._finished_callback(self._current, result)
+			if entry.analysis is None and entry is not self._discarded:
+				self._logger.debug("Analysis of entry {entry} finished, notifying callback".format(**locals()))
+				self._finished_callback(self._current, result)
 		finally:
 			self._current = None
 			self._current_progress = None
@@ -246,34 +566,354 @@ class GcodeAnalysisQueue(AbstractAnalysisQueue):
 	     * The extruded length in mm
 	   - * ``filament.toolX.volume``
 	     * The extruded volume in cm³
+	   - * ``analysisStats``
+	     * Substructure describing the analysis run itself: the number of ``lines`` analyzed, the ``duration`` of the
+	       analysis in seconds and the achieved ``linesPerSecond``.
+
+	Low priority entries are throttled according to the :class:`CpuBudget` of the queue, high priority entries are
+	analyzed at full speed.
+
+	The analysis engine used is selected through the ``gcodeAnalysis.engine`` setting, ``chunked`` (default) uses
+	:class:`~octoprint.util.gcodeInterpreter.chunkedGcode`, ``legacy`` the line based
+	:class:`~octoprint.util.gcodeInterpreter.gcode` interpreter. Both produce the same results.
+
+	If ``serial.compileJobs`` is enabled, analyzed files are also compiled into print jobs for streaming them to the
+	printer, see :func:`~octoprint.util.comm.compile_gcode_file`. If ``gcodeMinification.transfers`` is enabled, a
+	minified version for transferring them to the printer is created as well, see
+	:func:`~octoprint.filemanager.util.minify_gcode_file`. Entries with a known analysis result are only processed
+	further that way.
 	"""
 
+	ENGINES = dict(
+		chunked=gcodeInterpreter.chunkedGcode,
+		legacy=gcodeInterpreter.gcode
+	)
+
 	def _do_analysis(self, high_priority=False):
 		try:
-			def throttle():
-				time.sleep(0.01)
-
-			throttle_callback = throttle
-			if high_priority:
-				throttle_callback = None
-
-			self._gcode = gcodeInterpreter.gcode()
-			self._gcode.load(self._current.absolute_path, self._current.printer_profile, throttle=throttle_callback)
-
-			result = dict()
-			if self._gcode.totalMoveTimeMinute:
-				result["estimatedPrintTime"] = self._gcode.totalMoveTimeMinute * 60
-			if self._gcode.extrusionAmount:
-				result["filament"] = dict()
-				for i in range(len(self._gcode.extrusionAmount)):
-					result["filament"]["tool%d" % i] = {
-						"length": self._gcode.extrusionAmount[i],
-						"volume": self._gcode.extrusionVolume[i]
-					}
+			throttle_callback = None
+			if not high_priority:
+				self._budget.start()
+				throttle_callback = self._budget.throttle
+
+			result = self._current.analysis
+			if result is None:
+				self._gcode = self.ENGINES[self._engine()]()
+
+				start = time.time()
+				self._gcode.load(self._current.absolute_path, self._current.printer_profile, throttle=throttle_callback)
+				duration = time.time() - start
+
+				self._logger.debug("Analyzed {} lines in {:.2f}s".format(self._gcode.lineCount, duration))
+				result = self._create_result(self._gcode, duration)
+
+			_compile_job(self._current.absolute_path, self._compiled_job_path(self._current.absolute_path),
+			             throttle=throttle_callback)
+			_minify_gcode(self._current.absolute_path, self._current.printer_profile,
+			              self._minification(self._current.absolute_path), throttle=throttle_callback)
 			return result
 		finally:
 			self._gcode = None
 
+	def abort(self, location, path):
+		"""
+		Aborts a running analysis of the file ``path`` on ``location``. The entry will not be analyzed again and its
+		result, should the analysis already be past the point of aborting, is discarded.
+
+		Returns:
+		    boolean: True if a running analysis was aborted, False otherwise.
+		"""
+		current = self._current
+		if current is None or current.location != location or current.path != path:
+			return False
+
+		self._logger.debug("Aborting running analysis of {}".format(current))
+		self._discarded = current
+		self._do_abort()
+		return True
+
 	def _do_abort(self):
-		if self._gcode:
-			self._gcode.abort()
+		gcode = getattr(self, "_gcode", None)
+		if gcode:
+			gcode.abort()
+
+	def _engine(self):
+		engine = settings().get(["gcodeAnalysis", "engine"])
+		if not engine in self.ENGINES:
+			self._logger.warn("Unknown GCODE analysis engine {engine}, falling back to chunked".format(**locals()))
+			engine = "chunked"
+		return engine
+
+	@staticmethod
+	def _compiled_job_path(path):
+		if not settings().getBoolean(["serial", "compileJobs"]):
+			return None
+
+		from octoprint.util.comm import compiled_job_path
+		return compiled_job_path(path)
+
+	@staticmethod
+	def _minification(path):
+		if not settings().getBoolean(["gcodeMinification", "transfers"]):
+			return None
+
+		from octoprint.filemanager.util import minified_gcode_path
+		return (minified_gcode_path(path),
+		        settings().getBoolean(["gcodeMinification", "verify"]),
+		        settings().getInt(["gcodeMinification", "maxSize"]))
+
+	@staticmethod
+	def _create_result(gcode, duration):
+		result = dict()
+		if gcode.totalMoveTimeMinute:
+			result["estimatedPrintTime"] = gcode.totalMoveTimeMinute * 60
+		if gcode.extrusionAmount:
+			result["filament"] = dict()
+			for i in range(len(gcode.extrusionAmount)):
+				result["filament"]["tool%d" % i] = {
+					"length": gcode.extrusionAmount[i],
+					"volume": gcode.extrusionVolume[i]
+				}
+		result["analysisStats"] = {
+			"lines": gcode.lineCount,
+			"duration": duration,
+			"linesPerSecond": gcode.lineCount / duration if duration > 0 else None
+		}
+		return result
+
+
+class ProcessPoolGcodeAnalysisQueue(GcodeAnalysisQueue):
+	"""
+	A :class:`GcodeAnalysisQueue` that analyzes up to ``workers`` entries in parallel, each in its own worker process,
+	so that analysis neither waits behind a single thread nor competes for the GIL with the server and the printer
+	communication.
+
+	Entries are taken from the queue in the same order as with the :class:`GcodeAnalysisQueue`. Low priority entries
+	are analyzed in processes lowered in priority by ``niceness`` and are throttled by a copy of the queue's
+	:class:`CpuBudget` within each worker, following the busy state set through :meth:`set_busy`.
+
+	:meth:`pause` terminates all running worker processes, the affected entries will be analyzed again on
+	:meth:`resume`. :meth:`abort` terminates only the worker process analyzing a specific file.
+
+	Arguments:
+	    finished_callback (callable): See :class:`AbstractAnalysisQueue`.
+	    budget (CpuBudget): See :class:`AbstractAnalysisQueue`.
+	    workers (int): Maximum number of worker processes running in parallel, defaults to the number of CPUs.
+	    niceness (int): Niceness increment for worker processes analyzing low priority entries.
+	"""
+
+	def __init__(self, finished_callback, budget=None, workers=None, niceness=10):
+		if not workers:
+			workers = multiprocessing.cpu_count()
+		self._workers = workers
+		self._niceness = niceness
+
+		self._slots = threading.BoundedSemaphore(workers)
+		self._jobs = dict()
+		self._jobs_mutex = threading.Lock()
+		self._busy_event = multiprocessing.Event()
+
+		AbstractAnalysisQueue.__init__(self, finished_callback, budget=budget)
+
+	def pause(self):
+		self._logger.debug("Pausing analysis")
+		self._active.clear()
+
+		with self._jobs_mutex:
+			jobs = self._jobs.values()
+		for job in jobs:
+			self._logger.debug("Aborting running analysis of {}, will restart when analyzer is resumed".format(job.entry))
+			job.abort(requeue=True)
+
+	def abort(self, location, path):
+		"""
+		Aborts a running analysis of the file ``path`` on ``location`` by terminating the worker process analyzing
+		it. The entry will not be analyzed again.
+
+		Returns:
+		    boolean: True if a running analysis was aborted, False otherwise.
+		"""
+		with self._jobs_mutex:
+			jobs = [job for job in self._jobs.values() if job.entry.location == location and job.entry.path == path]
+		for job in jobs:
+			self._logger.debug("Aborting running analysis of {}".format(job.entry))
+			job.abort(requeue=False)
+		return len(jobs) > 0
+
+	def set_busy(self, busy):
+		AbstractAnalysisQueue.set_busy(self, busy)
+		if busy:
+			self._busy_event.set()
+		else:
+			self._busy_event.clear()
+
+	def _work(self):
+		while True:
+			self._slots.acquire()
+			(priority, entry) = self._queue.get()
+			self._logger.debug("Processing entry {entry} from queue (priority {priority})".format(**locals()))
+
+			self._active.wait()
+
+			thread = threading.Thread(target=self._run_job, args=(priority, entry), name="analysis.{}".format(entry))
+			thread.daemon = True
+			thread.start()
+
+	def _run_job(self, priority, entry):
+		try:
+			path = entry.absolute_path
+			if path is None or not os.path.exists(path):
+				return
+
+			high_priority = priority == self.__class__.HIGH_PRIO
+			job = _AnalysisJob(entry, high_priority, self._engine(), self._budget, self._busy_event,
+			                   None if high_priority else self._niceness, self._compiled_job_path(path),
+			                   self._minification(path))
+			with self._jobs_mutex:
+				self._jobs[id(job)] = job
+
+			try:
+				if entry.analysis is None:
+					self._logger.info("Starting analysis of {entry}".format(**locals()))
+					eventManager().fire(Events.METADATA_ANALYSIS_STARTED, {"file": entry.path, "type": entry.type})
+				result = job.run()
+			finally:
+				with self._jobs_mutex:
+					del self._jobs[id(job)]
+
+			if job.aborted:
+				self._logger.debug("Running analysis of entry {entry} aborted".format(**locals()))
+				if job.requeue:
+					self._queue.put((priority, entry))
+			elif result is not None and entry.analysis is None:
+				self._logger.debug("Analysis of entry {entry} finished, notifying callback".format(**locals()))
+				self._finished_callback(entry, result)
+		except:
+			self._logger.exception("Error while analyzing {entry}".format(**locals()))
+		finally:
+			self._queue.task_done()
+			self._slots.release()
+
+
+class _AnalysisJob(object):
+	"""
+	Analysis of a single :class:`QueueEntry` in a dedicated worker process, used by the
+	:class:`ProcessPoolGcodeAnalysisQueue`.
+	"""
+
+	def __init__(self, entry, high_priority, engine, budget, busy_event, niceness, compiled_job_path=None,
+	             minification=None):
+		self._logger = logging.getLogger(__name__)
+
+		self.entry = entry
+		self.aborted = False
+		self.requeue = False
+
+		self._connection, child_connection = multiprocessing.Pipe(duplex=False)
+		budget_parameters = None if high_priority else (budget.idle_share, budget.busy_share, budget.time_slice)
+		self._process = multiprocessing.Process(target=_analyze_gcode_in_worker,
+		                                        args=(child_connection, entry.absolute_path, entry.printer_profile,
+		                                              engine, budget_parameters, busy_event, niceness, compiled_job_path,
+		                                              entry.analysis, minification),
+		                                        name="analysis.{}".format(entry))
+		self._process.daemon = True
+		self._child_connection = child_connection
+		self._mutex = threading.Lock()
+
+	def run(self):
+		with self._mutex:
+			if self.aborted:
+				self._connection.close()
+				self._child_connection.close()
+				return None
+			self._process.start()
+		self._child_connection.close()
+
+		try:
+			success, result = self._connection.recv()
+		except EOFError:
+			# worker was terminated or died
+			success, result = False, None
+		finally:
+			self._connection.close()
+			self._process.join()
+
+		if not success:
+			if not self.aborted:
+				self._logger.error("Analysis of {} failed in worker process: {}".format(self.entry, result))
+			return None
+		return result
+
+	def abort(self, requeue=False):
+		with self._mutex:
+			self.aborted = True
+			self.requeue = requeue
+			if self._process.is_alive():
+				self._process.terminate()
+
+
+def _compile_job(path, job_path, throttle=None):
+	if job_path is None:
+		return
+
+	from octoprint.util.comm import compile_gcode_file
+	try:
+		compile_gcode_file(path, job_path, throttle=throttle)
+	except:
+		# the print will simply be streamed from the GCODE file then
+		logging.getLogger(__name__).exception("Error while compiling print job for {}".format(path))
+
+
+def _minify_gcode(path, printer_profile, minification, throttle=None):
+	if minification is None:
+		return
+
+	from octoprint.filemanager.util import is_minified_gcode_valid, minify_gcode_file, verify_minified_gcode, \
+		remove_minified_gcode
+
+	minified_path, verify, max_size = minification
+	try:
+		if is_minified_gcode_valid(path, minified_path):
+			return
+
+		minify_gcode_file(path, minified_path, max_size=max_size, throttle=throttle)
+		if verify and not verify_minified_gcode(path, minified_path, printer_profile, throttle=throttle):
+			logging.getLogger(__name__).warn("Minifying {} changed its moves, the original file will be transferred".format(path))
+			remove_minified_gcode(minified_path)
+	except:
+		# the original file will simply be transferred then
+		logging.getLogger(__name__).exception("Error while minifying {}".format(path))
+
+
+def _analyze_gcode_in_worker(connection, path, printer_profile, engine, budget_parameters, busy_event, niceness,
+                             compiled_job_path=None, analysis=None, minification=None):
+	try:
+		if niceness and hasattr(os, "nice"):
+			os.nice(niceness)
+
+		throttle = None
+		if budget_parameters is not None:
+			budget = CpuBudget(*budget_parameters)
+			budget.start()
+
+			def throttle():
+				budget.set_busy(busy_event.is_set())
+				budget.throttle()
+
+		result = analysis
+		if result is None:
+			gcode = GcodeAnalysisQueue.ENGINES[engine]()
+
+			start = time.time()
+			gcode.load(path, printer_profile, throttle=throttle)
+			duration = time.time() - start
+			result = GcodeAnalysisQueue._create_result(gcode, duration)
+
+		_compile_job(path, compiled_job_path, throttle=throttle)
+		_minify_gcode(path, printer_profile, minification, throttle=throttle)
+
+		connection.send((True, result))
+	except Exception as e:
+		connection.send((False, "{}: {}".format(e.__class__.__name__, e)))
+	finally:
+		connection.close()
@@ -0,0 +1,353 @@
+# coding=utf-8
+from __future__ import absolute_import
+
+__license__ = 'GNU Affero General Public License http://www.gnu.org/licenses/agpl.html'
+__copyright__ = "Copyright (C) 2016 The OctoPrint Project - Released under terms of the AGPLv3 License"
+
+
+import json
+import logging
+import os
+import shutil
+import tempfile
+import threading
+import time
+
+import pylru
+
+
+def create_metadata_backend(backend, basefolder):
+	"""
+	Creates the metadata backend of type ``backend`` (either ``yaml`` or ``sqlite``) for the storage located at
+	``basefolder``.
+
+	:param string backend:    the type of backend to create
+	:param string basefolder: the base folder of the storage to manage the metadata for
+	:return: the created :class:`MetadataBackend`
+	"""
+	if backend == "sqlite":
+		return SqliteMetadataBackend(basefolder)
+	elif backend == "yaml" or backend is None:
+		return YamlMetadataBackend(basefolder)
+	else:
+		raise ValueError("Unknown metadata backend: {backend}".format(**locals()))
+
+
+class MetadataBackend(object):
+	"""
+	Persistence of the file metadata managed by :class:`~octoprint.filemanager.storage.LocalFileStorage`.
+
+	Metadata is organized per folder as a dictionary mapping the names of the files within the folder to their
+	metadata. Dictionaries returned by :func:`get_folder` may be modified by the caller, modifications are persisted
+	through :func:`save_folder` or -- if only a single entry was modified -- :func:`save_entry`.
+	"""
+
+	CACHE_SIZE = 100
+	"""
+	Number of folders whose metadata is kept in memory. Listings recurse through all folders, so the cache should be
+	able to hold all of them for listings to be served from memory.
+	"""
+
+	def __init__(self, basefolder):
+		self.basefolder = basefolder
+
+	def get_folder(self, path):
+		"""
+		Retrieves the metadata of all files within the folder ``path``.
+
+		:param string path: absolute path of the folder
+		:return: dictionary mapping file names to their metadata, empty if there's no metadata for the folder yet
+		"""
+		raise NotImplementedError()
+
+	def save_folder(self, path, metadata):
+		"""
+		Persists the metadata of all files within the folder ``path``, removing entries not contained in ``metadata``.
+
+		:param string path:   absolute path of the folder
+		:param dict metadata: dictionary mapping file names to their metadata
+		"""
+		raise NotImplementedError()
+
+	def save_entry(self, path, name, metadata):
+		"""
+		Persists the metadata of file ``name`` within the folder ``path``. If ``name`` is not contained in
+		``metadata``, the entry will be removed.
+
+		:param string path:   absolute path of the folder
+		:param string name:   name of the file within the folder
+		:param dict metadata: the folder's metadata containing the modified entry
+		"""
+		self.save_folder(path, metadata)
+
+	def remove_folder(self, path):
+		"""
+		Removes all metadata of the folder ``path`` and its sub folders. Called before the folder itself gets deleted.
+
+		:param string path: absolute path of the folder
+		"""
+		pass
+
+	def is_metadata_file(self, name):
+		"""
+		:param string name: name of a file within a folder of the storage
+		:return: ``True`` if the file is managed by the backend, ``False`` otherwise
+		"""
+		return False
+
+
+class YamlMetadataBackend(MetadataBackend):
+	"""
+	Stores the metadata of each folder inside a ``.metadata.yaml`` file within the folder, indexed by the sanitized
+	filenames stored within the folder. Metadata access is managed through an LRU cache to minimize access overhead.
+	"""
+
+	METADATA_FILE = ".metadata.yaml"
+
+	def __init__(self, basefolder):
+		MetadataBackend.__init__(self, basefolder)
+
+		self._logger = logging.getLogger(__name__)
+		self._lock = threading.Lock()
+		self._cache = pylru.lrucache(self.CACHE_SIZE)
+
+	def get_folder(self, path):
+		if path in self._cache:
+			return self._cache[path]
+
+		metadata_path = os.path.join(path, self.METADATA_FILE)
+		if os.path.exists(metadata_path):
+			with self._lock:
+				with open(metadata_path) as f:
+					try:
+						import yaml
+						metadata = yaml.safe_load(f)
+					except:
+						self._logger.exception("Error while reading .metadata.yaml from {path}".format(**locals()))
+					else:
+						self._cache[path] = metadata
+						return metadata
+		return dict()
+
+	def save_folder(self, path, metadata):
+		metadata_path = os.path.join(path, self.METADATA_FILE)
+
+		with self._lock:
+			try:
+				import yaml
+
+				file_obj = tempfile.NamedTemporaryFile(delete=False)
+				try:
+					yaml.safe_dump(metadata, stream=file_obj, default_flow_style=False, indent="  ", allow_unicode=True)
+					file_obj.close()
+					shutil.move(file_obj.name, metadata_path)
+				finally:
+					try:
+						if os.path.exists(file_obj.name):
+							os.remove(file_obj.name)
+					except Exception as e:
+						self._logger.warn("Could not delete file {}: {}".format(file_obj.name, str(e)))
+			except:
+				self._logger.exception("Error while writing .metadata.yaml to {path}".format(**locals()))
+			else:
+				self._cache[path] = metadata
+
+	def remove_folder(self, path):
+		with self._lock:
+			for cached in list(self._cache.keys()):
+				if cached == path or cached.startswith(path + os.path.sep):
+					del self._cache[cached]
+
+	def is_metadata_file(self, name):
+		return name == self.METADATA_FILE
+
+
+class SqliteMetadataBackend(MetadataBackend):
+	"""
+	Stores the metadata of all folders of the storage in one SQLite database ``.metadata.db`` in the base folder.
+
+	Each file's metadata is stored as JSON in its own row, indexed by its path (folder and name), its hash and the
+	modification date of the file, so that modifying the metadata of one file only updates that file's row. Folders
+	read from the database are kept in an LRU cache, just like with the :class:`YamlMetadataBackend`.
+
+	Upon first use, the metadata stored in ``.metadata.yaml`` files by the :class:`YamlMetadataBackend` is migrated
+	into the database and the migrated files are renamed to ``.metadata.yaml.backup``.
+	"""
+
+	DATABASE_FILE = ".metadata.db"
+	SCHEMA_VERSION = 1
+
+	def __init__(self, basefolder, database=None):
+		MetadataBackend.__init__(self, basefolder)
+
+		if database is None:
+			database = os.path.join(basefolder, self.DATABASE_FILE)
+
+		self._logger = logging.getLogger(__name__)
+		self._lock = threading.RLock()
+		self._cache = pylru.lrucache(self.CACHE_SIZE)
+
+		import sqlite3
+		self._connection = sqlite3.connect(database, check_same_thread=False)
+		self._initialize_database()
+
+	def close(self):
+		with self._lock:
+			self._connection.close()
+
+	def get_folder(self, path):
+		folder = self._folder(path)
+
+		with self._lock:
+			if path in self._cache:
+				return self._cache[path]
+
+			metadata = dict()
+			for name, data in self._connection.execute("SELECT name, data FROM files WHERE folder = ?", (folder,)):
+				try:
+					metadata[name] = json.loads(data)
+				except ValueError:
+					self._logger.warn("Invalid metadata stored for {} in {}, ignoring it".format(name, path))
+			self._cache[path] = metadata
+			return metadata
+
+	def save_folder(self, path, metadata):
+		folder = self._folder(path)
+
+		with self._lock:
+			try:
+				stored = dict(self._connection.execute("SELECT name, data FROM files WHERE folder = ?", (folder,)))
+				with self._connection:
+					for name, entry in metadata.items():
+						data = self._serialize(entry)
+						if stored.get(name) != data:
+							self._write_row(path, folder, name, entry, data)
+					removed = [(folder, name) for name in stored if not name in metadata]
+					if removed:
+						self._connection.executemany("DELETE FROM files WHERE folder = ? AND name = ?", removed)
+			except:
+				self._logger.exception("Error while writing metadata of {path}".format(**locals()))
+				if path in self._cache:
+					del self._cache[path]
+			else:
+				self._cache[path] = metadata
+
+	def save_entry(self, path, name, metadata):
+		folder = self._folder(path)
+
+		with self._lock:
+			try:
+				with self._connection:
+					if name in metadata:
+						self._write_row(path, folder, name, metadata[name], self._serialize(metadata[name]))
+					else:
+						self._connection.execute("DELETE FROM files WHERE folder = ? AND name = ?", (folder, name))
+			except:
+				self._logger.exception("Error while writing metadata of {name} in {path}".format(**locals()))
+				if path in self._cache:
+					del self._cache[path]
+			else:
+				self._cache[path] = metadata
+
+	def remove_folder(self, path):
+		folder = self._folder(path)
+
+		with self._lock:
+			with self._connection:
+				self._connection.execute("DELETE FROM files WHERE folder = ? OR substr(folder, 1, ?) = ?",
+				                         (folder, len(folder) + 1, folder + "/"))
+			for cached in list(self._cache.keys()):
+				if cached == path or cached.startswith(path + os.path.sep):
+					del self._cache[cached]
+
+	def get_by_hash(self, file_hash):
+		"""
+		Retrieves the paths of all files with the given hash.
+
+		:param string file_hash: the hash to look for
+		:return: list of ``(folder, name)`` tuples of the matching files, ``folder`` relative to the base folder
+		"""
+		with self._lock:
+			return list(self._connection.execute("SELECT folder, name FROM files WHERE hash = ?", (file_hash,)))
+
+	def is_metadata_file(self, name):
+		return name.startswith(self.DATABASE_FILE)
+
+	##~~ internals
+
+	def _initialize_database(self):
+		with self._lock:
+			with self._connection:
+				self._connection.execute("CREATE TABLE IF NOT EXISTS files ("
+				                         "folder TEXT NOT NULL, "
+				                         "name TEXT NOT NULL, "
+				                         "hash TEXT, "
+				                         "date INTEGER, "
+				                         "data TEXT NOT NULL, "
+				                         "PRIMARY KEY (folder, name))")
+				self._connection.execute("CREATE INDEX IF NOT EXISTS files_hash ON files (hash)")
+				self._connection.execute("CREATE INDEX IF NOT EXISTS files_date ON files (date)")
+				self._connection.execute("CREATE TABLE IF NOT EXISTS info (key TEXT PRIMARY KEY, value TEXT)")
+
+			row = self._connection.execute("SELECT value FROM info WHERE key = 'version'").fetchone()
+			if row is None:
+				self._migrate_from_yaml()
+
+	def _migrate_from_yaml(self):
+		self._logger.info("Migrating file metadata of {} from .metadata.yaml files into {}...".format(self.basefolder, self.DATABASE_FILE))
+
+		import yaml
+
+		migrated = []
+		with self._connection:
+			for path, dirs, files in os.walk(self.basefolder):
+				dirs[:] = [d for d in dirs if not d.startswith(".")]
+				if not YamlMetadataBackend.METADATA_FILE in files:
+					continue
+
+				metadata_path = os.path.join(path, YamlMetadataBackend.METADATA_FILE)
+				try:
+					with open(metadata_path) as f:
+						metadata = yaml.safe_load(f)
+				except:
+					self._logger.exception("Error while reading {metadata_path}, not migrating it".format(**locals()))
+					continue
+
+				if not isinstance(metadata, dict):
+					continue
+
+				folder = self._folder(path)
+				for name, entry in metadata.items():
+					if isinstance(entry, dict):
+						self._write_row(path, folder, name, entry, self._serialize(entry))
+				migrated.append(metadata_path)
+
+			self._connection.execute("INSERT OR REPLACE INTO info (key, value) VALUES ('version', ?)", (str(self.SCHEMA_VERSION),))
+
+		for metadata_path in migrated:
+			try:
+				shutil.move(metadata_path, metadata_path + ".backup")
+			except:
+				self._logger.exception("Could not rename migrated {metadata_path}".format(**locals()))
+
+		self._logger.info("... migrated {} metadata files.".format(len(migrated)))
+
+	def _write_row(self, path, folder, name, entry, data):
+		file_hash = entry.get("hash") if isinstance(entry, dict) else None
+		try:
+			date = int(os.stat(os.path.join(path, name)).st_mtime)
+		except OSError:
+			date = int(time.time())
+
+		self._connection.execute("INSERT OR REPLACE INTO files (folder, name, hash, date, data) VALUES (?, ?, ?, ?, ?)",
+		                         (folder, name, file_hash, date, data))
+
+	def _folder(self, path):
+		folder = os.path.relpath(path, self.basefolder)
+		if folder == ".":
+			return ""
+		return folder.replace(os.path.sep, "/")
+
+	@staticmethod
+	def _serialize(entry):
+		return json.dumps(entry, sort_keys=True)
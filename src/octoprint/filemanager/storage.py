@@ -6,15 +6,32 @@ __license__ = 'GNU Affero General Public License http://www.gnu.org/licenses/agp
 __copyright__ = "Copyright (C) 2014 The OctoPrint Project - Released under terms of the AGPLv3 License"
 
 
+import bisect
 import logging
 import os
-import pylru
-import tempfile
 import shutil
+import stat
+import threading
+import time
+
+from collections import namedtuple
+
+import pylru
+import watchdog.events
 
 import octoprint.filemanager
 
 from octoprint.util import is_hidden_path
+from octoprint.filemanager.metadata import create_metadata_backend
+from octoprint.filemanager.util import AbstractFileWrapper, HashSink
+
+try:
+	from os import scandir
+except ImportError:
+	try:
+		from scandir import scandir
+	except ImportError:
+		scandir = None
 
 class StorageInterface(object):
 	"""
@@ -95,6 +112,30 @@ class StorageInterface(object):
 		"""
 		raise NotImplementedError()
 
+	def list_files_sorted(self, path=None, filter=None, sort="name", reverse=False, limit=None, cursor=None):
+		"""
+		List the files directly contained in ``path`` (not descending into sub folders) sorted by ``sort``, one page at
+		a time.
+
+		Supported sort keys are ``name``, ``date``, ``size``, ``estimatedPrintTime`` and ``lastPrint`` (the timestamp
+		of the most recent print). Files without a value for the sort key are listed last, regardless of ``reverse``.
+
+		The returned ``cursor`` can be passed to subsequent calls with the same ``path``, ``filter``, ``sort`` and
+		``reverse`` values to retrieve the next page. Since it refers to the last returned file's position in the sort
+		order instead of an offset, files added or removed in the meantime neither cause files to be skipped nor
+		returned twice.
+
+		:param string path:     path of the folder whose files to list, the root of the base folder if not supplied
+		:param function filter: a filter that matches the files that are to be returned, see :func:`list_files`
+		:param string sort:     the key to sort by
+		:param bool reverse:    ``True`` to sort in descending order, ``False`` for ascending order
+		:param int limit:       maximum number of files to return, all remaining files if not supplied
+		:param string cursor:   the cursor returned by the call that returned the previous page, if any
+		:return: a tuple of the list of entry data of the files on the requested page and the cursor for the next
+		         page, which is ``None`` if there are no more files
+		"""
+		raise NotImplementedError()
+
 	def add_folder(self, path, ignore_existing=True):
 		"""
 		Adds a folder as ``path``. The ``path`` will be sanitized.
@@ -285,19 +326,43 @@ class LocalFileStorage(StorageInterface):
 	"""
 	The ``LocalFileStorage`` is a storage implementation which holds all files, folders and metadata on disk.
 
-	Metadata is managed inside ``.metadata.yaml`` files in the respective folders, indexed by the sanitized filenames
-	stored within the folder. Metadata access is managed through an LRU cache to minimize access overhead.
+	Metadata is managed by a :class:`~octoprint.filemanager.metadata.MetadataBackend`, either inside ``.metadata.yaml``
+	files in the respective folders (the default) or inside an SQLite database in the base folder.
+
+	Folder contents are kept in an index from which unchanged folders are listed without touching their entries. By
+	default a folder counts as changed if its modification time differs from the one it had when it was scanned.
+	Alternatively the storage can watch its base folder for changes (through inotify on Linux) and invalidate the
+	affected folders, in which case listings don't touch the disk at all unless something changed.
 
 	This storage type implements :func:`path_on_disk`.
 	"""
 
-	def __init__(self, basefolder, create=False):
+	SORT_KEYS = dict(
+		name=lambda entry: entry["name"],
+		date=lambda entry: entry.get("date"),
+		size=lambda entry: entry.get("size"),
+		estimatedPrintTime=lambda entry: entry.get("analysis", dict()).get("estimatedPrintTime"),
+		lastPrint=lambda entry: max([history_entry["timestamp"] for history_entry in entry.get("history", []) if "timestamp" in history_entry] or [None])
+	)
+	"""Functions extracting the value to sort by from a file's entry data, by sort key for :func:`list_files_sorted`"""
+
+	LISTING_MTIME_GRANULARITY = 2.0
+	"""
+	Folders modified less than this many seconds ago are not added to the folder index, since further modifications
+	within the resolution of the file system's modification times would go unnoticed.
+	"""
+
+	def __init__(self, basefolder, create=False, metadata_backend="yaml", listing_cache=True, watch=False):
 		"""
 		Initializes a ``LocalFileStorage`` instance under the given ``basefolder``, creating the necessary folder
 		if necessary and ``create`` is set to ``True``.
 
-		:param string basefolder: the path to the folder under which to create the storage
-		:param bool create:       ``True`` if the folder should be created if it doesn't exist yet, ``False`` otherwise
+		:param string basefolder:       the path to the folder under which to create the storage
+		:param bool create:             ``True`` if the folder should be created if it doesn't exist yet, ``False`` otherwise
+		:param string metadata_backend: the type of metadata backend to use, either ``yaml`` or ``sqlite``
+		:param bool listing_cache:      ``True`` if folder contents should be kept in the folder index between listings
+		:param bool watch:              ``True`` if the folder index should be invalidated through file system events
+		                                instead of checking the folders' modification times
 		"""
 		self._logger = logging.getLogger(__name__)
 
@@ -307,10 +372,18 @@ class LocalFileStorage(StorageInterface):
 		if not os.path.exists(self.basefolder) or not os.path.isdir(self.basefolder):
 			raise RuntimeError("{basefolder} is not a valid directory".format(**locals()))
 
-		import threading
-		self._metadata_lock = threading.Lock()
+		self._metadata = create_metadata_backend(metadata_backend, self.basefolder)
 
-		self._metadata_cache = pylru.lrucache(10)
+		self._listing_cache = listing_cache
+		self._folder_index = dict()
+		self._folder_index_lock = threading.Lock()
+		self._folder_index_generation = 0
+		self._observer = None
+		if listing_cache and watch:
+			self._start_watching()
+
+		self._metadata_version = 0
+		self._sorted_indices = pylru.lrucache(20)
 
 		from slugify import Slugify
 		self._slugify = Slugify()
@@ -393,6 +466,49 @@ class LocalFileStorage(StorageInterface):
 			path = self.basefolder
 		return self._list_folder(path, entry_filter=filter, recursive=recursive)
 
+	def list_files_sorted(self, path=None, filter=None, sort="name", reverse=False, limit=None, cursor=None):
+		if path:
+			path = self.sanitize_path(path)
+		else:
+			path = self.basefolder
+
+		if not sort in self.SORT_KEYS:
+			raise ValueError("Unknown sort key: {sort}".format(**locals()))
+
+		keys, entries = self._sorted_index(path, sort, reverse)
+
+		if cursor is not None:
+			try:
+				position = self._decode_cursor(cursor)
+			except:
+				raise ValueError("Invalid cursor: {cursor}".format(**locals()))
+		else:
+			position = None
+
+		# every index is sorted ascending, descending order is achieved by walking it from the end
+		if reverse:
+			end = bisect.bisect_left(keys, position) if position is not None else len(keys)
+			candidates = (keys[i] for i in xrange(end - 1, -1, -1))
+		else:
+			start = bisect.bisect_right(keys, position) if position is not None else 0
+			candidates = (keys[i] for i in xrange(start, len(keys)))
+
+		result = []
+		last = None
+		next_cursor = None
+		for key in candidates:
+			name = key[-1]
+			entry_data = entries[name]
+			if filter and not filter(name, entry_data):
+				continue
+			if limit is not None and len(result) >= limit:
+				next_cursor = self._encode_cursor(last)
+				break
+			result.append(dict(entry_data))
+			last = key
+
+		return result, next_cursor
+
 	def add_folder(self, path, ignore_existing=True):
 		path, name = self.sanitize(path)
 
@@ -402,6 +518,7 @@ class LocalFileStorage(StorageInterface):
 				raise RuntimeError("{name} does already exist in {path}".format(**locals()))
 		else:
 			os.mkdir(folder_path)
+			self._invalidate_folder_index(path)
 
 		return self.path_in_storage((path, name))
 
@@ -412,15 +529,18 @@ class LocalFileStorage(StorageInterface):
 		if not os.path.exists(folder_path):
 			return
 
-		contents = os.listdir(folder_path)
-		if ".metadata.yaml" in contents:
-			contents.remove(".metadata.yaml")
+		contents = [entry for entry in os.listdir(folder_path) if not self._metadata.is_metadata_file(entry)]
 		if contents and not recursive:
 			raise RuntimeError("{name} in {path} is not empty".format(**locals()))
 
+		self._metadata.remove_folder(folder_path)
+
 		import shutil
 		shutil.rmtree(folder_path)
 
+		self._invalidate_folder_index(path)
+		self._invalidate_folder_index(folder_path, recursive=True)
+
 	def add_file(self, path, file_object, printer_profile=None, links=None, allow_overwrite=False):
 		path, name = self.sanitize(path)
 		if not octoprint.filemanager.valid_file_type(name):
@@ -440,18 +560,26 @@ class LocalFileStorage(StorageInterface):
 		if not os.path.exists(path):
 			os.makedirs(path)
 
-		# save the file
+		# save the file, hashing its contents on the way if the file object supports that and doesn't know its hash
+		file_hash = getattr(file_object, "hash", None)
+		hash_sink = None
+		if file_hash is None and isinstance(file_object, AbstractFileWrapper):
+			hash_sink = HashSink()
+			file_object.add_sink(hash_sink)
 		file_object.save(file_path)
 
 		# save the file's hash to the metadata of the folder
-		file_hash = self._create_hash(file_path)
+		if hash_sink is not None:
+			file_hash = hash_sink.hexdigest
+		if file_hash is None:
+			file_hash = self._create_hash(file_path)
 		if not name in metadata or not "hash" in metadata[name] or metadata[name]["hash"] != file_hash:
 			# make sure to create a new metadata entry if we've never seen that file with that content before
 			file_metadata = dict(
 				hash=file_hash
 			)
 			metadata[name] = file_metadata
-			self._save_metadata(path, metadata)
+			self._save_metadata_entry(path, name, metadata)
 
 		# process any links that were also provided for adding to the file
 		if not links:
@@ -464,6 +592,7 @@ class LocalFileStorage(StorageInterface):
 
 		# touch the file to set last access and modification time to now
 		os.utime(file_path, None)
+		self._invalidate_folder_index(path)
 
 		return self.path_in_storage((path, name))
 
@@ -482,6 +611,7 @@ class LocalFileStorage(StorageInterface):
 			os.remove(file_path)
 		except Exception as e:
 			raise RuntimeError("Could not delete {name} in {path}".format(**locals()), e)
+		self._invalidate_folder_index(path)
 
 		if name in metadata:
 			if "hash" in metadata[name]:
@@ -552,7 +682,7 @@ class LocalFileStorage(StorageInterface):
 			metadata_dirty = True
 
 		if metadata_dirty:
-			self._save_metadata(path, metadata)
+			self._save_metadata_entry(path, name, metadata)
 
 	def remove_additional_metadata(self, path, key):
 		path, name = self.sanitize(path)
@@ -565,7 +695,7 @@ class LocalFileStorage(StorageInterface):
 			return
 
 		del metadata[name][key]
-		self._save_metadata(path, metadata)
+		self._save_metadata_entry(path, name, metadata)
 
 	def split_path(self, path):
 		split = path.split("/")
@@ -706,7 +836,7 @@ class LocalFileStorage(StorageInterface):
 
 		metadata[name]["history"].append(data)
 		self._calculate_stats_from_history(name, path, metadata=metadata, save=False)
-		self._save_metadata(path, metadata)
+		self._save_metadata_entry(path, name, metadata)
 
 	def _update_history(self, name, path, index, data):
 		metadata = self._get_metadata(path)
@@ -717,7 +847,7 @@ class LocalFileStorage(StorageInterface):
 		try:
 			metadata[name]["history"][index].update(data)
 			self._calculate_stats_from_history(name, path, metadata=metadata, save=False)
-			self._save_metadata(path, metadata)
+			self._save_metadata_entry(path, name, metadata)
 		except IndexError:
 			pass
 
@@ -730,7 +860,7 @@ class LocalFileStorage(StorageInterface):
 		try:
 			del metadata[name]["history"][index]
 			self._calculate_stats_from_history(name, path, metadata=metadata, save=False)
-			self._save_metadata(path, metadata)
+			self._save_metadata_entry(path, name, metadata)
 		except IndexError:
 			pass
 
@@ -784,7 +914,7 @@ class LocalFileStorage(StorageInterface):
 		metadata[name]["statistics"] = statistics
 
 		if save:
-			self._save_metadata(path, metadata)
+			self._save_metadata_entry(path, name, metadata)
 
 	def _get_links(self, name, path, searched_rel):
 		metadata = self._get_metadata(path)
@@ -931,28 +1061,9 @@ class LocalFileStorage(StorageInterface):
 		metadata_dirty = False
 
 		result = dict()
-		for entry in os.listdir(path):
-			if is_hidden_path(entry):
-				# no hidden files and folders
-				continue
-
-			entry_path = os.path.join(path, entry)
-
-			try:
-				entry, entry_path = self._sanitize_entry(entry, path, entry_path)
-			except:
-				# error while trying to rename the file, we'll continue here and ignore it
-				continue
-
+		for entry, listed in self._scan_folder(path).items():
 			# file handling
-			if os.path.isfile(entry_path):
-				file_type = octoprint.filemanager.get_file_type(entry)
-				if not file_type:
-					# only supported extensions
-					continue
-				else:
-					file_type = file_type[0]
-
+			if listed.type == "file":
 				if entry in metadata and isinstance(metadata[entry], dict):
 					entry_data = metadata[entry]
 				else:
@@ -966,17 +1077,15 @@ class LocalFileStorage(StorageInterface):
 					extended_entry_data = dict()
 					extended_entry_data.update(entry_data)
 					extended_entry_data["name"] = entry
-					extended_entry_data["type"] = file_type
-					stat = os.stat(entry_path)
-					if stat:
-						extended_entry_data["size"] = stat.st_size
-						extended_entry_data["date"] = int(stat.st_mtime)
+					extended_entry_data["type"] = listed.file_type
+					extended_entry_data["size"] = listed.size
+					extended_entry_data["date"] = listed.date
 
 					result[entry] = extended_entry_data
 
 			# folder recursion
-			elif os.path.isdir(entry_path) and recursive:
-				sub_result = self._list_folder(entry_path, entry_filter=entry_filter)
+			elif listed.type == "folder" and recursive:
+				sub_result = self._list_folder(os.path.join(path, entry), entry_filter=entry_filter)
 				result[entry] = dict(
 					name=entry,
 					type="folder",
@@ -991,6 +1100,153 @@ class LocalFileStorage(StorageInterface):
 
 		return result
 
+	def _scan_folder(self, path):
+		"""
+		Returns a dictionary mapping the names of all supported files and all folders within ``path`` to
+		:class:`_ListedEntry` tuples, taken from the folder index if the folder didn't change since it was last scanned.
+		"""
+		if not self._listing_cache:
+			return self._read_folder(path)
+
+		watching = self._observer is not None
+		with self._folder_index_lock:
+			generation = self._folder_index_generation
+			indexed = self._folder_index.get(path)
+
+		mtime = None
+		if not watching:
+			mtime = os.stat(path).st_mtime
+
+		if indexed is not None and (watching or indexed[0] == mtime):
+			return indexed[1]
+
+		entries = self._read_folder(path)
+		if watching or time.time() - mtime > self.LISTING_MTIME_GRANULARITY:
+			with self._folder_index_lock:
+				if generation == self._folder_index_generation:
+					self._folder_index[path] = (mtime, entries)
+		return entries
+
+	def _read_folder(self, path):
+		"""
+		Reads the contents of ``path`` from disk, sanitizing the names of its entries and stat'ing each entry only once.
+		"""
+		if scandir is not None:
+			listing = [(dir_entry.name, dir_entry.path, dir_entry) for dir_entry in scandir(path)]
+		else:
+			listing = [(name, os.path.join(path, name), None) for name in os.listdir(path)]
+
+		result = dict()
+		for entry, entry_path, dir_entry in listing:
+			if is_hidden_path(entry):
+				# no hidden files and folders
+				continue
+
+			try:
+				sanitized, entry_path = self._sanitize_entry(entry, path, entry_path)
+			except:
+				# error while trying to rename the file, we'll continue here and ignore it
+				continue
+
+			try:
+				if dir_entry is not None and sanitized == entry:
+					entry_stat = dir_entry.stat()
+				else:
+					entry_stat = os.stat(entry_path)
+			except OSError:
+				# entry vanished in the meantime
+				continue
+
+			if stat.S_ISREG(entry_stat.st_mode):
+				file_type = octoprint.filemanager.get_file_type(sanitized)
+				if not file_type:
+					# only supported extensions
+					continue
+				result[sanitized] = _ListedEntry("file", file_type[0], entry_stat.st_size, int(entry_stat.st_mtime))
+
+			elif stat.S_ISDIR(entry_stat.st_mode):
+				result[sanitized] = _ListedEntry("folder", None, None, None)
+
+		return result
+
+	def _sorted_index(self, path, sort, reverse):
+		"""
+		Returns the sort keys of all files in ``path`` in ascending order together with a dictionary mapping the file
+		names to their entry data, rebuilt only if the folder contents or any metadata changed since it was last built.
+
+		The sort keys are tuples of a flag whether the file has no value for the sort key (which is inverted for
+		``reverse`` so that such files end up last either way), the value and the file name.
+		"""
+		listing = self._scan_folder(path)
+		version = self._metadata_version
+
+		cache_key = (path, sort, reverse)
+		if cache_key in self._sorted_indices:
+			indexed_listing, indexed_version, keys, entries = self._sorted_indices[cache_key]
+			if indexed_listing is listing and indexed_version == version:
+				return keys, entries
+
+		entries = self._list_folder(path, recursive=False)
+		value_of = self.SORT_KEYS[sort]
+
+		keys = []
+		for name, entry_data in entries.items():
+			value = value_of(entry_data)
+			keys.append(((value is None) != reverse, value, name))
+		keys.sort()
+
+		self._sorted_indices[cache_key] = (listing, version, keys, entries)
+		return keys, entries
+
+	@staticmethod
+	def _encode_cursor(key):
+		import base64
+		import json
+		return base64.urlsafe_b64encode(json.dumps(key))
+
+	@staticmethod
+	def _decode_cursor(cursor):
+		import base64
+		import json
+		missing, value, name = json.loads(base64.urlsafe_b64decode(str(cursor)))
+		return bool(missing), value, name
+
+	def _invalidate_folder_index(self, path, recursive=False):
+		with self._folder_index_lock:
+			self._folder_index_generation += 1
+			self._folder_index.pop(path, None)
+			if recursive:
+				prefix = path + os.path.sep
+				for indexed in [p for p in self._folder_index if p.startswith(prefix)]:
+					del self._folder_index[indexed]
+
+	def _start_watching(self):
+		import watchdog.observers
+
+		self._observer = watchdog.observers.Observer()
+		self._observer.schedule(_FolderIndexInvalidator(self), self.basefolder, recursive=True)
+		self._observer.start()
+
+	def _stop_watching(self):
+		if self._observer is None:
+			return
+		self._observer.stop()
+		self._observer.join()
+		self._observer = None
+
+	def _on_file_system_event(self, event):
+		paths = [event.src_path]
+		if getattr(event, "dest_path", None):
+			paths.append(event.dest_path)
+
+		for path in paths:
+			if self._metadata.is_metadata_file(os.path.basename(path)):
+				continue
+
+			self._invalidate_folder_index(os.path.dirname(path))
+			if event.is_directory:
+				self._invalidate_folder_index(path, recursive=True)
+
 	def _add_basic_metadata(self, path, entry, additional_metadata=None, save=True, metadata=None):
 		if additional_metadata is None:
 			additional_metadata = dict()
@@ -1012,7 +1268,7 @@ class LocalFileStorage(StorageInterface):
 		metadata[entry] = entry_data
 
 		if save:
-			self._save_metadata(path, metadata)
+			self._save_metadata_entry(path, entry, metadata)
 
 		return entry_data
 
@@ -1030,43 +1286,25 @@ class LocalFileStorage(StorageInterface):
 		return hash.hexdigest()
 
 	def _get_metadata(self, path):
-		if path in self._metadata_cache:
-			return self._metadata_cache[path]
-
-		metadata_path = os.path.join(path, ".metadata.yaml")
-		if os.path.exists(metadata_path):
-			with self._metadata_lock:
-				with open(metadata_path) as f:
-					try:
-						import yaml
-						metadata = yaml.safe_load(f)
-					except:
-						self._logger.exception("Error while reading .metadata.yaml from {path}".format(**locals()))
-					else:
-						self._metadata_cache[path] = metadata
-						return metadata
-		return dict()
+		return self._metadata.get_folder(path)
 
 	def _save_metadata(self, path, metadata):
-		metadata_path = os.path.join(path, ".metadata.yaml")
+		self._metadata.save_folder(path, metadata)
+		self._metadata_version += 1
 
-		with self._metadata_lock:
-			try:
-				import yaml
-				import shutil
+	def _save_metadata_entry(self, path, name, metadata):
+		self._metadata.save_entry(path, name, metadata)
+		self._metadata_version += 1
 
-				file_obj = tempfile.NamedTemporaryFile(delete=False)
-				try:
-					yaml.safe_dump(metadata, stream=file_obj, default_flow_style=False, indent="  ", allow_unicode=True)
-					file_obj.close()
-					shutil.move(file_obj.name, metadata_path)
-				finally:
-					try:
-						if os.path.exists(file_obj.name):
-							os.remove(file_obj.name)
-					except Exception as e:
-						self._logger.warn("Could not delete file {}: {}".format(file_obj.name, str(e)))
-			except:
-				self._logger.exception("Error while writing .metadata.yaml to {path}".format(**locals()))
-			else:
-				self._metadata_cache[path] = metadata
+
+_ListedEntry = namedtuple("_ListedEntry", "type, file_type, size, date")
+"""Folder index entry: ``type`` is either ``file`` or ``folder``, the rest is only set for files."""
+
+
+class _FolderIndexInvalidator(watchdog.events.FileSystemEventHandler):
+	def __init__(self, storage):
+		watchdog.events.FileSystemEventHandler.__init__(self)
+		self._storage = storage
+
+	def on_any_event(self, event):
+		self._storage._on_file_system_event(event)
@@ -5,9 +5,14 @@ __author__ = "Gina Häußge <osd@foosel.net>"
 __license__ = 'GNU Affero General Public License http://www.gnu.org/licenses/agpl.html'
 __copyright__ = "Copyright (C) 2015 The OctoPrint Project - Released under terms of the AGPLv3 License"
 
+import contextlib
+import hashlib
 import io
+import os
+import re
 
-from octoprint.util import atomic_write
+from octoprint.settings import settings
+from octoprint.util import atomic_write, to_str
 
 class AbstractFileWrapper(object):
 	"""
@@ -19,6 +24,20 @@ class AbstractFileWrapper(object):
 
 	def __init__(self, filename):
 		self.filename = filename
+		self.sinks = []
+
+	def add_sink(self, sink):
+		"""
+		Adds a :class:`StreamSink` to be fed with the file's contents while it is being saved.
+
+		Implementations of :meth:`save` supporting sinks call :meth:`StreamSink.finish` on all sinks once the whole
+		content has passed through them, or :meth:`StreamSink.abort` if saving failed. Sinks that never get finished
+		must be treated as not having any result.
+
+		Arguments:
+		    sink (StreamSink): The sink to add
+		"""
+		self.sinks.append(sink)
 
 	def save(self, path):
 		"""
@@ -44,24 +63,39 @@ class DiskFileWrapper(AbstractFileWrapper):
 	will either copy the file to the new path (preserving file attributes) or -- if `move` is `True` (the default) --
 	move the file.
 
+	If the SHA1 hash of the file is already known (e.g. because it was computed while the file was being uploaded), it
+	can be provided as ``hash`` so that storages don't need to compute it again.
+
 	Arguments:
 	    filename (str): The file's name
 	    path (str): The file's absolute path
 	    move (boolean): Whether to move the file upon saving (True, default) or copying.
+	    hash (str): The SHA1 hash of the file's contents, if known
 	"""
 
-	def __init__(self, filename, path, move=True):
+	def __init__(self, filename, path, move=True, hash=None):
 		AbstractFileWrapper.__init__(self, filename)
 		self.path = path
 		self.move = move
+		self.hash = hash
 
 	def save(self, path):
 		import shutil
 
-		if self.move:
-			shutil.move(self.path, path)
-		else:
-			shutil.copy2(self.path, path)
+		with _feeding(self.sinks):
+			if self.move:
+				shutil.move(self.path, path)
+				if self.sinks:
+					# moving doesn't touch the contents, so do one single pass over the moved file for all sinks
+					with io.open(path, "rb") as source:
+						_drain(TeeStream(source, *self.sinks))
+			elif self.sinks:
+				with io.open(self.path, "rb") as source:
+					with io.open(path, "wb") as dest:
+						shutil.copyfileobj(TeeStream(source, *self.sinks), dest)
+				shutil.copystat(self.path, path)
+			else:
+				shutil.copy2(self.path, path)
 
 	def stream(self):
 		return io.open(self.path, "rb")
@@ -87,9 +121,12 @@ class StreamWrapper(AbstractFileWrapper):
 		"""
 		import shutil
 
-		with atomic_write(path, "wb") as dest:
-			with self.stream() as source:
-				shutil.copyfileobj(source, dest)
+		with _feeding(self.sinks):
+			with atomic_write(path, "wb") as dest:
+				with self.stream() as source:
+					if self.sinks:
+						source = TeeStream(source, *self.sinks)
+					shutil.copyfileobj(source, dest)
 
 	def stream(self):
 		"""
@@ -239,3 +276,525 @@ class LineProcessorStream(io.RawIOBase):
 
 	def writable(self, *args, **kwargs):
 		return False
+
+class MinifyingGcodeStream(LineProcessorStream):
+	"""
+	A :class:`LineProcessorStream` minifying the GCODE read from `input_stream` through a :class:`GcodeMinifier`.
+
+	Arguments:
+	    input_stream (io.IOBase): The GCODE stream to minify on the fly.
+	    minifier (GcodeMinifier): The minifier to use, a new one if not provided. Its statistics reflect the data read
+	        so far.
+	"""
+
+	def __init__(self, input_stream, minifier=None):
+		LineProcessorStream.__init__(self, input_stream)
+		self.minifier = minifier if minifier is not None else GcodeMinifier()
+
+	def process_line(self, line):
+		return self.minifier.process_line(line)
+
+class TeeStream(io.RawIOBase):
+	"""
+	A stream implementation which passes all data read from the wrapped stream to one or more :class:`StreamSink`
+	instances, allowing to compute e.g. a hash of the data while it is being copied elsewhere.
+
+	Arguments:
+	    stream (io.IOBase): The stream to read from.
+	    *sinks (StreamSink): The sinks to feed with all data read from ``stream``.
+	"""
+	def __init__(self, stream, *sinks):
+		io.RawIOBase.__init__(self)
+		self.stream = stream
+		self.sinks = sinks
+
+	def read(self, n=-1):
+		data = self.stream.read(n)
+		if data:
+			for sink in self.sinks:
+				sink.update(data)
+		return data
+
+	def readinto(self, b):
+		n = len(b)
+		read = self.read(n)
+		b[:len(read)] = read
+		return len(read)
+
+	def close(self):
+		self.stream.close()
+		io.RawIOBase.close(self)
+
+	def readable(self, *args, **kwargs):
+		return True
+
+	def seekable(self, *args, **kwargs):
+		return False
+
+	def writable(self, *args, **kwargs):
+		return False
+
+class StreamSink(object):
+	"""
+	Consumer of data streamed through a :class:`TeeStream`.
+
+	:attr:`finished` will be ``True`` once :meth:`finish` was called, signaling that the sink has seen the full
+	content of the stream.
+	"""
+
+	def __init__(self):
+		self.finished = False
+
+	def update(self, data):
+		"""
+		Called with each chunk of data read from the stream.
+
+		Arguments:
+		    data (bytes): The data read from the stream
+		"""
+		pass
+
+	def finish(self):
+		"""
+		Called after the full content of the stream has been passed to :meth:`update`.
+		"""
+		self.finished = True
+
+	def abort(self):
+		"""
+		Called instead of :meth:`finish` if the stream could not be processed completely.
+		"""
+		pass
+
+	@property
+	def result(self):
+		"""
+		The sink's result, ``None`` if the sink doesn't produce one or hasn't been finished.
+		"""
+		return None
+
+class HashSink(StreamSink):
+	"""
+	Computes the SHA1 hash of the streamed data, available as :attr:`hexdigest` after the sink was finished.
+	"""
+
+	def __init__(self):
+		StreamSink.__init__(self)
+		import hashlib
+		self._hash = hashlib.sha1()
+
+	def update(self, data):
+		self._hash.update(data)
+
+	@property
+	def hexdigest(self):
+		if not self.finished:
+			return None
+		return self._hash.hexdigest()
+
+	@property
+	def result(self):
+		return self.hexdigest
+
+class GcodeAnalysisSink(StreamSink):
+	"""
+	Analyzes the streamed data as GCODE, the result is available as :attr:`result` after the sink was finished.
+
+	The analysis runs in a separate thread consuming the data while it is still being streamed, so that no additional
+	pass over the file is necessary once it has been saved. At most ``max_pending`` chunks are buffered before
+	:meth:`update` blocks until the analysis has caught up.
+
+	Arguments:
+	    printer_profile (dict): The printer profile to analyze the data for
+	    max_pending (int): The maximum number of chunks to buffer for the analysis
+	"""
+
+	def __init__(self, printer_profile, max_pending=16):
+		StreamSink.__init__(self)
+
+		import logging
+		import Queue
+		import threading
+		from octoprint.util import gcodeInterpreter
+
+		self._logger = logging.getLogger(__name__)
+		self._queue = Queue.Queue(maxsize=max_pending)
+		self._gcode = gcodeInterpreter.chunkedGcode()
+		self._result = None
+		self._failed = False
+
+		self._thread = threading.Thread(target=self._analyze, args=(printer_profile,))
+		self._thread.daemon = True
+		self._thread.start()
+
+	def update(self, data):
+		if self._failed:
+			return
+		self._queue.put(data)
+
+	def finish(self):
+		self._queue.put(b"")
+		self._thread.join()
+		StreamSink.finish(self)
+
+	def abort(self):
+		self._gcode.abort()
+		self._failed = True
+		try:
+			self._queue.put_nowait(b"")
+		except:
+			# the analysis will notice the abort on the next chunk
+			pass
+
+	@property
+	def result(self):
+		"""
+		The analysis result in the format produced by the :class:`~octoprint.filemanager.analysis.GcodeAnalysisQueue`,
+		or ``None`` if the sink hasn't been finished or the analysis failed.
+		"""
+		if not self.finished or self._failed:
+			return None
+		return self._result
+
+	def _analyze(self, printer_profile):
+		import time
+		from octoprint.filemanager.analysis import GcodeAnalysisQueue
+
+		try:
+			start = time.time()
+			self._gcode._load(_QueueReader(self._queue), printer_profile)
+			self._result = GcodeAnalysisQueue._create_result(self._gcode, time.time() - start)
+		except:
+			if not self._gcode._abort:
+				self._logger.exception("Error while analyzing streamed GCODE")
+			self._failed = True
+
+			# make sure the producer doesn't block on a full queue
+			while True:
+				try:
+					if not self._queue.get_nowait():
+						break
+				except:
+					break
+
+_gcode_words = re.compile(r"^(?:[A-Z][-+]?(?:\d+\.?\d*|\.\d+))+$")
+_gcode_word = re.compile(r"([A-Z])([-+]?(?:\d+\.?\d*|\.\d+))")
+
+class GcodeMinifier(object):
+	"""
+	Reduces the size of GCODE line by line without changing the moves it results in:
+
+	  * comments, whitespace and empty lines are removed
+	  * numbers of known commands are written without ``+`` signs, superfluous zeros or decimal points
+	  * feedrates and absolute axis positions of moves that are already the current value are dropped, moves left
+	    without any parameter are removed completely
+
+	The modal state is only kept across commands known not to influence it, any other command (including all lines
+	that can't be parsed, like text parameters or lines with checksums) resets it and passes through unchanged.
+	Positions are never dropped anymore after coordinate offsets (``G92`` on X, Y or Z), inch units or selecting
+	another tool than the first one, to keep the results of the GCODE analysis identical.
+
+	The number of bytes and lines processed and produced are available as :attr:`bytes_in`, :attr:`bytes_out`,
+	:attr:`lines_in` and :attr:`lines_out`.
+	"""
+
+	MOVES = ("G0", "G1")
+	ARCS = ("G2", "G3")
+
+	# some firmwares (e.g. Smoothieware) keep a separate feedrate for rapid moves while others share one feedrate
+	# across all moves, so a feedrate is only dropped if it's both the last one set by any move and the last one set
+	# by a move of the same group
+	FEEDRATE_GROUPS = dict(G0="rapid", G1="feed", G2="feed", G3="feed")
+
+	# increase whenever the output changes, to invalidate files minified by previous versions
+	VERSION = 1
+
+	# commands that don't influence feedrate, position or positioning mode
+	STATELESS = ("G4", "M104", "M105", "M106", "M107", "M109", "M140", "M190", "M400")
+
+	def __init__(self):
+		# imported here since octoprint.util.comm depends on octoprint.filemanager
+		from octoprint.util.comm import strip_comment
+		self._strip_comment = strip_comment
+
+		self.bytes_in = 0
+		self.bytes_out = 0
+		self.lines_in = 0
+		self.lines_out = 0
+
+		self._relative = False
+		self._relative_e = False
+		self._keep_positions = False
+		self._first_tool = None
+		self._values = dict()
+
+	@property
+	def saved(self):
+		return self.bytes_in - self.bytes_out
+
+	def process_line(self, line):
+		self.bytes_in += len(line)
+		self.lines_in += 1
+
+		result = self._minify(line)
+		if result is None:
+			return None
+
+		result += "\n"
+		self.bytes_out += len(result)
+		self.lines_out += 1
+		return result
+
+	def _minify(self, line):
+		line = self._strip_comment(line).strip()
+		if not line:
+			return None
+
+		compact = "".join(line.split())
+		words = _gcode_word.findall(compact) if _gcode_words.match(compact) else []
+		letters = [letter for letter, _ in words]
+		if not words or letters[0] not in "GMT" or "." in words[0][1] or len(set(letters)) != len(letters):
+			self._values.clear()
+			return line
+
+		command = letters[0] + str(int(words[0][1]))
+		parameters = [(letter, _normalize_number(value)) for letter, value in words[1:]]
+
+		if command in self.MOVES:
+			parameters = self._drop_unchanged(command, parameters)
+			if not parameters:
+				return None
+		elif command in self.ARCS:
+			parameters = self._drop_unchanged(command, parameters, positions=False)
+		elif command in ("G90", "G91"):
+			self._relative = command == "G91"
+			self._values.clear()
+		elif command in ("M82", "M83"):
+			self._relative_e = command == "M83"
+			self._values.clear()
+		elif command in ("G92", "G20", "G21"):
+			if command == "G20" or any(letter in "XYZ" for letter, _ in parameters):
+				self._keep_positions = True
+			self._values.clear()
+		elif letters[0] == "T":
+			if self._first_tool is None:
+				self._first_tool = command
+			elif command != self._first_tool:
+				self._keep_positions = True
+			self._values.clear()
+			return line
+		elif command not in self.STATELESS:
+			self._values.clear()
+			return line
+
+		return " ".join([command] + [letter + value for letter, value in parameters])
+
+	def _drop_unchanged(self, command, parameters, positions=True):
+		feedrate_group = ("F", self.FEEDRATE_GROUPS[command])
+
+		result = []
+		for letter, value in parameters:
+			if letter == "F":
+				if self._values.get("F") == value and self._values.get(feedrate_group) == value:
+					continue
+				result.append((letter, value))
+
+				if float(value) != 0: # F0 is ignored by firmwares
+					self._values["F"] = self._values[feedrate_group] = value
+				continue
+			elif letter in "XYZ":
+				droppable = positions and not self._relative and not self._keep_positions
+			elif letter == "E":
+				droppable = positions and not self._relative and not self._relative_e
+			else:
+				result.append((letter, value))
+				continue
+
+			if droppable and self._values.get(letter) == value:
+				continue
+			result.append((letter, value))
+
+			if droppable:
+				self._values[letter] = value
+			else:
+				self._values.pop(letter, None)
+
+		if not positions:
+			# arcs move to positions we don't track
+			for letter in "XYZE":
+				self._values.pop(letter, None)
+		return result
+
+def _normalize_number(value):
+	sign = ""
+	if value[0] in "+-":
+		sign = "-" if value[0] == "-" else ""
+		value = value[1:]
+
+	integer, _, fraction = value.partition(".")
+	integer = integer.lstrip("0") or "0"
+	fraction = fraction.rstrip("0")
+
+	result = integer + "." + fraction if fraction else integer
+	return sign + result if result != "0" else result
+
+def minified_gcode_path(path):
+	"""
+	Path of the minified version of the GCODE file ``path``, within the ``minified`` folder of the ``generated`` base
+	folder.
+	"""
+	name = hashlib.sha1(to_str(os.path.abspath(path))).hexdigest() + ".gcode"
+	return os.path.join(settings().getBaseFolder("generated"), "minified", name)
+
+def minified_gcode_metadata_path(minified_path):
+	"""
+	Path of the file describing the source of the minified GCODE file ``minified_path``.
+	"""
+	return minified_path + ".yaml"
+
+def is_minified_gcode_valid(path, minified_path):
+	"""
+	Whether ``minified_path`` was created by the current version of :func:`minify_gcode_file` from the current
+	contents of ``path``, judged by their size and modification date.
+	"""
+	import yaml
+
+	try:
+		with open(minified_gcode_metadata_path(minified_path)) as f:
+			metadata = yaml.safe_load(f)
+		stat = os.stat(path)
+	except (IOError, OSError, yaml.YAMLError):
+		return False
+
+	return isinstance(metadata, dict) \
+	       and metadata.get("version") == GcodeMinifier.VERSION \
+	       and metadata.get("size") == stat.st_size \
+	       and metadata.get("mtime") == stat.st_mtime \
+	       and os.path.isfile(minified_path)
+
+def minify_gcode_file(path, minified_path, max_size=None, throttle=None):
+	"""
+	Writes the minified version of the GCODE file ``path`` to ``minified_path``, see :class:`GcodeMinifier`, and
+	describes its source for :func:`is_minified_gcode_valid`.
+
+	If ``max_size`` is set, the oldest other minified files in the folder of ``minified_path`` are removed until all
+	of them together take up at most ``max_size`` bytes. ``throttle`` is called after each processed block, e.g. to
+	limit the CPU usage.
+
+	Returns:
+	    GcodeMinifier: The minifier used, providing the statistics.
+	"""
+	import yaml
+
+	folder = os.path.dirname(minified_path)
+	if not os.path.isdir(folder):
+		os.makedirs(folder)
+
+	# changes while minifying result in a different modification date than the described one
+	stat = os.stat(path)
+
+	minifier = GcodeMinifier()
+	with atomic_write(minified_path, "wb") as dest:
+		with MinifyingGcodeStream(io.open(path, "rb"), minifier=minifier) as source:
+			for block in iter(lambda: source.read(65536), b""):
+				dest.write(block)
+				if throttle is not None:
+					throttle()
+
+	metadata = dict(version=GcodeMinifier.VERSION, size=stat.st_size, mtime=stat.st_mtime)
+	with atomic_write(minified_gcode_metadata_path(minified_path)) as f:
+		yaml.safe_dump(metadata, stream=f, default_flow_style=False)
+
+	if max_size is not None:
+		_prune_minified_gcode(folder, max_size, minified_path)
+
+	return minifier
+
+def remove_minified_gcode(minified_path):
+	"""
+	Removes the minified GCODE file ``minified_path`` and the description of its source, if they exist.
+	"""
+	for p in (minified_path, minified_gcode_metadata_path(minified_path)):
+		if os.path.exists(p):
+			os.remove(p)
+
+def _prune_minified_gcode(folder, max_size, keep):
+	files = []
+	for name in os.listdir(folder):
+		p = os.path.join(folder, name)
+		if not name.endswith(".gcode") or not os.path.isfile(p):
+			continue
+		stat = os.stat(p)
+		files.append((stat.st_mtime, stat.st_size, p))
+
+	total = sum(size for _, size, _ in files)
+	for _, size, p in sorted(files):
+		if total <= max_size:
+			break
+		if p == keep:
+			continue
+		remove_minified_gcode(p)
+		total -= size
+
+def verify_minified_gcode(path, minified_path, printer_profile, throttle=None):
+	"""
+	Verifies that minifying the GCODE file ``path`` to ``minified_path`` didn't change the moves by comparing the
+	results of analyzing both files: extrusion lengths, estimated move time and printing area. ``throttle`` is passed
+	on to the analysis.
+
+	Returns:
+	    bool: Whether both files resulted in the same moves.
+	"""
+	from octoprint.util import gcodeInterpreter
+
+	original, minified = gcodeInterpreter.chunkedGcode(), gcodeInterpreter.chunkedGcode()
+	original.load(path, printer_profile, throttle=throttle)
+	minified.load(minified_path, printer_profile, throttle=throttle)
+
+	if len(original.extrusionAmount) != len(minified.extrusionAmount) \
+			or (original.printingArea is None) != (minified.printingArea is None):
+		return False
+
+	values = zip(original.extrusionAmount, minified.extrusionAmount)
+	values.append((original.totalMoveTimeMinute, minified.totalMoveTimeMinute))
+	if original.printingArea is not None:
+		values += [(original.printingArea[key], minified.printingArea[key]) for key in original.printingArea]
+
+	# moves dropped by the minifier change the order of summing up
+	return all(abs(a - b) <= 1e-9 * max(1.0, abs(a), abs(b)) for a, b in values)
+
+class _QueueReader(object):
+	"""
+	Minimal file like object returning the chunks put into ``queue`` on ``read``, an empty chunk signals the end.
+	"""
+
+	def __init__(self, queue):
+		self._queue = queue
+		self._done = False
+
+	def read(self, n=-1):
+		if self._done:
+			return b""
+		data = self._queue.get()
+		if not data:
+			self._done = True
+		return data
+
+@contextlib.contextmanager
+def _feeding(sinks):
+	"""
+	Finishes all ``sinks`` if the wrapped block completes and aborts them if it raises.
+	"""
+	try:
+		yield
+	except:
+		for sink in sinks:
+			sink.abort()
+		raise
+	else:
+		for sink in sinks:
+			sink.finish()
+
+def _drain(stream, blocksize=65536):
+	while stream.read(blocksize):
+		pass
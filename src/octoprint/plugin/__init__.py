@@ -44,7 +44,8 @@ def _validate_plugin(phase, plugin_info):
 			setattr(plugin_info.instance, PluginInfo.attr_hooks, hooks)
 
 def plugin_manager(init=False, plugin_folders=None, plugin_types=None, plugin_entry_points=None, plugin_disabled_list=None,
-                   plugin_restart_needing_hooks=None, plugin_obsolete_hooks=None, plugin_validators=None):
+                   plugin_restart_needing_hooks=None, plugin_obsolete_hooks=None, plugin_validators=None,
+                   plugin_timings=None):
 	"""
 	Factory method for initially constructing and consecutively retrieving the :class:`~octoprint.plugin.core.PluginManager`
 	singleton.
@@ -70,6 +71,8 @@ def plugin_manager(init=False, plugin_folders=None, plugin_types=None, plugin_en
 	    plugin_obsolete_hooks (list): A list of hooks that have been declared obsolete. Plugins implementing them will
 	        not be enabled since they might depend on functionality that is no longer available.
 	    plugin_validators (list): A list of additional plugin validators through which to process each plugin.
+	    plugin_timings (boolean): Whether to record the timings of calls to the plugins' implementation methods and
+	        hook handlers. If not provided this defaults to the ``devel.pluginTimings`` setting.
 
 	Returns:
 	    PluginManager: A fully initialized :class:`~octoprint.plugin.core.PluginManager` instance to be used for plugin
@@ -120,6 +123,8 @@ def plugin_manager(init=False, plugin_folders=None, plugin_types=None, plugin_en
 				plugin_validators = [
 					_validate_plugin
 				]
+			if plugin_timings is None:
+				plugin_timings = settings().getBoolean(["devel", "pluginTimings"])
 
 			_instance = PluginManager(plugin_folders,
 			                          plugin_types,
@@ -128,7 +133,8 @@ def plugin_manager(init=False, plugin_folders=None, plugin_types=None, plugin_en
 			                          plugin_disabled_list=plugin_disabled_list,
 			                          plugin_restart_needing_hooks=plugin_restart_needing_hooks,
 			                          plugin_obsolete_hooks=plugin_obsolete_hooks,
-			                          plugin_validators=plugin_validators)
+			                          plugin_validators=plugin_validators,
+			                          plugin_timings=plugin_timings)
 		else:
 			raise ValueError("Plugin Manager not initialized yet")
 	return _instance
@@ -197,17 +203,15 @@ def call_plugin(types, method, args=None, kwargs=None, callback=None, error_call
 	if kwargs is None:
 		kwargs = dict()
 
-	plugins = plugin_manager().get_implementations(*types)
-	for plugin in plugins:
-		if hasattr(plugin, method):
-			try:
-				result = getattr(plugin, method)(*args, **kwargs)
-				if callback:
-					callback(plugin._identifier, plugin, result)
-			except Exception as exc:
-				logging.getLogger(__name__).exception("Error while calling plugin %s" % plugin._identifier)
-				if error_callback:
-					error_callback(plugin._identifier, plugin, exc)
+	for plugin, plugin_method in plugin_manager().get_implementation_methods(method, *types):
+		try:
+			result = plugin_method(*args, **kwargs)
+			if callback:
+				callback(plugin._identifier, plugin, result)
+		except Exception as exc:
+			logging.getLogger(__name__).exception("Error while calling plugin %s" % plugin._identifier)
+			if error_callback:
+				error_callback(plugin._identifier, plugin, exc)
 
 
 class PluginSettings(object):
@@ -25,6 +25,8 @@ import os
 import imp
 from collections import defaultdict, namedtuple
 import logging
+import threading
+import time
 
 import pkg_resources
 import pkginfo
@@ -430,7 +432,7 @@ class PluginManager(object):
 
 	def __init__(self, plugin_folders, plugin_types, plugin_entry_points, logging_prefix=None,
 	             plugin_disabled_list=None, plugin_restart_needing_hooks=None, plugin_obsolete_hooks=None,
-	             plugin_validators=None):
+	             plugin_validators=None, plugin_timings=False):
 		self.logger = logging.getLogger(__name__)
 
 		if logging_prefix is None:
@@ -468,6 +470,13 @@ class PluginManager(object):
 
 		self.marked_plugins = defaultdict(list)
 
+		# implementations, their methods and hook handlers by what was asked for, rebuilt on (de)activation of plugins
+		self._dispatch_table = dict()
+
+		self.plugin_timings = plugin_timings
+		self._timings = defaultdict(lambda: defaultdict(_CallTimings))
+		self._timings_lock = threading.Lock()
+
 		self.reload_plugins(startup=True, initialize_implementations=False)
 
 	@property
@@ -776,6 +785,13 @@ class PluginManager(object):
 		return True
 
 	def _activate_plugin(self, name, plugin):
+		try:
+			self._register_plugin(name, plugin)
+		finally:
+			# invalidate only after the mutation, lookups during it might otherwise cache a stale result
+			self._invalidate_dispatch_table()
+
+	def _register_plugin(self, name, plugin):
 		plugin.hotchangeable = self.is_restart_needing_plugin(plugin)
 
 		# evaluate registered hooks
@@ -791,6 +807,12 @@ class PluginManager(object):
 			self.plugin_implementations[name] = plugin.implementation
 
 	def _deactivate_plugin(self, name, plugin):
+		try:
+			self._unregister_plugin(name, plugin)
+		finally:
+			self._invalidate_dispatch_table()
+
+	def _unregister_plugin(self, name, plugin):
 		for hook, callback in plugin.hooks.items():
 			try:
 				self.plugin_hooks[hook].remove((name, callback))
@@ -1016,9 +1038,12 @@ class PluginManager(object):
 		    dict: A dict containing all registered handlers mapped by their plugin's identifier.
 		"""
 
-		if not hook in self.plugin_hooks:
-			return dict()
-		return {hook[0]: hook[1] for hook in self.plugin_hooks[hook]}
+		def find_hooks():
+			if not hook in self.plugin_hooks:
+				return dict()
+			return dict((name, self._timed(name, hook, callback)) for name, callback in self.plugin_hooks[hook])
+
+		return dict(self._dispatch_entry(("hooks", hook), find_hooks))
 
 	def get_implementations(self, *types):
 		"""
@@ -1031,18 +1056,83 @@ class PluginManager(object):
 		    list: A list of all found implementations
 		"""
 
-		result = None
+		if not types:
+			return dict()
 
-		for t in types:
-			implementations = self.plugin_implementations_by_type[t]
-			if result is None:
-				result = set(implementations)
-			else:
-				result = result.intersection(implementations)
+		def find_implementations():
+			result = None
 
-		if result is None:
-			return dict()
-		return [impl[1] for impl in result]
+			for t in types:
+				implementations = self.plugin_implementations_by_type[t]
+				if result is None:
+					result = list(implementations)
+				else:
+					result = [impl for impl in result if impl in implementations]
+
+			return [impl[1] for impl in result]
+
+		return list(self._dispatch_entry(("implementations",) + types, find_implementations))
+
+	def get_implementation_methods(self, method, *types):
+		"""
+		Get the method ``method`` of all mixin implementations that implement *all* of the provided ``types`` and
+		provide it.
+
+		Arguments:
+		    method (str): The name of the method.
+		    types (one or more type): The types a mixin implementation needs to implement in order to be returned.
+
+		Returns:
+		    list: A list of tuples of the found implementations and their bound ``method``
+		"""
+
+		def find_methods():
+			result = []
+			for implementation in self.get_implementations(*types):
+				if hasattr(implementation, method):
+					callback = getattr(implementation, method)
+					result.append((implementation, self._timed(implementation._identifier, method, callback)))
+			return result
+
+		return list(self._dispatch_entry(("methods", method) + types, find_methods))
+
+	def get_timings(self):
+		"""
+		Retrieves the timings of the plugins' implementation methods and hook handlers, which are only recorded if
+		``plugin_timings`` is enabled.
+
+		Returns:
+		    dict: A dict mapping plugin identifiers to dicts mapping the called methods and hooks to the number of
+		        ``calls`` and the ``avg`` and ``max`` duration of a call in seconds.
+		"""
+
+		with self._timings_lock:
+			return dict((name, dict((target, timings.as_dict()) for target, timings in targets.items()))
+			            for name, targets in self._timings.items())
+
+	def _invalidate_dispatch_table(self):
+		self._dispatch_table = dict()
+
+	def _dispatch_entry(self, key, factory):
+		# lookups racing with an invalidation store their result in the replaced table only
+		table = self._dispatch_table
+		if not key in table:
+			table[key] = factory()
+		return table[key]
+
+	def _timed(self, name, target, callback):
+		if not self.plugin_timings:
+			return callback
+
+		def timed_callback(*args, **kwargs):
+			start = time.time()
+			try:
+				return callback(*args, **kwargs)
+			finally:
+				duration = time.time() - start
+				with self._timings_lock:
+					self._timings[name][target].record(duration)
+		return timed_callback
 
 	def get_filtered_implementations(self, f, *types):
 		"""
@@ -1118,6 +1208,21 @@ class PluginManager(object):
 			except: self.logger.exception("Exception while sending plugin data to client")
 
 
+class _CallTimings(object):
+	def __init__(self):
+		self.calls = 0
+		self.total = 0.0
+		self.max = 0.0
+
+	def record(self, duration):
+		self.calls += 1
+		self.total += duration
+		self.max = max(self.max, duration)
+
+	def as_dict(self):
+		return dict(calls=self.calls, avg=self.total / max(self.calls, 1), max=self.max)
+
+
 class InstalledEntryPoint(pkginfo.Installed):
 
 	def __init__(self, entry_point, metadata_version=None):
@@ -31,6 +31,7 @@ class VirtualPrinter(object):
 		self._write_timeout = write_timeout
 
 		self._rx_buffer_size = settings().getInt(["devel", "virtualPrinter", "rxBuffer"])
+		self._latency = settings().getFloat(["devel", "virtualPrinter", "latency"])
 
 		self.incoming = CharCountingQueue(self._rx_buffer_size, name="RxBuffer")
 		self.outgoing = Queue.Queue()
@@ -794,7 +795,8 @@ class VirtualPrinter(object):
 
 	def _output(self, line):
 		try:
-			self.outgoing.put(line)
+			# responses are delivered once the simulated latency has passed, see readline
+			self.outgoing.put((time.time() + self._latency, line))
 		except:
 			if self.outgoing is None:
 				pass
@@ -850,8 +852,12 @@ class VirtualPrinter(object):
 
 		try:
 			# fetch a line from the queue, wait no longer than timeout
-			line = self.outgoing.get(timeout=timeout)
+			due, line = self.outgoing.get(timeout=timeout)
 			self.outgoing.task_done()
+
+			delay = due - time.time()
+			if delay > 0:
+				time.sleep(delay)
 			return line
 		except Queue.Empty:
 			# queue empty? return empty line
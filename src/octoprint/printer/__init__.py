@@ -298,6 +298,18 @@ class PrinterInterface(object):
 		"""
 		raise NotImplementedError()
 
+	def get_log_lines(self, cursor=None):
+		"""
+		Fetches the communication log lines added since ``cursor``.
+
+		Arguments:
+		    cursor (int): The cursor returned by the previous call, None to fetch the whole available log.
+
+		Returns:
+		    (tuple) The cursor to pass to the next call and the list of log lines, oldest first.
+		"""
+		raise NotImplementedError()
+
 	def get_current_connection(self):
 		"""
 		Returns:
@@ -440,6 +452,7 @@ class PrinterCallback(object):
 		            target: <target temperature of the bed, in degC>
 		      - ...
 		    logs: <list of current communication log lines>
+		    logCursor: <cursor for fetching the log lines added after logs via PrinterInterface.get_log_lines>
 		    messages: <list of current messages from the firmware>
 
 		Arguments:
@@ -5,12 +5,13 @@ from __future__ import absolute_import
 import math
 import time
 import logging
+import threading
 from octoprint.util.bee_comm import BeeCom
 import os
 from octoprint.printer.standard import Printer
 from octoprint.printer import PrinterInterface
 from octoprint.settings import settings
-from octoprint.server.util.connection_util import ConnectionMonitorThread
+from octoprint.server.util.connection_util import HotplugWatcher
 from octoprint.server.util.printer_status_detection_util import bvc_printer_status_detection
 from octoprint.events import eventManager, Events
 from octoprint.slicing import SlicingManager
@@ -27,6 +28,13 @@ class BeePrinter(Printer):
     itself with it as a callback to react to changes on the communication layer.
     """
     TMP_FILE_MARKER = '__tmp-scn'
+    ANALYSIS_BUSY_STATES = (BeeCom.STATE_TRANSFERING_FILE, BeeCom.STATE_PREPARING_PRINT, BeeCom.STATE_HEATING,
+                            BeeCom.STATE_PRINTING, BeeCom.STATE_RESUMING)
+
+    # Seconds after which the values cached from the printer memory are read again from the printer, None for
+    # values which only change on reconnect or firmware flash. The filament in spool is consumed while printing.
+    MEMORY_CACHE_TTL = dict(filamentString=300.0, filamentInSpool=30.0, nozzleSize=300.0, firmwareVersion=None,
+                            serial=None)
 
 
     def __init__(self, fileManager, analysisQueue, printerProfileManager):
@@ -38,7 +46,15 @@ class BeePrinter(Printer):
         self._runningCalibrationTest = False
         self._insufficientFilamentForCurrent = False
         self._isConnecting = False
-        self._bvc_conn_thread = None
+
+        # Values from the printer memory, so that requests for them don't need a round trip over the USB connection
+        self._memoryCache = PrinterMemoryCache()
+        self._memoryCache.register('filamentString', ttl=BeePrinter.MEMORY_CACHE_TTL['filamentString'])
+        self._memoryCache.register('filamentInSpool', type=float, ttl=BeePrinter.MEMORY_CACHE_TTL['filamentInSpool'],
+                                   valid=lambda filament: filament >= 0)
+        self._memoryCache.register('nozzleSize', type=int, ttl=BeePrinter.MEMORY_CACHE_TTL['nozzleSize'])
+        self._memoryCache.register('firmwareVersion', ttl=BeePrinter.MEMORY_CACHE_TTL['firmwareVersion'])
+        self._memoryCache.register('serial', ttl=BeePrinter.MEMORY_CACHE_TTL['serial'])
 
         # Initializes the slicing manager for filament profile information
         self._slicingManager = SlicingManager(settings().getBaseFolder("slicingProfiles"), printerProfileManager)
@@ -64,6 +80,10 @@ class BeePrinter(Printer):
 
         super(BeePrinter, self).__init__(fileManager, analysisQueue, printerProfileManager)
 
+        # Watches for printers being attached to or detached from USB, independently of the connected clients
+        self._hotplugWatcher = HotplugWatcher(self._onPrinterAttached, on_detach=self._onPrinterDetached)
+        self._hotplugWatcher.start()
+
 
     def connect(self, port=None, baudrate=None, profile=None):
         """
@@ -87,6 +107,9 @@ class BeePrinter(Printer):
                     self._isConnecting = False
                     return False
 
+            # the values cached from the memory of a previously connected printer are not valid anymore
+            self._memoryCache.invalidate()
+
             self._comm = BeeCom(callbackObject=self, printerProfileManager=self._printerProfileManager)
 
             # returns in case the connection with the printer was not established
@@ -112,6 +135,9 @@ class BeePrinter(Printer):
             # Updates the printer connection state
             self._comm.confirmConnection()
 
+            # reads the values of the printer memory requested by the clients while the USB connection is idle
+            self._refreshPrinterMemory()
+
             # if the printer is printing or in shutdown mode selects the last selected file for print
             # and starts the progress monitor
             lastFile = settings().get(['lastPrintJobFile'])
@@ -142,11 +168,6 @@ class BeePrinter(Printer):
 
             self._isConnecting = False
 
-            # make sure the connection monitor thread is null so we are able to instantiate a new thread later on
-            if self._bvc_conn_thread is not None:
-                self._bvc_conn_thread.stop_connection_monitor()
-                self._bvc_conn_thread = None
-
             if self._comm.isOperational():
                 return True
         except Exception:
@@ -161,11 +182,9 @@ class BeePrinter(Printer):
         self._logger.info("Closing USB printer connection.")
         super(BeePrinter, self).disconnect()
 
-        # Starts the connection monitor thread only if there are any connected clients
-        if len(self._connectedClients) > 0 and self._bvc_conn_thread is None:
-            import threading
-            self._bvc_conn_thread = ConnectionMonitorThread(self.connect)
-            self._bvc_conn_thread.start()
+        # Reconnects right away if the printer is still attached and there are any connected clients
+        if len(self._connectedClients) > 0:
+            self._hotplugWatcher.rescan()
 
 
     def select_file(self, path, sd, printAfterSelect=False, pos=None):
@@ -195,7 +214,10 @@ class BeePrinter(Printer):
 
         self._printAfterSelect = printAfterSelect
         self._posAfterSelect = pos
-        self._comm.selectFile("/" + path if sd and not settings().getBoolean(["feature", "sdRelativePath"]) else path, sd)
+        if sd:
+            self._comm.selectFile("/" + path if not settings().getBoolean(["feature", "sdRelativePath"]) else path, sd)
+        else:
+            self._comm.selectFile(path, sd, file_hash=self._getFileHash(path))
 
         if not self._comm.isPrinting() and not self._comm.isShutdown():
             self._setProgressData(completion=0)
@@ -398,8 +420,12 @@ class BeePrinter(Printer):
         :return:
         """
         try:
-            return self._comm.getCommandsInterface().setFilamentString(filamentStr)
+            comm_return = self._comm.getCommandsInterface().setFilamentString(filamentStr)
+            self._updatePrinterMemory('filamentString', filamentStr, comm_return)
+
+            return comm_return
         except Exception as ex:
+            self._memoryCache.invalidate('filamentString')
             self._logger.error(ex)
 
 
@@ -410,7 +436,7 @@ class BeePrinter(Printer):
         :return: Profile or None
         """
         try:
-            filamentStr = self._comm.getCommandsInterface().getFilamentString()
+            filamentStr = self.getFilamentString()
             if not filamentStr:
                 return None
 
@@ -434,7 +460,7 @@ class BeePrinter(Printer):
         :return: string
         """
         try:
-            return self._comm.getCommandsInterface().getFilamentString()
+            return self._memoryCache.get('filamentString', self._comm.getCommandsInterface().getFilamentString)
         except Exception as ex:
             self._logger.error(ex)
 
@@ -445,7 +471,7 @@ class BeePrinter(Printer):
         :return: float filament amount in mm
         """
         try:
-            filament = self._comm.getCommandsInterface().getFilamentInSpool()
+            filament = self._memoryCache.get('filamentInSpool', self._comm.getCommandsInterface().getFilamentInSpool)
             if filament < 0:
                 # In case the value returned from the printer is not valid returns a high value to prevent false
                 # positives of not enough filament available
@@ -462,7 +488,7 @@ class BeePrinter(Printer):
         :return: float filament amount in grams
         """
         try:
-            filament_mm = self._comm.getCommandsInterface().getFilamentInSpool()
+            filament_mm = self._memoryCache.get('filamentInSpool', self._comm.getCommandsInterface().getFilamentInSpool)
 
             if filament_mm >= 0:
                 filament_cm = filament_mm / 10.0
@@ -501,12 +527,14 @@ class BeePrinter(Printer):
             filament_mm = filament_cm * 10.0
 
             comm_return = self._comm.getCommandsInterface().setFilamentInSpool(filament_mm)
+            self._updatePrinterMemory('filamentInSpool', filament_mm, comm_return)
 
             # updates the current print job information with availability of filament
             self._checkSufficientFilamentForPrint()
 
             return comm_return
         except Exception as ex:
+            self._memoryCache.invalidate('filamentInSpool')
             self._logger.error(ex)
 
 
@@ -517,8 +545,12 @@ class BeePrinter(Printer):
         :return:
         """
         try:
-            return self._comm.getCommandsInterface().setNozzleSize(nozzleSize)
+            comm_return = self._comm.getCommandsInterface().setNozzleSize(nozzleSize)
+            self._updatePrinterMemory('nozzleSize', nozzleSize, comm_return)
+
+            return comm_return
         except Exception as ex:
+            self._memoryCache.invalidate('nozzleSize')
             self._logger.error(ex)
 
 
@@ -528,7 +560,7 @@ class BeePrinter(Printer):
         :return: float
         """
         try:
-            return self._comm.getCommandsInterface().getNozzleSize()
+            return self._memoryCache.get('nozzleSize', self._comm.getCommandsInterface().getNozzleSize)
         except Exception as ex:
             self._logger.error(ex)
 
@@ -543,7 +575,7 @@ class BeePrinter(Printer):
             nozzle_type_prefix = 'nz'
             default_nozzle_size = 400
             if self._comm and self._comm.getCommandsInterface():
-                current_nozzle = self._comm.getCommandsInterface().getNozzleSize()
+                current_nozzle = self.getNozzleSize()
 
                 if current_nozzle is not None:
                     return nozzle_type_prefix + str(current_nozzle)
@@ -788,7 +820,7 @@ class BeePrinter(Printer):
         :return: string
         """
         if self._comm is not None and self._comm.getCommandsInterface() is not None:
-            firmware_v = self._comm.getCommandsInterface().getFirmwareVersion()
+            firmware_v = self._memoryCache.get('firmwareVersion', self._comm.getCommandsInterface().getFirmwareVersion)
 
             if firmware_v is not None:
                 return firmware_v
@@ -805,7 +837,7 @@ class BeePrinter(Printer):
         if self._comm is None:
             return ""
         else:
-            return self._comm.getConnectedPrinterSN()
+            return self._memoryCache.get('serial', self._comm.getConnectedPrinterSN)
 
 
     def printFromMemory(self):
@@ -899,6 +931,7 @@ class BeePrinter(Printer):
         """
         Print cancelled callback for the EventManager.
         """
+        self._memoryCache.invalidate('filamentInSpool')
         self.unselect_file()
 
         # sends usage statistics to remote server
@@ -921,16 +954,12 @@ class BeePrinter(Printer):
         """
         Callback method for the comm object, called if the connection state changes.
         """
-        oldState = self._state
-
-        # forward relevant state changes to gcode manager
-        if oldState == BeeCom.STATE_PRINTING:
-            self._analysisQueue.resume()  # printing done, put those cpu cycles to good use
-
-        elif state == BeeCom.STATE_PRINTING:
-            self._analysisQueue.pause()  # do not analyse files while printing
+        # forward relevant state changes to the analysis queue, background analysis backs off to its busy CPU
+        # budget while files are transferred to the printer or printed and speeds up again once the printer is idle
+        self._analysisQueue.set_busy(state in BeePrinter.ANALYSIS_BUSY_STATES)
 
-        elif state == BeeCom.STATE_CLOSED or state == BeeCom.STATE_CLOSED_WITH_ERROR:
+        if state == BeeCom.STATE_CLOSED or state == BeeCom.STATE_CLOSED_WITH_ERROR:
+            self._memoryCache.invalidate()
             if self._comm is not None:
                 self._comm = None
 
@@ -945,6 +974,9 @@ class BeePrinter(Printer):
         if BeePrinter.TMP_FILE_MARKER in payload["file"]:
             self._fileManager.remove_file(payload['origin'], payload['file'])
 
+        # the print consumed filament from the spool
+        self._memoryCache.invalidate('filamentInSpool')
+
         # unselects the current file
         self.unselect_file()
 
@@ -958,16 +990,14 @@ class BeePrinter(Printer):
         :param payload: 
         :return: 
         """
-        # Only appends the client address to the list. The connection monitor thread will automatically handle
+        # Only appends the client address to the list. The hotplug watcher will automatically handle
         # the connection itself
         if payload['remoteAddress'] not in self._connectedClients:
             self._connectedClients.append(payload['remoteAddress'])
 
-            # Starts the connection monitor thread
-            if self._bvc_conn_thread is None and (self._comm is None or (self._comm is not None and not self._comm.isOperational())):
-                import threading
-                self._bvc_conn_thread = ConnectionMonitorThread(self.connect)
-                self._bvc_conn_thread.start()
+            # Connects right away if a printer is attached
+            if self._comm is None or not self._comm.isOperational():
+                self._hotplugWatcher.rescan()
 
 
     def on_client_disconnected(self, event, payload):
@@ -980,19 +1010,33 @@ class BeePrinter(Printer):
         if payload['remoteAddress'] in self._connectedClients:
             self._connectedClients.remove(payload['remoteAddress'])
 
-        # if there are no more connected clients stops the connection monitor thread to release the USB connection
-        if len(self._connectedClients) == 0 and self._bvc_conn_thread is not None:
-            self._bvc_conn_thread.stop_connection_monitor()
-            self._bvc_conn_thread = None
-
         # Disconnects the printer connection if the connection is active
         if len(self._connectedClients) == 0 and self._comm is not None:
             # calls only the disconnect function on the parent class instead of the complete bee_printer.disconnect
-            # which also handles the connection monitor thread. This thread will be handled automatically when
-            # the disconnect function is called by the beecom driver disconnect hook
+            # which also triggers reconnecting through the hotplug watcher
+            super(BeePrinter, self).disconnect()
+
+    def _onPrinterAttached(self):
+        """
+        Hotplug watcher callback for a printer being attached, connects to it if there are any connected clients
+        :return: True if the printer is connected
+        """
+        if self._comm is not None and self._comm.isOperational():
+            return True
+
+        return self.connect()
+
+    def _onPrinterDetached(self):
+        """
+        Hotplug watcher callback for the printer being detached
+        :return:
+        """
+        if self._comm is not None:
+            self._logger.info("Printer detached, closing USB printer connection.")
             super(BeePrinter, self).disconnect()
 
     def on_flash_firmware_started(self, event, payload):
+        self._memoryCache.invalidate()
         for callback in self._callbacks:
             try:
                 callback.sendFlashingFirmware(payload['version'])
@@ -1000,6 +1044,7 @@ class BeePrinter(Printer):
                 self._logger.exception("Exception while notifying client of firmware update operation start")
 
     def on_flash_firmware_finished(self, event, payload):
+        self._memoryCache.invalidate()
         for callback in self._callbacks:
             try:
                 callback.sendFinishedFlashingFirmware(payload['result'])
@@ -1016,6 +1061,47 @@ class BeePrinter(Printer):
         self._checkSufficientFilamentForPrint()
 
 
+    def _getFileHash(self, path):
+        """
+        Returns the SHA1 hash of the content of the local file at ``path`` stored in its metadata by the file
+        manager, or None if it has no metadata
+        """
+        try:
+            metadata = self._fileManager.get_metadata(FileDestinations.LOCAL,
+                                                      self._fileManager.path_in_storage(FileDestinations.LOCAL, path))
+        except Exception:
+            self._logger.exception("Error reading the metadata of %s" % path)
+            return None
+
+        if not isinstance(metadata, dict):
+            return None
+        return metadata.get("hash")
+
+
+    def _refreshPrinterMemory(self):
+        """
+        Reads all values cached from the printer memory again from the printer
+        """
+        self._memoryCache.invalidate()
+
+        self.getFilamentString()
+        self.getFilamentInSpool()
+        self.getNozzleSize()
+        self.getCurrentFirmware()
+        self.get_printer_serial()
+
+
+    def _updatePrinterMemory(self, name, value, comm_return):
+        """
+        Updates a value cached from the printer memory after it was written to the printer. The commands interface
+        returns None if the command could not be sent, in which case the value is read again on the next request.
+        """
+        if comm_return is None:
+            self._memoryCache.invalidate(name)
+        else:
+            self._memoryCache.set(name, value)
+
+
     def _getFilamentSettings(self):
         """
         Gets the necessary filament settings for weight/size conversions
@@ -1175,6 +1261,81 @@ class BeePrinter(Printer):
         return False
 
 
+class PrinterMemoryCache(object):
+    """
+    Cache for values read from the printer memory through the commands interface.
+
+    Each value is registered with the type its reads are converted to, the time in seconds after which it is read
+    again from the printer (None to keep it until it's invalidated) and an optional check for its validity. None and
+    invalid values, e.g. the error values returned on communication errors, are returned but never cached.
+    """
+
+    def __init__(self):
+        self._properties = dict()
+        self._values = dict()
+        self._generation = 0
+        self._lock = threading.RLock()
+
+    def register(self, name, type=None, ttl=None, valid=None):
+        self._properties[name] = (type, ttl, valid)
+
+    def get(self, name, loader):
+        """
+        Returns the cached value ``name`` or reads it through ``loader`` if it isn't cached or has expired
+        """
+        with self._lock:
+            if name in self._values:
+                value, expires = self._values[name]
+                if expires is None or expires > time.time():
+                    return value
+            generation = self._generation
+
+        value = loader()
+
+        with self._lock:
+            # don't cache values read before an invalidation
+            if generation != self._generation:
+                return self._convert(name, value)
+            return self.set(name, value)
+
+    def set(self, name, value):
+        """
+        Caches ``value`` as ``name``, e.g. after it was written to the printer memory, and returns it converted to
+        the registered type
+        """
+        type, ttl, valid = self._properties[name]
+        value = self._convert(name, value)
+
+        with self._lock:
+            if value is None or (valid is not None and not valid(value)):
+                self._values.pop(name, None)
+            else:
+                self._values[name] = (value, time.time() + ttl if ttl is not None else None)
+
+        return value
+
+    def invalidate(self, name=None):
+        """
+        Drops the cached value ``name`` or all cached values if no name is provided
+        """
+        with self._lock:
+            self._generation += 1
+            if name is None:
+                self._values.clear()
+            else:
+                self._values.pop(name, None)
+
+    def _convert(self, name, value):
+        type = self._properties[name][0]
+        if value is None or type is None:
+            return value
+
+        try:
+            return type(value)
+        except (TypeError, ValueError):
+            return None
+
+
 class CalibrationGCoder:
 
     _calibration_gcode = { 'BVC_BEETHEFIRST_V1' :'M29,'
@@ -170,6 +170,7 @@ class PrinterProfileManager(object):
 	def __init__(self):
 		self._current = None
 		self._folder = settings().getBaseFolder("printerProfiles")
+		self._default_identifier = settings().accessor(["printerProfiles", "default"])
 		self._logger = logging.getLogger(__name__)
 
 	def select(self, identifier):
@@ -235,7 +236,7 @@ class PrinterProfileManager(object):
 		return self.get(identifier)
 
 	def get_default(self):
-		default = settings().get(["printerProfiles", "default"])
+		default = self._default_identifier()
 		if default is not None and self.exists(default):
 			profile = self.get(default)
 			if profile is not None:
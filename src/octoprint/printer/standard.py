@@ -15,6 +15,8 @@ import os
 import threading
 import time
 
+from collections import deque
+
 from octoprint import util as util
 from octoprint.events import eventManager, Events
 from octoprint.filemanager import FileDestinations, NoSuchStorage
@@ -23,7 +25,7 @@ from octoprint.printer import PrinterInterface, PrinterCallback, UnknownScript
 from octoprint.printer.estimation import TimeEstimationHelper
 from octoprint.settings import settings
 from octoprint.util import comm as comm
-from octoprint.util import InvariantContainer
+from octoprint.util import RingBuffer, SequencedRingBuffer
 from octoprint.util import to_unicode
 
 
@@ -34,8 +36,6 @@ class Printer(PrinterInterface, comm.MachineComPrintCallback):
 	"""
 
 	def __init__(self, fileManager, analysisQueue, printerProfileManager):
-		from collections import deque
-
 		self._logger = logging.getLogger(__name__)
 
 		self._analysisQueue = analysisQueue
@@ -54,8 +54,8 @@ class Printer(PrinterInterface, comm.MachineComPrintCallback):
 		self._messages = deque([], 300)
 		self._messageBacklog = []
 
-		self._log = deque([], 300)
-		self._logBacklog = []
+		# shared by all callbacks, which fetch new lines through cursors instead of keeping their own backlogs
+		self._log = SequencedRingBuffer(1000)
 
 		self._state = None
 
@@ -136,10 +136,14 @@ class Printer(PrinterInterface, comm.MachineComPrintCallback):
 			try: callback.on_printer_add_temperature(data)
 			except: self._logger.exception("Exception while adding temperature data point")
 
-	def _sendAddLogCallbacks(self, data):
+	def _sendAddLogCallbacks(self, logs):
+		logs = [to_unicode(log, "utf-8", errors="replace") for log in logs]
+		self._log.extend(logs)
+
 		for callback in self._callbacks:
-			try: callback.on_printer_add_log(data)
-			except: self._logger.exception("Exception while adding communication log entry")
+			for log in logs:
+				try: callback.on_printer_add_log(log)
+				except: self._logger.exception("Exception while adding communication log entry")
 
 	def _sendAddMessageCallbacks(self, data):
 		for callback in self._callbacks:
@@ -618,9 +622,11 @@ class Printer(PrinterInterface, comm.MachineComPrintCallback):
 		self._stateMonitor.set_state({"text": state_string, "flags": self._getStateFlags()})
 
 	def _addLog(self, log):
-		self._log.append(log)
 		self._stateMonitor.add_log(log)
 
+	def get_log_lines(self, cursor=None):
+		return self._log.since(cursor)
+
 	def _addMessage(self, message):
 		self._messages.append(message)
 		self._stateMonitor.add_message(message)
@@ -902,9 +908,11 @@ class Printer(PrinterInterface, comm.MachineComPrintCallback):
 	def _sendInitialStateUpdate(self, callback):
 		try:
 			data = self._stateMonitor.get_current_data()
+			log_cursor, logs = self._log.since()
 			data.update({
-				"temps": list(self._temps),
-				"logs": list(self._log),
+				"temps": self._temps[:],
+				"logs": logs[-300:],
+				"logCursor": log_cursor,
 				"messages": list(self._messages)
 			})
 			callback.on_printer_send_initial_data(data)
@@ -927,8 +935,11 @@ class Printer(PrinterInterface, comm.MachineComPrintCallback):
 	def on_comm_log(self, message):
 		"""
 		 Callback method for the comm object, called upon log output.
+
+		 Called for every line sent to or received from the printer, so the message is only queued here, it's
+		 decoded and passed on in batches by the state monitor.
 		"""
-		self._addLog(to_unicode(message, "utf-8", errors="replace"))
+		self._addLog(message)
 
 	def on_comm_temperature_update(self, temp, bedTemp):
 		self._addTemperatureData(copy.deepcopy(temp), copy.deepcopy(bedTemp))
@@ -1050,6 +1061,9 @@ class StateMonitor(object):
 		self._on_add_message = on_add_message
 		self._on_get_progress = on_get_progress
 
+		# appended to by the comm threads for every log line, deque appends are thread safe
+		self._logs = deque()
+
 		self._state = None
 		self._job_data = None
 		self._gcode_data = None
@@ -1086,8 +1100,12 @@ class StateMonitor(object):
 		self._change_event.set()
 
 	def add_log(self, log):
-		self._on_add_log(log)
-		self._change_event.set()
+		"""
+		Queues ``log`` to be passed to ``on_add_log`` with all other log lines added until the next update.
+		"""
+		self._logs.append(log)
+		if not self._change_event.is_set():
+			self._change_event.set()
 
 	def add_message(self, message):
 		self._on_add_message(message)
@@ -1132,10 +1150,23 @@ class StateMonitor(object):
 				time.sleep(additional_wait_time)
 
 			with self._state_lock:
+				# clear first so that changes during the update trigger the next one
+				self._change_event.clear()
+				self._flush_logs()
 				data = self.get_current_data()
 				self._update_callback(data)
 				self._last_update = time.time()
-				self._change_event.clear()
+
+	def _flush_logs(self):
+		logs = []
+		try:
+			while True:
+				logs.append(self._logs.popleft())
+		except IndexError:
+			pass
+
+		if logs and callable(self._on_add_log):
+			self._on_add_log(logs)
 
 	def get_current_data(self):
 		with self._progress_lock:
@@ -1152,12 +1183,48 @@ class StateMonitor(object):
 		}
 
 
-class TemperatureHistory(InvariantContainer):
-	def __init__(self, cutoff=30 * 60):
+class TemperatureHistory(RingBuffer):
+	"""
+	History of the temperature data of the last ``cutoff`` seconds, oldest first.
 
-		def temperature_invariant(data):
-			data.sort(key=lambda x: x["time"])
-			now = int(time.time())
-			return [item for item in data if item["time"] >= now - cutoff]
+	Data is expected to be appended in chronological order, which allows evicting outdated entries from the front in
+	O(1) instead of sorting and filtering the whole history on every append. Entries are only evicted once they are
+	outdated: the buffer starts out with room for one entry per second over the whole ``cutoff`` window (both ends
+	included) and doubles in size whenever temperatures are reported more often than that. If ``capacity`` is given,
+	at most that many entries are held instead.
+	"""
 
-		InvariantContainer.__init__(self, guarantee_invariant=temperature_invariant)
+	__slots__ = ("_cutoff", "_fixed_capacity")
+
+	def __init__(self, cutoff=30 * 60, capacity=None):
+		RingBuffer.__init__(self, capacity if capacity is not None else max(cutoff, 0) + 1)
+		self._cutoff = cutoff
+		self._fixed_capacity = capacity is not None
+
+	def append(self, item):
+		with self._mutex:
+			self._evict(item["time"])
+			if self._length == self._capacity and not self._fixed_capacity:
+				self._grow()
+			RingBuffer.append(self, item)
+
+	def __getitem__(self, index):
+		with self._mutex:
+			self._evict(int(time.time()))
+			return RingBuffer.__getitem__(self, index)
+
+	def __len__(self):
+		with self._mutex:
+			self._evict(int(time.time()))
+			return RingBuffer.__len__(self)
+
+	def _grow(self):
+		items = RingBuffer.__getitem__(self, slice(None))
+		self._capacity *= 2
+		self._items = items + [None] * (self._capacity - len(items))
+		self._start = 0
+
+	def _evict(self, now):
+		threshold = now - self._cutoff
+		while self._length and self._items[self._start]["time"] < threshold:
+			self.popleft()
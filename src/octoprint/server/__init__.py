@@ -65,6 +65,7 @@ import octoprint.timelapse
 import octoprint._version
 import octoprint.util
 import octoprint.filemanager.storage
+import octoprint.filemanager.util
 import octoprint.filemanager.analysis
 import octoprint.slicing
 from octoprint.server.util.flask import PreemptiveCache
@@ -195,7 +196,12 @@ class Server(object):
 		analysisQueue = octoprint.filemanager.analysis.AnalysisQueue()
 		slicingManager = octoprint.slicing.SlicingManager(s.getBaseFolder("slicingProfiles"), printerProfileManager)
 		storage_managers = dict()
-		storage_managers[octoprint.filemanager.FileDestinations.LOCAL] = octoprint.filemanager.storage.LocalFileStorage(s.getBaseFolder("uploads"))
+		storage_managers[octoprint.filemanager.FileDestinations.LOCAL] = octoprint.filemanager.storage.LocalFileStorage(
+			s.getBaseFolder("uploads"),
+			metadata_backend=s.get(["fileMetadata", "backend"]),
+			listing_cache=s.getBoolean(["fileListing", "cache"]),
+			watch=s.getBoolean(["fileListing", "watch"])
+		)
 		fileManager = octoprint.filemanager.FileManager(analysisQueue, slicingManager, printerProfileManager, initial_storage_managers=storage_managers)
 		printer = BeePrinter(fileManager, analysisQueue, printerProfileManager)
 		appSessionManager = util.flask.AppSessionManager()
@@ -331,6 +337,11 @@ class Server(object):
 		# register API blueprint
 		self._setup_blueprints()
 
+		# drop the index and i18n fingerprints whenever the files they depend on might have changed
+		from octoprint.server.views import fingerprints
+		pluginLifecycleManager.add_callback(["enabled", "disabled"], lambda name, plugin: fingerprints.invalidate())
+		eventManager.subscribe(events.Events.SETTINGS_UPDATED, lambda event, payload: fingerprints.invalidate())
+
 		## Tornado initialization starts here
 
 		if self._host is None:
@@ -341,6 +352,7 @@ class Server(object):
 		ioloop = IOLoop()
 		ioloop.install()
 
+		self._current_data_encoder = util.sockjs.CurrentDataEncoder(printer, fileManager)
 		self._router = SockJSRouter(self._create_socket_connection, "/sockjs")
 
 		upload_suffixes = dict(name=s.get(["server", "uploads", "nameSuffix"]), path=s.get(["server", "uploads", "pathSuffix"]))
@@ -404,7 +416,14 @@ class Server(object):
 						self._logger.debug("Adding additional route {route} handled by handler {handler} and with additional arguments {kwargs!r}".format(**locals()))
 						server_routes.append((route, handler, kwargs))
 
-		server_routes.append((r".*", util.tornado.UploadStorageFallbackHandler, dict(fallback=util.tornado.WsgiInputContainer(app.wsgi_app), file_prefix="octoprint-file-upload-", file_suffix=".tmp", suffixes=upload_suffixes)))
+		wsgi_limits = [(limit["pattern"], limit["concurrency"]) for limit in s.get(["server", "wsgi", "limits"]) if "pattern" in limit and "concurrency" in limit]
+		wsgi_app = util.tornado.WsgiInputContainer(app.wsgi_app, workers=s.getInt(["server", "wsgi", "workers"]), limits=wsgi_limits)
+		upload_hash_suffix = s.get(["server", "uploads", "hashSuffix"])
+		def upload_sinks(name, filename, content_type):
+			# hash uploaded files while they are being received so storages don't need to read them again for that
+			return {upload_hash_suffix: octoprint.filemanager.util.HashSink()}
+
+		server_routes.append((r".*", util.tornado.UploadStorageFallbackHandler, dict(fallback=wsgi_app, file_prefix="octoprint-file-upload-", file_suffix=".tmp", suffixes=upload_suffixes, sinks=upload_sinks)))
 
 		self._tornado_app = Application(server_routes)
 		max_body_sizes = [
@@ -464,6 +483,10 @@ class Server(object):
 			# use os default
 			observer = Observer()
 		observer.schedule(util.watchdog.GcodeWatchdogHandler(fileManager, printer), s.getBaseFolder("watched"))
+		if s.getBoolean(["devel", "cache", "watch"]):
+			from octoprint.server.views import fingerprints, get_fingerprint_folders
+			for folder in get_fingerprint_folders():
+				observer.schedule(util.watchdog.FingerprintWatchdogHandler(fingerprints), folder, recursive=True)
 		observer.start()
 
 		# run our startup plugins
@@ -498,6 +521,13 @@ class Server(object):
 					implementation.on_after_startup()
 				pluginLifecycleManager.add_callback("enabled", call_on_after_startup)
 
+				# precompute the fingerprints of the index page and the i18n bundles
+				try:
+					with app.app_context():
+						octoprint.server.views.compute_fingerprints()
+				except:
+					self._logger.exception("Error while computing the fingerprints of the index page and the i18n bundles")
+
 				# when we are through with that we also run our preemptive cache
 				if settings().getBoolean(["devel", "cache", "preemptive"]):
 					self._execute_preemptive_flask_caching(preemptiveCache)
@@ -517,6 +547,7 @@ class Server(object):
 			observer.join()
 			octoprint.plugin.call_plugin(octoprint.plugin.ShutdownPlugin,
 			                             "on_shutdown")
+			fileManager.flush_analysis_cache()
 
 			if self._octoprint_daemon is not None:
 				self._logger.info("Cleaning up daemon pidfile")
@@ -544,7 +575,8 @@ class Server(object):
 	def _create_socket_connection(self, session):
 		global printer, fileManager, analysisQueue, userManager, eventManager
 		return util.sockjs.PrinterStateConnection(printer, fileManager, analysisQueue, userManager,
-		                                          eventManager, pluginManager, session)
+		                                          eventManager, pluginManager, session,
+		                                          currentDataEncoder=self._current_data_encoder)
 
 	def _check_for_root(self):
 		if "geteuid" in dir(os) and os.geteuid() == 0:
@@ -14,13 +14,14 @@ from flask.ext.login import login_user, logout_user, current_user
 from flask.ext.principal import Identity, identity_changed, AnonymousIdentity
 
 import octoprint.util as util
+import octoprint.events
 import octoprint.users
 import octoprint.server
 import octoprint.plugin
 from octoprint.server import admin_permission, NO_CONTENT
 from octoprint.settings import settings as s, valid_boolean_trues
 from octoprint.server.util import noCachingResponseHandler, apiKeyRequestHandler, corsResponseHandler
-from octoprint.server.util.flask import restricted_access, get_json_command_from_request, passive_login
+from octoprint.server.util.flask import restricted_access, get_json_command_from_request, passive_login, get_cache_stats
 
 
 #~~ init api blueprint, including sub modules
@@ -179,6 +180,28 @@ def performSystemAction():
 	return NO_CONTENT
 
 
+@api.route("/system/cache", methods=["GET"])
+@restricted_access
+@admin_permission.require(403)
+def getCacheStats():
+	return jsonify(get_cache_stats())
+
+
+@api.route("/system/events", methods=["GET"])
+@restricted_access
+@admin_permission.require(403)
+def getEventStats():
+	return jsonify(octoprint.events.eventManager().get_metrics())
+
+
+@api.route("/system/plugins/timings", methods=["GET"])
+@restricted_access
+@admin_permission.require(403)
+def getPluginTimings():
+	return jsonify(enabled=s().getBoolean(["devel", "pluginTimings"]),
+	               plugins=octoprint.plugin.plugin_manager().get_timings())
+
+
 #~~ Login/user handling
 
 
@@ -39,13 +39,50 @@ def readGcodeFilesForOrigin(origin):
 	if origin not in [FileDestinations.LOCAL, FileDestinations.SDCARD]:
 		return make_response("Unknown origin: %s" % origin, 404)
 
-	files = _getFileList(origin)
+	filter = None
+	if origin == FileDestinations.LOCAL and "filter" in request.values:
+		filter = request.values["filter"]
+
+	fields = None
+	if "fields" in request.values:
+		fields = [field.strip() for field in request.values["fields"].split(",") if field.strip()]
+
+	result = dict()
+	if origin == FileDestinations.LOCAL and any(parameter in request.values for parameter in ("limit", "cursor", "sort", "order")):
+		limit = None
+		if "limit" in request.values:
+			try:
+				limit = int(request.values["limit"])
+			except ValueError:
+				limit = 0
+			if limit <= 0:
+				return make_response("limit must be a positive integer", 400)
+
+		order = request.values.get("order", "asc")
+		if not order in ("asc", "desc"):
+			return make_response("order must be either asc or desc", 400)
+
+		try:
+			files, next_cursor = _getSortedFileList(origin,
+			                                        filter=filter,
+			                                        sort=request.values.get("sort", "name"),
+			                                        reverse=order == "desc",
+			                                        limit=limit,
+			                                        cursor=request.values.get("cursor"))
+		except ValueError as e:
+			return make_response(str(e), 400)
+		result["next"] = next_cursor
+	else:
+		files = _getFileList(origin, filter=filter)
+
+	if fields:
+		files = [dict((key, value) for key, value in file.items() if key in fields) for file in files]
+	result["files"] = files
 
 	if origin == FileDestinations.LOCAL:
 		usage = psutil.disk_usage(settings().getBaseFolder("uploads"))
-		return jsonify(files=files, free=usage.free, total=usage.total)
-	else:
-		return jsonify(files=files)
+		result.update(free=usage.free, total=usage.total)
+	return jsonify(**result)
 
 
 def _getFileDetails(origin, filename):
@@ -75,51 +112,65 @@ def _getFileList(origin, filter=None):
 					file.update({"size": sdSize})
 				files.append(file)
 	else:
-		filter_func = None
-		if filter:
-			filter_func = lambda entry, entry_data: octoprint.filemanager.valid_file_type(entry, type=filter)
-		files = fileManager.list_files(origin, filter=filter_func, recursive=False)[origin].values()
+		files = fileManager.list_files(origin, filter=_fileTypeFilter(filter), recursive=False)[origin].values()
 		for file in files:
-			file["origin"] = FileDestinations.LOCAL
-
-			if "analysis" in file and octoprint.filemanager.valid_file_type(file["name"], type="gcode"):
-				file["gcodeAnalysis"] = file["analysis"]
-				del file["analysis"]
-
-			if "history" in file and octoprint.filemanager.valid_file_type(file["name"], type="gcode"):
-				# convert print log
-				history = file["history"]
-				del file["history"]
-				success = 0
-				failure = 0
-				last = None
-				for entry in history:
-					success += 1 if "success" in entry and entry["success"] else 0
-					failure += 1 if "success" in entry and not entry["success"] else 0
-					if not last or ("timestamp" in entry and "timestamp" in last and entry["timestamp"] > last["timestamp"]):
-						last = entry
-				if last:
-					prints = dict(
-						success=success,
-						failure=failure,
-						last=dict(
-							success=last["success"],
-							date=last["timestamp"]
-						)
-					)
-					if "printTime" in last:
-						prints["last"]["printTime"] = last["printTime"]
-					file["prints"] = prints
-
-			file.update({
-				"refs": {
-					"resource": url_for(".readGcodeFile", target=FileDestinations.LOCAL, filename=file["name"], _external=True),
-					"download": url_for("index", _external=True) + "downloads/files/" + FileDestinations.LOCAL + "/" + file["name"]
-				}
-			})
+			_convertLocalFile(file)
 	return files
 
 
+def _getSortedFileList(origin, filter=None, sort="name", reverse=False, limit=None, cursor=None):
+	files, next_cursor = fileManager.list_files_sorted(origin, filter=_fileTypeFilter(filter), sort=sort, reverse=reverse, limit=limit, cursor=cursor)
+	for file in files:
+		_convertLocalFile(file)
+	return files, next_cursor
+
+
+def _fileTypeFilter(filter):
+	if not filter:
+		return None
+	return lambda entry, entry_data: octoprint.filemanager.valid_file_type(entry, type=filter)
+
+
+def _convertLocalFile(file):
+	file["origin"] = FileDestinations.LOCAL
+
+	if "analysis" in file and octoprint.filemanager.valid_file_type(file["name"], type="gcode"):
+		file["gcodeAnalysis"] = file["analysis"]
+		del file["analysis"]
+
+	if "history" in file and octoprint.filemanager.valid_file_type(file["name"], type="gcode"):
+		# convert print log
+		history = file["history"]
+		del file["history"]
+		success = 0
+		failure = 0
+		last = None
+		for entry in history:
+			success += 1 if "success" in entry and entry["success"] else 0
+			failure += 1 if "success" in entry and not entry["success"] else 0
+			if not last or ("timestamp" in entry and "timestamp" in last and entry["timestamp"] > last["timestamp"]):
+				last = entry
+		if last:
+			prints = dict(
+				success=success,
+				failure=failure,
+				last=dict(
+					success=last["success"],
+					date=last["timestamp"]
+				)
+			)
+			if "printTime" in last:
+				prints["last"]["printTime"] = last["printTime"]
+			file["prints"] = prints
+
+	file.update({
+		"refs": {
+			"resource": url_for(".readGcodeFile", target=FileDestinations.LOCAL, filename=file["name"], _external=True),
+			"download": url_for("index", _external=True) + "downloads/files/" + FileDestinations.LOCAL + "/" + file["name"]
+		}
+	})
+
+
 def _verifyFileExists(origin, filename):
 	if origin == FileDestinations.SDCARD:
 		return filename in map(lambda x: x[0], printer.get_sd_files())
@@ -136,8 +187,10 @@ def uploadGcodeFile(target):
 	input_name = "file"
 	input_upload_name = input_name + "." + settings().get(["server", "uploads", "nameSuffix"])
 	input_upload_path = input_name + "." + settings().get(["server", "uploads", "pathSuffix"])
+	input_upload_hash = input_name + "." + settings().get(["server", "uploads", "hashSuffix"])
 	if input_upload_name in request.values and input_upload_path in request.values:
-		upload = octoprint.filemanager.util.DiskFileWrapper(request.values[input_upload_name], request.values[input_upload_path])
+		upload = octoprint.filemanager.util.DiskFileWrapper(request.values[input_upload_name], request.values[input_upload_path],
+		                                                    hash=request.values.get(input_upload_hash))
 	else:
 		return make_response("No file included", 400)
 
@@ -110,6 +110,7 @@ def uploadLanguagePack():
 	else:
 		return make_response("Neither zip file nor tarball included", 400)
 
+	_invalidate_fingerprints()
 	return getInstalledLanguagePacks()
 
 @api.route("/languages/<string:locale>/<string:pack>", methods=["DELETE"])
@@ -126,6 +127,7 @@ def deleteInstalledLanguagePack(locale, pack):
 		import shutil
 		shutil.rmtree(target_path)
 
+	_invalidate_fingerprints()
 	return getInstalledLanguagePacks()
 
 def _unpack_uploaded_zipfile(path, target):
@@ -148,6 +150,11 @@ def _validate_archive_name(name):
 	if name.startswith("/") or ".." in name:
 		raise InvalidLanguagePack("Provided language pack contains invalid name {name}".format(**locals()))
 
+def _invalidate_fingerprints():
+	# the index page and the translation bundles depend on the installed language packs
+	from octoprint.server.views import fingerprints
+	fingerprints.invalidate()
+
 
 class InvalidLanguagePack(Exception):
 	pass
@@ -389,11 +389,10 @@ def _get_temperature_data(preprocessor):
 		if "limit" in request.values.keys() and unicode(request.values["limit"]).isnumeric():
 			limit = int(request.values["limit"])
 
-		history = list(tempHistory)
-		limit = min(limit, len(history))
+		history = tempHistory[-limit:]
 
 		tempData.update({
-			"history": map(lambda x: preprocessor(x), history[-limit:])
+			"history": map(lambda x: preprocessor(x), history)
 		})
 
 	return preprocessor(tempData)
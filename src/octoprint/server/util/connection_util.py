@@ -1,44 +1,245 @@
 # coding=utf-8
 import logging
 import threading
-from beedriver.connection import Conn as BeePrinterConn
-from time import sleep
+import Queue as queue
 
-class ConnectionMonitorThread(threading.Thread):
+try:
+	import pyudev
+except ImportError:
+	pyudev = None
 
-	def __init__(self, connection_callback):
+# (vendor id, product id or None for all products) of the USB devices of BVC printers
+BVC_USB_DEVICES = ((0xffff, 0x014e), (0x29c9, None), (0x1d50, None))
+
+ATTACHED = "attached"
+DETACHED = "detached"
+
+
+def is_bvc_usb_device(vendor_id, product_id):
+	for vendor, product in BVC_USB_DEVICES:
+		if vendor == vendor_id and (product is None or product == product_id):
+			return True
+	return False
+
+
+def create_device_source():
+	"""
+	Creates the source of USB hotplug events for BVC printers: udev if available, polling the USB bus otherwise
+	"""
+	if pyudev is not None:
+		try:
+			return UdevDeviceSource()
+		except Exception:
+			logging.getLogger(__name__).exception("Could not monitor udev for USB devices, falling back to polling")
+	return PollingDeviceSource()
+
+
+class UdevDeviceSource(object):
+	"""
+	Reports BVC printers being attached to or detached from USB as announced by the kernel through udev
+	"""
+
+	def __init__(self):
+		self._context = pyudev.Context()
+		self._observer = None
+		self._callback = None
+
+	def is_present(self):
+		for device in self._context.list_devices(subsystem="usb", DEVTYPE="usb_device"):
+			if self._is_bvc_device(device):
+				return True
+		return False
+
+	def start(self, callback):
+		self._callback = callback
+
+		monitor = pyudev.Monitor.from_netlink(self._context)
+		monitor.filter_by(subsystem="usb", device_type="usb_device")
+		self._observer = pyudev.MonitorObserver(monitor, callback=self._on_device)
+		self._observer.daemon = True
+		self._observer.start()
+
+	def stop(self):
+		if self._observer is not None:
+			self._observer.stop()
+			self._observer = None
+
+	def _on_device(self, device):
+		if not self._is_bvc_device(device):
+			return
+
+		if device.action == "add":
+			self._callback(ATTACHED)
+		elif device.action == "remove":
+			self._callback(DETACHED)
+
+	def _is_bvc_device(self, device):
+		# PRODUCT is part of the uevent of usb devices, so it's also available once the device is removed
+		product = device.get("PRODUCT")
+		if not product:
+			return False
+
+		try:
+			vendor_id, product_id = [int(part, 16) for part in product.split("/")[:2]]
+		except ValueError:
+			return False
+		return is_bvc_usb_device(vendor_id, product_id)
+
+
+class PollingDeviceSource(object):
+	"""
+	Reports BVC printers being attached to or detached from USB by enumerating the USB bus, backing off exponentially
+	from ``MIN_INTERVAL`` to ``MAX_INTERVAL`` seconds as long as nothing changes
+	"""
+
+	MIN_INTERVAL = 1.0
+	MAX_INTERVAL = 8.0
+
+	def __init__(self, printer_list=None):
+		if printer_list is None:
+			from beedriver.connection import Conn as BeePrinterConn
+			printer_list = BeePrinterConn().getPrinterList
+		self._printer_list = printer_list
+		self._stopped = threading.Event()
+
+	def is_present(self):
+		return len(self._printer_list()) > 0
+
+	def start(self, callback):
+		# changes are reported relative to the devices present when starting
+		thread = threading.Thread(target=self._poll, args=(callback, self.is_present()), name="PollingDeviceSource")
+		thread.daemon = True
+		thread.start()
+
+	def stop(self):
+		self._stopped.set()
+
+	def _poll(self, callback, present):
+		interval = self.MIN_INTERVAL
+
+		while not self._stopped.wait(interval):
+			now_present = self.is_present()
+			if now_present != present:
+				present = now_present
+				interval = self.MIN_INTERVAL
+				callback(ATTACHED if present else DETACHED)
+			else:
+				interval = min(interval * 2, self.MAX_INTERVAL)
+
+
+class FakeDeviceSource(object):
+	"""
+	Device source attaching and detaching printers on request, for tests. ``started`` is set once the source was
+	started and reports printers being attached or detached.
+	"""
+
+	def __init__(self, present=False):
+		self._present = present
+		self._callback = None
+		self.started = threading.Event()
+
+	def is_present(self):
+		return self._present
+
+	def start(self, callback):
+		self._callback = callback
+		self.started.set()
+
+	def stop(self):
+		self._callback = None
+
+	def attach(self):
+		self._present = True
+		if self._callback is not None:
+			self._callback(ATTACHED)
+
+	def detach(self):
+		self._present = False
+		if self._callback is not None:
+			self._callback(DETACHED)
+
+
+class HotplugWatcher(threading.Thread):
+
+	RETRY_MIN_INTERVAL = 1.0
+	RETRY_MAX_INTERVAL = 30.0
+
+	_RESCAN = "rescan"
+	_STOP = "stop"
+
+	def __init__(self, on_attach, on_detach=None, source=None):
 		"""
-		Thread class to check if a BVC printer was connected to a USB port
+		Thread class notifying about BVC printers being attached to or detached from a USB port
+
+		As long as a printer is attached but ``on_attach`` didn't return True, e.g. since there are no clients to
+		connect the printer for yet, ``on_attach`` is retried with exponential backoff or on :func:`rescan`.
 
-		:param connection_callback: Callback function to call when a printer is detected
+		:param on_attach: Callback function to call when a printer is detected, returns True once it's connected
+		:param on_detach: Callback function to call when the printer is removed
+		:param source: Source of the hotplug events, defaults to udev if available and polling the USB bus otherwise
 		:return:
 		"""
-		super(ConnectionMonitorThread, self).__init__()
-		self.USB_POLL_INTERVAL = 1  # seconds
-		self._printerConnIntf = BeePrinterConn()
+		super(HotplugWatcher, self).__init__(name="HotplugWatcher")
+		self.daemon = True
 
-		self._logger = logging.getLogger()
-		self._printer_detected_msg_logged = False
-		self._controlFlag = True
-		self._connection_callback = connection_callback
+		self._logger = logging.getLogger(__name__)
+		self._on_attach = on_attach
+		self._on_detach = on_detach
+		self._source = source if source is not None else create_device_source()
+		self._events = queue.Queue()
 
-	def stop_connection_monitor(self):
-		self._controlFlag = False
-		self._logger.info("BVC Printer connection monitor stopped.")
+	def rescan(self):
+		"""
+		Retries ``on_attach`` right away if a printer is attached
+		"""
+		self._events.put(self._RESCAN)
+
+	def stop(self):
+		self._source.stop()
+		self._events.put(self._STOP)
 
 	def run(self):
+		self._logger.info("Starting BVC Printer hotplug watcher using %s..." % self._source.__class__.__name__)
+		self._source.start(self._events.put)
+		if self._source.is_present():
+			self._events.put(ATTACHED)
+
+		pending = False
+		retry_interval = self.RETRY_MIN_INTERVAL
+
+		while True:
+			try:
+				event = self._events.get(timeout=retry_interval if pending else None)
+			except queue.Empty:
+				event = None
 
-		self._logger.info("Starting BVC Printer connection monitor...")
+			if event == self._STOP:
+				break
+			elif event == ATTACHED:
+				self._logger.info("BVC Printer attached.")
+				pending = True
+				retry_interval = self.RETRY_MIN_INTERVAL
+			elif event == DETACHED:
+				self._logger.info("BVC Printer detached.")
+				pending = False
+				self._call(self._on_detach)
+			elif event == self._RESCAN:
+				pending = pending or self._source.is_present()
+				retry_interval = self.RETRY_MIN_INTERVAL
 
-		while self._controlFlag:
-			printers = self._printerConnIntf.getPrinterList()
+			if pending:
+				if self._call(self._on_attach):
+					pending = False
+				elif event is None:
+					retry_interval = min(retry_interval * 2, self.RETRY_MAX_INTERVAL)
 
-			if len(printers) > 0: # printer found
-				if not self._printer_detected_msg_logged:
-					self._logger.info("BVC Printer detected. Waiting for client connection...")
-					self._printer_detected_msg_logged = True
+		self._logger.info("BVC Printer hotplug watcher stopped.")
 
-				if self._connection_callback():
-					return
+	def _call(self, callback):
+		if callback is None:
+			return None
 
-			sleep (self.USB_POLL_INTERVAL)
+		try:
+			return callback()
+		except Exception:
+			self._logger.exception("Error while notifying about BVC Printer hotplug event")
@@ -13,6 +13,7 @@ import flask.ext.principal
 import flask.ext.assets
 import webassets.updater
 import webassets.utils
+import collections
 import functools
 import contextlib
 import time
@@ -27,8 +28,6 @@ import octoprint.server
 import octoprint.users
 import octoprint.plugin
 
-from werkzeug.contrib.cache import BaseCache
-
 
 #~~ monkey patching
 
@@ -505,81 +504,141 @@ def passive_login():
 
 #~~ cache decorator for cacheable views
 
-class LessSimpleCache(BaseCache):
+class CachedResponse(collections.namedtuple("CachedResponse", "body, status, headers, size")):
+	"""
+	Immutable copy of a response stored in the :class:`ResponseCache`. ``size`` is the approximate number of bytes the
+	copy occupies, body and headers.
 	"""
-	Slightly improved version of :class:`SimpleCache`.
+
+	@classmethod
+	def from_response(cls, response):
+		# the body of streamed responses (e.g. sent files) needs to be read into memory to be cached
+		response.direct_passthrough = False
+		body = response.data
+
+		headers = response.headers.to_list()
+		size = len(body) + sum(len(key) + len(value) for key, value in headers)
+		return cls(body, response.status, tuple(headers), size)
+
+	def to_response(self):
+		return flask.current_app.response_class(response=self.body, status=self.status, headers=list(self.headers))
+
+
+class ResponseCache(object):
+	"""
+	LRU cache for the responses of views decorated with :func:`cached`.
+
+	Responses are stored as :class:`CachedResponse` instead of being pickled, serving one only means wrapping the
+	stored body in a new response object. The summed up size of all stored responses is limited to ``max_size`` bytes,
+	storing a new response evicts the least recently used ones until it fits.
 
 	Setting ``default_timeout`` or ``timeout`` to ``-1`` will have no timeout be applied at all.
 	"""
 
-	def __init__(self, threshold=500, default_timeout=300):
-		BaseCache.__init__(self, default_timeout=default_timeout)
+	def __init__(self, max_size=10 * 1024 * 1024, default_timeout=300):
+		self.max_size = max_size
+		self.default_timeout = default_timeout
+
 		self._mutex = threading.RLock()
-		self._cache = {}
+		self._entries = collections.OrderedDict()
 		self._bypassed = set()
-		self.clear = self._cache.clear
-		self._threshold = threshold
+		self._size = 0
 
-	def _prune(self):
-		if self.over_threshold():
-			now = time.time()
-			for idx, (key, (expires, _)) in enumerate(self._cache.items()):
-				if expires is not None and expires <= now or idx % 3 == 0:
-					with self._mutex:
-						self._cache.pop(key, None)
+		self._hits = 0
+		self._misses = 0
+		self._evictions = 0
+		self._expirations = 0
 
 	def get(self, key):
-		import pickle
-		now = time.time()
+		"""
+		:param key: the cache key
+		:return: the :class:`CachedResponse` stored under ``key``, ``None`` if there's none or it timed out
+		"""
 		with self._mutex:
-			expires, value = self._cache.get(key, (0, None))
-		if expires is None or expires > now:
-			return pickle.loads(value)
+			entry = self._entries.pop(key, None)
+			if entry is None:
+				self._misses += 1
+				return None
+
+			expires, value = entry
+			if expires is not None and expires <= time.time():
+				self._size -= value.size
+				self._expirations += 1
+				self._misses += 1
+				return None
+
+			# re-insert as most recently used entry
+			self._entries[key] = entry
+			self._hits += 1
+			return value
 
 	def set(self, key, value, timeout=None):
-		import pickle
+		"""
+		Stores the :class:`CachedResponse` ``value`` under ``key``, evicting the least recently used entries if
+		necessary. Responses larger than the whole cache are not stored.
 
+		:param key:                  the cache key
+		:param CachedResponse value: the response to store
+		:param int timeout:          seconds after which the entry times out, ``-1`` for never, ``None`` for the default
+		:return: ``True`` if the response was stored, ``False`` otherwise
+		"""
 		with self._mutex:
-			self._prune()
-			self._cache[key] = (self.calculate_timeout(timeout=timeout),
-								pickle.dumps(value, pickle.HIGHEST_PROTOCOL))
-			if key in self._bypassed:
-				self._bypassed.remove(key)
+			self.delete(key)
+			self._bypassed.discard(key)
 
-	def add(self, key, value, timeout=None):
-		with self._mutex:
-			self.set(key, value, timeout=None)
-			self._cache.setdefault(key, self._cache[key])
+			if value.size > self.max_size:
+				return False
+
+			self._entries[key] = (self.calculate_timeout(timeout=timeout), value)
+			self._size += value.size
+
+			while self._size > self.max_size:
+				_, (_, evicted) = self._entries.popitem(last=False)
+				self._size -= evicted.size
+				self._evictions += 1
+
+			return True
 
 	def delete(self, key):
 		with self._mutex:
-			self._cache.pop(key, None)
+			entry = self._entries.pop(key, None)
+			if entry is not None:
+				self._size -= entry[1].size
+
+	def clear(self):
+		with self._mutex:
+			self._entries.clear()
+			self._size = 0
 
 	def calculate_timeout(self, timeout=None):
 		if timeout is None:
 			timeout = self.default_timeout
-		if timeout is -1:
+		if timeout == -1:
 			return None
 		return time.time() + timeout
 
-	def over_threshold(self):
-		if self._threshold is None:
-			return False
+	def stats(self):
+		"""
+		:return: dictionary with the number of entries, their size, the maximum size and the hit, miss, eviction
+		         and expiration counters
+		"""
 		with self._mutex:
-			return len(self._cache) > self._threshold
-
-	def __getitem__(self, key):
-		return self.get(key)
-
-	def __setitem__(self, key, value):
-		return self.set(key, value)
-
-	def __delitem__(self, key):
-		return self.delete(key)
+			return dict(entries=len(self._entries),
+			            size=self._size,
+			            maxSize=self.max_size,
+			            hits=self._hits,
+			            misses=self._misses,
+			            evictions=self._evictions,
+			            expirations=self._expirations)
 
 	def __contains__(self, key):
 		with self._mutex:
-			return key in self._cache
+			entry = self._entries.get(key)
+			return entry is not None and (entry[0] is None or entry[0] > time.time())
+
+	def __len__(self):
+		with self._mutex:
+			return len(self._entries)
 
 	def set_bypassed(self, key):
 		with self._mutex:
@@ -589,7 +648,7 @@ class LessSimpleCache(BaseCache):
 		with self._mutex:
 			return key in self._bypassed
 
-_cache = LessSimpleCache()
+_cache = ResponseCache()
 
 def cached(timeout=5 * 60, key=lambda: "view:%s" % flask.request.path, unless=None, refreshif=None, unless_response=None):
 	def decorator(f):
@@ -611,14 +670,15 @@ def cached(timeout=5 * 60, key=lambda: "view:%s" % flask.request.path, unless=No
 				_cache.set_bypassed(cache_key)
 				return f(*args, **kwargs)
 
-			rv = _cache.get(cache_key)
+			cached_response = _cache.get(cache_key)
+			if cached_response is not None:
+				rv = cached_response.to_response()
 
-			# only take the value from the cache if we are not required to refresh it from the wrapped function
-			if rv is not None and (not callable(refreshif) or not refreshif(rv)):
-				logger.debug("Serving entry for {path} from cache".format(path=flask.request.path))
-				if not "X-From-Cache" in rv.headers:
+				# only take the value from the cache if we are not required to refresh it from the wrapped function
+				if not callable(refreshif) or not refreshif(rv):
+					logger.debug("Serving entry for {path} from cache".format(path=flask.request.path))
 					rv.headers["X-From-Cache"] = "true"
-				return rv
+					return rv
 
 			# get value from wrapped function
 			logger.debug("No cache entry or refreshing cache for {path} (key: {key}), calling wrapped function".format(path=flask.request.path, key=cache_key))
@@ -630,8 +690,10 @@ def cached(timeout=5 * 60, key=lambda: "view:%s" % flask.request.path, unless=No
 				_cache.set_bypassed(cache_key)
 				return rv
 
-			# store it in the cache
-			_cache.set(cache_key, rv, timeout=timeout)
+			# store a copy of it in the cache
+			if not isinstance(rv, flask.Response):
+				rv = flask.make_response(rv)
+			_cache.set(cache_key, CachedResponse.from_response(rv), timeout=timeout)
 
 			return rv
 
@@ -649,6 +711,12 @@ def is_cache_bypassed(key=lambda: "view:%s" % flask.request.path):
 		key = key()
 	return _cache.is_bypassed(key)
 
+def get_cache_stats():
+	"""
+	:return: the statistics of the response cache used by :func:`cached`, see :func:`ResponseCache.stats`
+	"""
+	return _cache.stats()
+
 def cache_check_headers():
 	return "no-cache" in flask.request.cache_control or "no-cache" in flask.request.pragma
 
@@ -5,9 +5,12 @@ __author__ = "Gina Häußge <osd@foosel.net>"
 __license__ = 'GNU Affero General Public License http://www.gnu.org/licenses/agpl.html'
 __copyright__ = "Copyright (C) 2014 The OctoPrint Project - Released under terms of the AGPLv3 License"
 
+import collections
+import copy
 import logging
 import threading
 import sockjs.tornado
+import sockjs.tornado.proto
 import time
 
 import octoprint.timelapse
@@ -20,16 +23,120 @@ from octoprint.events import Events
 import octoprint.printer
 
 
+class CurrentDataEncoder(object):
+	"""
+	Shares the work of preparing the general state updates pushed to the clients in the ``current`` message between
+	all connected clients.
+
+	Each distinct state reported by the printer's state monitor (including the list of busy files, which hence is
+	only determined once per update instead of once per client) is recorded as a frame with an increasing sequence
+	number. For clients that opted into delta updates, :func:`serialize` provides the top level keys that changed
+	between the frame a client received last and the current one, serialized only once per combination of frames and
+	shared by all clients that received the same frame last.
+	"""
+
+	STATE_KEYS = ("state", "job", "currentZ", "progress", "offsets")
+
+	HISTORY_SIZE = 32
+	"""Number of frames to keep available as base for deltas."""
+
+	SAME_UPDATE_WINDOW = 0.25
+	"""Seconds within which identical data is considered to stem from the same update of the state monitor."""
+
+	def __init__(self, printer, fileManager):
+		self._printer = printer
+		self._fileManager = fileManager
+
+		self._mutex = threading.RLock()
+		self._frames = collections.OrderedDict()
+		self._sequence = 0
+		self._lastData = None
+		self._lastDataTime = None
+		self._serialized = dict()
+
+	def update(self, data):
+		"""
+		Records the state contained in the ``data`` of a ``current`` update.
+
+		Arguments:
+		    data (dict): the data as provided to :func:`~octoprint.printer.PrinterCallback.on_printer_send_current_data`
+
+		Returns:
+		    tuple: the sequence number of the frame matching ``data`` and the frame's state, including ``busyFiles``
+		"""
+		with self._mutex:
+			now = time.time()
+			# the printer might modify its data in place later on, frames need to keep the state as it is now
+			received = copy.deepcopy(dict((key, data.get(key)) for key in self.STATE_KEYS))
+			if self._sequence and received == self._lastData and now - self._lastDataTime < self.SAME_UPDATE_WINDOW:
+				return self._sequence, self._frames[self._sequence]
+			self._lastData = received
+			self._lastDataTime = now
+
+			state = dict(received)
+			state["busyFiles"] = self._getBusyFiles(data)
+			if self._sequence and state == self._frames[self._sequence]:
+				return self._sequence, self._frames[self._sequence]
+
+			self._sequence += 1
+			self._frames[self._sequence] = state
+			while len(self._frames) > self.HISTORY_SIZE:
+				self._frames.popitem(last=False)
+			self._serialized = dict()
+
+			return self._sequence, state
+
+	def serialize(self, sequence, base=None):
+		"""
+		Serializes the delta between the frames ``base`` and ``sequence``.
+
+		Arguments:
+		    sequence (int): the sequence number of the frame to serialize
+		    base (int): the sequence number of the frame the client received last, ``None`` for a keyframe
+
+		Returns:
+		    str: JSON object with the frame's ``seq``, the ``base`` it is relative to and the ``changed`` top level
+		        keys. ``base`` is ``null`` for keyframes, which are also sent if ``base`` is not available anymore.
+		"""
+		with self._mutex:
+			if base is not None and not base in self._frames:
+				base = None
+
+			key = (sequence, base)
+			if not key in self._serialized:
+				state = self._frames[sequence]
+				if base is None:
+					changed = state
+				else:
+					previous = self._frames[base]
+					changed = dict((k, v) for k, v in state.items() if previous.get(k) != v)
+				self._serialized[key] = sockjs.tornado.proto.json_encode(dict(seq=sequence, base=base, changed=changed))
+			return self._serialized[key]
+
+	def _getBusyFiles(self, data):
+		busy_files = [dict(origin=v[0], name=v[1]) for v in self._fileManager.get_busy_files()]
+		if "job" in data and data["job"] is not None \
+				and "file" in data["job"] and "name" in data["job"]["file"] and "origin" in data["job"]["file"] \
+				and data["job"]["file"]["name"] is not None and data["job"]["file"]["origin"] is not None \
+				and (self._printer.is_printing() or self._printer.is_paused()):
+			busy_files.append(dict(origin=data["job"]["file"]["origin"], name=data["job"]["file"]["name"]))
+		return busy_files
+
+
 class PrinterStateConnection(sockjs.tornado.SockJSConnection, octoprint.printer.PrinterCallback):
-	def __init__(self, printer, fileManager, analysisQueue, userManager, eventManager, pluginManager, session):
+
+	KEYFRAME_INTERVAL = 10.0
+	"""Seconds after which clients receiving delta updates get sent the full state again."""
+
+	def __init__(self, printer, fileManager, analysisQueue, userManager, eventManager, pluginManager, session,
+	             currentDataEncoder=None):
 		sockjs.tornado.SockJSConnection.__init__(self, session)
 
 		self._logger = logging.getLogger(__name__)
 
 		self._temperatureBacklog = []
 		self._temperatureBacklogMutex = threading.Lock()
-		self._logBacklog = []
-		self._logBacklogMutex = threading.Lock()
+		self._logCursor = None
 		self._messageBacklog = []
 		self._messageBacklogMutex = threading.Lock()
 
@@ -46,6 +153,13 @@ class PrinterStateConnection(sockjs.tornado.SockJSConnection, octoprint.printer.
 		self._lastCurrent = 0
 		self._baseRateLimit = 0.5
 
+		if currentDataEncoder is None:
+			currentDataEncoder = CurrentDataEncoder(printer, fileManager)
+		self._currentDataEncoder = currentDataEncoder
+		self._deltas = False
+		self._deltaBase = None
+		self._lastKeyframe = 0
+
 		self._emit_mutex = threading.RLock()
 
 	def _getRemoteAddress(self, info):
@@ -128,6 +242,12 @@ class PrinterStateConnection(sockjs.tornado.SockJSConnection, octoprint.printer.
 				self._throttleFactor = throttle
 				self._logger.debug("Set throttle factor for client {} to {}".format(self._remoteAddress, self._throttleFactor))
 
+		if "deltas" in message:
+			# (re)requesting delta updates always starts with a keyframe
+			self._deltas = bool(message["deltas"])
+			self._deltaBase = None
+			self._logger.debug("Set delta updates for client {} to {}".format(self._remoteAddress, self._deltas))
+
 	def on_printer_send_current_data(self, data):
 		# make sure we rate limit the updates according to our throttle factor
 		now = time.time()
@@ -140,32 +260,45 @@ class PrinterStateConnection(sockjs.tornado.SockJSConnection, octoprint.printer.
 			temperatures = self._temperatureBacklog
 			self._temperatureBacklog = []
 
-		with self._logBacklogMutex:
-			logs = self._logBacklog
-			self._logBacklog = []
+		# log lines are only fetched once the history sent on registering provided the cursor to continue from
+		logs = []
+		if self._logCursor is not None:
+			self._logCursor, logs = self._printer.get_log_lines(self._logCursor)
 
 		with self._messageBacklogMutex:
 			messages = self._messageBacklog
 			self._messageBacklog = []
 
-		busy_files = [dict(origin=v[0], name=v[1]) for v in self._fileManager.get_busy_files()]
-		if "job" in data and data["job"] is not None \
-				and "file" in data["job"] and "name" in data["job"]["file"] and "origin" in data["job"]["file"] \
-				and data["job"]["file"]["name"] is not None and data["job"]["file"]["origin"] is not None \
-				and (self._printer.is_printing() or self._printer.is_paused()):
-			busy_files.append(dict(origin=data["job"]["file"]["origin"], name=data["job"]["file"]["name"]))
+		sequence, state = self._currentDataEncoder.update(data)
+
+		if self._deltas:
+			base = self._deltaBase
+			if now >= self._lastKeyframe + self.KEYFRAME_INTERVAL:
+				base = None
+			if base is None:
+				self._lastKeyframe = now
+			self._deltaBase = sequence
+
+			self._emitSerialized("currentDelta", "delta", self._currentDataEncoder.serialize(sequence, base), {
+				"serverTime": time.time(),
+				"temps": temperatures,
+				"logs": logs,
+				"messages": messages
+			})
+			return
 
 		data.update({
 			"serverTime": time.time(),
 			"temps": temperatures,
 			"logs": logs,
 			"messages": messages,
-			"busyFiles": busy_files,
+			"busyFiles": state["busyFiles"],
 		})
 		self._emit("current", data)
 
 	def on_printer_send_initial_data(self, data):
 		data_to_send = dict(data)
+		self._logCursor = data_to_send.pop("logCursor", None)
 		data_to_send["serverTime"] = time.time()
 		self._emit("history", data_to_send)
 
@@ -189,10 +322,6 @@ class PrinterStateConnection(sockjs.tornado.SockJSConnection, octoprint.printer.
 	def on_plugin_message(self, plugin, data):
 		self._emit("plugin", dict(plugin=plugin, data=data))
 
-	def on_printer_add_log(self, data):
-		with self._logBacklogMutex:
-			self._logBacklog.append(data)
-
 	def on_printer_add_message(self, data):
 		with self._messageBacklogMutex:
 			self._messageBacklog.append(data)
@@ -213,3 +342,27 @@ class PrinterStateConnection(sockjs.tornado.SockJSConnection, octoprint.printer.
 					self._logger.exception("Could not send message to client {}".format(self._remoteAddress))
 				else:
 					self._logger.warn("Could not send message to client {}: {}".format(self._remoteAddress, e))
+
+	def _emitSerialized(self, type, key, serialized, payload):
+		"""
+		Emits a message of type ``type`` whose payload consists of the already JSON serialized ``serialized`` under
+		``key`` and the (small) remainder ``payload``, without serializing ``serialized`` again.
+		"""
+		message = "{{{}:{{{}:{},{}}}".format(sockjs.tornado.proto.json_encode(type),
+		                                      sockjs.tornado.proto.json_encode(key),
+		                                      serialized,
+		                                      sockjs.tornado.proto.json_encode(payload)[1:])
+
+		with self._emit_mutex:
+			try:
+				if self.is_closed:
+					return
+				if self.session.send_expects_json:
+					self.session.send_jsonified(message)
+				else:
+					self.session.send_message(message)
+			except Exception as e:
+				if self._logger.isEnabledFor(logging.DEBUG):
+					self._logger.exception("Could not send message to client {}".format(self._remoteAddress))
+				else:
+					self._logger.warn("Could not send message to client {}: {}".format(self._remoteAddress, e))
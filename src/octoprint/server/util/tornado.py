@@ -62,6 +62,13 @@ def fix_ioloop_scheduling():
 #~~ WSGI middleware
 
 
+_MULTIPART_PREAMBLE = "preamble"
+_MULTIPART_DELIMITER = "delimiter"
+_MULTIPART_HEADER = "header"
+_MULTIPART_BODY = "body"
+_MULTIPART_EPILOGUE = "epilogue"
+
+
 @tornado.web.stream_request_body
 class UploadStorageFallbackHandler(tornado.web.RequestHandler):
 	"""
@@ -126,12 +133,26 @@ class UploadStorageFallbackHandler(tornado.web.RequestHandler):
 
 	The underlying application can then access the contained files via their respective paths and just move them
 	where necessary.
+
+	The multipart body is parsed while it is streaming in, using a buffer which never holds more than one received
+	chunk plus a couple of bytes that might belong to a boundary. File data is written to disk directly from that
+	buffer.
+
+	If ``sinks`` is provided, it is called for each file part with the part's name, filename and content type and may
+	return a dictionary mapping additional field suffixes to sinks (objects with ``update(data)``, ``finish()`` and
+	``abort()`` methods like :class:`~octoprint.filemanager.util.StreamSink`). The sinks get fed with the file's data
+	while it is being received, and each finished sink's ``result`` (if not ``None``) is added as form field
+	``<name>.<suffix>``, e.g. ``file.hash``. Form fields sent by the client that collide with the names of generated
+	fields are dropped.
 	"""
 
 	BODY_METHODS = ("POST", "PATCH", "PUT")
 	""" The request methods that may contain a request body. """
 
-	def initialize(self, fallback, file_prefix="tmp", file_suffix="", path=None, suffixes=None):
+	MAX_PART_HEADER_SIZE = 64 * 1024
+	""" The maximum size of the headers of a multipart part. """
+
+	def initialize(self, fallback, file_prefix="tmp", file_suffix="", path=None, suffixes=None, sinks=None):
 		if not suffixes:
 			suffixes = dict()
 
@@ -139,6 +160,7 @@ class UploadStorageFallbackHandler(tornado.web.RequestHandler):
 		self._file_prefix = file_prefix
 		self._file_suffix = file_suffix
 		self._path = path
+		self._sinks = sinks
 
 		self._suffixes = dict((key, key) for key in ("name", "path", "content_type", "size"))
 		for suffix_type, suffix in suffixes.iteritems():
@@ -155,16 +177,20 @@ class UploadStorageFallbackHandler(tornado.web.RequestHandler):
 		# Part currently being processed
 		self._current_part = None
 
+		# state of the multipart parser, see _process_multipart_data
+		self._multipart_state = _MULTIPART_PREAMBLE
+
 		# content type of request body
 		self._content_type = None
 
 		# bytes left to read according to content_length of request body
 		self._bytes_left = 0
 
-		# buffer needed for identifying form data parts
-		self._buffer = b""
+		# window of not yet processed multipart data, or the chunks of a non multipart body
+		self._buffer = bytearray()
+		self._body_chunks = []
 
-		# buffer for new body
+		# new body
 		self._new_body = b""
 
 		# logger
@@ -206,66 +232,113 @@ class UploadStorageFallbackHandler(tornado.web.RequestHandler):
 					# So no boundary? 400 Bad Request
 					raise tornado.web.HTTPError(400, log_message="No multipart boundary supplied")
 		else:
-			self._fallback(self.request, b"")
-			self._finished = True
+			return self._finish_with_fallback(b"")
+
+	@tornado.gen.coroutine
+	def _finish_with_fallback(self, body):
+		yield tornado.gen.maybe_future(self._fallback(self.request, body))
+		self._finished = True
 
 	def data_received(self, chunk):
 		"""
 		Called by Tornado on receiving a chunk of the request body. If request is a multipart request, takes care of
 		processing the multipart data structure via :func:`_process_multipart_data`. If not, just adds the chunk to
-		internal in-memory buffer.
+		the internal list of received chunks.
 
 		:param chunk: chunk of data received from Tornado
 		"""
 
-		data = self._buffer + chunk
 		if self.is_multipart():
-			self._process_multipart_data(data)
+			self._buffer.extend(chunk)
+			self._process_multipart_data()
 		else:
-			self._buffer = data
+			self._body_chunks.append(chunk)
 
 	def is_multipart(self):
 		"""Checks whether this request is a ``multipart`` request"""
 		return self._content_type is not None and self._content_type.startswith("multipart")
 
-	def _process_multipart_data(self, data):
+	def _process_multipart_data(self):
+		"""
+		Processes the data in the buffer as far as possible, parsing it for multipart definitions and calling the
+		appropriate methods. Processed data is removed from the buffer, only data that might be part of a boundary or
+		an incomplete part header is kept for the next round.
 		"""
-		Processes the given data, parsing it for multipart definitions and calling the appropriate methods.
 
-		:param data: the data to process as a string
+		delimiter = b"--" + self._multipart_boundary
+		part_delimiter = b"\r\n" + delimiter
+
+		while self._buffer:
+			if self._multipart_state == _MULTIPART_PREAMBLE:
+				# anything before the first delimiter is to be ignored
+				pos = self._buffer.find(delimiter)
+				if pos == -1:
+					self._consume(len(self._buffer) - len(delimiter) + 1)
+					return
+				self._consume(pos + len(delimiter))
+				self._multipart_state = _MULTIPART_DELIMITER
+
+			elif self._multipart_state == _MULTIPART_DELIMITER:
+				# a delimiter is followed either by "--" marking the end of the body or (after optional
+				# whitespace) by a line break and the next part's header
+				if len(self._buffer) < 2:
+					return
+				if self._buffer.startswith(b"--"):
+					self._multipart_state = _MULTIPART_EPILOGUE
+					self._on_request_body_finish()
+					continue
+				pos = self._buffer.find(b"\r\n")
+				if pos == -1:
+					if len(self._buffer) > self.MAX_PART_HEADER_SIZE:
+						raise tornado.web.HTTPError(400, log_message="Invalid multipart delimiter")
+					return
+				self._consume(pos + 2)
+				self._multipart_state = _MULTIPART_HEADER
+
+			elif self._multipart_state == _MULTIPART_HEADER:
+				pos = self._buffer.find(b"\r\n\r\n")
+				if pos == -1:
+					if len(self._buffer) > self.MAX_PART_HEADER_SIZE:
+						raise tornado.web.HTTPError(400, log_message="Multipart part header too large")
+					return
+				header = bytes(self._buffer[:pos])
+				self._consume(pos + 4)
+				self._on_part_header(header)
+				self._multipart_state = _MULTIPART_BODY
+
+			elif self._multipart_state == _MULTIPART_BODY:
+				pos = self._buffer.find(part_delimiter)
+				if pos == -1:
+					# everything but what might be the start of the delimiter belongs to the current part
+					self._consume(len(self._buffer) - len(part_delimiter) + 1, to_part=True)
+					return
+				self._consume(pos, to_part=True)
+				self._consume(len(part_delimiter))
+				if self._current_part:
+					self._on_part_finish(self._current_part)
+					self._current_part = None
+				self._multipart_state = _MULTIPART_DELIMITER
+
+			else:
+				# epilogue, ignored
+				self._consume(len(self._buffer))
+
+	def _consume(self, length, to_part=False):
 		"""
+		Removes the first ``length`` bytes from the buffer, passing them on to the current part if ``to_part`` is
+		``True`` without copying them.
+		"""
+		if length <= 0:
+			return
 
-		# check for boundary
-		delimiter = b"--%s" % self._multipart_boundary
-		delimiter_loc = data.find(delimiter)
-		delimiter_len = len(delimiter)
-		end_of_header = None
-		if delimiter_loc != -1:
-			# found the delimiter in the currently available data
-			delimiter_data_end = 0 if delimiter_loc == 0 else delimiter_loc - 2
-			data, self._buffer = data[0:delimiter_data_end], data[delimiter_loc:]
-			end_of_header = self._buffer.find("\r\n\r\n")
-		else:
-			# make sure any boundary (with single or double ==) contained at the end of chunk does not get
-			# truncated by this processing round => save it to the buffer for next round
-			endlen = len(self._multipart_boundary) + 4
-			data, self._buffer = data[0:-endlen], data[-endlen:]
-
-		# stream data to part handler
-		if data and self._current_part:
-				self._on_part_data(self._current_part, data)
-
-		if end_of_header >= 0:
-			self._on_part_header(self._buffer[delimiter_len+2:end_of_header])
-			self._buffer = self._buffer[end_of_header + 4:]
-
-		if delimiter_loc != -1 and self._buffer.strip() == delimiter + "--":
-			# we saw the last boundary and are at the end of our request
-			if self._current_part:
-				self._on_part_finish(self._current_part)
-				self._current_part = None
-			self._buffer = b""
-			self._on_request_body_finish()
+		if to_part and self._current_part:
+			view = memoryview(self._buffer)[:length]
+			try:
+				self._on_part_data(self._current_part, view)
+			finally:
+				# the buffer can't be resized while the view is still around
+				del view
+		del self._buffer[:length]
 
 	def _on_part_header(self, header):
 		"""
@@ -338,12 +411,13 @@ class UploadStorageFallbackHandler(tornado.web.RequestHandler):
 		* ``content_type``: content type of the part
 		* ``file``: file handle for the temporary file (mode "wb", not deleted on close, will be deleted however after
 		  handling of the request has finished in :func:`_handle_method`)
+		* ``sinks``: dictionary of the sinks to feed the file's data to, if any were created
 
 		Structure of ``data`` parts:
 
 		* ``name``: name of the part
 		* ``content_type``: content type of the part
-		* ``data``: bytes of the part (initialized to an empty string)
+		* ``data``: bytes of the part (initialized to an empty ``bytearray``)
 
 		:param name: name of the part
 		:param content_type: content type of the part
@@ -354,26 +428,36 @@ class UploadStorageFallbackHandler(tornado.web.RequestHandler):
 			# this is a file
 			import tempfile
 			handle = tempfile.NamedTemporaryFile(mode="wb", prefix=self._file_prefix, suffix=self._file_suffix, dir=self._path, delete=False)
-			return dict(name=tornado.escape.utf8(name),
-						filename=tornado.escape.utf8(filename),
-						path=tornado.escape.utf8(handle.name),
-						content_type=tornado.escape.utf8(content_type),
-						file=handle)
+			part = dict(name=tornado.escape.utf8(name),
+			            filename=tornado.escape.utf8(filename),
+			            path=tornado.escape.utf8(handle.name),
+			            content_type=tornado.escape.utf8(content_type),
+			            file=handle)
+
+			sinks = self._sinks(name, filename, content_type) if callable(self._sinks) else None
+			if sinks:
+				part["sinks"] = sinks
+
+			return part
 
 		else:
-			return dict(name=tornado.escape.utf8(name), content_type=tornado.escape.utf8(content_type), data=b"")
+			return dict(name=tornado.escape.utf8(name), content_type=tornado.escape.utf8(content_type), data=bytearray())
 
 	def _on_part_data(self, part, data):
 		"""
 		Called when new bytes are received for the given ``part``, takes care of writing them to their storage.
 
 		:param part: part for which data was received
-		:param data: data chunk which was received
+		:param data: data chunk which was received, a ``memoryview`` only valid during the call
 		"""
 		if "file" in part:
 			part["file"].write(data)
+			if "sinks" in part:
+				data = data.tobytes()
+				for sink in part["sinks"].values():
+					sink.update(data)
 		else:
-			part["data"] += data
+			part["data"].extend(data)
 
 	def _on_part_finish(self, part):
 		"""
@@ -389,13 +473,43 @@ class UploadStorageFallbackHandler(tornado.web.RequestHandler):
 			part["file"].close()
 			del part["file"]
 
+			for sink in part.get("sinks", dict()).values():
+				sink.finish()
+		elif "data" in part:
+			part["data"] = bytes(part["data"])
+
+	def _discard_parts(self):
+		"""
+		Called if the request body could not be read completely, aborts the sinks of the part currently being
+		processed and removes all temporary files.
+		"""
+		part = self._current_part
+		self._current_part = None
+
+		if part and "file" in part:
+			part["file"].close()
+			octoprint.util.silent_remove(part["path"])
+			for sink in part.get("sinks", dict()).values():
+				try:
+					sink.abort()
+				except:
+					self._logger.exception("Error while aborting sink for upload {}".format(part["filename"]))
+
+		for f in self._files:
+			octoprint.util.silent_remove(f)
+
+	def on_connection_close(self):
+		if self.is_multipart() and self._multipart_state != _MULTIPART_EPILOGUE:
+			self._discard_parts()
+		tornado.web.RequestHandler.on_connection_close(self)
+
 	def _on_request_body_finish(self):
 		"""
 		Called when the request body has been read completely. Takes care of creating the replacement body out of the
 		logged parts, turning ``file`` parts into new ``data`` parts.
 		"""
 
-		self._new_body = b""
+		fields = []
 		for name, part in self._parts.items():
 			if "filename" in part:
 				# add form fields for filename, path, size and content_type for all files contained in the request
@@ -407,27 +521,39 @@ class UploadStorageFallbackHandler(tornado.web.RequestHandler):
 					path=part["path"],
 					size=str(os.stat(part["path"]).st_size)
 				)
-				if "content_type" in part:
+				if part.get("content_type") is not None:
 					parameters["content_type"] = part["content_type"]
 
-				fields = dict((self._suffixes[key], value) for (key, value) in parameters.items())
-				for n, p in fields.items():
-					key = name + "." + n
-					self._new_body += b"--%s\r\n" % self._multipart_boundary
-					self._new_body += b"Content-Disposition: form-data; name=\"%s\"\r\n" % key
-					self._new_body += b"Content-Type: text/plain; charset=utf-8\r\n"
-					self._new_body += b"\r\n"
-					self._new_body += b"%s\r\n" % p
-			elif "data" in part:
-				self._new_body += b"--%s\r\n" % self._multipart_boundary
-				value = part["data"]
-				self._new_body += b"Content-Disposition: form-data; name=\"%s\"\r\n" % name
-				if "content_type" in part and part["content_type"] is not None:
-					self._new_body += b"Content-Type: %s\r\n" % part["content_type"]
-				self._new_body += b"\r\n"
-				self._new_body += value + b"\r\n"
-		self._new_body += b"--%s--\r\n" % self._multipart_boundary
+				for n, p in parameters.items():
+					fields.append((name + "." + self._suffixes[n], b"text/plain; charset=utf-8", p))
+
+				for suffix, sink in part.get("sinks", dict()).items():
+					result = getattr(sink, "result", None)
+					if result is None:
+						continue
+					if not isinstance(result, basestring):
+						import json
+						result = json.dumps(result)
+					fields.append((name + "." + tornado.escape.utf8(suffix), b"text/plain; charset=utf-8", tornado.escape.utf8(result)))
+
+		generated = set(key for key, _, _ in fields)
+		for name, part in self._parts.items():
+			if "data" in part and not name in generated:
+				fields.append((name, part.get("content_type"), part["data"]))
+
+		new_body = []
+		for name, content_type, value in fields:
+			new_body.append(b"--%s\r\n" % self._multipart_boundary)
+			new_body.append(b"Content-Disposition: form-data; name=\"%s\"\r\n" % name)
+			if content_type is not None:
+				new_body.append(b"Content-Type: %s\r\n" % content_type)
+			new_body.append(b"\r\n")
+			new_body.append(value)
+			new_body.append(b"\r\n")
+		new_body.append(b"--%s--\r\n" % self._multipart_boundary)
+		self._new_body = b"".join(new_body)
 
+	@tornado.gen.coroutine
 	def _handle_method(self, *args, **kwargs):
 		"""
 		Takes care of defining the new request body if necessary and forwarding
@@ -437,23 +563,23 @@ class UploadStorageFallbackHandler(tornado.web.RequestHandler):
 		# determine which body to supply
 		body = b""
 		if self.is_multipart():
-			# make sure we really processed all data in the buffer
-			while len(self._buffer):
-				self._process_multipart_data(self._buffer)
+			if self._multipart_state != _MULTIPART_EPILOGUE:
+				self._discard_parts()
+				raise tornado.web.HTTPError(400, log_message="Incomplete multipart body")
 
 			# use rewritten body
 			body = self._new_body
 
 		elif self.request.method in UploadStorageFallbackHandler.BODY_METHODS:
-			# directly use data from buffer
-			body = self._buffer
+			# directly use received data
+			body = b"".join(self._body_chunks)
 
 		# rewrite content length
 		self.request.headers["Content-Length"] = len(body)
 
 		try:
-			# call the configured fallback with request and body to use
-			self._fallback(self.request, body)
+			# call the configured fallback with request and body to use, wait for it if it's processed asynchronously
+			yield tornado.gen.maybe_future(self._fallback(self.request, body))
 			self._headers_written = True
 		finally:
 			# make sure the temporary files are removed again
@@ -529,19 +655,50 @@ class WsgiInputContainer(object):
 
 	The implementation logic is basically the same as ``tornado.wsgi.WSGIContainer`` but the ``__call__`` and ``environ``
 	methods have been adjusted to allow for an optionally supplied ``body`` argument which is then used for ``wsgi.input``.
+
+	By default the WSGI app is called synchronously on the IOLoop, which blocks all other connections (push updates,
+	uploads, static files) for as long as the call takes. If ``workers`` is larger than 0, calls are instead dispatched
+	to a pool of that many threads and ``__call__`` returns a ``tornado.concurrent.Future`` which resolves once the
+	response has been written. Responses declaring a ``Content-Length`` are streamed back to the client in chunks of
+	:attr:`STREAM_CHUNK_SIZE` bytes instead of being joined in memory first.
+
+	``limits`` is a list of ``(pattern, concurrency)`` tuples limiting the number of concurrent calls against all request
+	paths matching the regular expression ``pattern`` (e.g. endpoints that talk to the printer and hence can't be run
+	in parallel anyway). Additional calls are queued until a running one finished, without occupying a worker. The
+	first matching pattern applies.
 	"""
 
-	def __init__(self, wsgi_application):
+	STREAM_CHUNK_SIZE = 64 * 1024
+	""" Size of the chunks in which streamed responses are written from the worker threads. """
+
+	def __init__(self, wsgi_application, workers=0, limits=None):
 		self.wsgi_application = wsgi_application
 
+		self._logger = logging.getLogger(__name__)
+
+		self._pool = None
+		if workers > 0:
+			from multiprocessing.pool import ThreadPool
+			self._pool = ThreadPool(processes=workers)
+
+		self._limits = []
+		if limits:
+			for pattern, concurrency in limits:
+				self._limits.append(_ConcurrencyLimit(pattern, concurrency))
+
 	def __call__(self, request, body=None):
 		"""
 		Wraps the call against the WSGI app, deriving the WSGI environment from the supplied Tornado ``HTTPServerRequest``.
 
 		:param request: the ``tornado.httpserver.HTTPServerRequest`` to derive the WSGI environment from
 		:param body: an optional body  to use as ``wsgi.input`` instead of ``request.body``, can be a string or a stream
+		:return: ``None`` if the call was processed synchronously, otherwise a ``tornado.concurrent.Future`` resolving
+		    once the call has been processed by a worker
 		"""
 
+		if self._pool is not None:
+			return self._dispatch(request, body)
+
 		data = {}
 		response = []
 
@@ -553,33 +710,141 @@ class WsgiInputContainer(object):
 			WsgiInputContainer.environ(request, body), start_response)
 		try:
 			response.extend(app_response)
-			body = b"".join(response)
+			body = tornado.escape.utf8(b"".join(response))
 		finally:
 			if hasattr(app_response, "close"):
 				app_response.close()
 		if not data:
 			raise Exception("WSGI app did not call start_response")
 
-		status_code = int(data["status"].split()[0])
-		headers = data["headers"]
+		status_code, head = self._head(data["status"], data["headers"], body=body)
+		request.write(head + body)
+		request.finish()
+		self._log(status_code, request)
+
+	def _dispatch(self, request, body):
+		import functools
+		from tornado.concurrent import Future
+		from tornado.ioloop import IOLoop
+
+		io_loop = IOLoop.current()
+		future = Future()
+
+		# the environment is created on the IOLoop since that modifies the request
+		environ = WsgiInputContainer.environ(request, body)
+		environ["wsgi.multithread"] = True
+
+		limit = None
+		for candidate in self._limits:
+			if candidate.matches(request.path):
+				limit = candidate
+				break
+
+		def done(exc_info=None):
+			if limit is not None:
+				limit.release()
+			if exc_info is not None:
+				future.set_exc_info(exc_info)
+			else:
+				future.set_result(None)
+
+		def run():
+			self._pool.apply_async(self._execute, (request, environ, io_loop, done))
+
+		if limit is None:
+			run()
+		else:
+			limit.acquire(run)
+
+		return future
+
+	def _execute(self, request, environ, io_loop, done):
+		"""
+		Runs the WSGI app in a worker thread. Everything touching the connection is handed back to the IOLoop.
+		"""
+		import sys
+
+		writer = _ThreadedResponseWriter(request, io_loop)
+		exc_info = None
+		try:
+			data = {}
+			response = []
+
+			def start_response(status, response_headers, exc_info=None):
+				data["status"] = status
+				data["headers"] = response_headers
+				return response.append
+
+			app_response = self.wsgi_application(environ, start_response)
+			try:
+				iterator = iter(app_response)
+
+				# start_response might only be called once the app starts producing its body
+				if not data:
+					for chunk in iterator:
+						response.append(chunk)
+						break
+				if not data:
+					raise Exception("WSGI app did not call start_response")
+
+				header_set = set(k.lower() for (k, v) in data["headers"])
+				if "content-length" in header_set:
+					# length is known, stream the body
+					status_code, head = self._head(data["status"], data["headers"])
+					buffered = [head] + response
+					buffered_size = sum(map(len, buffered))
+					for chunk in iterator:
+						buffered.append(chunk)
+						buffered_size += len(chunk)
+						if buffered_size >= self.STREAM_CHUNK_SIZE:
+							writer.write(b"".join(buffered))
+							buffered = []
+							buffered_size = 0
+					writer.write(b"".join(buffered))
+				else:
+					response.extend(iterator)
+					body = tornado.escape.utf8(b"".join(response))
+					status_code, head = self._head(data["status"], data["headers"], body=body)
+					writer.write(head + body)
+			finally:
+				if hasattr(app_response, "close"):
+					app_response.close()
+
+			writer.finish()
+			io_loop.add_callback(self._log, status_code, request)
+		except:
+			if writer.written:
+				# too late to send an error response, all we can do is close the connection
+				self._logger.exception("Error while streaming response for {}".format(request.uri))
+				writer.close()
+			else:
+				exc_info = sys.exc_info()
+		finally:
+			io_loop.add_callback(done, exc_info)
+
+	@staticmethod
+	def _head(status, headers, body=None):
+		"""
+		Creates status line and headers of the response, adding ``Content-Length`` (if ``body`` is provided),
+		``Content-Type`` and ``Server`` headers if missing.
+
+		:return: tuple of status code and the head of the response as bytes
+		"""
+		status_code = int(status.split()[0])
 		header_set = set(k.lower() for (k, v) in headers)
-		body = tornado.escape.utf8(body)
 		if status_code != 304:
-			if "content-length" not in header_set:
+			if "content-length" not in header_set and body is not None:
 				headers.append(("Content-Length", str(len(body))))
 			if "content-type" not in header_set:
 				headers.append(("Content-Type", "text/html; charset=UTF-8"))
 		if "server" not in header_set:
 			headers.append(("Server", "TornadoServer/%s" % tornado.version))
 
-		parts = [tornado.escape.utf8("HTTP/1.1 " + data["status"] + "\r\n")]
+		parts = [tornado.escape.utf8("HTTP/1.1 " + status + "\r\n")]
 		for key, value in headers:
 			parts.append(tornado.escape.utf8(key) + b": " + tornado.escape.utf8(value) + b"\r\n")
 		parts.append(b"\r\n")
-		parts.append(body)
-		request.write(b"".join(parts))
-		request.finish()
-		self._log(status_code, request)
+		return status_code, b"".join(parts)
 
 	@staticmethod
 	def environ(request, body=None):
@@ -653,6 +918,80 @@ class WsgiInputContainer(object):
 		log_method("%d %s %.2fms", status_code, summary, request_time)
 
 
+class _ConcurrencyLimit(object):
+	"""
+	Limits the number of concurrent calls against paths matching ``pattern`` for :class:`WsgiInputContainer`. Only to
+	be used from the IOLoop.
+	"""
+
+	def __init__(self, pattern, concurrency):
+		self.pattern = re.compile(pattern)
+		self.concurrency = max(concurrency, 1)
+		self.active = 0
+
+		import collections
+		self.waiting = collections.deque()
+
+	def matches(self, path):
+		return self.pattern.match(path) is not None
+
+	def acquire(self, callback):
+		if self.active < self.concurrency:
+			self.active += 1
+			callback()
+		else:
+			self.waiting.append(callback)
+
+	def release(self):
+		if self.waiting:
+			# hand over our slot directly
+			self.waiting.popleft()()
+		else:
+			self.active -= 1
+
+
+class _ThreadedResponseWriter(object):
+	"""
+	Writes the response of a request processed in a worker thread via the IOLoop, blocking the worker until the written
+	data has been flushed to the client (or the connection closed) so a slow client can't make responses pile up in
+	memory.
+	"""
+
+	def __init__(self, request, io_loop):
+		self._request = request
+		self._io_loop = io_loop
+		self.written = False
+
+	def write(self, data):
+		if not data:
+			return
+
+		import threading
+		flushed = threading.Event()
+
+		def write():
+			if self._closed():
+				flushed.set()
+			else:
+				self._request.write(data, callback=flushed.set)
+
+		self.written = True
+		self._io_loop.add_callback(write)
+		while not flushed.wait(1.0):
+			if self._closed():
+				break
+
+	def finish(self):
+		self._io_loop.add_callback(self._request.finish)
+
+	def close(self):
+		self._io_loop.add_callback(self._request.connection.close)
+
+	def _closed(self):
+		stream = getattr(self._request.connection, "stream", None)
+		return stream is not None and stream.closed()
+
+
 #~~ customized HTTP1Connection implementation
 
 
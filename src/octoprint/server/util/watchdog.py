@@ -68,3 +68,17 @@ class GcodeWatchdogHandler(watchdog.events.PatternMatchingEventHandler):
 
 	def on_created(self, event):
 		self._upload(event.src_path)
+
+
+class FingerprintWatchdogHandler(watchdog.events.PatternMatchingEventHandler):
+
+	"""
+	Invalidates the fingerprints of the index page and the i18n bundles when templates, assets or translations change.
+	"""
+
+	def __init__(self, registry):
+		watchdog.events.PatternMatchingEventHandler.__init__(self, ignore_patterns=["*.py", "*.pyc", "*.pyo"])
+		self._registry = registry
+
+	def on_any_event(self, event):
+		self._registry.invalidate()
@@ -7,8 +7,9 @@ __copyright__ = "Copyright (C) 2015 The OctoPrint Project - Released under terms
 
 import os
 import datetime
+import threading
 
-from collections import defaultdict
+from collections import defaultdict, namedtuple
 from flask import request, g, url_for, make_response, render_template, send_from_directory, redirect, abort
 
 import octoprint.plugin
@@ -21,6 +22,7 @@ from octoprint.filemanager import get_all_extensions
 
 import re
 import base64
+import pylru
 
 from . import util
 
@@ -30,6 +32,58 @@ _logger = logging.getLogger(__name__)
 _valid_id_re = re.compile("[a-z_]+")
 _valid_div_re = re.compile("[a-zA-Z_-]+")
 
+
+Fingerprint = namedtuple("Fingerprint", "files, lastmodified, etag")
+"""The files a page depends on, their most recent modification date and the resulting ETag."""
+
+
+class FingerprintRegistry(object):
+	"""
+	Keeps the fingerprints of the index page and the i18n bundles in memory, so that conditional requests can be
+	answered without collecting and stat'ing all templates, assets and translation files on every request.
+
+	Fingerprints are computed on first use (or upfront through :func:`compute_fingerprints`) and dropped again
+	through :func:`invalidate` when the files they were computed from might have changed.
+	"""
+
+	def __init__(self):
+		self._lock = threading.Lock()
+		self._fingerprints = dict()
+		self._generation = 0
+
+	def get(self, key, factory):
+		"""
+		Retrieves the fingerprint stored under ``key``, computing and storing it through ``factory`` if necessary.
+
+		:param key:              the key of the fingerprint, e.g. ``("index", "en")``
+		:param callable factory: returns the :class:`Fingerprint` to store if there's none yet
+		:return: the :class:`Fingerprint`
+		"""
+		with self._lock:
+			if key in self._fingerprints:
+				return self._fingerprints[key]
+			generation = self._generation
+
+		fingerprint = factory()
+
+		with self._lock:
+			# don't store what was computed from files that might have changed in the meantime
+			if generation == self._generation:
+				self._fingerprints[key] = fingerprint
+		return fingerprint
+
+	def invalidate(self):
+		"""Drops all stored fingerprints."""
+		with self._lock:
+			self._generation += 1
+			self._fingerprints.clear()
+
+fingerprints = FingerprintRegistry()
+
+_CATALOG_CACHE_SIZE = 50
+_catalogs = pylru.lrucache(_CATALOG_CACHE_SIZE)
+_catalogs_lock = threading.Lock()
+
 def _preemptive_unless(base_url=None):
 	if base_url is None:
 		base_url = request.url_root
@@ -518,9 +572,62 @@ def plugin_assets(name, filename):
 	return redirect(url_for("plugin." + name + ".static", filename=filename))
 
 
+def compute_fingerprints(locales=None):
+	"""
+	Computes the fingerprints of the index page and the core i18n bundle for all ``locales`` (defaults to all
+	available ones) upfront, so that the first requests can already be answered from memory. Needs an application
+	context.
+	"""
+	if locales is None:
+		from octoprint.server import LOCALES
+		locales = ["en"] + [locale.language for locale in LOCALES]
+
+	for locale in locales:
+		_fingerprint_for_index(locale)
+		_fingerprint_for_i18n(locale, "messages")
+
+
+def get_fingerprint_folders():
+	"""
+	:return: the folders containing the files fingerprints are computed from, to be watched for changes
+	"""
+	folders = [app.root_path, settings().getBaseFolder("translations")]
+	for plugin in octoprint.plugin.plugin_manager().enabled_plugins.values():
+		location = plugin.location
+		if location and os.path.isdir(location):
+			folders.append(location)
+
+	result = []
+	for folder in sorted(set(map(os.path.realpath, folders))):
+		if not any(folder.startswith(other + os.path.sep) for other in result):
+			result.append(folder)
+	return result
+
+
+def _fingerprint_for_index(locale=None):
+	if locale is None:
+		locale = g.locale.language if g.locale else "en"
+
+	def compute():
+		files = _files_for_index(locale)
+		lastmodified = _compute_date(files)
+		return Fingerprint(files, lastmodified, _compute_etag_for_index(files, lastmodified))
+
+	return fingerprints.get(("index", locale), compute)
+
+
+def _fingerprint_for_i18n(locale, domain):
+	def compute():
+		files = _get_all_translationfiles(locale, domain)
+		lastmodified = _compute_date(files)
+		return Fingerprint(files, lastmodified, _compute_etag_for_i18n(locale, domain, files, lastmodified))
+
+	return fingerprints.get(("i18n", locale, domain), compute)
+
+
 def _compute_etag_for_index(files=None, lastmodified=None):
 	if files is None:
-		files = _files_for_index()
+		return _fingerprint_for_index().etag
 	if lastmodified is None:
 		lastmodified = _compute_date(files)
 	if lastmodified and not isinstance(lastmodified, basestring):
@@ -542,7 +649,7 @@ def _compute_etag_for_index(files=None, lastmodified=None):
 
 def _compute_etag_for_i18n(locale, domain, files=None, lastmodified=None):
 	if files is None:
-		files = _get_all_translationfiles(locale, domain)
+		return _fingerprint_for_i18n(locale, domain).etag
 	if lastmodified is None:
 		lastmodified = _compute_date(files)
 	if lastmodified and not isinstance(lastmodified, basestring):
@@ -558,11 +665,11 @@ def _compute_etag_for_i18n(locale, domain, files=None, lastmodified=None):
 
 
 def _compute_date_for_i18n(locale, domain):
-	return _compute_date(_get_all_translationfiles(locale, domain))
+	return _fingerprint_for_i18n(locale, domain).lastmodified
 
 
 def _compute_date_for_index():
-	return _compute_date(_files_for_index())
+	return _fingerprint_for_index().lastmodified
 
 
 def _validate_cache_for_index(cached):
@@ -573,7 +680,7 @@ def _validate_cache_for_index(cached):
 	return no_cache_headers or refresh_flag or etag_different
 
 
-def _files_for_index():
+def _files_for_index(locale=None):
 	"""
 	Collects all paths of files that the index page depends on.
 
@@ -588,37 +695,46 @@ def _files_for_index():
 	    we also need to re-render
 	"""
 
+	if locale is None:
+		locale = g.locale.language if g.locale else "en"
+
 	templates = _get_all_templates()
 	assets = _get_all_assets()
-	translations = _get_all_translationfiles(g.locale.language if g.locale else "en", "messages")
+	translations = _get_all_translationfiles(locale, "messages")
 	return sorted(set(templates + assets + translations))
 
 
 def _compute_date(files):
 	from datetime import datetime
-	timestamps = map(lambda path: os.stat(path).st_mtime, files) + [0] if files else []
-	max_timestamp = max(*timestamps) if timestamps else None
+	timestamps = filter(lambda timestamp: timestamp is not None, map(_get_mtime, files))
+	max_timestamp = max(timestamps) if timestamps else None
 	if max_timestamp:
 		# we set the micros to 0 since microseconds are not speced for HTTP
 		max_timestamp = datetime.fromtimestamp(max_timestamp).replace(microsecond=0)
 	return max_timestamp
 
 
+def _get_mtime(path):
+	# files might be deleted while their fingerprint is still around, e.g. those of a removed language pack
+	try:
+		return os.stat(path).st_mtime
+	except OSError:
+		return None
+
+
 def _check_etag_and_lastmodified_for_index():
-	files = _files_for_index()
-	lastmodified = _compute_date(files)
-	lastmodified_ok = util.flask.check_lastmodified(lastmodified)
-	etag_ok = util.flask.check_etag(_compute_etag_for_index(files, lastmodified))
+	fingerprint = _fingerprint_for_index()
+	lastmodified_ok = util.flask.check_lastmodified(fingerprint.lastmodified)
+	etag_ok = util.flask.check_etag(fingerprint.etag)
 	return etag_ok and lastmodified_ok
 
 
 def _check_etag_and_lastmodified_for_i18n():
-	locale = request.view_args["locale"]
-	domain = request.view_args["domain"]
+	fingerprint = _fingerprint_for_i18n(request.view_args["locale"], request.view_args["domain"])
 
-	etag_ok = util.flask.check_etag(_compute_etag_for_i18n(request.view_args["locale"], request.view_args["domain"]))
+	etag_ok = util.flask.check_etag(fingerprint.etag)
 
-	lastmodified = _compute_date_for_i18n(locale, domain)
+	lastmodified = fingerprint.lastmodified
 	lastmodified_ok = lastmodified is None or util.flask.check_lastmodified(lastmodified)
 
 	return etag_ok and lastmodified_ok
@@ -635,8 +751,6 @@ def _get_all_assets():
 
 
 def _get_all_translationfiles(locale, domain):
-	from flask import _request_ctx_stack
-
 	def get_po_path(basedir, locale, domain):
 		path = os.path.join(basedir, locale)
 		if not os.path.isdir(path):
@@ -667,8 +781,7 @@ def _get_all_translationfiles(locale, domain):
 				break
 
 	# core translations
-	ctx = _request_ctx_stack.top
-	base_path = os.path.join(ctx.app.root_path, "translations")
+	base_path = os.path.join(app.root_path, "translations")
 
 	dirs = [user_base_path, base_path]
 	for dirname in dirs:
@@ -681,34 +794,54 @@ def _get_all_translationfiles(locale, domain):
 
 
 def _get_translations(locale, domain):
-	from babel.messages.pofile import read_po
 	from octoprint.util import dict_merge
 
 	messages = dict()
 	plural_expr = None
 
-	def messages_from_po(path, locale, domain):
-		messages = dict()
-		with file(path) as f:
-			catalog = read_po(f, locale=locale, domain=domain)
-
-			for message in catalog:
-				message_id = message.id
-				if isinstance(message_id, (list, tuple)):
-					message_id = message_id[0]
-				messages[message_id] = message.string
-
-		return messages, catalog.plural_expr
-
-	po_files = _get_all_translationfiles(locale, domain)
+	po_files = _fingerprint_for_i18n(locale, domain).files
 	for po_file in po_files:
-		po_messages, plural_expr = messages_from_po(po_file, locale, domain)
+		po_messages, po_plural_expr = _get_catalog(po_file, locale, domain)
 		if po_messages is not None:
 			messages = dict_merge(messages, po_messages)
+			plural_expr = po_plural_expr
 
 	return messages, plural_expr
 
 
+def _get_catalog(path, locale, domain):
+	"""
+	Parses the messages and the plural expression from the ``.po`` file at ``path``. Parsed catalogs are kept in an
+	LRU cache, keyed by locale, domain, path and the file's modification time. Returns ``None`` for both if the file
+	doesn't exist (anymore).
+	"""
+	mtime = _get_mtime(path)
+	if mtime is None:
+		return None, None
+
+	key = (locale, domain, path, mtime)
+	with _catalogs_lock:
+		if key in _catalogs:
+			return _catalogs[key]
+
+	from babel.messages.pofile import read_po
+
+	messages = dict()
+	with file(path) as f:
+		catalog = read_po(f, locale=locale, domain=domain)
+
+		for message in catalog:
+			message_id = message.id
+			if isinstance(message_id, (list, tuple)):
+				message_id = message_id[0]
+			messages[message_id] = message.string
+
+	result = messages, catalog.plural_expr
+	with _catalogs_lock:
+		_catalogs[key] = result
+	return result
+
+
 @app.route("/wifi")
 def wifi_config():
 
@@ -107,6 +107,12 @@ default_settings = {
 		"ignoreErrorsFromFirmware": False,
 		"logResends": True,
 		"supportResendsWithoutOk": False,
+		"compileJobs": False,
+		"sendWindow": {
+			"enabled": False,
+			"bufferSize": 127,
+			"maxCommands": 4
+		},
 
 		# command specific flags
 		"triggerOkForM29": True
@@ -131,7 +137,8 @@ default_settings = {
 		"uploads": {
 			"maxSize":  1 * 1024 * 1024 * 1024, # 1GB
 			"nameSuffix": "name",
-			"pathSuffix": "path"
+			"pathSuffix": "path",
+			"hashSuffix": "hash"
 		},
 		"maxSize": 100 * 1024, # 100 KB
 		"commands": {
@@ -146,6 +153,13 @@ default_settings = {
 		"preemptiveCache": {
 			"exceptions": [],
 			"until": 7
+		},
+		"wsgi": {
+			"workers": 0,
+			"limits": [
+				dict(pattern="/api/maintenance/", concurrency=1),
+				dict(pattern="/api/printer/serial", concurrency=1)
+			]
 		}
 	},
 	"webcam": {
@@ -172,7 +186,34 @@ default_settings = {
 		"sizeThreshold": 20 * 1024 * 1024, # 20MB
 	},
 	"gcodeAnalysis": {
-		"maxExtruders": 10
+		"maxExtruders": 10,
+		"engine": "chunked",
+		"workers": 1,
+		"workerNiceness": 10,
+		"streaming": True,
+		"cache": {
+			"enabled": True,
+			"size": 1000,
+			"maxSize": 1048576
+		},
+		"cpuBudget": {
+			"idle": 0.5,
+			"busy": 0.1,
+			"slice": 0.1
+		}
+	},
+	"gcodeMinification": {
+		"transfers": False,
+		"uploads": False,
+		"verify": False,
+		"maxSize": 100 * 1024 * 1024 # 100 MB
+	},
+	"fileMetadata": {
+		"backend": "yaml"
+	},
+	"fileListing": {
+		"cache": True,
+		"watch": False
 	},
 	"feature": {
 		"temperatureGraph": True,
@@ -274,7 +315,11 @@ default_settings = {
 	},
 	"events": {
 		"enabled": True,
-		"subscriptions": []
+		"subscriptions": [],
+		"dispatch": {
+			"workers": 4,
+			"coalesce": ["UpdatedFiles", "MetadataStatisticsUpdated", "SettingsUpdated"]
+		}
 	},
 	"api": {
 		"enabled": True,
@@ -309,9 +354,11 @@ default_settings = {
 	},
 	"devel": {
 		"stylesheet": "css",
+		"pluginTimings": False,
 		"cache": {
 			"enabled": True,
-			"preemptive": True
+			"preemptive": True,
+			"watch": False
 		},
 		"webassets": {
 			"minify": False,
@@ -347,7 +394,8 @@ default_settings = {
 			"waitInterval": 1.0,
 			"supportM112": True,
 			"echoOnM117": True,
-			"brokenM29": True
+			"brokenM29": True,
+			"latency": 0.0
 		}
 	}
 }
@@ -422,6 +470,10 @@ class Settings(object):
 		self._dirty = False
 		self._mtime = None
 
+		# cache of values looked up through _get_value, entries are only valid while their version matches
+		self._version = 0
+		self._lookups = dict()
+
 		self._get_preprocessors = dict(
 			controls=self._process_custom_controls
 		)
@@ -628,6 +680,8 @@ class Settings(object):
 		if migrate:
 			self._migrate_config()
 
+		self._invalidate_lookups()
+
 	def _migrate_config(self):
 		dirty = False
 
@@ -874,9 +928,55 @@ class Settings(object):
 		stat = os.stat(self._configfile)
 		return stat.st_mtime
 
+	##~~ Lookup cache
+
+	_CACHEABLE_TYPES = (type(None), bool, int, long, float, str, unicode)
+	"""Types of values kept in the lookup cache, mutable values might be modified by the caller."""
+
+	_NO_SUCH_PATH = object()
+
+	def _invalidate_lookups(self):
+		self._version += 1
+		self._lookups.clear()
+
+	def _lookup_key(self, path, asdict, config, defaults, preprocessors, merged, incl_defaults):
+		if config is not None or defaults is not None or preprocessors is not None or merged:
+			return None
+
+		key = (tuple(path), asdict, incl_defaults)
+		try:
+			hash(key)
+		except TypeError:
+			# path selecting several keys at once
+			return None
+		return key
+
 	##~~ Internal getter
 
 	def _get_value(self, path, asdict=False, config=None, defaults=None, preprocessors=None, merged=False, incl_defaults=True):
+		key = self._lookup_key(path, asdict, config, defaults, preprocessors, merged, incl_defaults)
+		if key is None:
+			return self._lookup_value(path, asdict=asdict, config=config, defaults=defaults,
+			                          preprocessors=preprocessors, merged=merged, incl_defaults=incl_defaults)
+
+		version = self._version
+		entry = self._lookups.get(key)
+		if entry is not None and entry[0] == version:
+			value = entry[1]
+		else:
+			try:
+				value = self._lookup_value(path, asdict=asdict, incl_defaults=incl_defaults)
+			except NoSuchSettingsPath:
+				value = self._NO_SUCH_PATH
+
+			if value is self._NO_SUCH_PATH or isinstance(value, self._CACHEABLE_TYPES):
+				self._lookups[key] = (version, value)
+
+		if value is self._NO_SUCH_PATH:
+			raise NoSuchSettingsPath()
+		return value
+
+	def _lookup_value(self, path, asdict=False, config=None, defaults=None, preprocessors=None, merged=False, incl_defaults=True):
 		import octoprint.util as util
 
 		if len(path) == 0:
@@ -966,6 +1066,33 @@ class Settings(object):
 			else:
 				return None
 
+	def accessor(self, path, type=None):
+		"""
+		Creates a getter for the value at ``path``, for code reading the same setting over and over again.
+
+		The getter takes no arguments and returns what :func:`get` -- or :func:`getInt`, :func:`getFloat` or
+		:func:`getBoolean` for a ``type`` of ``int``, ``float`` or ``bool`` -- would return for ``path``. The value is
+		only looked up again after the settings changed, values must therefore not be modified by the caller.
+
+		Arguments:
+		    path (list, tuple): the path of the value to get
+		    type (type): ``int``, ``float`` or ``bool`` to convert the value, ``None`` to return it as is
+
+		Returns:
+		    callable: the getter
+		"""
+		getter = {int: self.getInt, float: self.getFloat, bool: self.getBoolean}.get(type, self.get)
+		path = list(path)
+		cached = [None, None]
+
+		def access():
+			version = self._version
+			if cached[0] != version:
+				cached[1] = getter(list(path))
+				cached[0] = version
+			return cached[1]
+		return access
+
 	def getInt(self, path, **kwargs):
 		value = self.get(path, **kwargs)
 		if value is None:
@@ -1058,6 +1185,7 @@ class Settings(object):
 		if isinstance(config, dict) and key in config:
 			del config[key]
 		self._dirty = True
+		self._invalidate_lookups()
 
 	#~~ setter
 
@@ -1068,6 +1196,13 @@ class Settings(object):
 		if self._mtime is not None and self.last_modified != self._mtime:
 			self.load()
 
+		try:
+			self._set(path, value, force=force, defaults=defaults, config=config, preprocessors=preprocessors)
+		finally:
+			# only after the change, lookups running concurrently might otherwise cache the old value again
+			self._invalidate_lookups()
+
+	def _set(self, path, value, force=False, defaults=None, config=None, preprocessors=None):
 		if config is None:
 			config = self._config
 		if defaults is None:
@@ -1155,6 +1290,7 @@ class Settings(object):
 				self._config["folder"] = {}
 			self._config["folder"][type] = path
 			self._dirty = True
+		self._invalidate_lookups()
 
 	def saveScript(self, script_type, name, script):
 		script_folder = self.getBaseFolder("scripts")
@@ -16,6 +16,9 @@ function DataUpdater(allViewModels) {
     self._lastProcessingTimes = [];
     self._lastProcessingTimesSize = 20;
 
+    self._currentState = undefined;
+    self._currentSeq = undefined;
+
     self._connectCallback = undefined;
 
     self.connect = function(callback) {
@@ -185,6 +188,11 @@ function DataUpdater(allViewModels) {
 
                     self.setThrottle(1);
 
+                    // only get sent what changed since the last update
+                    self._currentState = undefined;
+                    self._currentSeq = undefined;
+                    self._send("deltas", true);
+
                     log.info("Connected to the server");
 
                     if (self._connectCallback) {
@@ -210,6 +218,33 @@ function DataUpdater(allViewModels) {
                     });
                     break;
                 }
+                case "currentDelta": {
+                    var delta = data["delta"];
+                    if (delta.base === null) {
+                        self._currentState = {};
+                    } else if (self._currentState === undefined || delta.base !== self._currentSeq) {
+                        // we are out of sync, request a keyframe and drop everything until it arrives
+                        log.debug("Got delta for frame " + delta.base + " but last frame was " + self._currentSeq + ", requesting keyframe");
+                        self._currentState = undefined;
+                        self._send("deltas", true);
+                        break;
+                    }
+                    _.extend(self._currentState, delta.changed);
+                    self._currentSeq = delta.seq;
+
+                    var currentData = _.extend({}, self._currentState, {
+                        serverTime: data["serverTime"],
+                        temps: data["temps"],
+                        logs: data["logs"],
+                        messages: data["messages"]
+                    });
+                    _.each(self.allViewModels, function(viewModel) {
+                        if (viewModel.hasOwnProperty("fromCurrentData")) {
+                            viewModel.fromCurrentData(currentData);
+                        }
+                    });
+                    break;
+                }
                 case "slicingProgress": {
                     _.each(self.allViewModels, function(viewModel) {
                         if (viewModel.hasOwnProperty("onSlicingProgress")) {
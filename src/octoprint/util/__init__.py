@@ -987,6 +987,137 @@ class InvariantContainer(object):
 		return self._data.__iter__()
 
 
+class RingBuffer(object):
+	"""
+	Fixed capacity container with O(1) appends that evicts its oldest item once its capacity is exceeded.
+
+	Items are kept in a preallocated list used as circular buffer, so neither appending nor evicting moves any other
+	items around. Iteration works on a snapshot and indexing and slicing (oldest item first, supporting negative
+	indices) only copy the requested items, so e.g. ``buffer[-10:]`` is cheap regardless of the buffer's size.
+
+	Arguments:
+	    capacity (int): The maximum number of items to hold
+	    initial_data (iterable): Items to append initially, if any
+	"""
+
+	__slots__ = ("_items", "_capacity", "_start", "_length", "_mutex")
+
+	def __init__(self, capacity, initial_data=None):
+		if capacity <= 0:
+			raise ValueError("capacity must be positive")
+
+		self._items = [None] * capacity
+		self._capacity = capacity
+		self._start = 0
+		self._length = 0
+		self._mutex = threading.RLock()
+
+		if initial_data is not None:
+			for item in initial_data:
+				self.append(item)
+
+	@property
+	def capacity(self):
+		return self._capacity
+
+	def append(self, item):
+		with self._mutex:
+			end = (self._start + self._length) % self._capacity
+			self._items[end] = item
+			if self._length < self._capacity:
+				self._length += 1
+			else:
+				self._start = (self._start + 1) % self._capacity
+
+	def popleft(self):
+		"""
+		Removes and returns the oldest item.
+
+		Raises:
+		    IndexError: The buffer is empty
+		"""
+		with self._mutex:
+			if not self._length:
+				raise IndexError("pop from an empty RingBuffer")
+			item = self._items[self._start]
+			self._items[self._start] = None
+			self._start = (self._start + 1) % self._capacity
+			self._length -= 1
+			return item
+
+	def clear(self):
+		with self._mutex:
+			self._items = [None] * self._capacity
+			self._start = 0
+			self._length = 0
+
+	def __len__(self):
+		return self._length
+
+	def __iter__(self):
+		return iter(self[:])
+
+	def __getitem__(self, index):
+		with self._mutex:
+			if isinstance(index, slice):
+				start, stop, step = index.indices(self._length)
+				if step == 1 and start < stop:
+					# copy at most two contiguous runs of the underlying list
+					first = self._start + start
+					last = self._start + stop
+					if last <= self._capacity:
+						return self._items[first:last]
+					elif first >= self._capacity:
+						return self._items[first - self._capacity:last - self._capacity]
+					return self._items[first:] + self._items[:last - self._capacity]
+				return [self._items[(self._start + i) % self._capacity] for i in xrange(start, stop, step)]
+
+			if index < 0:
+				index += self._length
+			if not 0 <= index < self._length:
+				raise IndexError("RingBuffer index out of range")
+			return self._items[(self._start + index) % self._capacity]
+
+
+class SequencedRingBuffer(RingBuffer):
+	"""
+	:class:`RingBuffer` numbering the items appended to it, so that any number of consumers can each fetch the items
+	appended since their previous fetch through a cursor, without the buffer having to know its consumers. Consumers
+	falling behind by more than the capacity miss the evicted items.
+	"""
+
+	__slots__ = ("_appended",)
+
+	def __init__(self, capacity, initial_data=None):
+		self._appended = 0
+		RingBuffer.__init__(self, capacity, initial_data=initial_data)
+
+	def append(self, item):
+		with self._mutex:
+			RingBuffer.append(self, item)
+			self._appended += 1
+
+	def extend(self, items):
+		with self._mutex:
+			for item in items:
+				self.append(item)
+
+	def since(self, cursor=None):
+		"""
+		Fetches the items appended after ``cursor``.
+
+		Arguments:
+		    cursor (int): Cursor returned by the previous fetch, None to fetch all items held by the buffer.
+
+		Returns:
+		    tuple: The cursor to pass to the next fetch and the list of items, oldest first.
+		"""
+		with self._mutex:
+			count = self._length if cursor is None else min(self._appended - cursor, self._length)
+			items = self[self._length - count:] if count > 0 else []
+			return self._appended, items
+
+
 class TypedQueue(queue.Queue):
 
 	def __init__(self, maxsize=0):
@@ -5,10 +5,13 @@ import threading
 import time
 import Queue as queue
 import logging
+import hashlib
+from collections import defaultdict
 
 from octoprint.settings import settings
 from octoprint.events import eventManager, Events
 from octoprint.util.comm import MachineCom, regex_sdPrintingByte, regex_sdFileOpened, PrintingFileInformation
+from octoprint.filemanager.util import minified_gcode_path, is_minified_gcode_valid
 from beedriver.connection import Conn as BeePrinterConn
 from octoprint.util import comm, get_exception_string, sanitize_ascii, RepeatedTimer, parsePropertiesFile
 
@@ -29,13 +32,26 @@ class BeeCom(MachineCom):
 
     _monitor_print_progress = True
     _connection_monitor_active = True
-    _prepare_print_thread = None
     _preparing_print = False
-    _resume_print_thread = None
     _transferProgress = 0
     _heatingProgress = 0
 
     def __init__(self, callbackObject=None, printerProfileManager=None):
+        # drives the transfer, heating and resume phases of print jobs on the printer
+        self._jobStateMachine = PrintJobStateMachine(progress_callback=self._onJobProgress)
+
+        # keeps track of the print file in the printer's memory to skip transferring it again
+        self._residentFiles = ResidentFileTracker()
+        self._pendingResidentFile = None
+        # path and content hash of the selected file as stored by the file manager, if known
+        self._selectedFileHash = (None, None)
+        self._transferStartTime = None
+        self._transferTime = 0.0
+        self._transferSkipped = False
+        self._transferSize = 0
+        self._transferBytesSaved = 0
+        self._transferTimeSaved = 0.0
+
         super(BeeCom, self).__init__(None, None, callbackObject, printerProfileManager)
 
         self._openConnection()
@@ -195,6 +211,8 @@ class BeeCom(MachineCom):
         :param kwargs:
         :return:
         """
+        self._jobStateMachine.cancel()
+
         if self._beeCommands is not None:
             self._beeCommands.stopStatusMonitor()
 
@@ -314,6 +332,14 @@ class BeeCom(MachineCom):
         try:
             self._changeState(self.STATE_PREPARING_PRINT)
 
+            self._pendingResidentFile = None
+            self._transferStartTime = None
+            self._transferTime = 0.0
+            self._transferSkipped = False
+            self._transferSize = 0
+            self._transferBytesSaved = 0
+            self._transferTimeSaved = 0.0
+
             if self.isSdFileSelected():
                 print_resp = self._beeCommands.startSDPrint(self._currentFile.getFilename())
 
@@ -322,8 +348,11 @@ class BeeCom(MachineCom):
                     self._sd_status_timer.start()
             elif pos == 'from_memory':
                 print_resp = self._beeCommands.repeatLastPrint()
+                self._transferSkipped = True
             else:
-                print_resp = self._beeCommands.printFile(self._currentFile.getFilename())
+                path = self._currentFile.getFilename()
+                selected_path, file_hash = self._selectedFileHash
+                print_resp = self._printFile(path, file_hash=file_hash if selected_path == path else None)
 
             if print_resp is True:
                 self._heatupWaitStartTime = time.time()
@@ -334,9 +363,14 @@ class BeeCom(MachineCom):
                 self._heating = True
 
                 self._preparing_print = True
-                self._prepare_print_thread = threading.Thread(target=self._preparePrintThread, name="comm._preparePrint")
-                self._prepare_print_thread.daemon = True
-                self._prepare_print_thread.start()
+                phases = [
+                    JobPhase("heating", self._beeCommands.isHeating,
+                             progress=self._beeCommands.getHeatingState, on_enter=self._onHeatingStarted)
+                ]
+                if self._transferStartTime is not None:
+                    phases.insert(0, JobPhase("transfer", self._beeCommands.isTransferring,
+                                              progress=self._beeCommands.getTransferState))
+                self._jobStateMachine.start(phases, on_done=self._onPrintPrepared)
             else:
                 self._errorValue = "Error while preparing the printing operation."
                 self._logger.exception(self._errorValue)
@@ -351,6 +385,80 @@ class BeeCom(MachineCom):
             eventManager().fire(Events.ERROR, {"error": self.getErrorString()})
 
 
+    def _printFile(self, path, file_hash=None):
+        """
+        Starts printing the file at ``path``. If the same file content was the last one transferred to this printer
+        and the printer still reports it in its memory, the transfer is skipped and the file in memory is printed.
+        :param path: path of the file to print
+        :param file_hash: SHA1 hash of the file's content from its metadata, the file is only hashed without it
+        :return: True if the print starts successfully
+        """
+        serial_number = self.getConnectedPrinterSN()
+        try:
+            if file_hash is not None:
+                resident_file = (file_hash, os.path.getsize(path))
+            else:
+                resident_file = ResidentFileTracker.describe(path)
+        except (IOError, OSError):
+            self._logger.exception("Error reading %s to compare it with the file in the printer's memory" % path)
+            resident_file = None
+
+        if serial_number and resident_file is not None \
+                and self._residentFiles.matches(serial_number, *resident_file) and self._isResidentFileOnPrinter():
+            self._logger.info("%s is already in the printer's memory, skipping its transfer" % path)
+            self._transferSkipped = True
+            return self._beeCommands.repeatLastPrint()
+
+        # the file in the printer's memory gets overwritten from here on
+        self._residentFiles.invalidate(serial_number)
+        if serial_number and resident_file is not None:
+            self._pendingResidentFile = (serial_number,) + resident_file
+
+        transfer_path, self._transferBytesSaved = self._prepareTransfer(path)
+        self._transferSize = os.path.getsize(transfer_path)
+
+        self._transferStartTime = time.time()
+        return self._beeCommands.printFile(transfer_path)
+
+    def _prepareTransfer(self, path):
+        """
+        Picks the minified version of the file at ``path`` for its transfer to the printer if enabled and available.
+        Minified versions are created in the background by the analysis queue, files without one yet are transferred
+        as they are instead of delaying the print by minifying them first
+        :param path: path of the file to transfer
+        :return: tuple of the path of the file to transfer and the number of bytes saved by minifying it
+        """
+        if not settings().getBoolean(["gcodeMinification", "transfers"]):
+            return path, 0
+
+        minified_path = minified_gcode_path(path)
+        try:
+            if not is_minified_gcode_valid(path, minified_path):
+                self._logger.info("No minified version of %s available yet, transferring the original file" % path)
+                return path, 0
+
+            return minified_path, os.path.getsize(path) - os.path.getsize(minified_path)
+        except Exception:
+            self._logger.exception("Error while looking up the minified version of %s, transferring the original file"
+                                   % path)
+            return path, 0
+
+    def _isResidentFileOnPrinter(self):
+        """
+        Checks that the printer still lists the print file in its memory
+        :return:
+        """
+        try:
+            file_list = self._beeCommands.getFileList()
+        except Exception:
+            self._logger.exception("Error reading the file list of the printer's memory")
+            return False
+
+        if not file_list or 'FileNames' not in file_list:
+            return False
+
+        return ResidentFileTracker.MEMORY_FILE_NAME in [name.strip().upper() for name in file_list['FileNames']]
+
     def cancelPrint(self, firmware_error=None):
         """
         Cancels the print operation
@@ -360,6 +468,7 @@ class BeeCom(MachineCom):
             return
 
         self._preparing_print = False
+        self._jobStateMachine.cancel()
         if self._beeCommands.cancelPrint():
 
             self._changeState(self.STATE_OPERATIONAL)
@@ -404,9 +513,10 @@ class BeeCom(MachineCom):
             self._beeCommands.resumePrint()
 
             self._heating = True
-            self._resume_print_thread = threading.Thread(target=self._resumePrintThread, name="comm._resumePrint")
-            self._resume_print_thread.daemon = True
-            self._resume_print_thread.start()
+            self._jobStateMachine.start([
+                JobPhase("resuming", self._beeCommands.isResuming,
+                         on_enter=lambda: self._changeState(self.STATE_RESUMING))
+            ], on_done=self._onPrintResumed)
 
         elif pause and self.isPrinting():
             if not self._pauseWaitStartTime:
@@ -502,21 +612,44 @@ class BeeCom(MachineCom):
         self._currentFile = comm.StreamingGcodeFileInformation(filename, localFilename, remoteFilename)
         self._currentFile.start()
 
+        transfer_path, self._transferBytesSaved = self._prepareTransfer(filename)
+        self._transferSize = os.path.getsize(transfer_path)
+        self._transferTimeSaved = 0.0
+        self._transferStartTime = time.time()
+
         # starts the transfer
-        self._beeCommands.transferSDFile(filename, localFilename)
+        self._beeCommands.transferSDFile(transfer_path, localFilename)
 
         eventManager().fire(Events.TRANSFER_STARTED, {"local": localFilename, "remote": remoteFilename})
         self._callback.on_comm_file_transfer_started(remoteFilename, self._currentFile.getFilesize())
 
         # waits for transfer to end
-        while self._beeCommands.getTransferCompletionState() > 0:
-            time.sleep(2)
+        self._jobStateMachine.start([
+            JobPhase("sdTransfer", lambda: (self._beeCommands.getTransferCompletionState() or 0) > 0)
+        ], on_done=self._onFileTransferDone)
+
+    def getJobTimings(self):
+        """
+        Returns the timings of the phases of the print jobs and file transfers, see
+        :meth:`PrintJobStateMachine.get_timings`
+        :return:
+        """
+        return self._jobStateMachine.get_timings()
+
+    def _onFileTransferDone(self):
+        """
+        Runs the post file transfer code
+        :return:
+        """
+        self._onTransferDone()
 
         remote = self._currentFile.getRemoteFilename()
         payload = {
             "local": self._currentFile.getLocalFilename(),
             "remote": remote,
-            "time": self.getPrintTime()
+            "time": self.getPrintTime(),
+            "bytesSaved": self._transferBytesSaved,
+            "timeSaved": self._transferTimeSaved
         }
 
         self._currentFile = None
@@ -534,14 +667,17 @@ class BeeCom(MachineCom):
             # starts the progress status thread
             self._beeCommands.startStatusMonitor(self._statusProgressQueueCallback)
 
-    def selectFile(self, filename, sd):
+    def selectFile(self, filename, sd, file_hash=None):
         """
         Overrides the original selectFile method to allow to select files when printer is busy. For example
         when reconnecting after connection was lost and the printer is still printing
         :param filename:
         :param sd:
+        :param file_hash: SHA1 hash of the file's content from its metadata, used to recognize it in the printer's
+            memory without hashing it again when the print starts
         :return:
         """
+        self._selectedFileHash = (None, None) if sd else (filename, file_hash)
         if sd:
             if not self.isOperational():
                 # printer is not connected, can't use SD
@@ -826,6 +962,9 @@ class BeeCom(MachineCom):
         Post connection callback
         """
 
+        # the printer might have printed or received other files while disconnected
+        self._residentFiles.clear()
+
         # starts the connection monitor thread
         self._beeConn.startConnectionMonitor()
 
@@ -870,42 +1009,76 @@ class BeeCom(MachineCom):
         self._callback.on_comm_force_disconnect()
 
 
-    def _preparePrintThread(self):
+    def _onJobProgress(self, phase, progress):
         """
-        Thread code that runs while the print job is being prepared
+        Progress callback of the job state machine
+        :param phase: name of the current job phase
+        :param progress: progress of the phase between 0 and 1
         :return:
         """
-        # waits for heating/file transfer
-        while self._beeCommands.isTransferring():
-            time.sleep(1)
-            self._transferProgress = self._beeCommands.getTransferState()
-            # makes use of the same method that is used for the print job progress, to update
-            # the transfer progress since we are going to use the same progress bar
-            self._callback._setProgressData(self._transferProgress, 0, 0, 0)
-            if not self._preparing_print:  # the print (transfer) was cancelled
-                return
-        self._callback._resetPrintProgress()
+        if phase == "transfer":
+            self._transferProgress = progress
+        elif phase == "heating":
+            progress = round(progress, 2)
+            self._heatingProgress = progress
 
+        # makes use of the same method that is used for the print job progress, to update
+        # the transfer and heating progress since we are going to use the same progress bar
+        self._callback._setProgressData(progress, 0, 0, 0)
+
+
+    def _onHeatingStarted(self):
+        """
+        Runs when the file transfer of a print job is done and the printer starts heating
+        :return:
+        """
+        self._onTransferDone()
+
+        self._callback._resetPrintProgress()
         self._changeState(self.STATE_HEATING)
 
-        while self._beeCommands.isHeating():
-            time.sleep(1)
-            self._heatingProgress = round(self._beeCommands.getHeatingState(), 2)
-            # makes use of the same method that is used for the print job progress, to update
-            # the heating progress since we are going to use the same progress bar
-            self._callback._setProgressData(self._heatingProgress, 0, 0, 0)
-            if not self._preparing_print:  # the print (heating) was cancelled
-                return
+
+    def _onTransferDone(self):
+        """
+        Measures the time the transfer of a file to the printer took and estimates the time saved by minifying it
+        :return:
+        """
+        if self._transferStartTime is None:
+            return
+
+        self._transferTime = time.time() - self._transferStartTime
+        self._transferStartTime = None
+
+        if self._transferBytesSaved > 0 and self._transferSize > 0:
+            self._transferTimeSaved = self._transferTime * self._transferBytesSaved / self._transferSize
+            self._logger.info("Transferred %d bytes in %.2fs, minifying saved %d bytes and about %.2fs"
+                              % (self._transferSize, self._transferTime, self._transferBytesSaved,
+                                 self._transferTimeSaved))
+
+    def _onPrintPrepared(self):
+        """
+        Runs when the print job is prepared, after the file transfer and heating
+        :return:
+        """
         self._callback._resetPrintProgress()
 
         if self._currentFile is not None:
             # Starts the real printing operation
             self._changeState(self.STATE_PRINTING)
 
+            # the printer only starts printing once the whole file is in its memory
+            if self._pendingResidentFile is not None:
+                self._residentFiles.record(*self._pendingResidentFile)
+                self._pendingResidentFile = None
+
             payload = {
                 "file": self._currentFile.getFilename(),
                 "filename": os.path.basename(self._currentFile.getFilename()),
-                "origin": self._currentFile.getFileLocation()
+                "origin": self._currentFile.getFileLocation(),
+                "transferTime": self._transferTime,
+                "transferSkipped": self._transferSkipped,
+                "transferBytesSaved": self._transferBytesSaved,
+                "transferTimeSaved": self._transferTimeSaved
             }
 
             eventManager().fire(Events.PRINT_STARTED, payload)
@@ -923,18 +1096,11 @@ class BeeCom(MachineCom):
             self._logger.error('Error starting Print operation. No selected file found.')
 
 
-    def _resumePrintThread(self):
+    def _onPrintResumed(self):
         """
-        Thread code that runs while the print job is being resumed after pause/shutdown
+        Runs when the print job is resumed after pause/shutdown
         :return:
         """
-        self._changeState(self.STATE_RESUMING)
-
-        while self._beeCommands.isResuming():
-            time.sleep(1)
-            if not self._preparing_print:  # the print (heating) was cancelled
-                return
-
         if self._currentFile is not None:
             # Starts the real printing operation
             self._changeState(self.STATE_PRINTING)
@@ -973,6 +1139,7 @@ class BeeCom(MachineCom):
 
         try:
             _logger.info("Updating printer firmware...")
+            self._residentFiles.invalidate(self.getConnectedPrinterSN())
             eventManager().fire(Events.FIRMWARE_UPDATE_STARTED, {"version": firmware_file_name})
 
             if self.getCommandsInterface().flashFirmware(join(firmware_path, firmware_file_name), firmware_file_name):
@@ -988,6 +1155,245 @@ class BeeCom(MachineCom):
         eventManager().fire(Events.FIRMWARE_UPDATE_FINISHED, {"result": False})
         return False
 
+class ResidentFileTracker(object):
+    """
+    Keeps track of the print file last transferred to the memory of each printer, identified by its serial number,
+    through the SHA1 hash and size of its content. The printer only reports the name of the file in its memory, not
+    anything derived from its content, so the records are only valid while the printer stays connected and are not
+    persisted.
+    """
+
+    # name under which the printer stores transferred print files, see beedriver's FileTransferThread
+    MEMORY_FILE_NAME = "ABCDE"
+
+    def __init__(self):
+        self._lock = threading.RLock()
+        self._records = dict()
+
+    @staticmethod
+    def describe(path):
+        """
+        Returns the SHA1 hash and the size of the file at ``path``
+        """
+        file_hash = hashlib.sha1()
+        with open(path, "rb") as f:
+            for block in iter(lambda: f.read(65536), b""):
+                file_hash.update(block)
+        return file_hash.hexdigest(), os.path.getsize(path)
+
+    def matches(self, serial_number, file_hash, size):
+        """
+        Returns True if a file with ``file_hash`` and ``size`` was the last one transferred to the printer
+        """
+        with self._lock:
+            record = self._records.get(serial_number)
+            return record is not None and record.get("hash") == file_hash and record.get("size") == size
+
+    def record(self, serial_number, file_hash, size):
+        with self._lock:
+            self._records[serial_number] = dict(hash=file_hash, size=size, date=time.time())
+
+    def invalidate(self, serial_number):
+        with self._lock:
+            self._records.pop(serial_number, None)
+
+    def clear(self):
+        with self._lock:
+            self._records.clear()
+
+
+class JobPhase(object):
+    """
+    A phase of a print job on the printer, e.g. transferring the file or heating, for the
+    :class:`PrintJobStateMachine`
+    :param name: name of the phase, used for its progress and timings
+    :param busy: callable returning True while the phase is still in progress
+    :param progress: optional callable returning the progress of the phase between 0 and 1
+    :param on_enter: optional callable to run when the phase starts
+    """
+
+    def __init__(self, name, busy, progress=None, on_enter=None):
+        self.name = name
+        self.busy = busy
+        self.progress = progress
+        self.on_enter = on_enter
+
+
+class PrintJobStateMachine(object):
+    """
+    Runs the phases of a print job one after another, polling the printer from a single timer until each phase is
+    done. Progress of the phases is reported through ``progress_callback(phase, progress)``.
+
+    The poll interval adapts to the progress of the current phase. It's estimated from the rate of progress to sample
+    the phase a few times before its expected end, so a long heat-up is polled slowly and the printer fast near the
+    end of a phase. Without progress the interval backs off from the minimum to the maximum.
+    """
+
+    MIN_INTERVAL = 0.1
+    MAX_INTERVAL = 2.0
+    BACKOFF = 1.5
+
+    # number of polls before the expected end of a phase
+    POLLS_TO_COMPLETION = 4.0
+
+    def __init__(self, progress_callback=None):
+        self._logger = logging.getLogger(__name__)
+        self._progress_callback = progress_callback
+
+        self._lock = threading.RLock()
+        self._timer = None
+        self._job = None
+
+        self._timings = defaultdict(_PhaseTimings)
+
+    def start(self, phases, on_done=None):
+        """
+        Starts running ``phases``, cancelling any job still running, and calls ``on_done`` once all are done
+        :param phases: list of :class:`JobPhase`
+        :param on_done: optional callable
+        :return:
+        """
+        with self._lock:
+            self.cancel()
+
+            job = _Job(phases, on_done)
+            self._job = job
+            self._timer = RepeatedTimer(lambda: job.interval, self._poll, args=[job], run_first=True,
+                                        condition=lambda: not job.done and not job.cancelled,
+                                        on_condition_false=lambda: self._finish(job))
+            self._timer.start()
+
+    def cancel(self):
+        """
+        Cancels the running job, ``on_done`` won't be called
+        :return:
+        """
+        with self._lock:
+            if self._job is not None:
+                self._job.cancelled = True
+                self._job = None
+            if self._timer is not None:
+                self._timer.cancel()
+                self._timer = None
+
+    def is_running(self):
+        with self._lock:
+            return self._job is not None
+
+    def get_timings(self):
+        """
+        Returns a dict mapping the names of the finished phases to their number (``count``), the duration of the
+        ``last`` one, their ``avg`` and ``max`` duration in seconds and the average number of ``polls``
+        :return:
+        """
+        with self._lock:
+            return dict((name, timings.as_dict()) for name, timings in self._timings.items())
+
+    def _poll(self, job):
+        now = time.time()
+
+        while not job.cancelled:
+            phase = job.phase
+            if job.started is None:
+                job.enter(now)
+                if phase.on_enter is not None:
+                    phase.on_enter()
+
+            job.polls += 1
+            try:
+                busy = phase.busy()
+                progress = phase.progress() if busy and phase.progress is not None else None
+            except:
+                self._logger.exception("Error while polling job phase %s" % phase.name)
+                busy, progress = True, None
+
+            if busy:
+                if progress is not None and self._progress_callback is not None:
+                    self._progress_callback(phase.name, progress)
+                job.interval = self._next_interval(job, progress, now)
+                return
+
+            duration = now - job.started
+            with self._lock:
+                self._timings[phase.name].record(duration, job.polls)
+            self._logger.info("Job phase %s done after %.2fs and %d polls" % (phase.name, duration, job.polls))
+
+            if not job.next():
+                job.done = True
+                return
+
+    def _next_interval(self, job, progress, now):
+        if progress is not None and job.last_progress is not None and progress > job.last_progress \
+                and now > job.last_poll:
+            rate = (progress - job.last_progress) / (now - job.last_poll)
+            interval = max(1.0 - progress, 0) / rate / self.POLLS_TO_COMPLETION
+        else:
+            interval = job.interval * self.BACKOFF
+
+        job.last_progress = progress
+        job.last_poll = now
+        return min(max(interval, self.MIN_INTERVAL), self.MAX_INTERVAL)
+
+    def _finish(self, job):
+        with self._lock:
+            if job.cancelled or self._job is not job:
+                return
+            self._job = None
+            self._timer = None
+
+        if job.on_done is not None:
+            try:
+                job.on_done()
+            except:
+                self._logger.exception("Error while finishing job")
+
+
+class _Job(object):
+    def __init__(self, phases, on_done):
+        self.phases = phases
+        self.on_done = on_done
+        self.index = 0
+        self.done = not phases
+        self.cancelled = False
+        self.enter(None)
+
+    @property
+    def phase(self):
+        return self.phases[self.index]
+
+    def enter(self, started):
+        self.started = started
+        self.polls = 0
+        self.interval = PrintJobStateMachine.MIN_INTERVAL
+        self.last_progress = None
+        self.last_poll = None
+
+    def next(self):
+        self.index += 1
+        self.enter(None)
+        return self.index < len(self.phases)
+
+
+class _PhaseTimings(object):
+    def __init__(self):
+        self.count = 0
+        self.total = 0.0
+        self.max = 0.0
+        self.last = 0.0
+        self.polls = 0
+
+    def record(self, duration, polls):
+        self.count += 1
+        self.total += duration
+        self.max = max(self.max, duration)
+        self.last = duration
+        self.polls += polls
+
+    def as_dict(self):
+        return dict(count=self.count, last=self.last, avg=self.total / self.count, max=self.max,
+                    polls=float(self.polls) / self.count)
+
+
 class InMemoryFileInformation(PrintingFileInformation):
     """
     Dummy file information handler for printer in memory files
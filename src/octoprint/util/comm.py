@@ -7,6 +7,9 @@ __copyright__ = "Copyright (C) 2013 David Braam - Released under terms of the AG
 
 import os
 import glob
+import codecs
+import hashlib
+import operator
 import time
 import re
 import threading
@@ -25,7 +28,7 @@ from octoprint.events import eventManager, Events
 from octoprint.filemanager import valid_file_type
 from octoprint.filemanager.destinations import FileDestinations
 from octoprint.util import get_exception_string, sanitize_ascii, filter_non_ascii, CountedEvent, RepeatedTimer, \
-	to_unicode, bom_aware_open, TypedQueue, TypeAlreadyInQueue
+	to_str, to_unicode, bom_aware_open, TypedQueue, TypeAlreadyInQueue
 
 try:
 	import _winreg
@@ -43,6 +46,16 @@ regex_int_pattern = "\d+"
 regex_command = re.compile("^\s*((?P<commandGM>[GM]\d+)|(?P<commandT>T)\d+)")
 """Regex for a GCODE command."""
 
+regex_ok_buffer = re.compile("\sB(?P<free>\d+)\\b")
+"""
+Regex for the free command buffer slots reported in an ``ok`` by firmwares like Marlin with ``ADVANCED_OK``, e.g.
+``ok N10 P15 B3``.
+
+Groups will be as follows:
+
+  * ``free``: free command buffer slots (int)
+"""
+
 regex_float = re.compile(regex_float_pattern)
 """Regex for a float value."""
 
@@ -256,7 +269,17 @@ class MachineCom(object):
 		self._currentLine = 1
 		self._line_mutex = threading.RLock()
 		self._resendDelta = None
-		self._lastLines = deque([], 50)
+
+		self._send_window = None
+		if settings().getBoolean(["serial", "sendWindow", "enabled"]):
+			self._send_window = SendWindow(settings().getInt(["serial", "sendWindow", "bufferSize"]),
+			                               settings().getInt(["serial", "sendWindow", "maxCommands"]))
+
+		# the resend history needs to cover all commands that might be in flight
+		history = 50
+		if self._send_window is not None:
+			history = max(history, 2 * self._send_window.max_commands)
+		self._lastLines = deque([], history)
 		self._lastCommError = None
 		self._lastResendNumber = None
 		self._currentResendCount = 0
@@ -730,7 +753,7 @@ class MachineCom(object):
 			self._sdFileToSelect = filename
 			self.sendCommand("M23 %s" % filename)
 		else:
-			self._currentFile = PrintingGcodeFileInformation(filename, offsets_callback=self.getOffsets, current_tool_callback=self.getCurrentTool)
+			self._currentFile = self._createPrintingFileInformation(filename)
 			eventManager().fire(Events.FILE_SELECTED, {
 				"file": self._currentFile.getFilename(),
 				"filename": os.path.basename(self._currentFile.getFilename()),
@@ -738,6 +761,14 @@ class MachineCom(object):
 			})
 			self._callback.on_comm_file_selected(filename, self._currentFile.getFilesize(), False)
 
+	def _createPrintingFileInformation(self, filename):
+		if settings().getBoolean(["serial", "compileJobs"]):
+			job_path = compiled_job_path(filename)
+			if is_compiled_job_valid(filename, job_path):
+				self._logger.info("Printing {} from compiled print job {}".format(filename, job_path))
+				return PrintingCompiledGcodeFileInformation(filename, job_path, offsets_callback=self.getOffsets, current_tool_callback=self.getCurrentTool)
+		return PrintingGcodeFileInformation(filename, offsets_callback=self.getOffsets, current_tool_callback=self.getCurrentTool)
+
 	def unselectFile(self):
 		if self.isBusy():
 			return
@@ -1046,9 +1077,13 @@ class MachineCom(object):
 
 				# process oks
 				if line.startswith("ok") or (self.isPrinting() and supportWait and line == "wait"):
+					if line == "wait" and self._send_window is not None:
+						# the printer is idle, so nothing we sent is still in flight
+						self._send_window.reset()
+
 					# ok only considered handled if it's alone on the line, might be
 					# a response to an M105 or an M114
-					self._handle_ok()
+					self._handle_ok(line)
 					handled = (line == "wait" or line == "ok" or not ("T:" in line or "T0:" in line or "B:" in line or "C:" in line))
 
 				# process resends
@@ -1263,7 +1298,15 @@ class MachineCom(object):
 				self.close(is_error=True)
 		self._log("Connection closed, closing down monitor")
 
-	def _handle_ok(self):
+	def _handle_ok(self, line=None):
+		if self._send_window is not None:
+			free_slots = None
+			if line is not None:
+				match = regex_ok_buffer.search(line)
+				if match is not None:
+					free_slots = int(match.group("free"))
+			self._send_window.acknowledged(free_slots=free_slots)
+
 		self._clear_to_send.set()
 
 		# reset long running commands, persisted current tools and heatup counters on ok
@@ -1323,6 +1366,7 @@ class MachineCom(object):
 			message = "Communication timeout during an active resend, resending same line again to trigger response from printer."
 			self._logger.info(message)
 			self._log(message + " " + general_message)
+			self._reset_send_window()
 			if self._resendSameCommand():
 				self._clear_to_send.set()
 
@@ -1341,6 +1385,7 @@ class MachineCom(object):
 			message = "Communication timeout while printing, trying to trigger response from printer."
 			self._logger.info(message)
 			self._log(message + " " + general_message)
+			self._reset_send_window()
 			if self._sendCommand("M105", cmd_type="temperature"):
 				self._clear_to_send.set()
 
@@ -1349,8 +1394,14 @@ class MachineCom(object):
 			message = "Communication timeout while idle, trying to trigger response from printer."
 			self._logger.info(message)
 			self._log(message + " " + general_message)
+			self._reset_send_window()
 			self._clear_to_send.set()
 
+	def _reset_send_window(self):
+		if self._send_window is not None:
+			# whatever was still in flight got lost or will not be acknowledged anymore
+			self._send_window.reset()
+
 	def _finish_heatup(self):
 		if self._heatupWaitStartTime:
 			self._heatupWaitTimeLost = self._heatupWaitTimeLost + (time.time() - self._heatupWaitStartTime)
@@ -1635,10 +1686,13 @@ class MachineCom(object):
 		return ret
 
 	def _getNext(self):
+		return self._getNextCommand()[0]
+
+	def _getNextCommand(self):
 		if self._currentFile is None:
-			return None
+			return None, None
 
-		line = self._currentFile.getNext()
+		line, gcode = self._currentFile.getNextCommand()
 		if line is None:
 			if self.isStreaming():
 				self._sendCommand("M29")
@@ -1667,7 +1721,7 @@ class MachineCom(object):
 				eventManager().fire(Events.PRINT_DONE, payload)
 
 				self.sendGcodeScript("afterPrintDone", replacements=dict(event=payload))
-		return line
+		return line, gcode
 
 	def _sendNext(self):
 		with self._sendNextLock:
@@ -1677,12 +1731,12 @@ class MachineCom(object):
 					# we are no longer printing, return false
 					return False
 
-				line = self._getNext()
+				line, gcode = self._getNextCommand()
 				if line is None:
 					# end of file, return false
 					return False
 
-				result = self._sendCommand(line)
+				result = self._sendCommand(line, gcode=gcode)
 				self._callback.on_comm_progress()
 				if result:
 					# line sent, return true
@@ -1735,6 +1789,12 @@ class MachineCom(object):
 				self._resendSwallowRepetitionsCounter -= 1
 				return True
 
+			if self._send_window is not None:
+				# the printer dropped everything after the requested line, and we fall back to sending one
+				# command per ok until the resend is done
+				self._send_window.reset()
+				self._clear_to_send.clear(completely=True)
+
 			self._resendActive = True
 			self._resendDelta = resendDelta
 			self._lastResendNumber = lineToResend
@@ -1807,14 +1867,12 @@ class MachineCom(object):
 
 			return result
 
-	def _sendCommand(self, cmd, cmd_type=None):
+	def _sendCommand(self, cmd, cmd_type=None, gcode=None):
 		# Make sure we are only handling one sending job at a time
 		with self._sendingLock:
 			if self._serial is None:
 				return False
 
-			gcode = None
-
 			# trigger the "queuing" phase only if we are not streaming to sd right now
 			cmd, cmd_type, gcode = self._process_command_phase("queuing", cmd, cmd_type, gcode=gcode)
 
@@ -1827,7 +1885,7 @@ class MachineCom(object):
 				eventManager().fire(gcodeToEvent[gcode])
 
 			# actually enqueue the command for sending
-			if self._enqueue_for_sending(cmd, command_type=cmd_type):
+			if self._enqueue_for_sending(cmd, command_type=cmd_type, gcode=gcode):
 				self._process_command_phase("queued", cmd, cmd_type, gcode=gcode)
 				return True
 			else:
@@ -1835,7 +1893,7 @@ class MachineCom(object):
 
 	##~~ send loop handling
 
-	def _enqueue_for_sending(self, command, linenumber=None, command_type=None):
+	def _enqueue_for_sending(self, command, linenumber=None, command_type=None, gcode=None):
 		"""
 		Enqueues a command an optional linenumber to use for it in the send queue.
 
@@ -1843,10 +1901,12 @@ class MachineCom(object):
 		    command (str): The command to send.
 		    linenumber (int): The line number with which to send the command. May be ``None`` in which case the command
 		        will be sent without a line number and checksum.
+		    gcode (str): The GCODE command identifier of the command if already known, will be determined from the
+		        command otherwise.
 		"""
 
 		try:
-			self._send_queue.put((command, linenumber, command_type), item_type=command_type)
+			self._send_queue.put((command, linenumber, command_type, gcode), item_type=command_type)
 			return True
 		except TypeAlreadyInQueue as e:
 			self._logger.debug("Type already in send queue: " + e.type)
@@ -1872,16 +1932,19 @@ class MachineCom(object):
 						break
 
 					# fetch command and optional linenumber from queue
-					command, linenumber, command_type = entry
+					command, linenumber, command_type, gcode = entry
 
 					# some firmwares (e.g. Smoothie) might support additional in-band communication that will not
 					# stick to the acknowledgement behaviour of GCODE, so we check here if we have a GCODE command
 					# at hand here and only clear our clear_to_send flag later if that's the case
-					gcode = gcode_command_for_cmd(command)
+					if gcode is None:
+						gcode = gcode_command_for_cmd(command)
 
 					if linenumber is not None:
 						# line number predetermined - this only happens for resends, so we'll use the number and
 						# send directly without any processing (since that already took place on the first sending!)
+						if self._send_window is not None and self._uses_up_clear(gcode):
+							self._reserve_send_window(len("N{} {}*255\n".format(linenumber, command)))
 						self._do_send_with_checksum(command, linenumber)
 
 					else:
@@ -1905,7 +1968,16 @@ class MachineCom(object):
 						checksum_enabled = self.isPrinting() or self._alwaysSendChecksum
 
 						command_to_send = command.encode("ascii", errors="replace")
-						if command_requiring_checksum or (command_allowing_checksum and checksum_enabled):
+						with_checksum = command_requiring_checksum or (command_allowing_checksum and checksum_enabled)
+
+						if self._send_window is not None and self._uses_up_clear(gcode):
+							if with_checksum:
+								size = len("N{} {}*255\n".format(self._currentLine, command_to_send))
+							else:
+								size = len(command_to_send) + 1
+							self._reserve_send_window(size)
+
+						if with_checksum:
 							self._do_increment_and_send_with_checksum(command_to_send)
 						else:
 							self._do_send_without_checksum(command_to_send)
@@ -1915,11 +1987,13 @@ class MachineCom(object):
 
 					# we only need to use up a clear if the command we just sent was either a gcode command or if we also
 					# require ack's for unknown commands
-					use_up_clear = self._unknownCommandsNeedAck
-					if gcode is not None:
-						use_up_clear = True
+					use_up_clear = self._uses_up_clear(gcode)
 
-					if use_up_clear:
+					if use_up_clear and self._send_window is not None and not self._resendActive:
+						# in windowed send mode the window limits what's in flight, so we keep it filled
+						if self._send_queue.empty():
+							self._continue_sending()
+					elif use_up_clear:
 						# if we need to use up a clear, do that now
 						self._clear_to_send.clear()
 					else:
@@ -1939,6 +2013,16 @@ class MachineCom(object):
 				self._logger.exception("Caught an exception in the send loop")
 		self._log("Closing down send loop")
 
+	def _uses_up_clear(self, gcode):
+		return gcode is not None or self._unknownCommandsNeedAck
+
+	def _reserve_send_window(self, size):
+		"""
+		Blocks until a line of ``size`` characters fits into the send window, or the send loop is stopped.
+		"""
+		while self._send_queue_active and not self._send_window.reserve(size, timeout=1.0):
+			pass
+
 	def _process_command_phase(self, phase, command, command_type=None, gcode=None):
 		if self.isStreaming() or phase not in ("queuing", "queued", "sending", "sent"):
 			return command, command_type, gcode
@@ -2013,9 +2097,7 @@ class MachineCom(object):
 
 	def _do_send_with_checksum(self, command, linenumber):
 		command_to_send = "N" + str(linenumber) + " " + command
-		checksum = 0
-		for c in command_to_send:
-			checksum ^= ord(c)
+		checksum = reduce(operator.xor, bytearray(command_to_send), 0)
 		command_to_send = command_to_send + "*" + str(checksum)
 		self._do_send_without_checksum(command_to_send)
 
@@ -2196,6 +2278,7 @@ class MachineCom(object):
 			# after a reset of the line number we have no way to determine what line exactly the printer now wants
 			self._lastLines.clear()
 		self._resendDelta = None
+		self._reset_send_window()
 
 	def _gcode_M112_queuing(self, cmd, cmd_type=None):
 		# emergency stop, jump the queue with the M112
@@ -2291,6 +2374,80 @@ class MachineComPrintCallback(object):
 
 ### Printing file information classes ##################################################################################
 
+class SendWindow(object):
+	"""
+	Tracks the commands sent to the printer but not yet acknowledged in windowed send mode, keeping up to
+	``max_commands`` commands with a total of ``buffer_size`` characters in flight so they fit into the receive buffer
+	of the printer's firmware. A single command may always be sent if nothing is in flight.
+
+	If the firmware reports its free command buffer slots with its acknowledgements, the commands in flight are further
+	limited to those slots.
+
+	Arguments:
+	    buffer_size (int): Size of the printer's receive buffer in characters.
+	    max_commands (int): Maximum number of commands in flight.
+	"""
+
+	def __init__(self, buffer_size, max_commands):
+		self.buffer_size = max(1, buffer_size)
+		self.max_commands = max(1, max_commands)
+
+		self._in_flight = deque()
+		self._characters = 0
+		self._free_slots = None
+		self._condition = threading.Condition()
+
+	def reserve(self, size, timeout=None):
+		"""
+		Waits until a line of ``size`` characters fits into the window and counts it as in flight.
+
+		Returns:
+		    bool: True if the line was counted as in flight, False if it did not fit within ``timeout`` seconds.
+		"""
+		with self._condition:
+			if not self._fits(size):
+				self._condition.wait(timeout)
+				if not self._fits(size):
+					return False
+
+			self._in_flight.append(size)
+			self._characters += size
+			return True
+
+	def acknowledged(self, free_slots=None):
+		"""
+		Removes the oldest line in flight, optionally updating the free command buffer slots reported by the printer.
+		"""
+		with self._condition:
+			if self._in_flight:
+				self._characters -= self._in_flight.popleft()
+			if free_slots is not None:
+				self._free_slots = free_slots
+			self._condition.notify_all()
+
+	def reset(self):
+		"""
+		Considers nothing in flight anymore.
+		"""
+		with self._condition:
+			self._in_flight.clear()
+			self._characters = 0
+			self._free_slots = None
+			self._condition.notify_all()
+
+	def get_in_flight(self):
+		with self._condition:
+			return len(self._in_flight), self._characters
+
+	def _fits(self, size):
+		if not self._in_flight:
+			return True
+
+		max_commands = self.max_commands
+		if self._free_slots is not None:
+			max_commands = min(max_commands, self._free_slots)
+		return len(self._in_flight) < max_commands and self._characters + size <= self.buffer_size
+
 class PrintingFileInformation(object):
 	"""
 	Encapsulates information regarding the current file being printed: file name, current position, total size and
@@ -2444,6 +2601,12 @@ class PrintingGcodeFileInformation(PrintingFileInformation):
 			self._logger.exception("Exception while processing line")
 			raise e
 
+	def getNextCommand(self):
+		"""
+		Retrieves the next line for printing and its GCODE command identifier, None if not determined yet.
+		"""
+		return self.getNext(), None
+
 	def _process(self, line, offsets, current_tool):
 		return process_gcode_line(line, offsets=offsets, current_tool=current_tool)
 
@@ -2452,6 +2615,81 @@ class PrintingGcodeFileInformation(PrintingFileInformation):
 		self._logger.info("Finished in {:.3f} s.".format(duration))
 		pass
 
+class PrintingCompiledGcodeFileInformation(PrintingGcodeFileInformation):
+	"""
+	Encapsulates information regarding an ongoing direct print from a compiled print job of the GCODE file, as created
+	by :func:`compile_gcode_file`. Lines are read pre-processed including their GCODE command identifier, only
+	temperature commands still get the temperature offsets applied. Positions and progress refer to the original
+	GCODE file.
+	"""
+
+	def __init__(self, filename, job_path, offsets_callback=None, current_tool_callback=None):
+		PrintingGcodeFileInformation.__init__(self, filename, offsets_callback=offsets_callback, current_tool_callback=current_tool_callback)
+		self._job_path = job_path
+
+	def seek(self, offset):
+		if self._handle is None:
+			return
+
+		# continue with the first line not completely before offset
+		self._handle.seek(0)
+		self._handle.readline()
+		while True:
+			position = self._handle.tell()
+			record = self._handle.readline()
+			if not record:
+				break
+			if int(record[:record.index("\t")]) > offset:
+				self._handle.seek(position)
+				break
+
+		self._pos = offset
+		self._read_lines = 0
+
+	def start(self):
+		"""
+		Opens the compiled print job for reading.
+		"""
+		PrintingFileInformation.start(self)
+		self._read_lines = 0
+		self._handle = open(self._job_path, "rb")
+		self._handle.readline()
+
+	def getNext(self):
+		"""
+		Retrieves the next line for printing.
+		"""
+		return self.getNextCommand()[0]
+
+	def getNextCommand(self):
+		"""
+		Retrieves the next line for printing and its GCODE command identifier.
+		"""
+		if self._handle is None:
+			raise ValueError("File %s is not open for reading" % self._filename)
+
+		try:
+			record = self._handle.readline()
+			if not record:
+				self.close()
+				self._pos = self._size
+				self._report_stats()
+				return None, None
+
+			end, flags, gcode, line = record.rstrip("\n").split("\t", 3)
+			if flags == COMPILED_JOB_TEMPERATURE and self._offsets_callback is not None:
+				offsets = self._offsets_callback()
+				current_tool = self._current_tool_callback() if self._current_tool_callback is not None else None
+				line = apply_temperature_offsets(line, offsets, current_tool=current_tool)
+
+			self._pos = int(end)
+			self._read_lines += 1
+			return line, gcode if gcode != COMPILED_JOB_NONE else None
+		except Exception as e:
+			self.close()
+			self._logger.exception("Exception while processing compiled print job")
+			raise e
+
 class StreamingGcodeFileInformation(PrintingGcodeFileInformation):
 	def __init__(self, path, localFilename, remoteFilename):
 		PrintingGcodeFileInformation.__init__(self, path)
@@ -2479,6 +2717,78 @@ class StreamingGcodeFileInformation(PrintingGcodeFileInformation):
 		             duration=duration)
 		self._logger.info("Finished in {duration:.3f} s. Approx. transfer rate of {rate:.3f} lines/s or {time_per_line:.3f} ms per line".format(**stats))
 
+COMPILED_JOB_VERSION = 1
+COMPILED_JOB_TEMPERATURE = "t"
+COMPILED_JOB_NONE = "-"
+
+def compiled_job_path(path):
+	"""
+	Path of the compiled print job for the GCODE file ``path``, within the ``jobs`` folder of the ``generated`` base
+	folder.
+	"""
+	name = hashlib.sha1(to_str(os.path.abspath(path))).hexdigest() + ".job"
+	return os.path.join(settings().getBaseFolder("generated"), "jobs", name)
+
+def _compiled_job_header(path):
+	stat = os.stat(path)
+	# full precision modification date, a file replaced within the same second must not match the old job
+	return "OCTOPRINT-JOB {} {} {!r}\n".format(COMPILED_JOB_VERSION, stat.st_size, stat.st_mtime)
+
+def is_compiled_job_valid(path, job_path):
+	"""
+	Whether the compiled print job ``job_path`` exists and was compiled by this version from the current contents
+	of the GCODE file ``path``.
+	"""
+	try:
+		with open(job_path, "rb") as job:
+			return job.readline() == _compiled_job_header(path)
+	except (IOError, OSError):
+		return False
+
+def compile_gcode_file(path, job_path, throttle=None):
+	"""
+	Compiles the GCODE file ``path`` into a print job at ``job_path`` for streaming it through
+	:class:`PrintingCompiledGcodeFileInformation`.
+
+	The print job starts with a header identifying the compiled GCODE file by size and modification date, followed by
+	one tab separated record per line to send: the offset in the GCODE file after the line, ``t`` for temperature
+	commands subject to temperature offsets and ``-`` otherwise, the GCODE command identifier or ``-`` and finally the
+	line with comments and whitespace stripped. Lines without a command are skipped.
+	"""
+	folder = os.path.dirname(job_path)
+	if not os.path.isdir(folder):
+		os.makedirs(folder)
+
+	header = _compiled_job_header(path)
+	temporary_path = job_path + ".tmp"
+	with open(path, "rb") as source:
+		with open(temporary_path, "wb") as job:
+			job.write(header)
+
+			end = 0
+			for raw in source:
+				line = raw
+				if end == 0 and line.startswith(codecs.BOM_UTF8):
+					line = line[len(codecs.BOM_UTF8):]
+				end += len(raw)
+
+				# lines read in binary mode only end on \n, split remaining line endings as bom_aware_open would
+				for part in to_unicode(line, errors="replace").splitlines():
+					command = process_gcode_line(part)
+					if command is None:
+						continue
+
+					flags = COMPILED_JOB_TEMPERATURE if _temp_command_regex.match(command) else COMPILED_JOB_NONE
+					gcode = gcode_command_for_cmd(command) or COMPILED_JOB_NONE
+					job.write("{}\t{}\t{}\t{}\n".format(end, flags, gcode, command.encode("ascii", errors="replace")))
+
+				if throttle is not None:
+					throttle()
+
+	if os.path.exists(job_path):
+		os.remove(job_path)
+	os.rename(temporary_path, job_path)
+
 def get_new_timeout(type, intervals):
 	now = time.time()
 	return now + intervals.get(type, 0.0)
@@ -5,7 +5,10 @@ __license__ = 'GNU Affero General Public License http://www.gnu.org/licenses/agp
 __copyright__ = "Copyright (C) 2013 David Braam, Gina Häußge - Released under terms of the AGPLv3 License"
 
 
+import array
+import itertools
 import math
+import operator
 import os
 import base64
 import zlib
@@ -127,9 +130,11 @@ class gcode(object):
 		self.extrusionAmount = [0]
 		self.extrusionVolume = [0]
 		self.totalMoveTimeMinute = 0
+		self.lineCount = 0
 		self.filename = None
 		self.progressCallback = None
 		self._abort = False
+		self._fileSize = None
 		self._filamentDiameter = 0
 
 	def load(self, filename, printer_profile, throttle=None):
@@ -162,6 +167,7 @@ class gcode(object):
 			# some somewhat sane default if axes speeds are insane...
 			feedrate = 2000
 		offsets = printer_profile["extruder"]["offsets"]
+		maxExtruders = settings().getInt(["gcodeAnalysis", "maxExtruders"])
 
 		for line in gcodeFile:
 			if self._abort:
@@ -183,28 +189,7 @@ class gcode(object):
 				pass
 
 			if ';' in line:
-				comment = line[line.find(';')+1:].strip()
-				if comment.startswith("filament_diameter"):
-					filamentValue = comment.split("=", 1)[1].strip()
-					try:
-						self._filamentDiameter = float(filamentValue)
-					except ValueError:
-						try:
-							self._filamentDiameter = float(filamentValue.split(",")[0].strip())
-						except ValueError:
-							self._filamentDiameter = 0.0
-				elif comment.startswith("CURA_PROFILE_STRING") or comment.startswith("CURA_OCTO_PROFILE_STRING"):
-					if comment.startswith("CURA_PROFILE_STRING"):
-						prefix = "CURA_PROFILE_STRING:"
-					else:
-						prefix = "CURA_OCTO_PROFILE_STRING:"
-
-					curaOptions = self._parseCuraProfileString(comment, prefix)
-					if "filament_diameter" in curaOptions:
-						try:
-							self._filamentDiameter = float(curaOptions["filament_diameter"])
-						except:
-							self._filamentDiameter = 0.0
+				self._parseComment(line[line.find(';')+1:].strip())
 				line = line[0:line.find(';')]
 
 			G = getCodeInt(line, 'G')
@@ -302,7 +287,7 @@ class gcode(object):
 					absoluteE = False
 
 			elif T is not None:
-				if T > settings().getInt(["gcodeAnalysis", "maxExtruders"]):
+				if T > maxExtruders:
 					self._logger.warn("GCODE tried to select tool %d, that looks wrong, ignoring for GCODE analysis" % T)
 				else:
 					posOffset.x -= offsets[currentExtruder][0] if currentExtruder < len(offsets) else 0
@@ -335,11 +320,321 @@ class gcode(object):
 			radius = self._filamentDiameter / 2
 			self.extrusionVolume[i] = (self.extrusionAmount[i] * (math.pi * radius * radius)) / 1000
 		self.totalMoveTimeMinute = totalMoveTimeMinute
+		self.lineCount = filePos
+
+	def _parseComment(self, comment):
+		if comment.startswith("filament_diameter"):
+			filamentValue = comment.split("=", 1)[1].strip()
+			try:
+				self._filamentDiameter = float(filamentValue)
+			except ValueError:
+				try:
+					self._filamentDiameter = float(filamentValue.split(",")[0].strip())
+				except ValueError:
+					self._filamentDiameter = 0.0
+		elif comment.startswith("CURA_PROFILE_STRING") or comment.startswith("CURA_OCTO_PROFILE_STRING"):
+			if comment.startswith("CURA_PROFILE_STRING"):
+				prefix = "CURA_PROFILE_STRING:"
+			else:
+				prefix = "CURA_OCTO_PROFILE_STRING:"
+
+			curaOptions = self._parseCuraProfileString(comment, prefix)
+			if "filament_diameter" in curaOptions:
+				try:
+					self._filamentDiameter = float(curaOptions["filament_diameter"])
+				except:
+					self._filamentDiameter = 0.0
 
 	def _parseCuraProfileString(self, comment, prefix):
 		return {key: value for (key, value) in map(lambda x: x.split("=", 1), zlib.decompress(base64.b64decode(comment[len(prefix):])).split("\b"))}
 
 
+class chunkedGcode(gcode):
+	"""
+	Alternative analysis engine for large files, producing the same results as :class:`gcode`.
+
+	Instead of decoding and walking the file line by line, the file is read as raw bytes in chunks of
+	:attr:`CHUNK_SIZE` bytes. Each line is tokenized with a single ``split`` (instead of one ``find`` per parameter)
+	and only the commands relevant for the analysis are interpreted. Resolved target positions, extrusion and
+	feedrate of all moves are collected into column arrays, from which move times and the bounding box are then
+	computed per batch of up to :attr:`BATCH_SIZE` moves using element wise operations.
+
+	In addition to the attributes provided by :class:`gcode`, :attr:`printingArea` will hold the minimum and maximum
+	coordinates of all extruding moves after loading, or ``None`` if the file didn't contain any extruding moves.
+	"""
+
+	CHUNK_SIZE = 1024 * 1024
+	BATCH_SIZE = 16384
+
+	def __init__(self):
+		gcode.__init__(self)
+		self.printingArea = None
+
+	def load(self, filename, printer_profile, throttle=None):
+		if os.path.isfile(filename):
+			self.filename = filename
+			self._fileSize = os.stat(filename).st_size
+
+			with open(filename, "rb") as f:
+				self._load(f, printer_profile, throttle=throttle)
+
+	def _load(self, gcodeFile, printer_profile, throttle=None):
+		posX = posY = posZ = 0.0
+		offsetX = offsetY = offsetZ = 0.0
+		currentE = [0.0]
+		totalExtrusion = [0.0]
+		maxExtrusion = [0.0]
+		currentExtruder = 0
+		absoluteE = True
+		scale = 1.0
+		posAbs = True
+		feedrate = min(printer_profile["axes"]["x"]["speed"], printer_profile["axes"]["y"]["speed"])
+		if feedrate == 0:
+			# some somewhat sane default if axes speeds are insane...
+			feedrate = 2000
+		offsets = printer_profile["extruder"]["offsets"]
+		maxExtruders = settings().getInt(["gcodeAnalysis", "maxExtruders"])
+
+		self._moveTime = 0.0
+		self._area = None
+
+		batchStart = (posX, posY, posZ)
+		moveX, moveY, moveZ, moveE, moveF = [array.array("d") for _ in range(5)]
+		batchSize = self.BATCH_SIZE
+
+		for lines, percentage in self._chunks(gcodeFile):
+			if self._abort:
+				raise AnalysisAborted()
+
+			self.lineCount += len(lines)
+			for line in lines:
+				if ";" in line:
+					self._parseComment(line[line.find(";")+1:].strip())
+					line = line[0:line.find(";")]
+
+				words = line.split()
+				if not words:
+					continue
+
+				command = words[0]
+				if command[0] == "N" and len(words) > 1:
+					# skip line number
+					words = words[1:]
+					command = words[0]
+
+				try:
+					code = int(command[1:])
+				except ValueError:
+					continue
+
+				letter = command[0]
+				if letter == "G":
+					if code == 0 or code == 1:
+						x = y = z = e = f = None
+						for word in words[1:]:
+							try:
+								value = float(word[1:])
+							except ValueError:
+								continue
+							if value != value or value in _infinities:
+								continue
+
+							axis = word[0]
+							if axis == "X":
+								x = value
+							elif axis == "Y":
+								y = value
+							elif axis == "Z":
+								z = value
+							elif axis == "E":
+								e = value
+							elif axis == "F":
+								f = value
+
+						# position handling mirrors gcode._load exactly, results need to stay identical
+						if posAbs:
+							posX = (x if x is not None else posX) * scale + offsetX
+							posY = (y if y is not None else posY) * scale + offsetY
+							posZ = (z if z is not None else posZ) * scale + offsetZ
+						else:
+							posX += (x if x is not None else posX) * scale
+							posY += (y if y is not None else posY) * scale
+							posZ += (z if z is not None else posZ) * scale
+						if f is not None and f != 0:
+							feedrate = f
+
+						if e is not None:
+							if absoluteE:
+								# make sure e is relative
+								e -= currentE[currentExtruder]
+							totalExtrusion[currentExtruder] += e
+							currentE[currentExtruder] += e
+							if totalExtrusion[currentExtruder] > maxExtrusion[currentExtruder]:
+								maxExtrusion[currentExtruder] = totalExtrusion[currentExtruder]
+						else:
+							e = 0.0
+
+						moveX.append(posX)
+						moveY.append(posY)
+						moveZ.append(posZ)
+						moveE.append(e)
+						moveF.append(feedrate)
+
+						if len(moveX) >= batchSize:
+							self._processMoves(batchStart, moveX, moveY, moveZ, moveE, moveF)
+							batchStart = (posX, posY, posZ)
+							moveX, moveY, moveZ, moveE, moveF = [array.array("d") for _ in range(5)]
+
+					elif code == 4:
+						S = _findFloat(words, "S")
+						if S is not None:
+							self._moveTime += S / 60.0
+						P = _findFloat(words, "P")
+						if P is not None:
+							self._moveTime += P / 60.0 / 1000.0
+					elif code == 20:
+						scale = 25.4
+					elif code == 21:
+						scale = 1.0
+					elif code == 28:
+						x = _findFloat(words, "X")
+						y = _findFloat(words, "Y")
+						z = _findFloat(words, "Z")
+						if x is None and y is None and z is None:
+							posX = posY = posZ = 0.0
+						else:
+							if x is not None:
+								posX = 0.0
+							if y is not None:
+								posY = 0.0
+							if z is not None:
+								posZ = 0.0
+
+						# the next move doesn't start where the last one ended, so finish the current batch
+						self._processMoves(batchStart, moveX, moveY, moveZ, moveE, moveF)
+						batchStart = (posX, posY, posZ)
+						moveX, moveY, moveZ, moveE, moveF = [array.array("d") for _ in range(5)]
+					elif code == 90:
+						posAbs = True
+					elif code == 91:
+						posAbs = False
+					elif code == 92:
+						x = _findFloat(words, "X")
+						y = _findFloat(words, "Y")
+						z = _findFloat(words, "Z")
+						e = _findFloat(words, "E")
+						if e is not None:
+							currentE[currentExtruder] = e
+						if x is not None:
+							offsetX = posX - x
+						if y is not None:
+							offsetY = posY - y
+						if z is not None:
+							offsetZ = posZ - z
+
+				elif letter == "M":
+					if code == 82:
+						absoluteE = True
+					elif code == 83:
+						absoluteE = False
+
+				elif letter == "T":
+					if code > maxExtruders:
+						self._logger.warn("GCODE tried to select tool %d, that looks wrong, ignoring for GCODE analysis" % code)
+					else:
+						offsetX -= offsets[currentExtruder][0] if currentExtruder < len(offsets) else 0
+						offsetY -= offsets[currentExtruder][1] if currentExtruder < len(offsets) else 0
+
+						currentExtruder = code
+
+						offsetX += offsets[currentExtruder][0] if currentExtruder < len(offsets) else 0
+						offsetY += offsets[currentExtruder][1] if currentExtruder < len(offsets) else 0
+
+						for l in (currentE, maxExtrusion, totalExtrusion):
+							if len(l) <= currentExtruder:
+								l.extend([0.0] * (currentExtruder + 1 - len(l)))
+
+			try:
+				if self.progressCallback is not None and percentage is not None:
+					self.progressCallback(percentage)
+			except:
+				pass
+
+			if throttle is not None:
+				throttle()
+
+		self._processMoves(batchStart, moveX, moveY, moveZ, moveE, moveF)
+
+		if self.progressCallback is not None:
+			self.progressCallback(100.0)
+
+		self.extrusionAmount = maxExtrusion
+		self.extrusionVolume = [0] * len(maxExtrusion)
+		for i in range(len(maxExtrusion)):
+			radius = self._filamentDiameter / 2
+			self.extrusionVolume[i] = (self.extrusionAmount[i] * (math.pi * radius * radius)) / 1000
+		self.totalMoveTimeMinute = self._moveTime
+		if self._area is not None:
+			self.printingArea = dict(zip(("minX", "minY", "minZ", "maxX", "maxY", "maxZ"), self._area))
+
+	def _chunks(self, gcodeFile):
+		"""
+		Yields tuples of the lines contained in the next chunk of ``gcodeFile`` and the fraction of the file processed
+		after that chunk. Lists of lines are yielded as one single chunk.
+		"""
+		if isinstance(gcodeFile, list):
+			yield gcodeFile, None
+			return
+
+		readBytes = 0
+		remainder = b""
+		while True:
+			chunk = gcodeFile.read(self.CHUNK_SIZE)
+			if not chunk:
+				break
+			readBytes += len(chunk)
+
+			lines = (remainder + chunk).split(b"\n")
+			remainder = lines.pop()
+			yield lines, float(readBytes) / float(self._fileSize) if self._fileSize else None
+
+		if remainder:
+			yield [remainder], 1.0
+
+	def _processMoves(self, start, xs, ys, zs, es, fs):
+		"""
+		Adds the move time of a batch of moves to the total and extends the printing area by its extruding moves.
+
+		``xs``, ``ys`` and ``zs`` are the target coordinates of the moves, ``start`` the position before the first
+		move, ``es`` the relative extrusion and ``fs`` the feedrate of each move.
+		"""
+		if not xs:
+			return
+
+		distances = None
+		for values, first in zip((xs, ys, zs), start):
+			previous = array.array("d", (first,))
+			previous.extend(values[:-1])
+			delta = map(operator.sub, values, previous)
+			squared = map(operator.mul, delta, delta)
+			distances = squared if distances is None else map(operator.add, distances, squared)
+		moveTimes = map(abs, map(operator.truediv, map(math.sqrt, distances), fs))
+		extrudeTimes = map(abs, map(operator.truediv, es, fs))
+
+		# sequential reduction, keeps the floating point sum identical to the line by line interpreter
+		self._moveTime = reduce(operator.add, map(max, moveTimes, extrudeTimes), self._moveTime)
+
+		extruding = map((0.0).__lt__, es)
+		if not any(extruding):
+			return
+
+		area = [min(itertools.compress(values, extruding)) for values in (xs, ys, zs)] \
+		       + [max(itertools.compress(values, extruding)) for values in (xs, ys, zs)]
+		if self._area is not None:
+			area = map(min, area[:3], self._area[:3]) + map(max, area[3:], self._area[3:])
+		self._area = area
+
+
 def getCodeInt(line, code):
 	n = line.find(code) + 1
 	if n < 1:
@@ -367,3 +662,22 @@ def getCodeFloat(line, code):
 		return val if not (math.isnan(val) or math.isinf(val)) else None
 	except:
 		return None
+
+
+
+_infinities = (float("inf"), float("-inf"))
+
+
+def _parseFloat(value):
+	try:
+		val = float(value)
+	except ValueError:
+		return None
+	return val if not (math.isnan(val) or math.isinf(val)) else None
+
+
+def _findFloat(words, code):
+	for word in words:
+		if word[0] == code:
+			return _parseFloat(word[1:])
+	return None
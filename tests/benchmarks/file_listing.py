@@ -0,0 +1,97 @@
+#!/usr/bin/env python
+# coding=utf-8
+"""
+Measures how long :meth:`~octoprint.filemanager.storage.LocalFileStorage.list_files` takes for a large library.
+
+Usage::
+
+    python tests/benchmarks/file_listing.py [--files N] [--folders N] [--runs N] [--metadata-backend yaml|sqlite]
+
+Creates a temporary storage with ``N`` small GCODE files spread over ``N`` folders and reports the time of the first
+(cold) listing, of listings without the folder index, of listings served from the folder index based on the folders'
+modification times and of listings served from the folder index while watching the storage for changes.
+"""
+
+from __future__ import absolute_import, print_function
+
+__license__ = 'GNU Affero General Public License http://www.gnu.org/licenses/agpl.html'
+__copyright__ = "Copyright (C) 2016 The OctoPrint Project - Released under terms of the AGPLv3 License"
+
+import argparse
+import os
+import shutil
+import tempfile
+import time
+
+import mock
+
+from octoprint.filemanager.storage import LocalFileStorage
+
+
+def populate(basefolder, files, folders):
+	for folder in range(folders):
+		os.mkdir(os.path.join(basefolder, "folder{}".format(folder)))
+
+	for index in range(files):
+		folder = os.path.join(basefolder, "folder{}".format(index % folders)) if folders else basefolder
+		with open(os.path.join(folder, "file{}.gcode".format(index)), "wb") as f:
+			f.write(b"G1 X{} Y{} E1\n".format(index, index))
+
+	# make sure all folders are considered stable, see LocalFileStorage.LISTING_MTIME_GRANULARITY
+	then = time.time() - 10
+	for path, dirs, _ in os.walk(basefolder):
+		os.utime(path, (then, then))
+
+
+def best_of(storage, runs):
+	best = None
+	for _ in range(runs):
+		start = time.time()
+		storage.list_files()
+		duration = time.time() - start
+		best = duration if best is None else min(best, duration)
+	return best
+
+
+def main():
+	parser = argparse.ArgumentParser(description="Benchmark listing the files of a local file storage")
+	parser.add_argument("--files", type=int, default=5000, help="Number of files in the storage")
+	parser.add_argument("--folders", type=int, default=10, help="Number of folders to spread the files over")
+	parser.add_argument("--runs", type=int, default=5, help="Number of listings per variant, best one counts")
+	parser.add_argument("--metadata-backend", default="yaml", choices=("yaml", "sqlite"))
+	args = parser.parse_args()
+
+	basefolder = tempfile.mkdtemp()
+	try:
+		populate(basefolder, args.files, args.folders)
+
+		with mock.patch("octoprint.plugin.plugin_manager") as plugin_manager:
+			plugin_manager.return_value.get_hooks.return_value = dict()
+
+			start = time.time()
+			storage = LocalFileStorage(basefolder, metadata_backend=args.metadata_backend, listing_cache=False)
+			cold = time.time() - start
+
+			uncached = best_of(storage, args.runs)
+
+			storage = LocalFileStorage(basefolder, metadata_backend=args.metadata_backend)
+			indexed = best_of(storage, args.runs)
+
+			storage = LocalFileStorage(basefolder, metadata_backend=args.metadata_backend, watch=True)
+			try:
+				storage.list_files()
+				watched = best_of(storage, args.runs)
+			finally:
+				storage._stop_watching()
+
+		print("{} files in {} folders, {} metadata".format(args.files, args.folders, args.metadata_backend))
+		print("  initial scan:     {:8.1f}ms".format(cold * 1000))
+		print("  without index:    {:8.1f}ms".format(uncached * 1000))
+		print("  index (mtime):    {:8.1f}ms ({:.1f}x)".format(indexed * 1000, uncached / indexed))
+		print("  index (watched):  {:8.1f}ms ({:.1f}x)".format(watched * 1000, uncached / watched))
+	finally:
+		shutil.rmtree(basefolder)
+
+
+if __name__ == "__main__":
+	main()
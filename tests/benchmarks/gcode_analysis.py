@@ -0,0 +1,85 @@
+#!/usr/bin/env python
+# coding=utf-8
+"""
+Compares speed and results of the GCODE analysis engines in :mod:`octoprint.util.gcodeInterpreter`.
+
+Usage::
+
+    python tests/benchmarks/gcode_analysis.py [--runs N] [--max-extruders N] FILE [FILE ...]
+
+For every file both the line based :class:`~octoprint.util.gcodeInterpreter.gcode` interpreter and the
+:class:`~octoprint.util.gcodeInterpreter.chunkedGcode` engine are run ``N`` times, the best run time of each is
+reported together with the speedup and whether the analysis results match.
+"""
+
+from __future__ import absolute_import, print_function
+
+__license__ = 'GNU Affero General Public License http://www.gnu.org/licenses/agpl.html'
+__copyright__ = "Copyright (C) 2016 The OctoPrint Project - Released under terms of the AGPLv3 License"
+
+import argparse
+import os
+import time
+
+import mock
+
+import octoprint.util.gcodeInterpreter as gcodeInterpreter
+
+PRINTER_PROFILE = dict(axes=dict(x=dict(speed=6000), y=dict(speed=6000)),
+                       extruder=dict(offsets=[(0, 0)]))
+
+
+def result_of(analysis):
+	return dict(estimatedPrintTime=analysis.totalMoveTimeMinute * 60,
+	            filament=[dict(length=length, volume=volume)
+	                      for length, volume in zip(analysis.extrusionAmount, analysis.extrusionVolume)])
+
+
+def results_match(a, b, tolerance=1e-6):
+	def close(x, y):
+		return abs(x - y) <= tolerance * max(1.0, abs(x), abs(y))
+
+	if not close(a["estimatedPrintTime"], b["estimatedPrintTime"]) or len(a["filament"]) != len(b["filament"]):
+		return False
+	return all(close(x["length"], y["length"]) and close(x["volume"], y["volume"])
+	           for x, y in zip(a["filament"], b["filament"]))
+
+
+def run(factory, path, runs):
+	best = None
+	analysis = None
+	for _ in range(runs):
+		analysis = factory()
+		start = time.time()
+		analysis.load(path, PRINTER_PROFILE)
+		duration = time.time() - start
+		best = duration if best is None else min(best, duration)
+	return best, analysis
+
+
+def main():
+	parser = argparse.ArgumentParser(description="Benchmark the GCODE analysis engines against each other")
+	parser.add_argument("--runs", type=int, default=3, help="Number of runs per engine, best one counts")
+	parser.add_argument("--max-extruders", type=int, default=10, help="Value of gcodeAnalysis.maxExtruders")
+	parser.add_argument("files", nargs="+", metavar="FILE")
+	args = parser.parse_args()
+
+	with mock.patch("octoprint.util.gcodeInterpreter.settings") as settings:
+		settings.return_value.getInt.return_value = args.max_extruders
+
+		for path in args.files:
+			size = os.stat(path).st_size / 1024.0 / 1024.0
+
+			legacy_time, legacy = run(gcodeInterpreter.gcode, path, args.runs)
+			chunked_time, chunked = run(gcodeInterpreter.chunkedGcode, path, args.runs)
+
+			print("{} ({:.1f} MB)".format(path, size))
+			print("  gcode:        {:8.3f}s ({:.2f} MB/s)".format(legacy_time, size / legacy_time))
+			print("  chunkedGcode: {:8.3f}s ({:.2f} MB/s)".format(chunked_time, size / chunked_time))
+			print("  speedup:      {:8.2f}x".format(legacy_time / chunked_time))
+			print("  results match: {}".format(results_match(result_of(legacy), result_of(chunked))))
+			print("  printing area: {!r}".format(chunked.printingArea))
+
+
+if __name__ == "__main__":
+	main()
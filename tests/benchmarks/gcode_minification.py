@@ -0,0 +1,70 @@
+#!/usr/bin/env python
+# coding=utf-8
+"""
+Measures how much :class:`~octoprint.filemanager.util.GcodeMinifier` reduces the size of a GCODE file, how long
+minifying it takes and how much transfer time that saves at a given transfer rate to the printer. Optionally verifies
+the minified file through :func:`~octoprint.filemanager.util.verify_minified_gcode`.
+
+Usage::
+
+    python tests/benchmarks/gcode_minification.py [--rate BYTES_PER_SECOND] [--verify] [FILE]
+
+Without a file, the GCODE file bundled with the file manager tests is used.
+"""
+
+from __future__ import absolute_import, print_function
+
+__license__ = 'GNU Affero General Public License http://www.gnu.org/licenses/agpl.html'
+__copyright__ = "Copyright (C) 2016 The OctoPrint Project - Released under terms of the AGPLv3 License"
+
+import argparse
+import os
+import shutil
+import tempfile
+import time
+
+import mock
+
+from octoprint.filemanager.util import minify_gcode_file, verify_minified_gcode
+
+GCODE_PATH = os.path.join(os.path.dirname(os.path.realpath(__file__)), "..", "filemanager", "_files", "bp_case.gcode")
+
+PRINTER_PROFILE = dict(
+	axes=dict(x=dict(speed=6000), y=dict(speed=6000)),
+	extruder=dict(offsets=[(0, 0)])
+)
+
+
+def main():
+	parser = argparse.ArgumentParser(description="Benchmark GCODE minification")
+	parser.add_argument("file", nargs="?", default=GCODE_PATH, help="GCODE file to minify")
+	parser.add_argument("--rate", type=float, default=30000, help="Transfer rate to the printer in bytes per second")
+	parser.add_argument("--verify", action="store_true", help="Verify the moves of the minified file")
+	args = parser.parse_args()
+
+	folder = tempfile.mkdtemp()
+	try:
+		minified_path = os.path.join(folder, "minified.gcode")
+
+		start = time.time()
+		minifier = minify_gcode_file(args.file, minified_path)
+		duration = time.time() - start
+
+		print("{} lines, {} bytes".format(minifier.lines_in, minifier.bytes_in))
+		print("  minified        {:>10} lines {:>10} bytes".format(minifier.lines_out, minifier.bytes_out))
+		print("  saved           {:>10.1f}%".format(100.0 * minifier.saved / minifier.bytes_in))
+		print("  minifying       {:>10.2f}s".format(duration))
+		print("  transfer saved  {:>10.1f}s at {:.0f} bytes/s".format(minifier.saved / args.rate, args.rate))
+
+		if args.verify:
+			with mock.patch("octoprint.util.gcodeInterpreter.settings") as settings:
+				settings.return_value.getInt.return_value = 10
+				start = time.time()
+				verified = verify_minified_gcode(args.file, minified_path, PRINTER_PROFILE)
+			print("  verified        {:>10} in {:.2f}s".format(str(verified), time.time() - start))
+	finally:
+		shutil.rmtree(folder)
+
+
+if __name__ == "__main__":
+	main()
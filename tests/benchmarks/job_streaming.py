@@ -0,0 +1,101 @@
+#!/usr/bin/env python
+# coding=utf-8
+"""
+Measures the per line work of streaming a print job from the host, comparing reading the GCODE file through
+:class:`~octoprint.util.comm.PrintingGcodeFileInformation` against reading the compiled print job through
+:class:`~octoprint.util.comm.PrintingCompiledGcodeFileInformation`. Both include determining the GCODE command and
+the checksum of each line as done by :class:`~octoprint.util.comm.MachineCom` before sending it.
+
+Usage::
+
+    python tests/benchmarks/job_streaming.py [--lines N] [--runs N]
+
+The generated GCODE file resembles a print of tiny segments, with comments and temperature commands in between.
+"""
+
+from __future__ import absolute_import, print_function
+
+__license__ = 'GNU Affero General Public License http://www.gnu.org/licenses/agpl.html'
+__copyright__ = "Copyright (C) 2016 The OctoPrint Project - Released under terms of the AGPLv3 License"
+
+import argparse
+import operator
+import os
+import shutil
+import tempfile
+import time
+
+from octoprint.util.comm import PrintingCompiledGcodeFileInformation, PrintingGcodeFileInformation, \
+	compile_gcode_file, gcode_command_for_cmd
+
+
+def write_gcode(path, lines):
+	with open(path, "wb") as f:
+		f.write("; generated for benchmarking\n")
+		for i in range(lines):
+			if i % 1000 == 0:
+				f.write("M104 S210 ; keep hot\n")
+			elif i % 100 == 0:
+				f.write(";LAYER:{}\n".format(i // 100))
+			f.write("G1 X{:.3f} Y{:.3f} E{:.5f} ; segment\n".format(i % 200 * 0.05, i % 300 * 0.05, i * 0.0001))
+
+
+def stream(file_information):
+	file_information.start()
+	linenumber = 0
+	while True:
+		line, gcode = file_information.getNextCommand()
+		if line is None:
+			break
+		if gcode is None:
+			gcode = gcode_command_for_cmd(line)
+		linenumber += 1
+		command = "N" + str(linenumber) + " " + line.encode("ascii", errors="replace")
+		command += "*" + str(reduce(operator.xor, bytearray(command), 0))
+	return linenumber
+
+
+def measure(factory, runs):
+	best = None
+	lines = 0
+	for _ in range(runs):
+		start = time.time()
+		lines = stream(factory())
+		result = time.time() - start
+		best = result if best is None else min(best, result)
+	return best, lines
+
+
+def main():
+	parser = argparse.ArgumentParser(description="Benchmark streaming print jobs")
+	parser.add_argument("--lines", type=int, default=200000, help="Number of moves in the generated GCODE file")
+	parser.add_argument("--runs", type=int, default=3, help="Number of runs per variant, best one counts")
+	args = parser.parse_args()
+
+	folder = tempfile.mkdtemp()
+	try:
+		path = os.path.join(folder, "benchmark.gcode")
+		job_path = os.path.join(folder, "benchmark.job")
+		write_gcode(path, args.lines)
+
+		start = time.time()
+		compile_gcode_file(path, job_path)
+		print("Compiled in {:.2f}s".format(time.time() - start))
+
+		offsets = lambda: dict(tool0=5)
+		tool = lambda: 0
+		plain, lines = measure(lambda: PrintingGcodeFileInformation(path, offsets_callback=offsets,
+		                                                            current_tool_callback=tool), args.runs)
+		compiled, _ = measure(lambda: PrintingCompiledGcodeFileInformation(path, job_path, offsets_callback=offsets,
+		                                                                   current_tool_callback=tool), args.runs)
+
+		print("{} lines".format(lines))
+		print("  gcode file     {:>10.0f} lines/s".format(lines / plain))
+		print("  compiled job   {:>10.0f} lines/s".format(lines / compiled))
+		print("  speedup        {:>10.1f}x".format(plain / compiled))
+	finally:
+		shutil.rmtree(folder)
+
+
+if __name__ == "__main__":
+	main()
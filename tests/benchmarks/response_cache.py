@@ -0,0 +1,171 @@
+#!/usr/bin/env python
+# coding=utf-8
+"""
+Compares the :class:`~octoprint.server.util.flask.ResponseCache` behind :func:`~octoprint.server.util.flask.cached`
+against the former ``LessSimpleCache``, which pickled every response on storing and unpickled it on every hit.
+
+Usage::
+
+    python tests/benchmarks/response_cache.py [--index-size KB] [--requests N] [--runs N]
+
+Serves two views through :func:`~octoprint.server.util.flask.cached` like OctoPrint's own: an ``index`` view
+returning a rendered page of ``index-size`` kilobytes, with the same ``refreshif`` ETag check as the real index page,
+and a ``robotsTxt`` view sending OctoPrint's ``robots.txt`` from the static folder. Reports the time per cached
+request through Flask's test client and per cache lookup alone.
+"""
+
+from __future__ import absolute_import, print_function
+
+__license__ = 'GNU Affero General Public License http://www.gnu.org/licenses/agpl.html'
+__copyright__ = "Copyright (C) 2016 The OctoPrint Project - Released under terms of the AGPLv3 License"
+
+import argparse
+import functools
+import os
+import pickle
+import shutil
+import tempfile
+import threading
+import time
+
+import flask
+import mock
+from werkzeug.contrib.cache import BaseCache
+
+
+class LessSimpleCache(BaseCache):
+	def __init__(self, threshold=500, default_timeout=300):
+		BaseCache.__init__(self, default_timeout=default_timeout)
+		self._mutex = threading.RLock()
+		self._cache = {}
+		self._threshold = threshold
+
+	def _prune(self):
+		if len(self._cache) > self._threshold:
+			now = time.time()
+			for idx, (key, (expires, _)) in enumerate(self._cache.items()):
+				if expires is not None and expires <= now or idx % 3 == 0:
+					with self._mutex:
+						self._cache.pop(key, None)
+
+	def get(self, key):
+		now = time.time()
+		with self._mutex:
+			expires, value = self._cache.get(key, (0, None))
+		if expires is None or expires > now:
+			return pickle.loads(value)
+
+	def set(self, key, value, timeout=None):
+		with self._mutex:
+			self._prune()
+			self._cache[key] = (None, pickle.dumps(value, pickle.HIGHEST_PROTOCOL))
+
+
+def legacy_cached(cache, refreshif=None):
+	def decorator(f):
+		@functools.wraps(f)
+		def decorated_function(*args, **kwargs):
+			cache_key = "view:%s" % flask.request.path
+			rv = cache.get(cache_key)
+			if rv is not None and (not callable(refreshif) or not refreshif(rv)):
+				if not "X-From-Cache" in rv.headers:
+					rv.headers["X-From-Cache"] = "true"
+				return rv
+
+			rv = f(*args, **kwargs)
+			cache.set(cache_key, rv)
+			return rv
+		return decorated_function
+	return decorator
+
+
+def create_app(decorator, index_size):
+	import octoprint
+
+	page = "<html><body>{}</body></html>".format("x" * index_size)
+	etag = "some-etag"
+
+	app = flask.Flask(__name__, static_folder=os.path.join(os.path.dirname(octoprint.__file__), "static"))
+
+	@app.route("/")
+	@decorator(refreshif=lambda cached: cached.get_etag()[0] != etag)
+	def index():
+		response = flask.make_response(page)
+		response.set_etag(etag)
+		return response
+
+	@app.route("/robots.txt")
+	@decorator()
+	def robotsTxt():
+		return flask.send_from_directory(app.static_folder, "robots.txt")
+
+	return app
+
+
+def measure_requests(app, path, requests, runs):
+	best = None
+	with app.test_client() as client:
+		# fill the cache
+		client.get(path)
+
+		for _ in range(runs):
+			start = time.time()
+			for _ in range(requests):
+				client.get(path)
+			result = (time.time() - start) / requests
+			best = result if best is None else min(best, result)
+	return best
+
+
+def measure_lookups(get, requests, runs):
+	best = None
+	for _ in range(runs):
+		start = time.time()
+		for _ in range(requests):
+			get()
+		result = (time.time() - start) / requests
+		best = result if best is None else min(best, result)
+	return best
+
+
+def main():
+	parser = argparse.ArgumentParser(description="Benchmark the response cache implementations")
+	parser.add_argument("--index-size", type=int, default=200, help="Size of the rendered index page in KB")
+	parser.add_argument("--requests", type=int, default=2000, help="Number of requests per run")
+	parser.add_argument("--runs", type=int, default=3, help="Number of runs per implementation, best one counts")
+	args = parser.parse_args()
+
+	import octoprint.settings
+	import octoprint.server.util.flask as util_flask
+
+	basedir = tempfile.mkdtemp()
+	try:
+		octoprint.settings.settings(init=True, basedir=basedir)
+
+		legacy_cache = LessSimpleCache()
+		legacy_app = create_app(functools.partial(legacy_cached, legacy_cache), args.index_size * 1024)
+
+		cache = util_flask.ResponseCache()
+		with mock.patch("octoprint.server.util.flask._cache", cache):
+			app = create_app(util_flask.cached, args.index_size * 1024)
+
+			print("{}KB index page, {} requests per run".format(args.index_size, args.requests))
+			print("                       LessSimpleCache   ResponseCache   speedup")
+			for view, path in (("index", "/"), ("robotsTxt", "/robots.txt")):
+				old = measure_requests(legacy_app, path, args.requests, args.runs)
+				new = measure_requests(app, path, args.requests, args.runs)
+				print("  {:<9} request  {:>13.1f}us {:>13.1f}us {:>8.1f}x".format(view, old * 1e6, new * 1e6, old / new))
+
+			key = "view:/"
+			with app.test_request_context():
+				old = measure_lookups(lambda: legacy_cache.get(key), args.requests, args.runs)
+				new = measure_lookups(lambda: cache.get(key).to_response(), args.requests, args.runs)
+			print("  {:<9} lookup   {:>13.1f}us {:>13.1f}us {:>8.1f}x".format("index", old * 1e6, new * 1e6, old / new))
+
+			print("ResponseCache stats: {!r}".format(cache.stats()))
+	finally:
+		shutil.rmtree(basedir)
+
+
+if __name__ == "__main__":
+	main()
@@ -0,0 +1,136 @@
+#!/usr/bin/env python
+# coding=utf-8
+"""
+Measures the line rate of host-streamed prints through :class:`~octoprint.util.comm.MachineCom` against the bundled
+virtual printer plugin's ``VirtualPrinter``, comparing the default mode of waiting for the ``ok`` of every command with
+the windowed send mode (``serial.sendWindow``).
+
+Usage::
+
+    python tests/benchmarks/send_window.py [--lines N] [--latency MS] [--window N] [--rx-buffer N]
+
+The printed GCODE file consists of tiny moves, every response of the virtual printer is delayed by ``latency``
+milliseconds to simulate the round trip of a USB link. The virtual printer requests some resends during each print,
+so resend handling is part of the measurement.
+"""
+
+from __future__ import absolute_import, print_function
+
+__license__ = 'GNU Affero General Public License http://www.gnu.org/licenses/agpl.html'
+__copyright__ = "Copyright (C) 2016 The OctoPrint Project - Released under terms of the AGPLv3 License"
+
+import argparse
+import os
+import shutil
+import sys
+import tempfile
+import threading
+import time
+
+import mock
+
+
+def write_gcode(path, lines):
+	with open(path, "wb") as f:
+		f.write("G91\n")
+		for i in range(lines):
+			f.write("G1 X0.01 Y0.01 E0.0005\n")
+
+
+class Callback(object):
+
+	def __init__(self):
+		self.operational = threading.Event()
+		self.done = threading.Event()
+
+	def on_comm_state_change(self, state):
+		from octoprint.util.comm import MachineCom
+		if state == MachineCom.STATE_OPERATIONAL:
+			self.operational.set()
+
+	def on_comm_print_job_done(self):
+		self.done.set()
+
+	def __getattr__(self, item):
+		return lambda *args, **kwargs: None
+
+
+def measure(path, lines):
+	from octoprint.util.comm import MachineCom
+	from virtual_printer.virtual import VirtualPrinter
+
+	profile = dict(heatedBed=False, extruder=dict(count=1))
+	printer_profile_manager = mock.MagicMock()
+	printer_profile_manager.get_current_or_default.return_value = profile
+
+	callback = Callback()
+	with mock.patch.object(MachineCom, "_openSerial", autospec=True) as open_serial:
+		def create_virtual_printer(comm):
+			comm._serial = VirtualPrinter(read_timeout=1.0)
+			return True
+		open_serial.side_effect = create_virtual_printer
+
+		comm = MachineCom(port="VIRTUAL", baudrate=115200, callbackObject=callback,
+		                  printerProfileManager=printer_profile_manager)
+
+		# MachineCom doesn't start its threads itself in this tree
+		comm._monitoring_active = True
+		comm._send_queue_active = True
+		for target, name in ((comm._monitor, "comm._monitor"), (comm._send_loop, "comm.sending_thread")):
+			thread = threading.Thread(target=target, name=name)
+			thread.daemon = True
+			thread.start()
+
+		try:
+			if not callback.operational.wait(10):
+				raise RuntimeError("Virtual printer did not become operational")
+
+			comm.selectFile(path, False)
+			start = time.time()
+			comm.startPrint()
+			if not callback.done.wait(600):
+				raise RuntimeError("Print did not finish")
+			return lines / (time.time() - start)
+		finally:
+			comm.close()
+
+
+def main():
+	parser = argparse.ArgumentParser(description="Benchmark streaming prints with and without send window")
+	parser.add_argument("--lines", type=int, default=2000, help="Number of moves in the printed GCODE file")
+	parser.add_argument("--latency", type=float, default=2.0, help="Simulated latency per response in milliseconds")
+	parser.add_argument("--window", type=int, default=4, help="Maximum commands in flight in windowed send mode")
+	parser.add_argument("--rx-buffer", type=int, default=127, help="Receive buffer size of the virtual printer")
+	args = parser.parse_args()
+
+	import octoprint.settings
+	import octoprint.plugin
+
+	basedir = tempfile.mkdtemp()
+	try:
+		s = octoprint.settings.settings(init=True, basedir=basedir)
+		s.setFloat(["devel", "virtualPrinter", "latency"], args.latency / 1000.0)
+		s.setInt(["devel", "virtualPrinter", "rxBuffer"], args.rx_buffer)
+		s.setInt(["devel", "virtualPrinter", "commandBuffer"], 16)
+		s.setBoolean(["feature", "waitForStartOnConnect"], True)
+		s.setFloat(["serial", "timeout", "communication"], 1.0)
+		s.setInt(["serial", "sendWindow", "bufferSize"], args.rx_buffer)
+		s.setInt(["serial", "sendWindow", "maxCommands"], args.window)
+
+		octoprint.plugin.plugin_manager(init=True, plugin_folders=[], plugin_entry_points=[])
+		sys.path.insert(0, os.path.join(os.path.dirname(octoprint.__file__), "plugins"))
+
+		path = os.path.join(basedir, "benchmark.gcode")
+		write_gcode(path, args.lines)
+
+		print("{} lines, {:.1f}ms latency".format(args.lines, args.latency))
+		with mock.patch("virtual_printer.virtual.plugin_manager"):
+			for label, enabled in (("ok per command", False), ("send window", True)):
+				s.setBoolean(["serial", "sendWindow", "enabled"], enabled)
+				print("  {:<16} {:>8.0f} lines/s".format(label, measure(path, args.lines)))
+	finally:
+		shutil.rmtree(basedir)
+
+
+if __name__ == "__main__":
+	main()
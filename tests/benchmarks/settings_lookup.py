@@ -0,0 +1,82 @@
+#!/usr/bin/env python
+# coding=utf-8
+"""
+Measures get-heavy settings workloads, comparing uncached lookups through the nested configuration and default
+dictionaries against the versioned lookup cache of :class:`~octoprint.settings.Settings` and getters created
+through :func:`~octoprint.settings.Settings.accessor`.
+
+Usage::
+
+    python tests/benchmarks/settings_lookup.py [--lookups N] [--runs N]
+
+The workloads resemble the settings access on hot paths: the checks of the ``restricted_access`` decorator on every
+API request, ``gcodeAnalysis.maxExtruders`` for tool changes during analysis and the default printer profile.
+"""
+
+from __future__ import absolute_import, print_function
+
+__license__ = 'GNU Affero General Public License http://www.gnu.org/licenses/agpl.html'
+__copyright__ = "Copyright (C) 2016 The OctoPrint Project - Released under terms of the AGPLv3 License"
+
+import argparse
+import shutil
+import tempfile
+import time
+
+import mock
+
+from octoprint.settings import Settings
+
+
+WORKLOADS = (
+	("restricted_access", ((["server", "firstRun"], bool), (["accessControl", "enabled"], bool))),
+	("maxExtruders", ((["gcodeAnalysis", "maxExtruders"], int),)),
+	("default profile", ((["printerProfiles", "default"], None),)),
+)
+
+
+def getter(s, path, type):
+	return {int: s.getInt, float: s.getFloat, bool: s.getBoolean}.get(type, s.get)
+
+
+def measure(functions, lookups, runs):
+	best = None
+	for _ in range(runs):
+		start = time.time()
+		for _ in range(lookups):
+			for f in functions:
+				f()
+		result = (time.time() - start) / lookups
+		best = result if best is None else min(best, result)
+	return best
+
+
+def main():
+	parser = argparse.ArgumentParser(description="Benchmark settings lookups")
+	parser.add_argument("--lookups", type=int, default=100000, help="Number of lookups per run and workload")
+	parser.add_argument("--runs", type=int, default=3, help="Number of runs per variant, best one counts")
+	args = parser.parse_args()
+
+	basedir = tempfile.mkdtemp()
+	try:
+		s = Settings(basedir=basedir)
+
+		print("{} lookups per run".format(args.lookups))
+		print("                      uncached     cached   accessor   speedup")
+		for label, paths in WORKLOADS:
+			gets = [(lambda get=getter(s, path, type), path=path: get(list(path))) for path, type in paths]
+			accessors = [s.accessor(path, type=type) for path, type in paths]
+
+			with mock.patch.object(s, "_lookup_key", return_value=None):
+				uncached = measure(gets, args.lookups, args.runs)
+			cached = measure(gets, args.lookups, args.runs)
+			accessed = measure(accessors, args.lookups, args.runs)
+
+			print("  {:<17} {:>8.2f}us {:>8.2f}us {:>8.2f}us {:>8.1f}x".format(label, uncached * 1e6, cached * 1e6,
+			                                                                  accessed * 1e6, uncached / accessed))
+	finally:
+		shutil.rmtree(basedir)
+
+
+if __name__ == "__main__":
+	main()
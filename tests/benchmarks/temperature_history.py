@@ -0,0 +1,106 @@
+#!/usr/bin/env python
+# coding=utf-8
+"""
+Compares the ring buffer based :class:`~octoprint.printer.standard.TemperatureHistory` against the former
+implementation on top of :class:`~octoprint.util.InvariantContainer`, which sorted and filtered the whole history on
+every append.
+
+Usage::
+
+    python tests/benchmarks/temperature_history.py [--cutoff SECONDS] [--interval SECONDS] [--appends N] [--runs N]
+
+Simulates ``N`` temperature samples taken every ``interval`` seconds with a history window of ``cutoff`` seconds and
+reports the time per append, per retrieval of the full history (initial state update) and per retrieval of the most
+recent 300 entries (``/api/printer?history=true``).
+"""
+
+from __future__ import absolute_import, print_function
+
+__license__ = 'GNU Affero General Public License http://www.gnu.org/licenses/agpl.html'
+__copyright__ = "Copyright (C) 2016 The OctoPrint Project - Released under terms of the AGPLv3 License"
+
+import argparse
+import time
+
+import mock
+
+from octoprint.printer.standard import TemperatureHistory
+from octoprint.util import InvariantContainer
+
+
+class InvariantContainerTemperatureHistory(InvariantContainer):
+	def __init__(self, cutoff=30 * 60):
+
+		def temperature_invariant(data):
+			data.sort(key=lambda x: x["time"])
+			now = int(time.time())
+			return [item for item in data if item["time"] >= now - cutoff]
+
+		InvariantContainer.__init__(self, guarantee_invariant=temperature_invariant)
+
+
+class Clock(object):
+	def __init__(self, start):
+		self.now = start
+
+	def time(self):
+		return self.now
+
+
+def sample(t):
+	return dict(time=t, tool0=dict(actual=210.0, target=210.0), bed=dict(actual=60.0, target=60.0))
+
+
+def measure(factory, cutoff, interval, appends, runs):
+	best = None
+	for _ in range(runs):
+		clock = Clock(0)
+		with mock.patch("time.time", clock.time):
+			history = factory(cutoff=cutoff)
+
+			start = time.clock()
+			for i in range(appends):
+				clock.now = i * interval
+				history.append(sample(int(clock.now)))
+			append = (time.clock() - start) / appends
+
+			start = time.clock()
+			for _ in range(100):
+				if isinstance(history, TemperatureHistory):
+					history[:]
+				else:
+					list(history)
+			full = (time.clock() - start) / 100
+
+			start = time.clock()
+			for _ in range(100):
+				if isinstance(history, TemperatureHistory):
+					history[-300:]
+				else:
+					list(history)[-300:]
+			recent = (time.clock() - start) / 100
+
+		result = (append, full, recent)
+		best = result if best is None else tuple(map(min, best, result))
+	return best
+
+
+def main():
+	parser = argparse.ArgumentParser(description="Benchmark the temperature history implementations")
+	parser.add_argument("--cutoff", type=int, default=30 * 60, help="History window in seconds")
+	parser.add_argument("--interval", type=float, default=1.0, help="Seconds between two samples")
+	parser.add_argument("--appends", type=int, default=5000, help="Number of samples to append")
+	parser.add_argument("--runs", type=int, default=3, help="Number of runs per implementation, best one counts")
+	args = parser.parse_args()
+
+	legacy = measure(InvariantContainerTemperatureHistory, args.cutoff, args.interval, args.appends, args.runs)
+	ring = measure(TemperatureHistory, args.cutoff, args.interval, args.appends, args.runs)
+
+	print("{} samples every {}s, {}s window".format(args.appends, args.interval, args.cutoff))
+	print("                   InvariantContainer   RingBuffer   speedup")
+	for label, old, new in zip(("append", "full history", "last 300"), legacy, ring):
+		print("  {:<15} {:>14.1f}us {:>10.1f}us {:>8.1f}x".format(label, old * 1e6, new * 1e6, old / new))
+
+
+if __name__ == "__main__":
+	main()
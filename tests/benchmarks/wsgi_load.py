@@ -0,0 +1,175 @@
+#!/usr/bin/env python
+# coding=utf-8
+"""
+Load test for :class:`~octoprint.server.util.tornado.WsgiInputContainer`, comparing processing requests on the IOLoop
+against processing them in worker threads.
+
+Usage::
+
+    python tests/benchmarks/wsgi_load.py [--clients N] [--printer-clients N] [--duration SECONDS] [--usb-latency MS] [--workers N]
+
+Serves a small Flask application through the same handler chain as OctoPrint's server. ``/api/printer/temperature``
+sends ``M105`` to the bundled virtual printer plugin's ``VirtualPrinter`` and waits for the answer,
+adding ``usb-latency`` milliseconds to simulate a slow USB transfer. ``/api/version`` is a cheap endpoint. While
+``printer-clients`` clients keep querying the printer, ``clients`` clients keep querying the cheap endpoint, and the
+latencies of both as seen by the clients are reported, once with all requests being processed on the IOLoop and once
+with ``workers`` worker threads and the printer endpoint limited to one concurrent request.
+"""
+
+from __future__ import absolute_import, print_function
+
+__license__ = 'GNU Affero General Public License http://www.gnu.org/licenses/agpl.html'
+__copyright__ = "Copyright (C) 2016 The OctoPrint Project - Released under terms of the AGPLv3 License"
+
+import argparse
+import httplib
+import os
+import shutil
+import socket
+import sys
+import tempfile
+import threading
+import time
+
+import mock
+
+
+def create_app(usb_latency):
+	import flask
+	from virtual_printer.virtual import VirtualPrinter
+
+	printer = VirtualPrinter()
+	printer_lock = threading.Lock()
+
+	# consume the virtual printer's start up messages
+	while printer.readline().strip() != "SD card ok":
+		pass
+
+	app = flask.Flask(__name__)
+
+	@app.route("/api/version")
+	def version():
+		return flask.jsonify(api="0.1", server="1.2.0")
+
+	@app.route("/api/printer/temperature")
+	def temperature():
+		with printer_lock:
+			time.sleep(usb_latency)
+			printer.write("M105\n")
+			while True:
+				line = printer.readline().strip()
+				if line.startswith("ok"):
+					break
+		return flask.jsonify(line=line)
+
+	return app, printer
+
+
+def serve(app, workers):
+	import tornado.httpserver
+	import tornado.ioloop
+	import tornado.web
+	from octoprint.server.util.tornado import UploadStorageFallbackHandler, WsgiInputContainer
+
+	container = WsgiInputContainer(app.wsgi_app, workers=workers, limits=[("/api/printer/", 1)])
+	application = tornado.web.Application([(r".*", UploadStorageFallbackHandler, dict(fallback=container))])
+
+	sock = socket.socket()
+	sock.bind(("127.0.0.1", 0))
+	port = sock.getsockname()[1]
+	sock.close()
+
+	io_loop = tornado.ioloop.IOLoop()
+	started = threading.Event()
+
+	def run():
+		io_loop.make_current()
+		server = tornado.httpserver.HTTPServer(application)
+		server.listen(port, address="127.0.0.1")
+		io_loop.add_callback(started.set)
+		io_loop.start()
+		server.stop()
+
+	thread = threading.Thread(target=run)
+	thread.daemon = True
+	thread.start()
+	started.wait()
+
+	return port, io_loop, thread
+
+
+def client(port, path, until, latencies):
+	while time.time() < until:
+		start = time.time()
+		# the server closes the connection after each response, so no keep-alive here
+		connection = httplib.HTTPConnection("127.0.0.1", port)
+		connection.request("GET", path)
+		connection.getresponse().read()
+		connection.close()
+		latencies.append(time.time() - start)
+
+
+def percentile(values, p):
+	if not values:
+		return float("nan")
+	values = sorted(values)
+	return values[min(int(len(values) * p), len(values) - 1)]
+
+
+def run(app, workers, args):
+	port, io_loop, thread = serve(app, workers)
+
+	until = time.time() + args.duration
+	fast, slow = [], []
+	clients = [threading.Thread(target=client, args=(port, "/api/version", until, fast)) for _ in range(args.clients)]
+	clients += [threading.Thread(target=client, args=(port, "/api/printer/temperature", until, slow)) for _ in range(args.printer_clients)]
+	for c in clients:
+		c.start()
+	for c in clients:
+		c.join()
+
+	io_loop.add_callback(io_loop.stop)
+	thread.join()
+
+	return fast, slow
+
+
+def main():
+	parser = argparse.ArgumentParser(description="Load test the WSGI container against a virtual printer")
+	parser.add_argument("--clients", type=int, default=20, help="Number of clients querying the cheap endpoint")
+	parser.add_argument("--printer-clients", type=int, default=4, help="Number of clients querying the printer")
+	parser.add_argument("--duration", type=float, default=5.0, help="Duration of each run in seconds")
+	parser.add_argument("--usb-latency", type=float, default=50, help="Simulated USB latency per printer query in ms")
+	parser.add_argument("--workers", type=int, default=8, help="Number of worker threads for the threaded run")
+	args = parser.parse_args()
+
+	import octoprint.settings
+
+	basedir = tempfile.mkdtemp()
+	try:
+		octoprint.settings.settings(init=True, basedir=basedir)
+		# bundled plugins are no regular package but loaded from the plugin folder
+		import octoprint
+		sys.path.insert(0, os.path.join(os.path.dirname(octoprint.__file__), "plugins"))
+
+		with mock.patch("virtual_printer.virtual.plugin_manager"):
+			app, printer = create_app(args.usb_latency / 1000.0)
+
+		print("{} clients on /api/version, {} clients on /api/printer/temperature ({}ms USB latency), {}s per run".format(args.clients, args.printer_clients, args.usb_latency, args.duration))
+		print("                          requests/s      p50       p95       max")
+		for label, workers in (("IOLoop", 0), ("{} workers".format(args.workers), args.workers)):
+			fast, slow = run(app, workers, args)
+			for endpoint, latencies in (("version", fast), ("printer", slow)):
+				print("  {:<11} {:<9} {:>10.1f} {:>7.1f}ms {:>7.1f}ms {:>7.1f}ms".format(label, endpoint,
+				                                                                 len(latencies) / args.duration,
+				                                                                 percentile(latencies, 0.5) * 1000,
+				                                                                 percentile(latencies, 0.95) * 1000,
+				                                                                 max(latencies or [float("nan")]) * 1000))
+
+		printer.close()
+	finally:
+		shutil.rmtree(basedir)
+
+
+if __name__ == "__main__":
+	main()
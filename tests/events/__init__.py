@@ -0,0 +1,9 @@
+# coding=utf-8
+"""
+Unit tests for ``octoprint.events``.
+"""
+
+from __future__ import absolute_import
+
+__license__ = 'GNU Affero General Public License http://www.gnu.org/licenses/agpl.html'
+__copyright__ = "Copyright (C) 2016 The OctoPrint Project - Released under terms of the AGPLv3 License"
@@ -0,0 +1,173 @@
+# coding=utf-8
+from __future__ import absolute_import
+
+__license__ = 'GNU Affero General Public License http://www.gnu.org/licenses/agpl.html'
+__copyright__ = "Copyright (C) 2016 The OctoPrint Project - Released under terms of the AGPLv3 License"
+
+
+import threading
+import time
+import unittest
+
+import mock
+
+from octoprint.events import EventManager, Events
+
+
+class EventManagerTest(unittest.TestCase):
+
+	def setUp(self):
+		self.plugin_manager_patcher = mock.patch("octoprint.plugin.plugin_manager")
+		plugin_manager = self.plugin_manager_patcher.start()
+		self.plugins = []
+		plugin_manager.return_value.get_implementation_methods.side_effect = \
+			lambda method, *types: [(plugin, getattr(plugin, method)) for plugin in self.plugins]
+
+		self.event_manager = EventManager(workers=4, coalesce=[Events.UPDATED_FILES])
+
+	def tearDown(self):
+		self.plugin_manager_patcher.stop()
+
+	def _wait_idle(self, timeout=5.0):
+		until = time.time() + timeout
+		while time.time() < until:
+			metrics = self.event_manager.get_metrics()
+			if metrics["queued"] == 0 and not any(l["pending"] for l in metrics["listeners"].values()) \
+					and not self.event_manager._subscribers:
+				return
+			time.sleep(0.01)
+		self.fail("Events were not delivered in time")
+
+	def test_order_per_subscriber(self):
+		received = []
+		self.event_manager.subscribe(Events.Z_CHANGE, lambda event, payload: received.append(payload))
+
+		for z in range(100):
+			self.event_manager.fire(Events.Z_CHANGE, dict(new=z))
+		self._wait_idle()
+
+		self.assertEquals([dict(new=z) for z in range(100)], received)
+
+	def test_order_per_object(self):
+		received = []
+
+		class Listener(object):
+			def on_opened(self, event, payload):
+				time.sleep(0.05)
+				received.append(event)
+
+			def on_closed(self, event, payload):
+				received.append(event)
+
+		listener = Listener()
+		self.event_manager.subscribe(Events.CLIENT_OPENED, listener.on_opened)
+		self.event_manager.subscribe(Events.CLIENT_CLOSED, listener.on_closed)
+
+		self.event_manager.fire(Events.CLIENT_OPENED, dict(remoteAddress="127.0.0.1"))
+		self.event_manager.fire(Events.CLIENT_CLOSED, dict(remoteAddress="127.0.0.1"))
+		self._wait_idle()
+
+		self.assertEquals([Events.CLIENT_OPENED, Events.CLIENT_CLOSED], received)
+
+	def test_slow_subscriber_does_not_block_others(self):
+		release = threading.Event()
+		fast_received = threading.Event()
+
+		self.event_manager.subscribe(Events.PRINT_DONE, lambda event, payload: release.wait(5.0))
+		self.event_manager.subscribe(Events.PRINT_DONE, lambda event, payload: fast_received.set())
+
+		self.event_manager.fire(Events.PRINT_DONE, dict(file="test.gcode"))
+
+		self.assertTrue(fast_received.wait(2.0))
+		self.assertFalse(release.is_set())
+		release.set()
+		self._wait_idle()
+
+	def test_plugins_receive_events(self):
+		plugin = mock.MagicMock()
+		plugin._identifier = "some_plugin"
+		self.plugins.append(plugin)
+
+		self.event_manager.fire(Events.PRINT_DONE, dict(file="test.gcode"))
+		self._wait_idle()
+
+		plugin.on_event.assert_called_once_with(Events.PRINT_DONE, dict(file="test.gcode"))
+		self.assertEquals(1, self.event_manager.get_metrics()["listeners"]["some_plugin"]["calls"])
+
+	def test_coalesce(self):
+		release = threading.Event()
+		received = []
+
+		def listener(event, payload):
+			release.wait(5.0)
+			received.append(payload)
+
+		self.event_manager.subscribe(Events.UPDATED_FILES, listener)
+
+		for _ in range(10):
+			self.event_manager.fire(Events.UPDATED_FILES, dict(type="folder"))
+		self.event_manager.fire(Events.UPDATED_FILES, dict(type="other"))
+
+		time.sleep(0.1)
+		release.set()
+		self._wait_idle()
+
+		# the first one was already being delivered, the following identical ones were coalesced into one
+		self.assertEquals([dict(type="folder"), dict(type="folder"), dict(type="other")], received)
+		self.assertEquals(8, self.event_manager.get_metrics()["listeners"][__name__ + ".listener"]["coalesced"])
+
+	def test_not_coalesced(self):
+		received = []
+		release = threading.Event()
+
+		def listener(event, payload):
+			release.wait(5.0)
+			received.append(payload)
+
+		self.event_manager.subscribe(Events.Z_CHANGE, listener)
+		for _ in range(3):
+			self.event_manager.fire(Events.Z_CHANGE, dict(new=1.0))
+
+		time.sleep(0.1)
+		release.set()
+		self._wait_idle()
+
+		self.assertEquals(3, len(received))
+
+	def test_legacy_updated_files(self):
+		received = []
+		self.event_manager.subscribe(Events.UPDATED_FILES, lambda event, payload: received.append(payload))
+
+		payload = dict(type="printables")
+		self.event_manager.fire(Events.UPDATED_FILES, payload)
+		self._wait_idle()
+
+		self.assertEquals([dict(type="printables"), dict(type="gcode")], received)
+		self.assertEquals(dict(type="printables"), payload)
+
+	def test_exception_in_listener(self):
+		received = []
+		self.event_manager.subscribe(Events.PRINT_DONE, mock.MagicMock(side_effect=ValueError(), __name__="failing"))
+		self.event_manager.subscribe(Events.PRINT_DONE, lambda event, payload: received.append(payload))
+
+		self.event_manager.fire(Events.PRINT_DONE, None)
+		self.event_manager.fire(Events.PRINT_DONE, None)
+		self._wait_idle()
+
+		self.assertEquals([None, None], received)
+
+	def test_metrics(self):
+		class Listener(object):
+			def on_event(self, event, payload):
+				time.sleep(0.05)
+
+		self.event_manager.subscribe(Events.PRINT_DONE, Listener().on_event)
+		self.event_manager.fire(Events.PRINT_DONE, None)
+		self.event_manager.fire(Events.PRINT_DONE, None)
+		self._wait_idle()
+
+		metrics = self.event_manager.get_metrics()["listeners"]["Listener.on_event"]
+		self.assertEquals(2, metrics["calls"])
+		self.assertEquals(0, metrics["pending"])
+		self.assertGreaterEqual(metrics["duration"]["max"], 0.05)
+		self.assertGreaterEqual(metrics["delay"]["max"], 0.04)
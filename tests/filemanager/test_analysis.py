@@ -0,0 +1,282 @@
+# coding=utf-8
+from __future__ import absolute_import
+
+__license__ = 'GNU Affero General Public License http://www.gnu.org/licenses/agpl.html'
+__copyright__ = "Copyright (C) 2016 The OctoPrint Project - Released under terms of the AGPLv3 License"
+
+import threading
+import time
+import unittest
+
+import mock
+from ddt import ddt, data, unpack
+
+from octoprint.filemanager.analysis import CpuBudget
+
+@ddt
+class CpuBudgetTest(unittest.TestCase):
+
+	@data(
+		(0.5, 0.1, False, 0.5),
+		(0.5, 0.1, True, 0.1),
+		(2.0, 0.0, False, 1.0),
+		(2.0, 0.0, True, CpuBudget.MIN_SHARE)
+	)
+	@unpack
+	def test_share(self, idle, busy, is_busy, expected):
+		budget = CpuBudget(idle_share=idle, busy_share=busy)
+		budget.set_busy(is_busy)
+		self.assertEquals(expected, budget.share)
+
+	@data(
+		(0.5, 0.04, None),     # still within the slice share
+		(0.5, 0.2, 0.2),       # worked 0.2s at 50% => sleep 0.2s
+		(0.25, 0.1, 0.3),      # worked 0.1s at 25% => sleep 0.3s
+		(1.0, 10.0, None)      # unthrottled
+	)
+	@unpack
+	def test_throttle(self, share, worked, expected_sleep):
+		budget = CpuBudget(idle_share=share, time_slice=0.1)
+		budget._condition = mock.MagicMock()
+
+		with mock.patch("octoprint.filemanager.analysis.time") as mock_time:
+			mock_time.time.return_value = 100.0
+			budget.start()
+			mock_time.time.return_value = 100.0 + worked
+			budget.throttle()
+
+		if expected_sleep is None:
+			self.assertFalse(budget._condition.wait.called)
+		else:
+			self.assertEquals(1, budget._condition.wait.call_count)
+			self.assertAlmostEquals(expected_sleep, budget._condition.wait.call_args[0][0])
+
+	def test_wakeup_on_idle(self):
+		budget = CpuBudget(idle_share=1.0, busy_share=0.01, time_slice=0.1)
+		budget.set_busy(True)
+
+		with mock.patch("octoprint.filemanager.analysis.time") as mock_time:
+			mock_time.time.return_value = 0.0
+			budget.start()
+			mock_time.time.return_value = 10.0
+
+			# would sleep for 990s if not woken up
+			thread = threading.Thread(target=budget.throttle)
+			thread.daemon = True
+			thread.start()
+
+			time.sleep(0.1)
+			budget.set_busy(False)
+			thread.join(5.0)
+
+		self.assertFalse(thread.is_alive())
+
+
+class GcodeAnalysisQueueTestMixin(object):
+
+	def setUp(self):
+		import os
+
+		self.settings_patcher = mock.patch("octoprint.filemanager.analysis.settings")
+		settings_getter = self.settings_patcher.start()
+		settings_getter.return_value.get.return_value = "chunked"
+		settings_getter.return_value.getBoolean.return_value = False
+
+		self.interpreter_settings_patcher = mock.patch("octoprint.util.gcodeInterpreter.settings")
+		settings_getter = self.interpreter_settings_patcher.start()
+		settings_getter.return_value.getInt.return_value = 10
+
+		self.event_manager_patcher = mock.patch("octoprint.filemanager.analysis.eventManager")
+		self.event_manager_patcher.start()
+
+		self.path = os.path.join(os.path.dirname(os.path.realpath(__file__)), "_files", "bp_case.gcode")
+		self.printer_profile = dict(axes=dict(x=dict(speed=6000), y=dict(speed=6000)),
+		                            extruder=dict(offsets=[(0, 0)]))
+
+		self.finished = []
+		self.finished_condition = threading.Condition()
+
+	def tearDown(self):
+		self.settings_patcher.stop()
+		self.interpreter_settings_patcher.stop()
+		self.event_manager_patcher.stop()
+
+	def _on_finished(self, entry, result):
+		with self.finished_condition:
+			self.finished.append((entry, result))
+			self.finished_condition.notify_all()
+
+	def _wait_for_finished(self, count, timeout=30.0):
+		deadline = time.time() + timeout
+		with self.finished_condition:
+			while len(self.finished) < count and time.time() < deadline:
+				self.finished_condition.wait(0.1)
+		return len(self.finished) >= count
+
+	def _entry(self, name):
+		from octoprint.filemanager.analysis import QueueEntry
+		return QueueEntry(name, "gcode", "local", self.path, self.printer_profile)
+
+
+class GcodeAnalysisQueueTest(GcodeAnalysisQueueTestMixin, unittest.TestCase):
+
+	def test_abort(self):
+		from octoprint.filemanager.analysis import GcodeAnalysisQueue
+
+		# low priority entries get throttled down to 1%, which leaves plenty of time to abort
+		queue = GcodeAnalysisQueue(self._on_finished, budget=CpuBudget(idle_share=0.01))
+		slow = self._entry("slow.gcode")
+		queue.enqueue(slow, high_priority=False)
+
+		deadline = time.time() + 10.0
+		while queue._current is None and time.time() < deadline:
+			time.sleep(0.05)
+
+		self.assertFalse(queue.abort(slow.location, "other.gcode"))
+		self.assertTrue(queue.abort(slow.location, slow.path))
+
+		queue.enqueue(self._entry("fast.gcode"), high_priority=True)
+		self.assertTrue(self._wait_for_finished(1))
+		self.assertEquals(["fast.gcode"], [entry.path for entry, _ in self.finished])
+
+		# the aborted entry is not analyzed again
+		deadline = time.time() + 10.0
+		while queue._queue.unfinished_tasks and time.time() < deadline:
+			time.sleep(0.05)
+		self.assertEquals(0, queue._queue.unfinished_tasks)
+		self.assertIsNone(queue._current)
+		self.assertEquals(1, len(self.finished))
+
+
+class ProcessPoolGcodeAnalysisQueueTest(GcodeAnalysisQueueTestMixin, unittest.TestCase):
+
+	def test_parallel_analysis(self):
+		from octoprint.filemanager.analysis import ProcessPoolGcodeAnalysisQueue
+
+		queue = ProcessPoolGcodeAnalysisQueue(self._on_finished, workers=3)
+		for i in range(4):
+			queue.enqueue(self._entry("file{}.gcode".format(i)), high_priority=True)
+
+		self.assertTrue(self._wait_for_finished(4))
+		self.assertEquals(set("file{}.gcode".format(i) for i in range(4)), set(entry.path for entry, _ in self.finished))
+		for _, result in self.finished:
+			self.assertAlmostEquals(63.40111477582754 * 60, result["estimatedPrintTime"])
+			self.assertAlmostEquals(1407.434510000002, result["filament"]["tool0"]["length"])
+			self.assertEquals(56416, result["analysisStats"]["lines"])
+
+	def test_abort_single_worker(self):
+		from octoprint.filemanager.analysis import ProcessPoolGcodeAnalysisQueue
+
+		# low priority entries get throttled down to 1%, which leaves plenty of time to abort
+		queue = ProcessPoolGcodeAnalysisQueue(self._on_finished, budget=CpuBudget(idle_share=0.01), workers=2)
+		slow = self._entry("slow.gcode")
+		queue.enqueue(slow, high_priority=False)
+
+		deadline = time.time() + 10.0
+		while not queue._jobs and time.time() < deadline:
+			time.sleep(0.05)
+		queue.enqueue(self._entry("fast.gcode"), high_priority=True)
+
+		self.assertTrue(queue.abort(slow.location, slow.path))
+		self.assertTrue(self._wait_for_finished(1))
+		self.assertEquals(["fast.gcode"], [entry.path for entry, _ in self.finished])
+
+		time.sleep(0.5)
+		self.assertEquals(1, len(self.finished))
+		self.assertEquals(dict(), queue._jobs)
+
+
+class AnalysisResultCacheTest(unittest.TestCase):
+
+	def setUp(self):
+		import tempfile
+		import os
+
+		self.folder = tempfile.mkdtemp()
+		self.path = os.path.join(self.folder, "analysis_cache.yaml")
+
+		self.profile = dict(axes=dict(x=dict(speed=6000), y=dict(speed=6000)), extruder=dict(offsets=[(0, 0)]))
+
+	def tearDown(self):
+		import shutil
+		shutil.rmtree(self.folder)
+
+	def test_get_put(self):
+		from octoprint.filemanager.analysis import AnalysisResultCache
+
+		cache = AnalysisResultCache(self.path, save_delay=0)
+		self.assertIsNone(cache.get("abc", self.profile))
+
+		cache.put("abc", self.profile, dict(estimatedPrintTime=100))
+		self.assertEquals(dict(estimatedPrintTime=100), cache.get("abc", self.profile))
+
+	def test_profile_parameters(self):
+		from octoprint.filemanager.analysis import AnalysisResultCache
+
+		cache = AnalysisResultCache(self.path, save_delay=0)
+		cache.put("abc", self.profile, dict(estimatedPrintTime=100))
+
+		# a different name doesn't matter for the analysis...
+		renamed = dict(self.profile, name="Renamed")
+		self.assertEquals(dict(estimatedPrintTime=100), cache.get("abc", renamed))
+
+		# ... but a different speed does
+		faster = dict(self.profile, axes=dict(x=dict(speed=9000), y=dict(speed=9000)))
+		self.assertIsNone(cache.get("abc", faster))
+
+	def test_lru_eviction(self):
+		from octoprint.filemanager.analysis import AnalysisResultCache
+
+		cache = AnalysisResultCache(self.path, max_entries=2, save_delay=0)
+		cache.put("a", self.profile, dict(estimatedPrintTime=1))
+		cache.put("b", self.profile, dict(estimatedPrintTime=2))
+
+		# touch a, making b the least recently used entry
+		cache.get("a", self.profile)
+		cache.put("c", self.profile, dict(estimatedPrintTime=3))
+
+		self.assertEquals(2, len(cache))
+		self.assertIsNone(cache.get("b", self.profile))
+		self.assertIsNotNone(cache.get("a", self.profile))
+		self.assertIsNotNone(cache.get("c", self.profile))
+
+	def test_persistence(self):
+		from octoprint.filemanager.analysis import AnalysisResultCache
+
+		cache = AnalysisResultCache(self.path, save_delay=0)
+		cache.put("abc", self.profile, dict(estimatedPrintTime=100))
+
+		reloaded = AnalysisResultCache(self.path, save_delay=0)
+		self.assertEquals(dict(estimatedPrintTime=100), reloaded.get("abc", self.profile))
+
+	def test_fields(self):
+		from octoprint.filemanager.analysis import AnalysisResultCache
+
+		cache = AnalysisResultCache(self.path, save_delay=0)
+		cache.put("abc", self.profile, dict(estimatedPrintTime=100, analysisStats=dict(lines=10)))
+
+		self.assertEquals(dict(estimatedPrintTime=100), cache.get("abc", self.profile))
+
+	def test_size_eviction(self):
+		from octoprint.filemanager.analysis import AnalysisResultCache
+
+		# {"estimatedPrintTime": 1} takes 25 bytes
+		cache = AnalysisResultCache(self.path, max_size=60, save_delay=0)
+		for key in ("a", "b", "c"):
+			cache.put(key, self.profile, dict(estimatedPrintTime=1))
+
+		self.assertEquals(2, len(cache))
+		self.assertIsNone(cache.get("a", self.profile))
+
+	def test_delayed_save(self):
+		import os
+		from octoprint.filemanager.analysis import AnalysisResultCache
+
+		cache = AnalysisResultCache(self.path, save_delay=60)
+		cache.put("abc", self.profile, dict(estimatedPrintTime=100))
+		cache.put("def", self.profile, dict(estimatedPrintTime=200))
+		self.assertFalse(os.path.exists(self.path))
+
+		cache.flush()
+		reloaded = AnalysisResultCache(self.path)
+		self.assertEquals(dict(estimatedPrintTime=200), reloaded.get("def", self.profile))
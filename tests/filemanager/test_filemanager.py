@@ -132,10 +132,22 @@ class FileManagerTest(unittest.TestCase):
 
 		self.settings = mock.create_autospec(octoprint.settings.Settings)
 		self.settings.getBaseFolder.return_value = "/path/to/a/base_folder"
+		self.settings.getBoolean.side_effect = lambda path, **kwargs: path not in (["serial", "compileJobs"],
+		                                                                           ["gcodeMinification", "transfers"])
 
 		self.settings_getter.return_value = self.settings
 
+		# mock paths of generated files
+		self.compiled_job_path_patcher = mock.patch("octoprint.util.comm.compiled_job_path")
+		self.compiled_job_path = self.compiled_job_path_patcher.start()
+		self.compiled_job_path.side_effect = lambda path: "/path/to/a/base_folder/generated/jobs/" + path
+
+		self.minified_gcode_path_patcher = mock.patch("octoprint.filemanager.minified_gcode_path")
+		self.minified_gcode_path = self.minified_gcode_path_patcher.start()
+		self.minified_gcode_path.side_effect = lambda path: "/path/to/a/base_folder/generated/minified/" + path
+
 		self.analysis_queue = mock.MagicMock(spec=octoprint.filemanager.AnalysisQueue)
+		self.analysis_queue.paused = False
 
 		self.slicing_manager = mock.MagicMock(spec=octoprint.slicing.SlicingManager)
 
@@ -153,6 +165,8 @@ class FileManagerTest(unittest.TestCase):
 		self.event_manager_patcher.stop()
 		self.plugin_manager_patcher.stop()
 		self.settings_patcher.stop()
+		self.compiled_job_path_patcher.stop()
+		self.minified_gcode_path_patcher.stop()
 
 	def test_add_file(self):
 		wrapper = object()
@@ -169,12 +183,164 @@ class FileManagerTest(unittest.TestCase):
 		self.local_storage.add_file.assert_called_once_with("test.file", wrapper, printer_profile=test_profile, allow_overwrite=False, links=None)
 		self.fire_event.assert_called_once_with(octoprint.filemanager.Events.UPDATED_FILES, dict(type="printables"))
 
+	def test_add_file_cached_analysis(self):
+		wrapper = object()
+
+		self.local_storage.add_file.return_value = "test.gcode"
+		self.local_storage.path_on_disk.return_value = "prefix/test.gcode"
+		self.local_storage.get_metadata.return_value = dict(hash="abc")
+
+		test_profile = dict(id="_default", name="My Default Profile")
+		self.printer_profile_manager.get_current_or_default.return_value = test_profile
+
+		result = dict(estimatedPrintTime=100)
+		self.file_manager._analysis_cache = mock.MagicMock(spec=octoprint.filemanager.AnalysisResultCache)
+		self.file_manager._analysis_cache.get.return_value = result
+
+		self.file_manager.add_file(octoprint.filemanager.FileDestinations.LOCAL, "test.gcode", wrapper)
+
+		self.file_manager._analysis_cache.get.assert_called_once_with("abc", test_profile)
+		self.local_storage.set_additional_metadata.assert_called_once_with("test.gcode", "analysis", result)
+		self.assertFalse(self.analysis_queue.enqueue.called)
+
+	def test_add_file_uncached_analysis(self):
+		wrapper = object()
+
+		self.local_storage.add_file.return_value = "test.gcode"
+		self.local_storage.path_on_disk.return_value = "prefix/test.gcode"
+		self.local_storage.get_metadata.return_value = dict(hash="abc")
+
+		test_profile = dict(id="_default", name="My Default Profile")
+		self.printer_profile_manager.get_current_or_default.return_value = test_profile
+
+		self.file_manager._analysis_cache = mock.MagicMock(spec=octoprint.filemanager.AnalysisResultCache)
+		self.file_manager._analysis_cache.get.return_value = None
+
+		self.file_manager.add_file(octoprint.filemanager.FileDestinations.LOCAL, "test.gcode", wrapper)
+
+		self.assertEquals(1, self.analysis_queue.enqueue.call_count)
+
+	def test_add_file_streamed_analysis(self):
+		wrapper = octoprint.filemanager.util.StreamWrapper("test.gcode", io.BytesIO(b"G1 X10 E1"))
+		result = dict(estimatedPrintTime=100)
+
+		def add_file(path, file_object, **kwargs):
+			for sink in file_object.sinks:
+				sink.finish()
+			return "test.gcode"
+
+		self.local_storage.add_file.side_effect = add_file
+		self.local_storage.path_on_disk.return_value = "prefix/test.gcode"
+		self.local_storage.get_metadata.return_value = dict(hash="abc")
+
+		test_profile = dict(id="_default", name="My Default Profile")
+		self.printer_profile_manager.get_current_or_default.return_value = test_profile
+
+		self.file_manager._analysis_cache = mock.MagicMock(spec=octoprint.filemanager.AnalysisResultCache)
+
+		with mock.patch("octoprint.filemanager.GcodeAnalysisSink") as sink_class:
+			sink = sink_class.return_value
+			sink.result = result
+			self.file_manager.add_file(octoprint.filemanager.FileDestinations.LOCAL, "test.gcode", wrapper)
+
+		sink_class.assert_called_once_with(test_profile)
+		self.local_storage.set_additional_metadata.assert_called_once_with("test.gcode", "analysis", result)
+		self.file_manager._analysis_cache.put.assert_called_once_with("abc", test_profile, result)
+		self.assertFalse(self.file_manager._analysis_cache.get.called)
+		self.assertFalse(self.analysis_queue.enqueue.called)
+		self.fire_event.assert_any_call(octoprint.filemanager.Events.METADATA_ANALYSIS_FINISHED, dict(file="test.gcode", result=result))
+
+	def test_add_file_moved_not_streamed(self):
+		wrapper = octoprint.filemanager.util.DiskFileWrapper("test.gcode", "/tmp/upload.tmp")
+		self.file_manager._minify_uploads = False
+
+		self.local_storage.add_file.return_value = "test.gcode"
+		self.local_storage.path_on_disk.return_value = "prefix/test.gcode"
+		self.file_manager._analysis_cache = None
+
+		with mock.patch("octoprint.filemanager.GcodeAnalysisSink") as sink_class:
+			self.file_manager.add_file(octoprint.filemanager.FileDestinations.LOCAL, "test.gcode", wrapper)
+
+		self.assertFalse(sink_class.called)
+		self.assertEquals([], wrapper.sinks)
+		self.assertEquals(1, self.analysis_queue.enqueue.call_count)
+		self.assertTrue(self.analysis_queue.enqueue.call_args[1]["high_priority"])
+
+	def test_add_file_paused_not_streamed(self):
+		wrapper = octoprint.filemanager.util.StreamWrapper("test.gcode", io.BytesIO(b"G1 X10 E1"))
+		self.analysis_queue.paused = True
+
+		self.local_storage.add_file.return_value = "test.gcode"
+		self.local_storage.path_on_disk.return_value = "prefix/test.gcode"
+		self.file_manager._analysis_cache = None
+
+		with mock.patch("octoprint.filemanager.GcodeAnalysisSink") as sink_class:
+			self.file_manager.add_file(octoprint.filemanager.FileDestinations.LOCAL, "test.gcode", wrapper)
+
+		self.assertFalse(sink_class.called)
+		self.assertEquals(1, self.analysis_queue.enqueue.call_count)
+
+	def test_add_file_rejected_streamed_analysis(self):
+		wrapper = octoprint.filemanager.util.StreamWrapper("test.gcode", io.BytesIO(b"G1 X10 E1"))
+		self.local_storage.add_file.side_effect = RuntimeError("File already exists")
+
+		with mock.patch("octoprint.filemanager.GcodeAnalysisSink") as sink_class:
+			sink = sink_class.return_value
+			sink.finished = False
+			self.assertRaises(RuntimeError, self.file_manager.add_file, octoprint.filemanager.FileDestinations.LOCAL,
+			                  "test.gcode", wrapper)
+
+		sink.abort.assert_called_once_with()
+
 	def test_remove_file(self):
+		self.local_storage.path_on_disk.return_value = "prefix/test.file"
+
 		self.file_manager.remove_file(octoprint.filemanager.FileDestinations.LOCAL, "test.file")
 
 		self.local_storage.remove_file.assert_called_once_with("test.file")
 		self.fire_event.assert_called_once_with(octoprint.filemanager.Events.UPDATED_FILES, dict(type="printables"))
 
+	def test_remove_file_aborts_analysis(self):
+		from octoprint.filemanager.analysis import QueueEntry
+
+		self.local_storage.path_on_disk.return_value = "prefix/test.gcode"
+		self.local_storage.path_in_storage.return_value = "test.gcode"
+		self.local_storage.remove_file.side_effect = lambda path: self.assertTrue(self.analysis_queue.abort.called)
+
+		self.file_manager.remove_file(octoprint.filemanager.FileDestinations.LOCAL, "test.gcode")
+
+		self.local_storage.path_in_storage.assert_called_once_with("prefix/test.gcode")
+		self.analysis_queue.abort.assert_called_once_with(QueueEntry("test.gcode", "gcode",
+		                                                             octoprint.filemanager.FileDestinations.LOCAL,
+		                                                             "prefix/test.gcode", None))
+		self.local_storage.remove_file.assert_called_once_with("test.gcode")
+
+	def test_remove_file_generated_files(self):
+		import os
+		import shutil
+		import tempfile
+
+		folder = tempfile.mkdtemp()
+		self.addCleanup(shutil.rmtree, folder)
+
+		path = os.path.join(folder, "test.gcode")
+		job_path = os.path.join(folder, "test.job")
+		minified_path = os.path.join(folder, "minified.gcode")
+		for p in (path, job_path, minified_path, minified_path + ".yaml"):
+			with open(p, "wb") as f:
+				f.write("G28\n")
+		self.local_storage.path_on_disk.return_value = path
+		self.compiled_job_path.side_effect = None
+		self.compiled_job_path.return_value = job_path
+		self.minified_gcode_path.side_effect = None
+		self.minified_gcode_path.return_value = minified_path
+
+		self.file_manager.remove_file(octoprint.filemanager.FileDestinations.LOCAL, "test.gcode")
+
+		self.compiled_job_path.assert_called_once_with(path)
+		self.minified_gcode_path.assert_called_once_with(path)
+		self.assertEquals(["test.gcode"], os.listdir(folder))
+
 	def test_add_folder(self):
 		self.local_storage.add_folder.return_value = ("", "test_folder")
 
@@ -195,15 +361,45 @@ class FileManagerTest(unittest.TestCase):
 		self.local_storage.add_folder.assert_called_once_with("test_folder", ignore_existing=False)
 
 	def test_remove_folder(self):
+		self.local_storage.path_on_disk.return_value = "prefix/test_folder"
+
 		self.file_manager.remove_folder(octoprint.filemanager.FileDestinations.LOCAL, "test_folder")
 
 		self.local_storage.remove_folder.assert_called_once_with("test_folder", recursive=True)
 		self.fire_event.assert_called_once_with(octoprint.filemanager.Events.UPDATED_FILES, dict(type="printables"))
 
 	def test_remove_folder_nonrecursive(self):
+		self.local_storage.path_on_disk.return_value = "prefix/test_folder"
+
 		self.file_manager.remove_folder(octoprint.filemanager.FileDestinations.LOCAL, "test_folder", recursive=False)
 		self.local_storage.remove_folder.assert_called_once_with("test_folder", recursive=False)
 
+	def test_remove_folder_generated_files(self):
+		import os
+		import shutil
+		import tempfile
+
+		folder = tempfile.mkdtemp()
+		self.addCleanup(shutil.rmtree, folder)
+
+		uploads = os.path.join(folder, "uploads")
+		jobs = os.path.join(folder, "jobs")
+		os.makedirs(os.path.join(uploads, "test_folder", "sub"))
+		os.makedirs(jobs)
+
+		self.compiled_job_path.side_effect = lambda path: os.path.join(jobs, os.path.basename(path) + ".job")
+		self.minified_gcode_path.side_effect = lambda path: os.path.join(jobs, os.path.basename(path) + ".min")
+
+		for p in (os.path.join(uploads, "test_folder", "a.gcode"), os.path.join(uploads, "test_folder", "sub", "b.gcode")):
+			for target in (p, self.compiled_job_path(p), self.minified_gcode_path(p)):
+				with open(target, "wb") as f:
+					f.write("G28\n")
+		self.local_storage.path_on_disk.return_value = os.path.join(uploads, "test_folder")
+
+		self.file_manager.remove_folder(octoprint.filemanager.FileDestinations.LOCAL, "test_folder")
+
+		self.assertEquals([], os.listdir(jobs))
+
 	@mock.patch("octoprint.util.atomic_write", create=True)
 	@mock.patch("yaml.safe_dump", create=True)
 	@mock.patch("time.time")
@@ -487,3 +683,127 @@ class FileManagerTest(unittest.TestCase):
 
 		# assert that time.time was only called once
 		mocked_time.assert_called_once()
+
+class FileManagerGeneratedFilesTest(unittest.TestCase):
+
+	GCODE = b"G28\nG1 X10 Y10 E1 F1500\nG1 X20 E2\n"
+
+	def setUp(self):
+		import os
+		import shutil
+		import tempfile
+
+		self.folder = tempfile.mkdtemp()
+		self.addCleanup(shutil.rmtree, self.folder)
+
+		self.values = {
+			("serial", "compileJobs"): True,
+			("gcodeAnalysis", "streaming"): True,
+			("gcodeAnalysis", "engine"): "chunked",
+			("gcodeAnalysis", "workers"): 1,
+			("gcodeAnalysis", "maxExtruders"): 10,
+			("gcodeAnalysis", "cpuBudget", "idle"): 1.0,
+			("gcodeAnalysis", "cpuBudget", "busy"): 1.0,
+			("gcodeAnalysis", "cpuBudget", "slice"): 0.1,
+			("gcodeAnalysis", "cache", "enabled"): True,
+			("gcodeAnalysis", "cache", "size"): 100,
+			("gcodeAnalysis", "cache", "maxSize"): 1024 * 1024,
+			("gcodeMinification", "uploads"): False,
+			("gcodeMinification", "transfers"): False,
+			("gcodeMinification", "verify"): True,
+			("gcodeMinification", "maxSize"): 1024 * 1024
+		}
+		lookup = lambda path, **kwargs: self.values.get(tuple(path))
+
+		settings = mock.MagicMock()
+		settings.get.side_effect = lookup
+		settings.getBoolean.side_effect = lookup
+		settings.getInt.side_effect = lookup
+		settings.getFloat.side_effect = lookup
+		settings.getBaseFolder.side_effect = lambda name, **kwargs: os.path.join(self.folder, name)
+
+		for target in ("octoprint.settings.settings", "octoprint.filemanager.analysis.settings",
+		               "octoprint.filemanager.util.settings", "octoprint.util.comm.settings",
+		               "octoprint.util.gcodeInterpreter.settings"):
+			patcher = mock.patch(target, return_value=settings)
+			patcher.start()
+			self.addCleanup(patcher.stop)
+
+		for target in ("octoprint.filemanager.eventManager", "octoprint.filemanager.analysis.eventManager",
+		               "octoprint.plugin.plugin_manager"):
+			patcher = mock.patch(target)
+			patcher.start()
+			self.addCleanup(patcher.stop)
+
+		import octoprint.filemanager.storage
+		storage = octoprint.filemanager.storage.LocalFileStorage(os.path.join(self.folder, "uploads"), create=True)
+
+		printer_profile_manager = mock.MagicMock()
+		printer_profile_manager.get_current_or_default.return_value = dict(id="_default", name="Default",
+		                                                                   axes=dict(x=dict(speed=6000),
+		                                                                             y=dict(speed=6000)),
+		                                                                   extruder=dict(offsets=[(0, 0)]))
+
+		self.file_manager = octoprint.filemanager.FileManager(octoprint.filemanager.AnalysisQueue(), None,
+		                                                      printer_profile_manager,
+		                                                      initial_storage_managers=dict(local=storage))
+		self.addCleanup(self.file_manager.flush_analysis_cache)
+
+	def _add_file(self, name, file_object):
+		path = self.file_manager.add_file(octoprint.filemanager.FileDestinations.LOCAL, name, file_object)
+		return self.file_manager.path_on_disk(octoprint.filemanager.FileDestinations.LOCAL, path)
+
+	def _wait_for(self, condition, timeout=10.0):
+		import time
+
+		deadline = time.time() + timeout
+		while time.time() < deadline:
+			if condition():
+				return True
+			time.sleep(0.05)
+		return False
+
+	def _wait_for_compiled_job(self, path):
+		from octoprint.util.comm import compiled_job_path, is_compiled_job_valid
+		return self._wait_for(lambda: is_compiled_job_valid(path, compiled_job_path(path)))
+
+	def _wait_for_minified(self, path):
+		from octoprint.filemanager.util import minified_gcode_path, is_minified_gcode_valid
+		return self._wait_for(lambda: is_minified_gcode_valid(path, minified_gcode_path(path)))
+
+	def test_compiled_job_streamed(self):
+		path = self._add_file("test.gcode", octoprint.filemanager.util.StreamWrapper("test.gcode", io.BytesIO(self.GCODE)))
+		self.assertTrue(self._wait_for_compiled_job(path))
+
+	def test_compiled_job_cached(self):
+		self._add_file("test.gcode", octoprint.filemanager.util.StreamWrapper("test.gcode", io.BytesIO(self.GCODE)))
+
+		# same contents, the analysis result comes from the cache
+		path = self._add_file("copy.gcode", octoprint.filemanager.util.StreamWrapper("copy.gcode", io.BytesIO(self.GCODE)))
+		self.assertTrue(self._wait_for_compiled_job(path))
+
+	def test_compiled_job_moved(self):
+		import os
+		upload = os.path.join(self.folder, "upload.tmp")
+		with open(upload, "wb") as f:
+			f.write(self.GCODE)
+
+		path = self._add_file("test.gcode", octoprint.filemanager.util.DiskFileWrapper("test.gcode", upload))
+		self.assertTrue(self._wait_for_compiled_job(path))
+
+	def test_minified_streamed(self):
+		self.values[("gcodeMinification", "transfers")] = True
+
+		path = self._add_file("test.gcode", octoprint.filemanager.util.StreamWrapper("test.gcode", io.BytesIO(self.GCODE)))
+		self.assertTrue(self._wait_for_minified(path))
+
+	def test_minified_moved(self):
+		import os
+		self.values[("gcodeMinification", "transfers")] = True
+
+		upload = os.path.join(self.folder, "upload.tmp")
+		with open(upload, "wb") as f:
+			f.write(self.GCODE)
+
+		path = self._add_file("test.gcode", octoprint.filemanager.util.DiskFileWrapper("test.gcode", upload))
+		self.assertTrue(self._wait_for_minified(path))
@@ -12,6 +12,8 @@ import mock
 from ddt import ddt, unpack, data
 
 import octoprint.filemanager.storage
+from octoprint.filemanager.storage import LocalFileStorage
+from octoprint.filemanager.util import DiskFileWrapper
 
 
 class FileWrapper(object):
@@ -39,10 +41,12 @@ FILE_CRAZYRADIO_STL = FileWrapper("crazyradio.stl")
 @ddt
 class LocalStorageTest(unittest.TestCase):
 
+	metadata_backend = "yaml"
+
 	def setUp(self):
 		import tempfile
 		self.basefolder = tempfile.mkdtemp()
-		self.storage = octoprint.filemanager.storage.LocalFileStorage(self.basefolder)
+		self.storage = octoprint.filemanager.storage.LocalFileStorage(self.basefolder, metadata_backend=self.metadata_backend)
 
 		# mock file manager module
 		self.filemanager_patcher = mock.patch("octoprint.filemanager")
@@ -68,6 +72,35 @@ class LocalStorageTest(unittest.TestCase):
 	def test_add_file(self):
 		self._add_file("bp_case.stl", "bp_case.stl", FILE_BP_CASE_STL)
 
+	def test_add_file_wrapper(self):
+		import shutil
+		import tempfile
+
+		source = tempfile.NamedTemporaryFile(delete=False)
+		source.close()
+		shutil.copy(FILE_BP_CASE_GCODE.path, source.name)
+
+		wrapper = DiskFileWrapper("bp_case.gcode", source.name)
+
+		with mock.patch.object(self.storage, "_create_hash") as create_hash:
+			self._add_file("bp_case.gcode", "bp_case.gcode", wrapper, expected_hash=FILE_BP_CASE_GCODE.hash)
+			self.assertFalse(create_hash.called)
+
+	def test_add_file_wrapper_known_hash(self):
+		import shutil
+		import tempfile
+
+		source = tempfile.NamedTemporaryFile(delete=False)
+		source.close()
+		shutil.copy(FILE_BP_CASE_GCODE.path, source.name)
+
+		wrapper = DiskFileWrapper("bp_case.gcode", source.name, hash=FILE_BP_CASE_GCODE.hash)
+
+		with mock.patch.object(self.storage, "_create_hash") as create_hash:
+			self._add_file("bp_case.gcode", "bp_case.gcode", wrapper)
+			self.assertFalse(create_hash.called)
+		self.assertEquals([], wrapper.sinks)
+
 	def test_add_file_overwrite(self):
 		self._add_file("bp_case.stl", "bp_case.stl", FILE_BP_CASE_STL)
 
@@ -213,6 +246,138 @@ class LocalStorageTest(unittest.TestCase):
 		self.assertEquals("folder", file_list["empty"]["type"])
 		self.assertEquals(0, len(file_list["empty"]["children"]))
 
+	def test_list_from_folder_index(self):
+		self._add_file("bp_case.stl", "bp_case.stl", FILE_BP_CASE_STL)
+		self._add_folder("content", "content")
+		self._age_folder(self.basefolder)
+		self._age_folder(os.path.join(self.basefolder, "content"))
+
+		expected = self.storage.list_files()
+
+		with mock.patch.object(self.storage, "_read_folder") as read_folder:
+			self.assertEquals(expected, self.storage.list_files())
+			self.assertFalse(read_folder.called)
+
+	def test_list_external_change(self):
+		self._add_file("bp_case.stl", "bp_case.stl", FILE_BP_CASE_STL)
+		self._age_folder(self.basefolder)
+		self.storage.list_files()
+
+		import shutil
+		shutil.copy(FILE_CRAZYRADIO_STL.path, os.path.join(self.basefolder, "crazyradio.stl"))
+		self._age_folder(self.basefolder, age=5)
+
+		file_list = self.storage.list_files()
+		self.assertTrue("crazyradio.stl" in file_list)
+		self.assertEquals(FILE_CRAZYRADIO_STL.hash, file_list["crazyradio.stl"]["hash"])
+
+	def test_list_after_remove(self):
+		stl_name = self._add_file("bp_case.stl", "bp_case.stl", FILE_BP_CASE_STL)
+		self._age_folder(self.basefolder)
+		self.storage.list_files()
+
+		self.storage.remove_file(stl_name)
+		self._age_folder(self.basefolder)
+
+		self.assertFalse("bp_case.stl" in self.storage.list_files())
+
+	def test_list_watched(self):
+		import shutil
+		import time
+
+		storage = LocalFileStorage(self.basefolder, metadata_backend=self.metadata_backend, watch=True)
+		try:
+			self.assertEquals(dict(), storage.list_files())
+
+			shutil.copy(FILE_BP_CASE_STL.path, os.path.join(self.basefolder, "bp_case.stl"))
+
+			for _ in range(50):
+				file_list = storage.list_files()
+				if "bp_case.stl" in file_list:
+					break
+				time.sleep(0.1)
+			self.assertTrue("bp_case.stl" in file_list)
+		finally:
+			storage._stop_watching()
+
+	def test_list_files_sorted(self):
+		self._add_file("bp_case.stl", "bp_case.stl", FILE_BP_CASE_STL)
+		self._add_file("bp_case.gcode", "bp_case.gcode", FILE_BP_CASE_GCODE)
+		self._add_file("crazyradio.stl", "crazyradio.stl", FILE_CRAZYRADIO_STL)
+		self._add_folder("content", "content")
+
+		files, cursor = self.storage.list_files_sorted(sort="name")
+		self.assertEquals(["bp_case.gcode", "bp_case.stl", "crazyradio.stl"], [f["name"] for f in files])
+		self.assertIsNone(cursor)
+
+		files, cursor = self.storage.list_files_sorted(sort="size", reverse=True)
+		sizes = [f["size"] for f in files]
+		self.assertEquals(sorted(sizes, reverse=True), sizes)
+
+	def test_list_files_sorted_pages(self):
+		self._add_file("bp_case.stl", "bp_case.stl", FILE_BP_CASE_STL)
+		self._add_file("bp_case.gcode", "bp_case.gcode", FILE_BP_CASE_GCODE)
+		self._add_file("crazyradio.stl", "crazyradio.stl", FILE_CRAZYRADIO_STL)
+
+		files, cursor = self.storage.list_files_sorted(sort="name", reverse=True, limit=2)
+		self.assertEquals(["crazyradio.stl", "bp_case.stl"], [f["name"] for f in files])
+		self.assertIsNotNone(cursor)
+
+		# files added before the cursor's position don't shift the next page
+		self._add_file("zzz.stl", "zzz.stl", FILE_CRAZYRADIO_STL)
+
+		files, cursor = self.storage.list_files_sorted(sort="name", reverse=True, limit=2, cursor=cursor)
+		self.assertEquals(["bp_case.gcode"], [f["name"] for f in files])
+		self.assertIsNone(cursor)
+
+	def test_list_files_sorted_missing_values_last(self):
+		stl_name = self._add_file("bp_case.stl", "bp_case.stl", FILE_BP_CASE_STL)
+		gcode_name = self._add_file("bp_case.gcode", "bp_case.gcode", FILE_BP_CASE_GCODE)
+		other_stl_name = self._add_file("crazyradio.stl", "crazyradio.stl", FILE_CRAZYRADIO_STL)
+
+		self.storage.set_additional_metadata(gcode_name, "analysis", dict(estimatedPrintTime=100))
+		self.storage.set_additional_metadata(other_stl_name, "analysis", dict(estimatedPrintTime=200))
+
+		files, _ = self.storage.list_files_sorted(sort="estimatedPrintTime")
+		self.assertEquals([gcode_name, other_stl_name, stl_name], [f["name"] for f in files])
+
+		files, _ = self.storage.list_files_sorted(sort="estimatedPrintTime", reverse=True)
+		self.assertEquals([other_stl_name, gcode_name, stl_name], [f["name"] for f in files])
+
+	def test_list_files_sorted_last_print(self):
+		stl_name = self._add_file("bp_case.stl", "bp_case.stl", FILE_BP_CASE_STL)
+		gcode_name = self._add_file("bp_case.gcode", "bp_case.gcode", FILE_BP_CASE_GCODE)
+
+		files, _ = self.storage.list_files_sorted(sort="lastPrint", reverse=True)
+		self.assertEquals([gcode_name, stl_name], sorted(f["name"] for f in files))
+
+		self.storage.add_history(stl_name, dict(timestamp=1, success=True))
+		self.storage.add_history(gcode_name, dict(timestamp=2, success=True))
+
+		files, _ = self.storage.list_files_sorted(sort="lastPrint", reverse=True)
+		self.assertEquals([gcode_name, stl_name], [f["name"] for f in files])
+
+	def test_list_files_sorted_filter(self):
+		self._add_file("bp_case.stl", "bp_case.stl", FILE_BP_CASE_STL)
+		self._add_file("bp_case.gcode", "bp_case.gcode", FILE_BP_CASE_GCODE)
+		self._add_file("crazyradio.stl", "crazyradio.stl", FILE_CRAZYRADIO_STL)
+
+		stl_filter = lambda entry, entry_data: entry.endswith(".stl")
+
+		files, cursor = self.storage.list_files_sorted(sort="name", filter=stl_filter, limit=1)
+		self.assertEquals(["bp_case.stl"], [f["name"] for f in files])
+
+		files, cursor = self.storage.list_files_sorted(sort="name", filter=stl_filter, limit=1, cursor=cursor)
+		self.assertEquals(["crazyradio.stl"], [f["name"] for f in files])
+		self.assertIsNone(cursor)
+
+	@data("unknown", "")
+	def test_list_files_sorted_invalid_sort(self, sort):
+		self.assertRaises(ValueError, self.storage.list_files_sorted, sort=sort)
+
+	def test_list_files_sorted_invalid_cursor(self):
+		self.assertRaises(ValueError, self.storage.list_files_sorted, cursor="invalid")
+
 	def test_add_link_model(self):
 		stl_name = self._add_file("bp_case.stl", "bp_case.stl", FILE_BP_CASE_STL)
 		gcode_name = self._add_file("bp_case.gcode", "bp_case.gcode", FILE_BP_CASE_GCODE)
@@ -378,7 +543,7 @@ class LocalStorageTest(unittest.TestCase):
 		self.assertEquals(expected_path, actual_path)
 		self.assertEquals(expected_name, actual_name)
 
-	def _add_file(self, path, expected_path, file_object, links=None, overwrite=False):
+	def _add_file(self, path, expected_path, file_object, links=None, overwrite=False, expected_hash=None):
 		sanitized_path = self.storage.add_file(path, file_object, links=links, allow_overwrite=overwrite)
 		split_path = sanitized_path.split("/")
 		if len(split_path) == 1:
@@ -390,14 +555,14 @@ class LocalStorageTest(unittest.TestCase):
 
 		self.assertEquals(expected_path, sanitized_path)
 		self.assertTrue(os.path.exists(file_path))
-		self.assertTrue(os.path.exists(os.path.join(folder_path, ".metadata.yaml")))
+		self._assert_metadata_persisted(folder_path)
 
 		metadata = self.storage.get_metadata(sanitized_path)
 		self.assertIsNotNone(metadata)
 
 		# assert hash
 		self.assertTrue("hash" in metadata)
-		self.assertEquals(file_object.hash, metadata["hash"])
+		self.assertEquals(expected_hash if expected_hash is not None else file_object.hash, metadata["hash"])
 
 		# assert presence of links if supplied
 		if links:
@@ -405,6 +570,14 @@ class LocalStorageTest(unittest.TestCase):
 
 		return sanitized_path
 
+	def _assert_metadata_persisted(self, folder_path):
+		self.assertTrue(os.path.exists(os.path.join(folder_path, ".metadata.yaml")))
+
+	def _age_folder(self, folder_path, age=10):
+		import time
+		then = time.time() - age
+		os.utime(folder_path, (then, then))
+
 	def _add_folder(self, path, expected_path):
 		sanitized_path = self.storage.add_folder(path)
 		self.assertEquals(expected_path, sanitized_path)
@@ -413,3 +586,46 @@ class LocalStorageTest(unittest.TestCase):
 
 		return sanitized_path
 
+class SqliteLocalStorageTest(LocalStorageTest):
+
+	metadata_backend = "sqlite"
+
+	def test_add_history(self):
+		gcode_name = self._add_file("bp_case.gcode", "bp_case.gcode", FILE_BP_CASE_GCODE)
+
+		self.storage.add_history(gcode_name, dict(timestamp=1, printTime=100, success=True, printerProfile="_default"))
+
+		# a fresh storage instance will read everything from the database
+		storage = LocalFileStorage(self.basefolder, metadata_backend="sqlite")
+		metadata = storage.get_metadata(gcode_name)
+		self.assertEquals(1, len(metadata["history"]))
+		self.assertEquals(100, metadata["statistics"]["averagePrintTime"]["_default"])
+
+	def test_migrate_from_yaml(self):
+		yaml_storage = LocalFileStorage(self.basefolder, metadata_backend="yaml")
+		stl_name = yaml_storage.add_file("bp_case.stl", FILE_BP_CASE_STL)
+		yaml_storage.add_folder("content")
+		other_stl_name = yaml_storage.add_file("content/crazyradio.stl", FILE_CRAZYRADIO_STL)
+		yaml_storage.set_additional_metadata(other_stl_name, "userdata", dict(key="value"))
+
+		os.remove(os.path.join(self.basefolder, ".metadata.db"))
+
+		storage = LocalFileStorage(self.basefolder, metadata_backend="sqlite")
+		self.assertEquals(FILE_BP_CASE_STL.hash, storage.get_metadata(stl_name)["hash"])
+		self.assertEquals(dict(key="value"), storage.get_metadata(other_stl_name)["userdata"])
+
+		self.assertFalse(os.path.exists(os.path.join(self.basefolder, "content", ".metadata.yaml")))
+		self.assertTrue(os.path.exists(os.path.join(self.basefolder, "content", ".metadata.yaml.backup")))
+
+	def test_remove_folder_removes_metadata(self):
+		content_folder = self._add_folder("content", "content")
+		other_stl_name = self._add_file((content_folder, "crazyradio.stl"), content_folder + "/crazyradio.stl", FILE_CRAZYRADIO_STL)
+
+		self.storage.remove_folder(content_folder, recursive=True)
+		self.assertEquals([], self.storage._metadata.get_by_hash(FILE_CRAZYRADIO_STL.hash))
+
+		content_folder = self._add_folder("content", "content")
+		self.assertIsNone(self.storage.get_metadata(other_stl_name))
+
+	def _assert_metadata_persisted(self, folder_path):
+		self.assertTrue(os.path.exists(os.path.join(self.basefolder, ".metadata.db")))
@@ -0,0 +1,289 @@
+# coding=utf-8
+from __future__ import absolute_import
+
+__license__ = 'GNU Affero General Public License http://www.gnu.org/licenses/agpl.html'
+__copyright__ = "Copyright (C) 2016 The OctoPrint Project - Released under terms of the AGPLv3 License"
+
+import hashlib
+import io
+import os
+import shutil
+import tempfile
+import unittest
+
+import mock
+
+import octoprint.filemanager.util
+from octoprint.filemanager.util import DiskFileWrapper, StreamWrapper, TeeStream, StreamSink, HashSink, GcodeAnalysisSink, \
+	GcodeMinifier, MinifyingGcodeStream, minify_gcode_file, is_minified_gcode_valid, verify_minified_gcode, \
+	remove_minified_gcode
+from octoprint.util import gcodeInterpreter
+
+GCODE_PATH = os.path.join(os.path.dirname(os.path.realpath(__file__)), "_files", "bp_case.gcode")
+
+PRINTER_PROFILE = dict(
+	axes=dict(x=dict(speed=6000), y=dict(speed=6000)),
+	extruder=dict(offsets=[(0, 0)])
+)
+
+class RecordingSink(StreamSink):
+	def __init__(self):
+		StreamSink.__init__(self)
+		self.data = b""
+		self.aborted = False
+
+	def update(self, data):
+		self.data += data
+
+	def abort(self):
+		self.aborted = True
+
+class FailingStream(io.RawIOBase):
+	def read(self, n=-1):
+		raise IOError("broken")
+
+class StreamSinkTest(unittest.TestCase):
+
+	def setUp(self):
+		self.folder = tempfile.mkdtemp()
+		self.addCleanup(shutil.rmtree, self.folder)
+
+		with open(GCODE_PATH, "rb") as f:
+			self.content = f.read()
+		self.hash = hashlib.sha1(self.content).hexdigest()
+
+		self.settings_patcher = mock.patch("octoprint.util.gcodeInterpreter.settings")
+		settings_getter = self.settings_patcher.start()
+		settings_getter.return_value.getInt.return_value = 10
+		self.addCleanup(self.settings_patcher.stop)
+
+	def test_tee_stream(self):
+		sinks = [RecordingSink(), RecordingSink()]
+		stream = TeeStream(io.BytesIO(self.content), *sinks)
+
+		self.assertEquals(self.content, stream.read())
+		for sink in sinks:
+			self.assertEquals(self.content, sink.data)
+
+	def test_hash_sink(self):
+		sink = HashSink()
+		sink.update(self.content)
+		self.assertIsNone(sink.hexdigest)
+
+		sink.finish()
+		self.assertEquals(self.hash, sink.hexdigest)
+
+	def test_stream_wrapper(self):
+		sink = HashSink()
+		wrapper = StreamWrapper("test.gcode", io.BytesIO(self.content))
+		wrapper.add_sink(sink)
+
+		wrapper.save(os.path.join(self.folder, "test.gcode"))
+
+		self.assertEquals(self.hash, sink.hexdigest)
+
+	def test_stream_wrapper_failing(self):
+		sink = RecordingSink()
+		wrapper = StreamWrapper("test.gcode", FailingStream())
+		wrapper.add_sink(sink)
+
+		self.assertRaises(IOError, wrapper.save, os.path.join(self.folder, "test.gcode"))
+		self.assertTrue(sink.aborted)
+		self.assertFalse(sink.finished)
+
+	def test_disk_file_wrapper_move(self):
+		source = os.path.join(self.folder, "source.gcode")
+		shutil.copy(GCODE_PATH, source)
+		destination = os.path.join(self.folder, "destination.gcode")
+
+		sink = HashSink()
+		wrapper = DiskFileWrapper("source.gcode", source)
+		wrapper.add_sink(sink)
+		wrapper.save(destination)
+
+		self.assertFalse(os.path.exists(source))
+		self.assertTrue(os.path.exists(destination))
+		self.assertEquals(self.hash, sink.hexdigest)
+
+	def test_disk_file_wrapper_copy(self):
+		destination = os.path.join(self.folder, "destination.gcode")
+
+		sink = HashSink()
+		wrapper = DiskFileWrapper("bp_case.gcode", GCODE_PATH, move=False)
+		wrapper.add_sink(sink)
+		wrapper.save(destination)
+
+		with open(destination, "rb") as f:
+			self.assertEquals(self.content, f.read())
+		self.assertEquals(self.hash, sink.hexdigest)
+
+	def test_gcode_analysis_sink(self):
+		sink = GcodeAnalysisSink(PRINTER_PROFILE, max_pending=2)
+		wrapper = StreamWrapper("test.gcode", io.BytesIO(self.content))
+		wrapper.add_sink(sink)
+		wrapper.save(os.path.join(self.folder, "test.gcode"))
+
+		expected = gcodeInterpreter.chunkedGcode()
+		expected.load(GCODE_PATH, PRINTER_PROFILE)
+
+		result = sink.result
+		self.assertIsNotNone(result)
+		self.assertEquals(expected.totalMoveTimeMinute * 60, result["estimatedPrintTime"])
+		self.assertEquals(expected.extrusionAmount[0], result["filament"]["tool0"]["length"])
+		self.assertEquals(expected.lineCount, result["analysisStats"]["lines"])
+
+	def test_gcode_analysis_sink_aborted(self):
+		sink = GcodeAnalysisSink(PRINTER_PROFILE, max_pending=2)
+		wrapper = StreamWrapper("test.gcode", io.BytesIO(self.content[:1024]), FailingStream())
+		wrapper.add_sink(sink)
+
+		self.assertRaises(IOError, wrapper.save, os.path.join(self.folder, "test.gcode"))
+		self.assertIsNone(sink.result)
+
+class GcodeMinifierTest(unittest.TestCase):
+
+	def setUp(self):
+		self.minifier = GcodeMinifier()
+
+	def _minify(self, *lines):
+		return [self.minifier.process_line(line + "\n") for line in lines]
+
+	def test_comments_and_empty_lines(self):
+		self.assertEquals([None, None, "G28\n", "M117 Hello \\; World\n"],
+		                  self._minify("; generated", "   ", "G28 ; home", "M117 Hello \\; World ; comment"))
+
+	def test_numbers(self):
+		self.assertEquals(["G1 X10 Y0.5 Z0 E-1.25 F1500\n", "M104 S210\n"],
+		                  self._minify("G1 X10.000 Y+00.50 Z-0.0 E-1.250 F1500.", "M104 S210.0"))
+
+	def test_unchanged_words(self):
+		self.assertEquals(["G1 X10 Y10 F1500\n", "G1 X20\n", "G0 Y10.5 F3000\n", None],
+		                  self._minify("G1 X10 Y10 F1500", "G1 X20 Y10.0 F1500", "G0 X20 Y10.5 F3000", "G1 X20 Y10.5"))
+
+	def test_feedrate_groups(self):
+		self.assertEquals(["G1 X10 F1500\n", "G0 X20 F1500\n", "G1 X30\n", "G0 X40 F6000\n", "G1 X50 F1500\n"],
+		                  self._minify("G1 X10 F1500", "G0 X20 F1500", "G1 X30 F1500", "G0 X40 F6000", "G1 X50 F1500"))
+
+	def test_arc_feedrate(self):
+		self.assertEquals(["G1 X10 F1500\n", "G2 X20 I5 F3000\n", "G0 X30 F1500\n", "G1 X40 F1500\n"],
+		                  self._minify("G1 X10 F1500", "G2 X20 I5 F3000", "G0 X30 F1500", "G1 X40 F1500"))
+
+	def test_relative(self):
+		self.assertEquals(["G1 X10 E1\n", "G91\n", "G1 X10 E1\n", "G1 X10 E1\n"],
+		                  self._minify("G1 X10 E1", "G91", "G1 X10 E1", "G1 X10 E1"))
+
+	def test_relative_extrusion(self):
+		self.assertEquals(["M83\n", "G1 X10 E1\n", "G1 Y10 E1\n"],
+		                  self._minify("M83", "G1 X10 E1", "G1 X10 Y10 E1"))
+
+	def test_unknown_commands_reset(self):
+		self.assertEquals(["G1 X10 F1500\n", "G28\n", "G1 X10 F1500\n", "M117 G1 X10\n", "G1 X10 F1500\n"],
+		                  self._minify("G1 X10 F1500", "G28", "G1 X10 F1500", "M117 G1 X10", "G1 X10 F1500"))
+
+	def test_unparseable_lines(self):
+		self.assertEquals(["N10 G1 X10*90\n", "g1 x10\n", "G1 X1 X2\n"],
+		                  self._minify("N10 G1 X10*90", "g1 x10", "G1 X1 X2"))
+
+	def test_coordinate_offsets(self):
+		self.assertEquals(["G92 X5\n", "G1 X10 Y10\n", "G1 X10 Y10\n"],
+		                  self._minify("G92 X5", "G1 X10 Y10", "G1 X10 Y10"))
+
+	def test_zero_feedrate(self):
+		self.assertEquals(["G1 X10 F1500\n", "G1 X11 F0\n", "G1 X12\n"],
+		                  self._minify("G1 X10 F1500", "G1 X11 F0", "G1 X12 F1500"))
+
+	def test_statistics(self):
+		self._minify("; comment", "G1 X10.00")
+
+		self.assertEquals(20, self.minifier.bytes_in)
+		self.assertEquals(7, self.minifier.bytes_out)
+		self.assertEquals(13, self.minifier.saved)
+		self.assertEquals((2, 1), (self.minifier.lines_in, self.minifier.lines_out))
+
+	def test_stream(self):
+		stream = MinifyingGcodeStream(io.BytesIO(b"; comment\r\nG1 X10.00 F1500\r\nG1 X10 F1500\r\nG28\r\n"))
+		self.assertEquals(b"G1 X10 F1500\nG28\n", stream.read())
+
+class MinifyGcodeFileTest(unittest.TestCase):
+
+	def setUp(self):
+		self.folder = tempfile.mkdtemp()
+		self.addCleanup(shutil.rmtree, self.folder)
+
+		self.path = os.path.join(self.folder, "bp_case.gcode")
+		shutil.copy(GCODE_PATH, self.path)
+		self.minified_path = os.path.join(self.folder, "minified", "bp_case.gcode")
+
+		self.settings_patcher = mock.patch("octoprint.util.gcodeInterpreter.settings")
+		settings_getter = self.settings_patcher.start()
+		settings_getter.return_value.getInt.return_value = 10
+		self.addCleanup(self.settings_patcher.stop)
+
+	def test_minify(self):
+		minifier = minify_gcode_file(self.path, self.minified_path)
+
+		self.assertEquals(os.path.getsize(self.path), minifier.bytes_in)
+		self.assertEquals(os.path.getsize(self.minified_path), minifier.bytes_out)
+		self.assertTrue(minifier.saved > 0)
+
+	def test_throttle(self):
+		throttle = mock.MagicMock()
+		minify_gcode_file(self.path, self.minified_path, throttle=throttle)
+		self.assertTrue(throttle.called)
+
+		throttle.reset_mock()
+		self.assertTrue(verify_minified_gcode(self.path, self.minified_path, PRINTER_PROFILE, throttle=throttle))
+		self.assertTrue(throttle.called)
+
+	def test_verify(self):
+		minify_gcode_file(self.path, self.minified_path)
+		self.assertTrue(verify_minified_gcode(self.path, self.minified_path, PRINTER_PROFILE))
+
+		with open(self.minified_path, "ab") as f:
+			f.write(b"G1 X300 E1000\n")
+		self.assertFalse(verify_minified_gcode(self.path, self.minified_path, PRINTER_PROFILE))
+
+	def test_valid(self):
+		self.assertFalse(is_minified_gcode_valid(self.path, self.minified_path))
+
+		minify_gcode_file(self.path, self.minified_path)
+		self.assertTrue(is_minified_gcode_valid(self.path, self.minified_path))
+
+		stat = os.stat(self.path)
+		os.utime(self.path, (stat.st_atime, stat.st_mtime + 10))
+		self.assertFalse(is_minified_gcode_valid(self.path, self.minified_path))
+
+	def test_valid_size(self):
+		minify_gcode_file(self.path, self.minified_path)
+
+		stat = os.stat(self.path)
+		with open(self.path, "ab") as f:
+			f.write(b"G28\n")
+		os.utime(self.path, (stat.st_atime, stat.st_mtime))
+		self.assertFalse(is_minified_gcode_valid(self.path, self.minified_path))
+
+	def test_valid_version(self):
+		minify_gcode_file(self.path, self.minified_path)
+
+		with mock.patch.object(GcodeMinifier, "VERSION", GcodeMinifier.VERSION + 1):
+			self.assertFalse(is_minified_gcode_valid(self.path, self.minified_path))
+
+	def test_remove(self):
+		minify_gcode_file(self.path, self.minified_path)
+		remove_minified_gcode(self.minified_path)
+
+		self.assertEquals([], os.listdir(os.path.dirname(self.minified_path)))
+		self.assertFalse(is_minified_gcode_valid(self.path, self.minified_path))
+
+	def test_max_size(self):
+		folder = os.path.dirname(self.minified_path)
+		older = [os.path.join(folder, name) for name in ("a.gcode", "b.gcode")]
+		minify_gcode_file(self.path, older[0])
+		minify_gcode_file(self.path, older[1])
+		for i, p in enumerate(older):
+			os.utime(p, (1000 + i, 1000 + i))
+
+		size = os.path.getsize(older[0])
+		minify_gcode_file(self.path, self.minified_path, max_size=2 * size)
+
+		self.assertEquals(["b.gcode", "b.gcode.yaml", "bp_case.gcode", "bp_case.gcode.yaml"], sorted(os.listdir(folder)))
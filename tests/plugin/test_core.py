@@ -132,6 +132,95 @@ class PluginTestCase(unittest.TestCase):
 		implementations = self.plugin_manager.get_implementations(octoprint.plugin.AssetPlugin)
 		self.assertEquals(1, len(implementations)) # deprecated_plugin, but only first implementation!
 
+	def test_get_implementations_cached(self):
+		first = self.plugin_manager.get_implementations(octoprint.plugin.SettingsPlugin)
+
+		with mock.patch.object(self.plugin_manager, "plugin_implementations_by_type") as by_type:
+			second = self.plugin_manager.get_implementations(octoprint.plugin.SettingsPlugin)
+
+		self.assertFalse(by_type.__getitem__.called)
+		self.assertEquals(first, second)
+
+		# callers may modify the returned list without affecting the dispatch table
+		second.pop()
+		self.assertEquals(first, self.plugin_manager.get_implementations(octoprint.plugin.SettingsPlugin))
+
+	def test_get_implementations_invalidated(self):
+		implementations = self.plugin_manager.get_implementations(octoprint.plugin.SettingsPlugin)
+		self.assertEquals(2, len(implementations))
+		hooks = self.plugin_manager.get_hooks("octoprint.core.startup")
+		self.assertEquals(1, len(hooks))
+
+		self.plugin_manager.disable_plugin("settings_plugin")
+		self.plugin_manager.disable_plugin("hook_plugin")
+
+		implementations = self.plugin_manager.get_implementations(octoprint.plugin.SettingsPlugin)
+		self.assertEquals(1, len(implementations))
+		self.assertNotIn("settings_plugin", [impl._identifier for impl in implementations])
+		hooks = self.plugin_manager.get_hooks("octoprint.core.startup")
+		self.assertEquals(0, len(hooks))
+
+		self.plugin_manager.enable_plugin("settings_plugin")
+		self.plugin_manager.enable_plugin("hook_plugin")
+
+		implementations = self.plugin_manager.get_implementations(octoprint.plugin.SettingsPlugin)
+		self.assertEquals(2, len(implementations))
+		hooks = self.plugin_manager.get_hooks("octoprint.core.startup")
+		self.assertEquals(1, len(hooks))
+
+	def test_get_implementations_lookup_during_disable(self):
+		unregister = self.plugin_manager._unregister_plugin
+
+		def racing_unregister(name, plugin):
+			# a lookup from another thread right before the plugin's registrations are removed
+			self.plugin_manager.get_implementations(octoprint.plugin.SettingsPlugin)
+			unregister(name, plugin)
+
+		with mock.patch.object(self.plugin_manager, "_unregister_plugin", side_effect=racing_unregister):
+			self.plugin_manager.disable_plugin("settings_plugin")
+
+		implementations = self.plugin_manager.get_implementations(octoprint.plugin.SettingsPlugin)
+		self.assertNotIn("settings_plugin", [impl._identifier for impl in implementations])
+
+	def test_get_implementation_methods(self):
+		methods = self.plugin_manager.get_implementation_methods("get_settings_defaults", octoprint.plugin.SettingsPlugin)
+		self.assertEquals(self.plugin_manager.get_implementations(octoprint.plugin.SettingsPlugin),
+		                  [implementation for implementation, _ in methods])
+		for implementation, method in methods:
+			self.assertEquals(implementation.get_settings_defaults, method)
+
+		methods = self.plugin_manager.get_implementation_methods("unknown_method", octoprint.plugin.SettingsPlugin)
+		self.assertEquals(0, len(methods))
+
+	def test_call_plugin(self):
+		callback = mock.MagicMock()
+		with mock.patch("octoprint.plugin.plugin_manager", return_value=self.plugin_manager):
+			octoprint.plugin.call_plugin(octoprint.plugin.SettingsPlugin, "get_settings_defaults", callback=callback)
+
+		self.assertEquals(set(["settings_plugin", "mixed_plugin"]),
+		                  set(call[0][0] for call in callback.call_args_list))
+
+	def test_timings_disabled(self):
+		self.plugin_manager.get_hooks("octoprint.core.startup")["hook_plugin"]()
+		self.assertEquals(dict(), self.plugin_manager.get_timings())
+
+	def test_timings(self):
+		self.plugin_manager.plugin_timings = True
+		self.plugin_manager._invalidate_dispatch_table()
+
+		hook = self.plugin_manager.get_hooks("octoprint.core.startup")["hook_plugin"]
+		self.assertEquals("success", hook())
+		self.assertEquals("success", hook())
+
+		for implementation, method in self.plugin_manager.get_implementation_methods("get_settings_defaults", octoprint.plugin.SettingsPlugin):
+			method()
+
+		timings = self.plugin_manager.get_timings()
+		self.assertEquals(set(["hook_plugin", "settings_plugin", "mixed_plugin"]), set(timings.keys()))
+		self.assertEquals(2, timings["hook_plugin"]["octoprint.core.startup"]["calls"])
+		self.assertEquals(1, timings["settings_plugin"]["get_settings_defaults"]["calls"])
+		self.assertTrue(timings["hook_plugin"]["octoprint.core.startup"]["max"] >= 0)
+
 	def test_client_registration(self):
 		def test_client(*args, **kwargs):
 			pass
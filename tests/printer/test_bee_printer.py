@@ -0,0 +1,158 @@
+# coding=utf-8
+from __future__ import absolute_import
+
+__license__ = 'GNU Affero General Public License http://www.gnu.org/licenses/agpl.html'
+__copyright__ = "Copyright (C) 2016 The OctoPrint Project - Released under terms of the AGPLv3 License"
+
+import unittest
+import mock
+
+from octoprint.printer.bee_printer import BeePrinter, PrinterMemoryCache
+
+
+class PrinterMemoryCacheTest(unittest.TestCase):
+
+	def setUp(self):
+		self.time_patcher = mock.patch("octoprint.printer.bee_printer.time")
+		self.time = self.time_patcher.start()
+		self.time.time.return_value = 1000
+		self.addCleanup(self.time_patcher.stop)
+
+		self.cache = PrinterMemoryCache()
+		self.cache.register("nozzleSize", type=int, ttl=60)
+		self.cache.register("filamentInSpool", type=float, valid=lambda filament: filament >= 0)
+
+		self.loader = mock.MagicMock(return_value="400")
+
+	def test_get_loads_once(self):
+		self.assertEquals(400, self.cache.get("nozzleSize", self.loader))
+		self.assertEquals(400, self.cache.get("nozzleSize", self.loader))
+		self.assertEquals(1, self.loader.call_count)
+
+	def test_get_expired(self):
+		self.cache.get("nozzleSize", self.loader)
+
+		self.time.time.return_value = 1061
+		self.cache.get("nozzleSize", self.loader)
+
+		self.assertEquals(2, self.loader.call_count)
+
+	def test_get_invalid_not_cached(self):
+		loader = mock.MagicMock(return_value=-1.0)
+
+		self.assertEquals(-1.0, self.cache.get("filamentInSpool", loader))
+		self.assertEquals(-1.0, self.cache.get("filamentInSpool", loader))
+		self.assertEquals(2, loader.call_count)
+
+	def test_get_none_not_cached(self):
+		loader = mock.MagicMock(return_value=None)
+
+		self.assertIsNone(self.cache.get("nozzleSize", loader))
+		self.cache.get("nozzleSize", loader)
+		self.assertEquals(2, loader.call_count)
+
+	def test_set(self):
+		self.assertEquals(600, self.cache.set("nozzleSize", "600"))
+		self.assertEquals(600, self.cache.get("nozzleSize", self.loader))
+		self.assertFalse(self.loader.called)
+
+	def test_invalidate(self):
+		self.cache.get("nozzleSize", self.loader)
+		self.cache.get("filamentInSpool", lambda: 100.0)
+
+		self.cache.invalidate("nozzleSize")
+		self.assertEquals(100.0, self.cache.get("filamentInSpool", self.loader))
+		self.cache.get("nozzleSize", self.loader)
+		self.assertEquals(2, self.loader.call_count)
+
+		self.cache.invalidate()
+		self.cache.get("filamentInSpool", self.loader)
+		self.assertEquals(3, self.loader.call_count)
+
+	def test_invalidate_while_loading(self):
+		def loader():
+			self.cache.invalidate()
+			return 400
+
+		self.assertEquals(400, self.cache.get("nozzleSize", loader))
+		self.assertEquals(400, self.cache.get("nozzleSize", self.loader))
+		self.assertEquals(1, self.loader.call_count)
+
+
+class BeePrinterMemoryTest(unittest.TestCase):
+
+	def setUp(self):
+		self.printer = BeePrinter.__new__(BeePrinter)
+		self.printer._logger = mock.MagicMock()
+		self.printer._memoryCache = PrinterMemoryCache()
+		for name in ("filamentString", "nozzleSize"):
+			self.printer._memoryCache.register(name, ttl=BeePrinter.MEMORY_CACHE_TTL[name])
+
+		self.commands = mock.MagicMock()
+		self.commands.getFilamentString.return_value = "A023 - Black"
+		self.commands.getNozzleSize.return_value = 400
+
+		self.printer._comm = mock.MagicMock()
+		self.printer._comm.getCommandsInterface.return_value = self.commands
+
+	def test_getter_cached(self):
+		self.assertEquals("A023 - Black", self.printer.getFilamentString())
+		self.assertEquals("A023 - Black", self.printer.getFilamentString())
+		self.assertEquals(400, self.printer.getNozzleSize())
+		self.assertEquals("nz400", self.printer.getNozzleTypeString())
+
+		self.assertEquals(1, self.commands.getFilamentString.call_count)
+		self.assertEquals(1, self.commands.getNozzleSize.call_count)
+
+	def test_setter_updates(self):
+		self.printer.getNozzleSize()
+		self.commands.setNozzleSize.return_value = "ok"
+
+		self.printer.setNozzleSize(600)
+
+		self.assertEquals(600, self.printer.getNozzleSize())
+		self.assertEquals(1, self.commands.getNozzleSize.call_count)
+
+	def test_setter_failed(self):
+		self.printer.getFilamentString()
+		self.commands.setFilamentString.return_value = None
+
+		self.printer.setFilamentString("A101 - White")
+
+		self.assertEquals("A023 - Black", self.printer.getFilamentString())
+		self.assertEquals(2, self.commands.getFilamentString.call_count)
+
+	def test_flash_firmware_invalidates(self):
+		self.printer._callbacks = []
+		self.printer.getFilamentString()
+
+		self.printer.on_flash_firmware_finished(None, dict(result=True))
+		self.printer.getFilamentString()
+
+		self.assertEquals(2, self.commands.getFilamentString.call_count)
+
+
+class BeePrinterFileHashTest(unittest.TestCase):
+
+	def setUp(self):
+		self.printer = BeePrinter.__new__(BeePrinter)
+		self.printer._logger = mock.MagicMock()
+		self.printer._fileManager = mock.MagicMock()
+		self.printer._fileManager.path_in_storage.return_value = "test.gcode"
+
+	def test_get_file_hash(self):
+		self.printer._fileManager.get_metadata.return_value = dict(hash="abc")
+
+		self.assertEquals("abc", self.printer._getFileHash("/uploads/test.gcode"))
+		self.printer._fileManager.path_in_storage.assert_called_once_with("local", "/uploads/test.gcode")
+		self.printer._fileManager.get_metadata.assert_called_once_with("local", "test.gcode")
+
+	def test_get_file_hash_no_metadata(self):
+		self.printer._fileManager.get_metadata.return_value = None
+
+		self.assertIsNone(self.printer._getFileHash("/uploads/test.gcode"))
+
+	def test_get_file_hash_error(self):
+		self.printer._fileManager.get_metadata.side_effect = IOError()
+
+		self.assertIsNone(self.printer._getFileHash("/uploads/test.gcode"))
@@ -0,0 +1,33 @@
+# coding=utf-8
+from __future__ import absolute_import
+
+__license__ = 'GNU Affero General Public License http://www.gnu.org/licenses/agpl.html'
+__copyright__ = "Copyright (C) 2016 The OctoPrint Project - Released under terms of the AGPLv3 License"
+
+import threading
+import unittest
+import mock
+
+from octoprint.printer.standard import StateMonitor
+
+
+class StateMonitorLogTest(unittest.TestCase):
+
+	def setUp(self):
+		self.updated = threading.Event()
+		self.on_add_log = mock.MagicMock()
+		self.monitor = StateMonitor(interval=0.2, on_update=lambda data: self.updated.set(),
+		                            on_add_log=self.on_add_log)
+
+	def test_batch(self):
+		for line in ("Send: M105", "Recv: ok T:21.0 /0.0"):
+			self.monitor.add_log(line)
+
+		self.assertTrue(self.updated.wait(5))
+		self.on_add_log.assert_called_once_with(["Send: M105", "Recv: ok T:21.0 /0.0"])
+
+	def test_no_logs(self):
+		self.monitor.set_current_z(1.0)
+
+		self.assertTrue(self.updated.wait(5))
+		self.assertFalse(self.on_add_log.called)
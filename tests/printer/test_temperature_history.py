@@ -0,0 +1,71 @@
+# coding=utf-8
+from __future__ import absolute_import
+
+__license__ = 'GNU Affero General Public License http://www.gnu.org/licenses/agpl.html'
+__copyright__ = "Copyright (C) 2016 The OctoPrint Project - Released under terms of the AGPLv3 License"
+
+import unittest
+import mock
+
+from octoprint.printer.standard import TemperatureHistory
+
+
+class TemperatureHistoryTest(unittest.TestCase):
+
+	def setUp(self):
+		self.time_patcher = mock.patch("octoprint.printer.standard.time")
+		self.time = self.time_patcher.start()
+		self.time.time.return_value = 1000
+		self.addCleanup(self.time_patcher.stop)
+
+	def test_append(self):
+		history = TemperatureHistory(cutoff=60)
+		for t in range(990, 1000):
+			history.append(dict(time=t))
+
+		self.assertEquals(10, len(history))
+		self.assertEquals(range(990, 1000), [entry["time"] for entry in history])
+
+	def test_append_evicts_outdated(self):
+		history = TemperatureHistory(cutoff=60)
+		for t in range(900, 1000):
+			history.append(dict(time=t))
+
+		self.assertEquals(60, len(history))
+		self.assertEquals(940, history[0]["time"])
+
+	def test_read_evicts_outdated(self):
+		history = TemperatureHistory(cutoff=60)
+		for t in range(990, 1000):
+			history.append(dict(time=t))
+
+		self.time.time.return_value = 1055
+
+		self.assertEquals(5, len(history))
+		self.assertEquals(range(995, 1000), [entry["time"] for entry in history])
+
+	def test_capacity(self):
+		history = TemperatureHistory(cutoff=60, capacity=5)
+		for t in range(990, 1000):
+			history.append(dict(time=t))
+
+		self.assertEquals(5, len(history))
+		self.assertEquals(range(995, 1000), [entry["time"] for entry in history])
+
+	def test_frequent_reports(self):
+		history = TemperatureHistory(cutoff=60)
+		for t in range(940, 1000):
+			for _ in range(4):
+				history.append(dict(time=t))
+
+		self.time.time.return_value = 999
+
+		self.assertEquals(240, len(history))
+		self.assertEquals(940, history[0]["time"])
+
+	def test_recent(self):
+		history = TemperatureHistory(cutoff=60)
+		for t in range(940, 1000):
+			history.append(dict(time=t))
+
+		self.assertEquals(range(990, 1000), [entry["time"] for entry in history[-10:]])
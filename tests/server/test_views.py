@@ -0,0 +1,130 @@
+# coding=utf-8
+"""
+Unit tests for the fingerprint registry and the translation catalog cache in ``octoprint.server.views``.
+"""
+
+from __future__ import absolute_import
+
+__license__ = 'GNU Affero General Public License http://www.gnu.org/licenses/agpl.html'
+__copyright__ = "Copyright (C) 2016 The OctoPrint Project - Released under terms of the AGPLv3 License"
+
+
+import os
+import shutil
+import tempfile
+import unittest
+
+import babel.messages.pofile
+import mock
+
+import octoprint.server.views
+from octoprint.server.views import Fingerprint, FingerprintRegistry
+
+
+PO_TEMPLATE = """
+msgid ""
+msgstr ""
+"Plural-Forms: nplurals=2; plural=(n != 1)\\n"
+
+msgid "Hello"
+msgstr "{}"
+"""
+
+
+class FingerprintRegistryTest(unittest.TestCase):
+
+	def setUp(self):
+		self.registry = FingerprintRegistry()
+		self.factory = mock.MagicMock(side_effect=lambda: Fingerprint(["a"], None, "etag"))
+
+	def test_get_computes_once(self):
+		first = self.registry.get(("index", "en"), self.factory)
+		second = self.registry.get(("index", "en"), self.factory)
+
+		self.assertIs(first, second)
+		self.assertEquals(1, self.factory.call_count)
+
+	def test_get_per_key(self):
+		self.registry.get(("index", "en"), self.factory)
+		self.registry.get(("index", "de"), self.factory)
+
+		self.assertEquals(2, self.factory.call_count)
+
+	def test_invalidate(self):
+		self.registry.get(("index", "en"), self.factory)
+		self.registry.invalidate()
+		self.registry.get(("index", "en"), self.factory)
+
+		self.assertEquals(2, self.factory.call_count)
+
+	def test_invalidate_while_computing(self):
+		def factory():
+			self.registry.invalidate()
+			return Fingerprint([], None, "stale")
+
+		self.assertEquals("stale", self.registry.get(("index", "en"), factory).etag)
+		self.assertEquals("etag", self.registry.get(("index", "en"), self.factory).etag)
+
+
+class FingerprintForI18nTest(unittest.TestCase):
+
+	def setUp(self):
+		self.registry = FingerprintRegistry()
+		registry_patcher = mock.patch("octoprint.server.views.fingerprints", self.registry)
+		registry_patcher.start()
+		self.addCleanup(registry_patcher.stop)
+
+		self.basedir = tempfile.mkdtemp()
+		self.addCleanup(shutil.rmtree, self.basedir)
+		self.po_file = os.path.join(self.basedir, "messages.po")
+		with open(self.po_file, "w") as f:
+			f.write(PO_TEMPLATE.format("Hallo"))
+
+	def test_files_collected_once(self):
+		with mock.patch("octoprint.server.views._get_all_translationfiles", return_value=[self.po_file]) as collect:
+			first = octoprint.server.views._fingerprint_for_i18n("de", "messages")
+			second = octoprint.server.views._fingerprint_for_i18n("de", "messages")
+
+		self.assertEquals(1, collect.call_count)
+		self.assertEquals([self.po_file], first.files)
+		self.assertEquals(first.etag, second.etag)
+		self.assertIsNotNone(first.lastmodified)
+
+	def test_etag_changes_after_invalidation(self):
+		with mock.patch("octoprint.server.views._get_all_translationfiles", return_value=[self.po_file]):
+			before = octoprint.server.views._fingerprint_for_i18n("de", "messages")
+
+			os.utime(self.po_file, (1000000000, 1000000000))
+			self.registry.invalidate()
+			after = octoprint.server.views._fingerprint_for_i18n("de", "messages")
+
+		self.assertNotEquals(before.etag, after.etag)
+
+	def test_get_catalog_cached(self):
+		with mock.patch("babel.messages.pofile.read_po", wraps=babel.messages.pofile.read_po) as read_po:
+			first = octoprint.server.views._get_catalog(self.po_file, "de", "messages")
+			second = octoprint.server.views._get_catalog(self.po_file, "de", "messages")
+
+		self.assertEquals(1, read_po.call_count)
+		self.assertIs(first, second)
+		self.assertEquals("Hallo", first[0]["Hello"])
+
+	def test_get_catalog_modified(self):
+		first = octoprint.server.views._get_catalog(self.po_file, "de", "messages")
+
+		with open(self.po_file, "w") as f:
+			f.write(PO_TEMPLATE.format("Servus"))
+		os.utime(self.po_file, (2000000000, 2000000000))
+
+		second = octoprint.server.views._get_catalog(self.po_file, "de", "messages")
+		self.assertEquals("Hallo", first[0]["Hello"])
+		self.assertEquals("Servus", second[0]["Hello"])
+
+	def test_deleted_file(self):
+		with mock.patch("octoprint.server.views._get_all_translationfiles", return_value=[self.po_file]):
+			octoprint.server.views._fingerprint_for_i18n("de", "messages")
+			os.remove(self.po_file)
+
+			self.assertEquals((None, None), octoprint.server.views._get_catalog(self.po_file, "de", "messages"))
+			self.assertEquals(dict(), octoprint.server.views._get_translations("de", "messages")[0])
+			self.assertIsNone(octoprint.server.views._compute_date([self.po_file]))
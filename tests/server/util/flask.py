@@ -14,7 +14,8 @@ import unittest
 import mock
 from ddt import ddt, data, unpack
 
-from octoprint.server.util.flask import ReverseProxiedEnvironment, OctoPrintFlaskRequest, OctoPrintFlaskResponse
+from octoprint.server.util.flask import ReverseProxiedEnvironment, OctoPrintFlaskRequest, OctoPrintFlaskResponse, \
+	CachedResponse, ResponseCache
 
 standard_environ = {
 	"HTTP_HOST": "localhost:5000",
@@ -590,3 +591,102 @@ class OctoPrintFlaskResponseTest(unittest.TestCase):
 			with mock.patch("flask.Response.delete_cookie") as delete_cookie_mock:
 				response.delete_cookie("some_key", "some_value", **kwargs)
 				delete_cookie_mock.assert_called_once_with(response, "some_key_P5000", "some_value", path=expected_path)
+
+
+def cached_response(size):
+	return CachedResponse("x" * size, "200 OK", (), size)
+
+class ResponseCacheTest(unittest.TestCase):
+
+	def setUp(self):
+		self.cache = ResponseCache(max_size=100, default_timeout=-1)
+
+	def test_get_and_set(self):
+		value = cached_response(10)
+		self.assertTrue(self.cache.set("key", value))
+
+		self.assertIs(value, self.cache.get("key"))
+		self.assertIsNone(self.cache.get("other"))
+		self.assertTrue("key" in self.cache)
+
+		stats = self.cache.stats()
+		self.assertEquals(1, stats["hits"])
+		self.assertEquals(1, stats["misses"])
+		self.assertEquals(10, stats["size"])
+
+	def test_evict_least_recently_used(self):
+		for key in ("a", "b", "c"):
+			self.cache.set(key, cached_response(40))
+		self.assertFalse("a" in self.cache)
+
+		self.cache.get("b")
+		self.cache.set("d", cached_response(40))
+
+		self.assertFalse("c" in self.cache)
+		self.assertTrue("b" in self.cache)
+		self.assertTrue("d" in self.cache)
+		self.assertEquals(2, self.cache.stats()["evictions"])
+		self.assertEquals(80, self.cache.stats()["size"])
+
+	def test_set_replaces(self):
+		self.cache.set("key", cached_response(60))
+		self.cache.set("key", cached_response(70))
+
+		self.assertEquals(1, len(self.cache))
+		self.assertEquals(70, self.cache.stats()["size"])
+		self.assertEquals(0, self.cache.stats()["evictions"])
+
+	def test_set_too_large(self):
+		self.cache.set("key", cached_response(10))
+		self.assertFalse(self.cache.set("key", cached_response(101)))
+
+		self.assertFalse("key" in self.cache)
+		self.assertEquals(0, self.cache.stats()["size"])
+
+	def test_set_clears_bypassed(self):
+		self.cache.set_bypassed("key")
+		self.assertTrue(self.cache.is_bypassed("key"))
+
+		self.cache.set("key", cached_response(10))
+		self.assertFalse(self.cache.is_bypassed("key"))
+
+	def test_timeout(self):
+		with mock.patch("octoprint.server.util.flask.time.time", return_value=1000.0):
+			self.cache.set("key", cached_response(10), timeout=5)
+
+		with mock.patch("octoprint.server.util.flask.time.time", return_value=1004.0):
+			self.assertIsNotNone(self.cache.get("key"))
+
+		with mock.patch("octoprint.server.util.flask.time.time", return_value=1005.0):
+			self.assertFalse("key" in self.cache)
+			self.assertIsNone(self.cache.get("key"))
+
+		stats = self.cache.stats()
+		self.assertEquals(1, stats["expirations"])
+		self.assertEquals(0, stats["entries"])
+		self.assertEquals(0, stats["size"])
+
+class CachedResponseTest(unittest.TestCase):
+
+	def test_round_trip(self):
+		import flask
+		app = flask.Flask(__name__)
+
+		with app.test_request_context():
+			response = flask.make_response(("some body", 201, [("X-Custom", "value")]))
+			cached = CachedResponse.from_response(response)
+
+			self.assertEquals("some body", cached.body)
+			self.assertEquals(len("some body") + sum(len(k) + len(v) for k, v in cached.headers), cached.size)
+
+			first = cached.to_response()
+			second = cached.to_response()
+
+		self.assertIsNot(first, second)
+		for restored in (first, second):
+			self.assertEquals(201, restored.status_code)
+			self.assertEquals("some body", restored.data)
+			self.assertEquals("value", restored.headers["X-Custom"])
+
+		first.headers["X-From-Cache"] = "true"
+		self.assertFalse("X-From-Cache" in second.headers)
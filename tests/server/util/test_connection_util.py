@@ -0,0 +1,170 @@
+# coding=utf-8
+"""
+Unit tests for the USB hotplug detection in ``octoprint.server.util.connection_util``.
+"""
+
+from __future__ import absolute_import
+
+__license__ = 'GNU Affero General Public License http://www.gnu.org/licenses/agpl.html'
+__copyright__ = "Copyright (C) 2016 The OctoPrint Project - Released under terms of the AGPLv3 License"
+
+
+import threading
+import unittest
+
+import mock
+
+from octoprint.server.util.connection_util import ATTACHED, DETACHED, FakeDeviceSource, HotplugWatcher, \
+	PollingDeviceSource, UdevDeviceSource
+
+
+class Callback(object):
+	def __init__(self, results):
+		self.results = list(results)
+		self.called = threading.Semaphore(0)
+		self.call_count = 0
+
+	def __call__(self):
+		self.call_count += 1
+		self.called.release()
+		return self.results.pop(0) if self.results else True
+
+	def wait(self, timeout=5):
+		# threading.Semaphore.acquire has no timeout on Python 2
+		event = threading.Event()
+
+		def acquire():
+			self.called.acquire()
+			event.set()
+		thread = threading.Thread(target=acquire)
+		thread.daemon = True
+		thread.start()
+		return event.wait(timeout)
+
+
+class HotplugWatcherTest(unittest.TestCase):
+
+	def setUp(self):
+		self.source = FakeDeviceSource()
+		self.on_detach = Callback([])
+
+	def _watcher(self, on_attach):
+		watcher = HotplugWatcher(on_attach, on_detach=self.on_detach, source=self.source)
+		watcher.start()
+		self.addCleanup(watcher.stop)
+		self.assertTrue(self.source.started.wait(5))
+		return watcher
+
+	def test_attach(self):
+		on_attach = Callback([True])
+		self._watcher(on_attach)
+
+		self.source.attach()
+
+		self.assertTrue(on_attach.wait())
+		self.assertEquals(1, on_attach.call_count)
+
+	def test_present_on_start(self):
+		self.source = FakeDeviceSource(present=True)
+		on_attach = Callback([True])
+		self._watcher(on_attach)
+
+		self.assertTrue(on_attach.wait())
+
+	def test_detach(self):
+		self._watcher(Callback([True]))
+
+		self.source.attach()
+		self.source.detach()
+
+		self.assertTrue(self.on_detach.wait())
+
+	def test_retry(self):
+		on_attach = Callback([False, True])
+		with mock.patch.object(HotplugWatcher, "RETRY_MIN_INTERVAL", 0.01):
+			self._watcher(on_attach)
+			self.source.attach()
+
+			self.assertTrue(on_attach.wait())
+			self.assertTrue(on_attach.wait())
+
+	def test_rescan(self):
+		on_attach = Callback([False, True])
+		with mock.patch.object(HotplugWatcher, "RETRY_MIN_INTERVAL", 60):
+			watcher = self._watcher(on_attach)
+			self.source.attach()
+			self.assertTrue(on_attach.wait())
+
+			watcher.rescan()
+			self.assertTrue(on_attach.wait())
+
+	def test_rescan_not_present(self):
+		on_attach = Callback([])
+		watcher = self._watcher(on_attach)
+
+		watcher.rescan()
+
+		self.assertFalse(on_attach.wait(0.1))
+
+
+class PollingDeviceSourceTest(unittest.TestCase):
+
+	def setUp(self):
+		patcher = mock.patch.object(PollingDeviceSource, "MIN_INTERVAL", 0.001)
+		patcher.start()
+		self.addCleanup(patcher.stop)
+		patcher = mock.patch.object(PollingDeviceSource, "MAX_INTERVAL", 0.01)
+		patcher.start()
+		self.addCleanup(patcher.stop)
+
+		self.printers = []
+		self.source = PollingDeviceSource(printer_list=lambda: self.printers)
+		self.addCleanup(self.source.stop)
+
+	def test_attach_detach(self):
+		events = []
+		changed = threading.Event()
+
+		def callback(event):
+			events.append(event)
+			changed.set()
+
+		self.source.start(callback)
+		self.assertFalse(self.source.is_present())
+
+		self.printers = [dict(Product="BEETHEFIRST")]
+		self.assertTrue(changed.wait(5))
+		changed.clear()
+
+		self.printers = []
+		self.assertTrue(changed.wait(5))
+
+		self.assertEquals([ATTACHED, DETACHED], events)
+
+
+class UdevDeviceSourceTest(unittest.TestCase):
+
+	def setUp(self):
+		# no udev context needed for matching devices
+		self.source = UdevDeviceSource.__new__(UdevDeviceSource)
+		self.events = []
+		self.source._callback = self.events.append
+
+	def _device(self, action, product):
+		device = mock.MagicMock()
+		device.action = action
+		device.get.side_effect = lambda key: product if key == "PRODUCT" else None
+		return device
+
+	def test_bvc_devices(self):
+		self.source._on_device(self._device("add", "29c9/1/100"))
+		self.source._on_device(self._device("remove", "ffff/14e/100"))
+
+		self.assertEquals([ATTACHED, DETACHED], self.events)
+
+	def test_other_devices(self):
+		self.source._on_device(self._device("add", "46d/c52b/1201"))
+		self.source._on_device(self._device("add", "ffff/14f/100"))
+		self.source._on_device(self._device("add", None))
+
+		self.assertEquals([], self.events)
@@ -0,0 +1,237 @@
+# coding=utf-8
+"""
+Unit tests for ``octoprint.server.util.sockjs``.
+"""
+
+from __future__ import absolute_import
+
+__license__ = 'GNU Affero General Public License http://www.gnu.org/licenses/agpl.html'
+__copyright__ = "Copyright (C) 2016 The OctoPrint Project - Released under terms of the AGPLv3 License"
+
+
+import json
+import unittest
+
+import mock
+
+from octoprint.server.util.sockjs import CurrentDataEncoder, PrinterStateConnection
+
+
+def current_data(completion=None, state="Operational"):
+	return dict(state=dict(text=state), job=dict(file=dict(name=None, origin=None)), currentZ=None,
+	            progress=dict(completion=completion), offsets=dict())
+
+
+class CurrentDataEncoderTest(unittest.TestCase):
+
+	def setUp(self):
+		self.printer = mock.MagicMock()
+		self.printer.is_printing.return_value = False
+		self.printer.is_paused.return_value = False
+
+		self.file_manager = mock.MagicMock()
+		self.file_manager.get_busy_files.return_value = []
+
+		self.encoder = CurrentDataEncoder(self.printer, self.file_manager)
+
+	def test_update_same_frame(self):
+		seq1, state = self.encoder.update(current_data())
+		seq2, _ = self.encoder.update(current_data())
+
+		self.assertEquals(seq1, seq2)
+		self.assertEquals([], state["busyFiles"])
+		self.assertEquals(1, self.file_manager.get_busy_files.call_count)
+
+	def test_update_changed_frame(self):
+		seq1, _ = self.encoder.update(current_data(completion=1.0))
+		seq2, state = self.encoder.update(current_data(completion=2.0))
+
+		self.assertEquals(seq1 + 1, seq2)
+		self.assertEquals(2.0, state["progress"]["completion"])
+
+	def test_update_busy_files_changed(self):
+		seq1, _ = self.encoder.update(current_data())
+
+		self.file_manager.get_busy_files.return_value = [("local", "test.gcode")]
+		with mock.patch("octoprint.server.util.sockjs.time.time", return_value=1e10):
+			seq2, state = self.encoder.update(current_data())
+
+		self.assertEquals(seq1 + 1, seq2)
+		self.assertEquals([dict(origin="local", name="test.gcode")], state["busyFiles"])
+
+	def test_update_modified_in_place(self):
+		data = current_data(completion=1.0)
+		seq1, _ = self.encoder.update(data)
+
+		data["job"]["file"]["name"] = "test.gcode"
+		with mock.patch("octoprint.server.util.sockjs.time.time", return_value=1e10):
+			seq2, _ = self.encoder.update(data)
+
+		self.assertEquals(seq1 + 1, seq2)
+		delta = json.loads(self.encoder.serialize(seq2, seq1))
+		self.assertEquals(["job"], delta["changed"].keys())
+
+	def test_serialize_keyframe(self):
+		seq, _ = self.encoder.update(current_data(completion=1.0))
+
+		delta = json.loads(self.encoder.serialize(seq))
+		self.assertEquals(seq, delta["seq"])
+		self.assertIsNone(delta["base"])
+		self.assertEquals(set(CurrentDataEncoder.STATE_KEYS + ("busyFiles",)), set(delta["changed"].keys()))
+
+	def test_serialize_delta(self):
+		base, _ = self.encoder.update(current_data(completion=1.0))
+		seq, _ = self.encoder.update(current_data(completion=2.0))
+
+		delta = json.loads(self.encoder.serialize(seq, base))
+		self.assertEquals(dict(seq=seq, base=base, changed=dict(progress=dict(completion=2.0))), delta)
+
+	def test_serialize_shared(self):
+		base, _ = self.encoder.update(current_data(completion=1.0))
+		seq, _ = self.encoder.update(current_data(completion=2.0))
+
+		self.assertIs(self.encoder.serialize(seq, base), self.encoder.serialize(seq, base))
+
+	def test_serialize_unknown_base(self):
+		base, _ = self.encoder.update(current_data(completion=0))
+		for completion in range(1, CurrentDataEncoder.HISTORY_SIZE + 1):
+			seq, _ = self.encoder.update(current_data(completion=completion))
+
+		delta = json.loads(self.encoder.serialize(seq, base))
+		self.assertIsNone(delta["base"])
+		self.assertEquals(CurrentDataEncoder.HISTORY_SIZE, delta["changed"]["progress"]["completion"])
+
+
+class PrinterStateConnectionTest(unittest.TestCase):
+
+	def setUp(self):
+		self.printer = mock.MagicMock()
+		self.printer.is_printing.return_value = False
+		self.printer.is_paused.return_value = False
+
+		self.file_manager = mock.MagicMock()
+		self.file_manager.get_busy_files.return_value = []
+
+		self.printer.get_log_lines.return_value = (0, [])
+
+		self.encoder = CurrentDataEncoder(self.printer, self.file_manager)
+
+	def _connection(self):
+		session = mock.MagicMock()
+		session.is_closed = False
+		session.send_expects_json = True
+
+		connection = PrinterStateConnection(self.printer, self.file_manager, None, None, None, None, session,
+		                                    currentDataEncoder=self.encoder)
+		connection._baseRateLimit = 0
+		return connection, session
+
+	def _sent(self, session):
+		return [json.loads(call[0][0]) for call in session.send_jsonified.call_args_list]
+
+	def test_current(self):
+		connection, session = self._connection()
+		connection.on_printer_add_temperature(dict(time=1))
+
+		connection.on_printer_send_current_data(current_data(completion=1.0))
+
+		self.assertFalse(session.send_jsonified.called)
+		payload = session.send_message.call_args[0][0]["current"]
+		self.assertEquals(1.0, payload["progress"]["completion"])
+		self.assertEquals([], payload["busyFiles"])
+		self.assertEquals([dict(time=1)], payload["temps"])
+
+	def test_current_logs(self):
+		from octoprint.util import SequencedRingBuffer
+		log = SequencedRingBuffer(10, initial_data=["Send: M105"])
+		self.printer.get_log_lines.side_effect = log.since
+
+		connection1, session1 = self._connection()
+		connection2, session2 = self._connection()
+		cursor, _ = log.since()
+		connection1.on_printer_send_initial_data(dict(logs=["Send: M105"], logCursor=cursor))
+
+		log.extend(["Recv: ok T:21.0 /0.0", "Send: G28"])
+		for connection in (connection1, connection2):
+			connection.on_printer_send_current_data(current_data())
+		log.append("Recv: ok")
+		connection1.on_printer_send_current_data(current_data())
+
+		logs = lambda session: [call[0][0]["current"]["logs"] for call in session.send_message.call_args_list
+		                        if "current" in call[0][0]]
+		self.assertEquals([["Recv: ok T:21.0 /0.0", "Send: G28"], ["Recv: ok"]], logs(session1))
+
+		# no history received yet, the lines are part of it once it arrives
+		self.assertEquals([[]], logs(session2))
+
+	def test_initial_data_log_cursor(self):
+		connection, session = self._connection()
+		connection.on_printer_send_initial_data(dict(logs=["Send: M105"], logCursor=1))
+
+		history = session.send_message.call_args[0][0]["history"]
+		self.assertEquals(["Send: M105"], history["logs"])
+		self.assertNotIn("logCursor", history)
+		self.assertEquals(1, connection._logCursor)
+
+	def test_current_delta(self):
+		connection, session = self._connection()
+		connection.on_message(json.dumps(dict(deltas=True)))
+
+		connection.on_printer_send_current_data(current_data(completion=1.0))
+		connection.on_printer_add_temperature(dict(time=1))
+		connection.on_printer_send_current_data(current_data(completion=2.0))
+
+		keyframe, delta = [message["currentDelta"] for message in self._sent(session)]
+
+		self.assertIsNone(keyframe["delta"]["base"])
+		self.assertEquals(set(CurrentDataEncoder.STATE_KEYS + ("busyFiles",)), set(keyframe["delta"]["changed"].keys()))
+		self.assertEquals([], keyframe["temps"])
+
+		self.assertEquals(keyframe["delta"]["seq"], delta["delta"]["base"])
+		self.assertEquals(dict(progress=dict(completion=2.0)), delta["delta"]["changed"])
+		self.assertEquals([dict(time=1)], delta["temps"])
+		self.assertEquals([], delta["logs"])
+		self.assertEquals([], delta["messages"])
+		self.assertIn("serverTime", delta)
+
+	def test_current_delta_shared(self):
+		connection1, session1 = self._connection()
+		connection2, session2 = self._connection()
+		for connection in (connection1, connection2):
+			connection.on_message(json.dumps(dict(deltas=True)))
+
+		for completion in (1.0, 2.0):
+			for connection in (connection1, connection2):
+				connection.on_printer_send_current_data(current_data(completion=completion))
+
+		deltas = lambda session: [message["currentDelta"]["delta"] for message in self._sent(session)]
+		self.assertEquals(deltas(session1), deltas(session2))
+		self.assertEquals(2, self.file_manager.get_busy_files.call_count)
+
+	def test_current_delta_keyframe_interval(self):
+		connection, session = self._connection()
+		connection.on_message(json.dumps(dict(deltas=True)))
+
+		with mock.patch("octoprint.server.util.sockjs.time.time") as time_mock:
+			time_mock.return_value = 1000.0
+			connection.on_printer_send_current_data(current_data(completion=1.0))
+			time_mock.return_value = 1001.0
+			connection.on_printer_send_current_data(current_data(completion=2.0))
+			time_mock.return_value = 1000.0 + PrinterStateConnection.KEYFRAME_INTERVAL + 1
+			connection.on_printer_send_current_data(current_data(completion=3.0))
+
+		bases = [message["currentDelta"]["delta"]["base"] for message in self._sent(session)]
+		self.assertIsNone(bases[0])
+		self.assertIsNotNone(bases[1])
+		self.assertIsNone(bases[2])
+
+	def test_current_delta_rerequested(self):
+		connection, session = self._connection()
+		connection.on_message(json.dumps(dict(deltas=True)))
+		connection.on_printer_send_current_data(current_data(completion=1.0))
+
+		connection.on_message(json.dumps(dict(deltas=True)))
+		connection.on_printer_send_current_data(current_data(completion=2.0))
+
+		bases = [message["currentDelta"]["delta"]["base"] for message in self._sent(session)]
+		self.assertEquals([None, None], bases)
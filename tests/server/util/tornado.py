@@ -10,6 +10,7 @@ __license__ = 'GNU Affero General Public License http://www.gnu.org/licenses/agp
 __copyright__ = "Copyright (C) 2016 The OctoPrint Project - Released under terms of the AGPLv3 License"
 
 
+import os
 import unittest
 import mock
 from ddt import ddt, data, unpack
@@ -93,3 +94,251 @@ class ExtendedHeaderValueTest(unittest.TestCase):
 		actual = _extended_header_value(value)
 
 		self.assertEqual(expected, actual)
+
+
+##~~ UploadStorageFallbackHandler
+
+MULTIPART_BODY = b"\r\n".join([
+	b"preamble to ignore",
+	b"--boundary",
+	b"Content-Disposition: form-data; name=\"file\"; filename=\"test.gcode\"",
+	b"Content-Type: application/octet-stream",
+	b"",
+	b"G28\r\n--boundar\r\nG1 X10\r\n",
+	b"--boundary",
+	b"Content-Disposition: form-data; name=\"select\"",
+	b"",
+	b"true",
+	b"--boundary",
+	b"Content-Disposition: form-data; name=\"file.path\"",
+	b"",
+	b"/etc/passwd",
+	b"--boundary--",
+	b""
+])
+MULTIPART_FILE = b"G28\r\n--boundar\r\nG1 X10\r\n"
+
+
+class RecordingSink(object):
+	def __init__(self):
+		self.data = b""
+		self.finished = False
+		self.aborted = False
+
+	def update(self, data):
+		self.data += data
+
+	def finish(self):
+		self.finished = True
+
+	def abort(self):
+		self.aborted = True
+
+	@property
+	def result(self):
+		return len(self.data) if self.finished else None
+
+
+@ddt
+class UploadStorageFallbackHandlerTest(unittest.TestCase):
+
+	def setUp(self):
+		import tempfile
+		self.folder = tempfile.mkdtemp()
+
+		self.bodies = []
+		self.files = dict()
+		self.sinks = dict()
+
+	def tearDown(self):
+		import shutil
+		shutil.rmtree(self.folder)
+
+	def _fallback(self, request, body):
+		import cgi
+		import io
+
+		self.bodies.append(body)
+		if request.headers.get("Content-Type", "").startswith("multipart"):
+			environ = dict(REQUEST_METHOD="POST", CONTENT_TYPE=request.headers["Content-Type"], CONTENT_LENGTH=str(len(body)))
+			form = cgi.FieldStorage(fp=io.BytesIO(body), environ=environ)
+			self.fields = dict((key, form.getfirst(key)) for key in form.keys())
+			if "file.path" in self.fields:
+				with open(self.fields["file.path"], "rb") as f:
+					self.files[self.fields["file.name"]] = f.read()
+
+	def _create_sinks(self, name, filename, content_type):
+		sink = RecordingSink()
+		self.sinks[filename] = sink
+		return dict(length=sink)
+
+	def _handler(self, content_type="multipart/form-data; boundary=boundary", sinks=None):
+		import tornado.httputil
+		import tornado.web
+		from octoprint.server.util.tornado import UploadStorageFallbackHandler
+
+		headers = tornado.httputil.HTTPHeaders({"Content-Type": content_type, "Content-Length": str(len(MULTIPART_BODY))})
+		request = tornado.httputil.HTTPServerRequest(method="POST", uri="/api/files/local", headers=headers,
+		                                             connection=mock.MagicMock())
+		handler = UploadStorageFallbackHandler(tornado.web.Application(), request, fallback=self._fallback,
+		                                       path=self.folder, sinks=sinks)
+		handler.prepare()
+		return handler
+
+	def _feed(self, handler, body, chunk_size):
+		for offset in range(0, len(body), chunk_size):
+			handler.data_received(body[offset:offset + chunk_size])
+
+	@data(1, 2, 7, 13, 64, 1024, 65536)
+	def test_multipart(self, chunk_size):
+		handler = self._handler()
+		self._feed(handler, MULTIPART_BODY, chunk_size)
+		handler._handle_method().result()
+
+		self.assertEqual(dict(test_gcode=MULTIPART_FILE), dict((k.replace(".", "_"), v) for k, v in self.files.items()))
+		self.assertEqual("true", self.fields["select"])
+		self.assertEqual(str(len(MULTIPART_FILE)), self.fields["file.size"])
+		self.assertEqual("application/octet-stream", self.fields["file.content_type"])
+
+		# client supplied fields must not override generated ones
+		self.assertNotEqual("/etc/passwd", self.fields["file.path"])
+
+		# temporary files are removed after the request was handled
+		self.assertEqual([], os.listdir(self.folder))
+
+	@data(1, 5, 65536)
+	def test_multipart_sinks(self, chunk_size):
+		handler = self._handler(sinks=self._create_sinks)
+		self._feed(handler, MULTIPART_BODY, chunk_size)
+		handler._handle_method().result()
+
+		sink = self.sinks["test.gcode"]
+		self.assertTrue(sink.finished)
+		self.assertEqual(MULTIPART_FILE, sink.data)
+		self.assertEqual(str(len(MULTIPART_FILE)), self.fields["file.length"])
+
+	def test_multipart_incomplete(self):
+		import tornado.web
+
+		handler = self._handler(sinks=self._create_sinks)
+		self._feed(handler, MULTIPART_BODY[:MULTIPART_BODY.index(b"G1 X10")], 16)
+
+		self.assertRaises(tornado.web.HTTPError, handler._handle_method().result)
+		self.assertTrue(self.sinks["test.gcode"].aborted)
+		self.assertEqual([], self.bodies)
+		self.assertEqual([], os.listdir(self.folder))
+
+	def test_plain_body(self):
+		handler = self._handler(content_type="application/json")
+		self._feed(handler, MULTIPART_BODY, 10)
+		handler._handle_method().result()
+
+		self.assertEqual([MULTIPART_BODY], self.bodies)
+
+
+
+##~~ WsgiInputContainer
+
+import threading
+import time
+
+import tornado.testing
+import tornado.web
+
+
+class WsgiApplication(object):
+	def __init__(self):
+		self.active = 0
+		self.max_active = 0
+		self._mutex = threading.Lock()
+
+	def __call__(self, environ, start_response):
+		path = environ["PATH_INFO"]
+		with self._mutex:
+			self.active += 1
+			self.max_active = max(self.active, self.max_active)
+		try:
+			if path.startswith("/slow"):
+				time.sleep(0.3)
+			elif path == "/error":
+				raise RuntimeError("expected")
+
+			if path == "/stream":
+				body = [b"x" * 1000] * 200
+				start_response("200 OK", [("Content-Type", "text/plain"), ("Content-Length", str(200 * 1000))])
+				return iter(body)
+
+			start_response("200 OK", [("Content-Type", "text/plain")])
+			return [b"path=", path.encode("utf-8")]
+		finally:
+			with self._mutex:
+				self.active -= 1
+
+
+class WsgiInputContainerTest(tornado.testing.AsyncHTTPTestCase):
+
+	workers = 4
+	limits = [("/slow/limited", 1)]
+
+	def get_app(self):
+		from octoprint.server.util.tornado import UploadStorageFallbackHandler, WsgiInputContainer
+
+		self.wsgi_app = WsgiApplication()
+		container = WsgiInputContainer(self.wsgi_app, workers=self.workers, limits=self.limits)
+		return tornado.web.Application([(r".*", UploadStorageFallbackHandler, dict(fallback=container))])
+
+	def fetch_all(self, *paths):
+		responses = []
+
+		def callback(response):
+			responses.append((response.request.url[len(self.get_url("")):], time.time(), response))
+			if len(responses) == len(paths):
+				self.stop()
+
+		for path in paths:
+			self.http_client.fetch(self.get_url(path), callback)
+		self.wait(timeout=10)
+
+		return responses
+
+	def test_response(self):
+		response = self.fetch("/test")
+		self.assertEqual(200, response.code)
+		self.assertEqual(b"path=/test", response.body)
+		self.assertEqual("10", response.headers["Content-Length"])
+
+	def test_streamed_response(self):
+		response = self.fetch("/stream")
+		self.assertEqual(200, response.code)
+		self.assertEqual(b"x" * 200 * 1000, response.body)
+
+	def test_error(self):
+		response = self.fetch("/error")
+		self.assertEqual(500, response.code)
+
+	def test_slow_call_does_not_block(self):
+		responses = self.fetch_all("/slow/unlimited", "/fast")
+		self.assertEqual(["/fast", "/slow/unlimited"], [path for path, _, _ in responses])
+
+	def test_limit(self):
+		responses = self.fetch_all("/slow/limited", "/slow/limited", "/slow/unlimited")
+		self.assertTrue(all(response.code == 200 for _, _, response in responses))
+
+		limited = sorted(t for path, t, _ in responses if path == "/slow/limited")
+		self.assertGreaterEqual(limited[1] - limited[0], 0.25)
+		self.assertEqual(2, self.wsgi_app.max_active)
+
+
+class SynchronousWsgiInputContainerTest(WsgiInputContainerTest):
+
+	workers = 0
+	limits = None
+
+	def test_slow_call_does_not_block(self):
+		# the IOLoop is blocked while processing the slow call, so it finishes first
+		responses = self.fetch_all("/slow/unlimited", "/fast")
+		self.assertEqual(["/slow/unlimited", "/fast"], [path for path, _, _ in responses])
+
+	def test_limit(self):
+		self.fetch_all("/slow/limited", "/slow/limited", "/slow/unlimited")
+		self.assertEqual(1, self.wsgi_app.max_active)
@@ -0,0 +1,117 @@
+# coding=utf-8
+from __future__ import absolute_import
+
+__license__ = 'GNU Affero General Public License http://www.gnu.org/licenses/agpl.html'
+__copyright__ = "Copyright (C) 2016 The OctoPrint Project - Released under terms of the AGPLv3 License"
+
+
+import os
+import shutil
+import tempfile
+import unittest
+
+import mock
+
+from octoprint.settings import Settings, NoSuchSettingsPath
+
+
+class SettingsLookupCacheTest(unittest.TestCase):
+
+	def setUp(self):
+		self.basedir = tempfile.mkdtemp()
+		self.addCleanup(shutil.rmtree, self.basedir)
+		self.settings = Settings(basedir=self.basedir)
+
+	def test_get_cached(self):
+		self.assertEquals(5000, self.settings.getInt(["server", "port"]))
+
+		with mock.patch.object(self.settings, "_lookup_value") as lookup:
+			self.assertEquals(5000, self.settings.getInt(["server", "port"]))
+			self.assertFalse(lookup.called)
+
+	def test_get_missing_cached(self):
+		self.assertIsNone(self.settings.get(["server", "nonexisting"]))
+
+		with mock.patch.object(self.settings, "_lookup_value") as lookup:
+			self.assertIsNone(self.settings.get(["server", "nonexisting"]))
+			self.assertRaises(NoSuchSettingsPath, self.settings.get, ["server", "nonexisting"], error_on_path=True)
+			self.assertFalse(lookup.called)
+
+	def test_get_mutable_not_cached(self):
+		first = self.settings.get(["server", "uploads"])
+		second = self.settings.get(["server", "uploads"], merged=True)
+
+		with mock.patch.object(self.settings, "_lookup_value", return_value=dict()) as lookup:
+			self.settings.get(["server", "uploads"])
+			self.settings.get(["server", ["host", "port"]])
+			self.assertEquals(2, lookup.call_count)
+
+		self.assertEquals(first, second)
+
+	def test_set_invalidates(self):
+		self.assertEquals(5000, self.settings.getInt(["server", "port"]))
+
+		self.settings.setInt(["server", "port"], 8080)
+		self.assertEquals(8080, self.settings.getInt(["server", "port"]))
+
+		self.settings.set(["server", "port"], 5000)
+		self.assertEquals(5000, self.settings.getInt(["server", "port"]))
+
+	def test_set_concurrent_lookup(self):
+		self.assertEquals(5000, self.settings.getInt(["server", "port"]))
+
+		original_set = self.settings._set
+		def set_after_lookup(*args, **kwargs):
+			# another thread looking up the value while it is being changed
+			self.assertEquals(5000, self.settings.getInt(["server", "port"]))
+			original_set(*args, **kwargs)
+
+		with mock.patch.object(self.settings, "_set", side_effect=set_after_lookup):
+			self.settings.setInt(["server", "port"], 8080)
+
+		self.assertEquals(8080, self.settings.getInt(["server", "port"]))
+
+	def test_remove_invalidates(self):
+		self.settings.set(["server", "host"], "127.0.0.1")
+		self.assertEquals("127.0.0.1", self.settings.get(["server", "host"]))
+
+		self.settings.remove(["server", "host"])
+		self.assertEquals("0.0.0.0", self.settings.get(["server", "host"]))
+
+	def test_load_invalidates(self):
+		self.assertEquals(5000, self.settings.getInt(["server", "port"]))
+
+		with open(os.path.join(self.basedir, "config.yaml"), "a") as f:
+			f.write("server:\n  port: 8080\n")
+		self.settings.load()
+
+		self.assertEquals(8080, self.settings.getInt(["server", "port"]))
+
+	def test_set_base_folder_invalidates(self):
+		folder = os.path.join(self.basedir, "other_uploads")
+		os.makedirs(folder)
+		self.settings.getBaseFolder("uploads")
+
+		self.settings.setBaseFolder("uploads", folder)
+		self.assertEquals(folder, self.settings.getBaseFolder("uploads"))
+
+	def test_accessor(self):
+		port = self.settings.accessor(["server", "port"], type=int)
+		host = self.settings.accessor(["server", "host"])
+		self.assertEquals(5000, port())
+		self.assertEquals("0.0.0.0", host())
+
+		with mock.patch.object(self.settings, "getInt") as get_int:
+			self.assertEquals(5000, port())
+			self.assertFalse(get_int.called)
+
+		self.settings.set(["server", "port"], "8080")
+		self.assertEquals(8080, port())
+		self.assertEquals("0.0.0.0", host())
+
+	def test_accessor_boolean(self):
+		enabled = self.settings.accessor(["devel", "cache", "enabled"], type=bool)
+		self.assertTrue(enabled())
+
+		self.settings.set(["devel", "cache", "enabled"], "false")
+		self.assertFalse(enabled())
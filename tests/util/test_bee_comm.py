@@ -0,0 +1,203 @@
+# coding=utf-8
+from __future__ import absolute_import
+
+__license__ = 'GNU Affero General Public License http://www.gnu.org/licenses/agpl.html'
+__copyright__ = "Copyright (C) 2016 The OctoPrint Project - Released under terms of the AGPLv3 License"
+
+import os
+import shutil
+import tempfile
+import threading
+import unittest
+
+import mock
+
+from octoprint.util.bee_comm import BeeCom, JobPhase, PrintJobStateMachine, ResidentFileTracker
+
+
+class Countdown(object):
+	def __init__(self, polls):
+		self.polls = polls
+
+	def busy(self):
+		self.polls -= 1
+		return self.polls > 0
+
+
+class PrintJobStateMachineTest(unittest.TestCase):
+
+	def setUp(self):
+		patcher = mock.patch.object(PrintJobStateMachine, "MAX_INTERVAL", 0.01)
+		patcher.start()
+		self.addCleanup(patcher.stop)
+		patcher = mock.patch.object(PrintJobStateMachine, "MIN_INTERVAL", 0.001)
+		patcher.start()
+		self.addCleanup(patcher.stop)
+
+		self.progress = mock.MagicMock()
+		self.machine = PrintJobStateMachine(progress_callback=self.progress)
+
+		self.done = threading.Event()
+
+	def test_phases(self):
+		entered = []
+		phases = [
+			JobPhase("transfer", Countdown(3).busy, progress=lambda: 0.5, on_enter=lambda: entered.append("transfer")),
+			JobPhase("heating", Countdown(2).busy, on_enter=lambda: entered.append("heating"))
+		]
+
+		self.machine.start(phases, on_done=self.done.set)
+
+		self.assertTrue(self.done.wait(5))
+		self.assertEquals(["transfer", "heating"], entered)
+		self.assertEquals([mock.call("transfer", 0.5)] * 2, self.progress.call_args_list)
+		self.assertFalse(self.machine.is_running())
+
+		timings = self.machine.get_timings()
+		self.assertEquals(set(["transfer", "heating"]), set(timings.keys()))
+		self.assertEquals(1, timings["transfer"]["count"])
+		self.assertEquals(3, timings["transfer"]["polls"])
+		self.assertEquals(2, timings["heating"]["polls"])
+
+	def test_cancel(self):
+		phase_entered = threading.Event()
+		phases = [JobPhase("resuming", lambda: True, on_enter=phase_entered.set)]
+
+		self.machine.start(phases, on_done=self.done.set)
+		self.assertTrue(phase_entered.wait(5))
+		self.machine.cancel()
+
+		self.assertFalse(self.done.wait(0.1))
+		self.assertFalse(self.machine.is_running())
+		self.assertEquals(dict(), self.machine.get_timings())
+
+	def test_start_replaces_job(self):
+		replaced = mock.MagicMock()
+		self.machine.start([JobPhase("transfer", lambda: True)], on_done=replaced)
+		self.machine.start([JobPhase("sdTransfer", lambda: False)], on_done=self.done.set)
+
+		self.assertTrue(self.done.wait(5))
+		self.assertFalse(replaced.called)
+
+	def test_poll_error(self):
+		busy = mock.MagicMock(side_effect=[IOError(), False])
+		self.machine.start([JobPhase("transfer", busy)], on_done=self.done.set)
+
+		self.assertTrue(self.done.wait(5))
+		self.assertEquals(2, busy.call_count)
+
+
+class PrintJobStateMachineIntervalTest(unittest.TestCase):
+
+	def setUp(self):
+		self.machine = PrintJobStateMachine()
+		self.job = mock.MagicMock()
+		self.job.interval = PrintJobStateMachine.MIN_INTERVAL
+		self.job.last_progress = None
+		self.job.last_poll = None
+
+	def test_backoff_without_progress(self):
+		intervals = []
+		for now in range(10):
+			self.job.interval = self.machine._next_interval(self.job, None, float(now))
+			intervals.append(self.job.interval)
+
+		self.assertEquals(sorted(intervals), intervals)
+		self.assertEquals(PrintJobStateMachine.MAX_INTERVAL, intervals[-1])
+
+	def test_slow_progress(self):
+		# a heat-up progressing by 1% per second
+		self.machine._next_interval(self.job, 0.10, 100.0)
+		interval = self.machine._next_interval(self.job, 0.11, 101.0)
+
+		self.assertEquals(PrintJobStateMachine.MAX_INTERVAL, interval)
+
+	def test_near_completion(self):
+		self.machine._next_interval(self.job, 0.97, 100.0)
+		interval = self.machine._next_interval(self.job, 0.98, 101.0)
+
+		self.assertAlmostEquals(0.5, interval)
+
+
+class ResidentFileTrackerTest(unittest.TestCase):
+
+	def setUp(self):
+		self.folder = tempfile.mkdtemp()
+		self.addCleanup(shutil.rmtree, self.folder)
+
+		self.tracker = ResidentFileTracker()
+
+	def test_describe(self):
+		gcode = os.path.join(self.folder, "test.gcode")
+		with open(gcode, "wb") as f:
+			f.write("G28\nG1 X10\n")
+
+		self.assertEquals(("9b1ba82d243757807af759a7cb66c7802b287cb7", 11), ResidentFileTracker.describe(gcode))
+
+	def test_matches(self):
+		self.assertFalse(self.tracker.matches("SN1", "abc", 10))
+
+		self.tracker.record("SN1", "abc", 10)
+
+		self.assertTrue(self.tracker.matches("SN1", "abc", 10))
+		self.assertFalse(self.tracker.matches("SN1", "abc", 11))
+		self.assertFalse(self.tracker.matches("SN1", "def", 10))
+		self.assertFalse(self.tracker.matches("SN2", "abc", 10))
+
+	def test_invalidate(self):
+		self.tracker.record("SN1", "abc", 10)
+		self.tracker.record("SN2", "abc", 10)
+
+		self.tracker.invalidate("SN1")
+
+		self.assertFalse(self.tracker.matches("SN1", "abc", 10))
+		self.assertTrue(self.tracker.matches("SN2", "abc", 10))
+
+	def test_clear(self):
+		self.tracker.record("SN1", "abc", 10)
+		self.tracker.record("SN2", "abc", 10)
+
+		self.tracker.clear()
+
+		self.assertFalse(self.tracker.matches("SN1", "abc", 10))
+		self.assertFalse(self.tracker.matches("SN2", "abc", 10))
+
+
+class BeeComPrintFileTest(unittest.TestCase):
+
+	def setUp(self):
+		self.folder = tempfile.mkdtemp()
+		self.addCleanup(shutil.rmtree, self.folder)
+
+		self.gcode = os.path.join(self.folder, "test.gcode")
+		with open(self.gcode, "wb") as f:
+			f.write("G28\nG1 X10\n")
+
+		self.comm = BeeCom.__new__(BeeCom)
+		self.comm._logger = mock.MagicMock()
+		self.comm._beeConn = mock.MagicMock()
+		self.comm._beeConn.getConnectedPrinterSN.return_value = "SN1"
+		self.comm._beeCommands = mock.MagicMock()
+		self.comm._beeCommands.getFileList.return_value = dict(FileNames=["ABCDE"])
+		self.comm._beeCommands.repeatLastPrint.return_value = True
+		self.comm._residentFiles = ResidentFileTracker()
+		self.comm._pendingResidentFile = None
+		self.comm._transferSkipped = False
+
+	@mock.patch.object(ResidentFileTracker, "describe")
+	def test_print_file_with_hash(self, describe):
+		self.comm._residentFiles.record("SN1", "metadata hash", 11)
+
+		self.assertTrue(self.comm._printFile(self.gcode, file_hash="metadata hash"))
+
+		self.assertFalse(describe.called)
+		self.assertTrue(self.comm._transferSkipped)
+		self.comm._beeCommands.repeatLastPrint.assert_called_once_with()
+
+	def test_print_file_without_hash(self):
+		self.comm._residentFiles.record("SN1", "9b1ba82d243757807af759a7cb66c7802b287cb7", 11)
+
+		self.assertTrue(self.comm._printFile(self.gcode))
+
+		self.assertTrue(self.comm._transferSkipped)
+		self.comm._beeCommands.repeatLastPrint.assert_called_once_with()
@@ -0,0 +1,133 @@
+# coding=utf-8
+from __future__ import absolute_import
+
+__license__ = 'GNU Affero General Public License http://www.gnu.org/licenses/agpl.html'
+__copyright__ = "Copyright (C) 2016 The OctoPrint Project - Released under terms of the AGPLv3 License"
+
+import codecs
+import os
+import shutil
+import tempfile
+import unittest
+
+from octoprint.util.comm import PrintingCompiledGcodeFileInformation, PrintingGcodeFileInformation, \
+	compile_gcode_file, is_compiled_job_valid
+
+
+GCODE = "\r\n".join([
+	"; generated by a slicer",
+	"M190 S60 ; bed",
+	"M104 T0 S200",
+	"",
+	"G28",
+	"G1 X10 Y10 E1.5 ; first move",
+	"   ",
+	"T1",
+	"M109 S210",
+	"M117 Hello \\; World",
+	"G1 X20"
+]) + "\r\n"
+
+
+class CompiledJobTest(unittest.TestCase):
+
+	def setUp(self):
+		self.folder = tempfile.mkdtemp()
+		self.addCleanup(shutil.rmtree, self.folder)
+
+		self.path = self._write("test.gcode", GCODE)
+		self.job_path = os.path.join(self.folder, "jobs", "test.job")
+		self.offsets = dict(tool0=5, bed=-5)
+
+	def _write(self, name, contents):
+		path = os.path.join(self.folder, name)
+		with open(path, "wb") as f:
+			f.write(contents)
+		return path
+
+	def _read_all(self, file_information):
+		file_information.start()
+		result = []
+		while True:
+			line = file_information.getNext()
+			if line is None:
+				break
+			result.append((line, file_information.getFilepos()))
+		return result
+
+	def _plain(self, path):
+		return PrintingGcodeFileInformation(path, offsets_callback=lambda: self.offsets,
+		                                    current_tool_callback=lambda: 0)
+
+	def _compiled(self, path):
+		return PrintingCompiledGcodeFileInformation(path, self.job_path, offsets_callback=lambda: self.offsets,
+		                                            current_tool_callback=lambda: 0)
+
+	def test_same_lines_as_gcode_file(self):
+		compile_gcode_file(self.path, self.job_path)
+
+		expected = [line for line, _ in self._read_all(self._plain(self.path))]
+		compiled = [line for line, _ in self._read_all(self._compiled(self.path))]
+
+		self.assertEquals(expected, compiled)
+		self.assertEquals("M190 S55.000000", compiled[0])
+		self.assertEquals("M104 T0 S205.000000", compiled[1])
+
+	def test_gcode_commands(self):
+		compile_gcode_file(self.path, self.job_path)
+
+		file_information = self._compiled(self.path)
+		file_information.start()
+		commands = []
+		while True:
+			line, gcode = file_information.getNextCommand()
+			if line is None:
+				break
+			commands.append(gcode)
+
+		self.assertEquals(["M190", "M104", "G28", "G1", "T", "M109", "M117", "G1"], commands)
+
+	def test_positions(self):
+		compile_gcode_file(self.path, self.job_path)
+
+		file_information = self._compiled(self.path)
+		positions = [pos for _, pos in self._read_all(file_information)]
+
+		self.assertEquals(GCODE.index("G28") - 2, positions[1])
+		self.assertEquals(len(GCODE), positions[-1])
+		self.assertEquals(1.0, file_information.getProgress())
+
+	def test_seek(self):
+		compile_gcode_file(self.path, self.job_path)
+
+		file_information = self._compiled(self.path)
+		file_information.start()
+		file_information.seek(GCODE.index("G28"))
+
+		self.assertEquals("G28", file_information.getNext())
+		self.assertEquals("G1 X10 Y10 E1.5", file_information.getNext())
+
+	def test_bom(self):
+		path = self._write("bom.gcode", codecs.BOM_UTF8 + "G28\nG1 X10\n")
+		compile_gcode_file(path, self.job_path)
+
+		self.assertEquals([("G28", 7), ("G1 X10", 14)], self._read_all(self._compiled(path)))
+
+	def test_valid(self):
+		self.assertFalse(is_compiled_job_valid(self.path, self.job_path))
+
+		compile_gcode_file(self.path, self.job_path)
+		self.assertTrue(is_compiled_job_valid(self.path, self.job_path))
+
+		self._write("test.gcode", GCODE + "G28\n")
+		self.assertFalse(is_compiled_job_valid(self.path, self.job_path))
+
+	def test_valid_same_second(self):
+		os.utime(self.path, (1000000000.25, 1000000000.25))
+		compile_gcode_file(self.path, self.job_path)
+		self.assertTrue(is_compiled_job_valid(self.path, self.job_path))
+
+		# replaced by a file of the same size within the same second
+		self._write("test.gcode", GCODE.replace("X10", "X11"))
+		os.utime(self.path, (1000000000.75, 1000000000.75))
+		self.assertFalse(is_compiled_job_valid(self.path, self.job_path))
@@ -0,0 +1,82 @@
+# coding=utf-8
+from __future__ import absolute_import
+
+__license__ = 'GNU Affero General Public License http://www.gnu.org/licenses/agpl.html'
+__copyright__ = "Copyright (C) 2016 The OctoPrint Project - Released under terms of the AGPLv3 License"
+
+import os
+import unittest
+
+import mock
+from ddt import ddt, data, unpack
+
+import octoprint.util.gcodeInterpreter as gcodeInterpreter
+
+PRINTER_PROFILE = dict(axes=dict(x=dict(speed=6000), y=dict(speed=6000)),
+                       extruder=dict(offsets=[(0, 0), (10, 5)]))
+
+@ddt
+class ChunkedGcodeTest(unittest.TestCase):
+
+	def setUp(self):
+		self.settings_patcher = mock.patch("octoprint.util.gcodeInterpreter.settings")
+		self.settings_getter = self.settings_patcher.start()
+		self.settings_getter.return_value.getInt.return_value = 10
+
+	def tearDown(self):
+		self.settings_patcher.stop()
+
+	@data(
+		(["G1 X10 Y10 F600", "G1 X20 E5"],),
+		(["G21", "G90", "M82", "G1 X10 E1 F1200", "G92 E0", "G1 Y10 E2", "G1 X0 Y0 E1.5"],),
+		(["G91", "M83", "G1 X10 E1 F1200", "G1 Y10 E1", "G90", "G1 X0"],),
+		(["G20", "G1 X1 Y1 E0.1 F600", "G21", "G1 X1 Y1 E0.2"],),
+		(["G1 X10 Y10 F600 ; comment", "G28", "G1 X10 Y10", "G28 X0", "G1 Y20", "G4 S2", "G4 P500"],),
+		(["G1 X10 E5 F600", "T1", "G92 E0", "G1 X20 E3", "T0", "G1 X30 E7", "T42", "G1 X40 E8"],),
+		(["N1 G1 X10 F600", "G1 Xfoo Y10", "G1 X10 Ynan E1", "M117 Printing...", "", "   "],),
+		([";filament_diameter = 1.75", "G1 X10 E10 F600"],),
+	)
+	@unpack
+	def test_same_results(self, lines):
+		legacy = gcodeInterpreter.gcode()
+		legacy._load(list(lines), PRINTER_PROFILE)
+
+		chunked = gcodeInterpreter.chunkedGcode()
+		chunked._load(list(lines), PRINTER_PROFILE)
+
+		self.assertEquals(legacy.totalMoveTimeMinute, chunked.totalMoveTimeMinute)
+		self.assertEquals(legacy.extrusionAmount, chunked.extrusionAmount)
+		self.assertEquals(legacy.extrusionVolume, chunked.extrusionVolume)
+
+	def test_same_results_file(self):
+		path = os.path.join(os.path.dirname(os.path.realpath(__file__)), "..", "filemanager", "_files", "bp_case.gcode")
+
+		legacy = gcodeInterpreter.gcode()
+		legacy.load(path, PRINTER_PROFILE)
+
+		chunked = gcodeInterpreter.chunkedGcode()
+		chunked.CHUNK_SIZE = 4096
+		chunked.BATCH_SIZE = 100
+		chunked.load(path, PRINTER_PROFILE)
+
+		self.assertEquals(legacy.totalMoveTimeMinute, chunked.totalMoveTimeMinute)
+		self.assertEquals(legacy.extrusionAmount, chunked.extrusionAmount)
+		self.assertEquals(legacy.extrusionVolume, chunked.extrusionVolume)
+
+	def test_printing_area(self):
+		chunked = gcodeInterpreter.chunkedGcode()
+		chunked._load(["G1 X50 Y50 Z5 F600", "G1 X10 Y20 Z0.3 E1", "G1 X100 Y80 E2", "G1 X200 Y200"], PRINTER_PROFILE)
+
+		self.assertEquals(dict(minX=10.0, minY=20.0, minZ=0.3, maxX=100.0, maxY=80.0, maxZ=0.3), chunked.printingArea)
+
+	def test_printing_area_no_extrusion(self):
+		chunked = gcodeInterpreter.chunkedGcode()
+		chunked._load(["G1 X50 Y50 Z5 F600"], PRINTER_PROFILE)
+
+		self.assertIsNone(chunked.printingArea)
+
+	def test_abort(self):
+		chunked = gcodeInterpreter.chunkedGcode()
+		chunked.abort()
+
+		self.assertRaises(gcodeInterpreter.AnalysisAborted, chunked._load, ["G1 X10"], PRINTER_PROFILE)
@@ -0,0 +1,116 @@
+# coding=utf-8
+from __future__ import absolute_import
+
+__license__ = 'GNU Affero General Public License http://www.gnu.org/licenses/agpl.html'
+__copyright__ = "Copyright (C) 2016 The OctoPrint Project - Released under terms of the AGPLv3 License"
+
+import unittest
+
+from ddt import ddt, data, unpack
+
+from octoprint.util import RingBuffer, SequencedRingBuffer
+
+
+@ddt
+class RingBufferTest(unittest.TestCase):
+
+	def test_append(self):
+		buffer = RingBuffer(3)
+		for i in range(2):
+			buffer.append(i)
+
+		self.assertEquals(2, len(buffer))
+		self.assertEquals([0, 1], list(buffer))
+
+	def test_append_evicts_oldest(self):
+		buffer = RingBuffer(3, initial_data=range(5))
+
+		self.assertEquals(3, len(buffer))
+		self.assertEquals([2, 3, 4], list(buffer))
+
+	def test_popleft(self):
+		buffer = RingBuffer(3, initial_data=range(4))
+
+		self.assertEquals(1, buffer.popleft())
+		self.assertEquals([2, 3], list(buffer))
+
+		buffer.append(4)
+		buffer.append(5)
+		self.assertEquals([3, 4, 5], list(buffer))
+
+	def test_popleft_empty(self):
+		buffer = RingBuffer(3)
+		self.assertRaises(IndexError, buffer.popleft)
+
+	def test_clear(self):
+		buffer = RingBuffer(3, initial_data=range(4))
+		buffer.clear()
+
+		self.assertEquals(0, len(buffer))
+		self.assertEquals([], list(buffer))
+
+	@data(0, 1, 2, -1, -2, -3)
+	def test_index(self, index):
+		buffer = RingBuffer(3, initial_data=range(5))
+		self.assertEquals([2, 3, 4][index], buffer[index])
+
+	@data(3, -4)
+	def test_index_out_of_range(self, index):
+		buffer = RingBuffer(3, initial_data=range(5))
+		self.assertRaises(IndexError, buffer.__getitem__, index)
+
+	@data(
+		(None, None, None),
+		(-2, None, None),
+		(1, None, None),
+		(None, -1, None),
+		(1, 3, None),
+		(None, None, 2),
+		(None, None, -1),
+		(-10, 10, None),
+		(3, 1, None)
+	)
+	@unpack
+	def test_slice(self, start, stop, step):
+		expected = range(10)[-6:]
+		for offset in range(6):
+			# same contents with the start at every possible position of the underlying list
+			buffer = RingBuffer(6, initial_data=range(10 - 6 - offset, 10))
+			self.assertEquals(expected[start:stop:step], buffer[start:stop:step])
+
+	def test_invalid_capacity(self):
+		self.assertRaises(ValueError, RingBuffer, 0)
+
+
+class SequencedRingBufferTest(unittest.TestCase):
+
+	def test_since_all(self):
+		buffer = SequencedRingBuffer(3, initial_data=range(4))
+
+		self.assertEquals((4, [1, 2, 3]), buffer.since())
+
+	def test_since_cursor(self):
+		buffer = SequencedRingBuffer(5, initial_data=range(2))
+		cursor, _ = buffer.since()
+
+		buffer.extend([2, 3])
+
+		self.assertEquals((4, [2, 3]), buffer.since(cursor))
+		self.assertEquals((4, []), buffer.since(4))
+
+	def test_since_evicted(self):
+		buffer = SequencedRingBuffer(3)
+		cursor, _ = buffer.since()
+
+		buffer.extend(range(5))
+
+		self.assertEquals((5, [2, 3, 4]), buffer.since(cursor))
+
+	def test_since_after_clear(self):
+		buffer = SequencedRingBuffer(3, initial_data=range(2))
+		cursor, _ = buffer.since()
+
+		buffer.clear()
+		buffer.append(2)
+
+		self.assertEquals((3, [2]), buffer.since(cursor))
@@ -0,0 +1,85 @@
+# coding=utf-8
+from __future__ import absolute_import
+
+__license__ = 'GNU Affero General Public License http://www.gnu.org/licenses/agpl.html'
+__copyright__ = "Copyright (C) 2016 The OctoPrint Project - Released under terms of the AGPLv3 License"
+
+import threading
+import unittest
+
+from octoprint.util.comm import SendWindow, regex_ok_buffer
+
+
+class SendWindowTest(unittest.TestCase):
+
+	def setUp(self):
+		self.window = SendWindow(buffer_size=64, max_commands=3)
+
+	def test_max_commands(self):
+		for _ in range(3):
+			self.assertTrue(self.window.reserve(10, timeout=0))
+		self.assertFalse(self.window.reserve(10, timeout=0))
+
+		self.window.acknowledged()
+		self.assertTrue(self.window.reserve(10, timeout=0))
+		self.assertEquals((3, 30), self.window.get_in_flight())
+
+	def test_buffer_size(self):
+		self.assertTrue(self.window.reserve(40, timeout=0))
+		self.assertFalse(self.window.reserve(30, timeout=0))
+		self.assertTrue(self.window.reserve(24, timeout=0))
+
+	def test_oversized_line_when_empty(self):
+		self.assertTrue(self.window.reserve(100, timeout=0))
+		self.assertFalse(self.window.reserve(1, timeout=0))
+
+	def test_acknowledged_in_order(self):
+		self.window.reserve(40, timeout=0)
+		self.window.reserve(10, timeout=0)
+
+		self.window.acknowledged()
+
+		self.assertEquals((1, 10), self.window.get_in_flight())
+
+	def test_acknowledged_empty(self):
+		self.window.acknowledged()
+		self.assertEquals((0, 0), self.window.get_in_flight())
+
+	def test_free_slots(self):
+		self.window.reserve(10, timeout=0)
+		self.window.acknowledged(free_slots=1)
+
+		self.assertTrue(self.window.reserve(10, timeout=0))
+		self.assertFalse(self.window.reserve(10, timeout=0))
+
+	def test_reset(self):
+		self.window.reserve(10, timeout=0)
+		self.window.acknowledged(free_slots=1)
+		self.window.reserve(10, timeout=0)
+
+		self.window.reset()
+
+		self.assertEquals((0, 0), self.window.get_in_flight())
+		for _ in range(3):
+			self.assertTrue(self.window.reserve(10, timeout=0))
+
+	def test_reserve_waits_for_acknowledgement(self):
+		for _ in range(3):
+			self.window.reserve(10, timeout=0)
+
+		timer = threading.Timer(0.05, self.window.acknowledged)
+		timer.start()
+		self.addCleanup(timer.cancel)
+
+		self.assertTrue(self.window.reserve(10, timeout=5))
+
+
+class OkBufferRegexTest(unittest.TestCase):
+
+	def test_advanced_ok(self):
+		match = regex_ok_buffer.search("ok N10 P15 B3")
+		self.assertEquals("3", match.group("free"))
+
+	def test_temperatures(self):
+		self.assertIsNone(regex_ok_buffer.search("ok T:210.0 /210.0 B:60.0 /60.0"))
+		self.assertIsNone(regex_ok_buffer.search("ok"))